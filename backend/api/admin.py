@@ -0,0 +1,97 @@
+# api/admin.py
+from fastapi import APIRouter, HTTPException, Header, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import Iterator, Optional
+import hmac
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.config import load_config
+from services.export import BATCH_SIZE, EXPORT_TABLES, ExportError, export_chunks, open_source, settled_until
+from services.profiler import list_profiles, profile_file
+from services import metrics
+
+load_config()
+
+# Operator endpoints. Disabled unless ADMIN_TOKEN is set; callers send it as X-Admin-Token.
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+
+def require_admin(token: Optional[str]) -> None:
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin API is disabled (ADMIN_TOKEN is not set)")
+    if not token or not hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.get("/export/{table}")
+async def export_table(
+    table: str,
+    format: str = Query("ndjson", pattern="^(ndjson|parquet)$"),
+    since: Optional[str] = Query(None, description="Watermark: '<created_at>|<id>' of the last row already exported"),
+    batch_size: int = Query(BATCH_SIZE, ge=1, le=10000),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Stream every row of `table` (conversations, messages, scores) after the `since`
+    watermark, oldest first, as NDJSON or a Parquet file. Rows are read in keyset
+    batches, so the response streams in constant memory. The last row's
+    "<created_at>|<id>" (finished_at for scores) is the next export's `since`;
+    X-Export-Until is the cut-off, after which rows are left for the next export.
+    """
+    require_admin(x_admin_token)
+    spec = EXPORT_TABLES.get(table)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown table '{table}'. Exportable: {', '.join(EXPORT_TABLES)}")
+
+    until = settled_until()
+    try:
+        source = open_source(spec.origin)
+        chunks = export_chunks(source, spec, format, since=since, until=until, batch_size=batch_size)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    def counted() -> Iterator[bytes]:
+        # A sync generator: Starlette iterates it in a worker thread, off the event loop
+        for chunk in chunks:
+            metrics.inc("export_bytes_total", len(chunk), table=table, format=format)
+            yield chunk
+
+    print(f"📦 Exporting {table} as {format} since {since or 'the beginning'}")
+    return StreamingResponse(
+        counted(),
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "X-Export-Until": until,
+            "Content-Disposition": f'attachment; filename="{table}.{format}"',
+        },
+    )
+
+
+@router.get("/profiles")
+async def get_profiles(x_admin_token: Optional[str] = Header(None)):
+    """
+    Stored request profiles (services/profiler.py), newest first. Profile a request
+    by sending X-Profile-Token with the admin token; its id comes back in X-Profile-Id.
+    """
+    require_admin(x_admin_token)
+    return {"profiles": list_profiles()}
+
+
+@router.get("/profiles/{filename}")
+async def download_profile(filename: str, x_admin_token: Optional[str] = Header(None)):
+    """
+    One profile file: <id>.speedscope.json (open at https://www.speedscope.app),
+    or <id>.wall.folded / <id>.cpu.folded collapsed stacks for flamegraph.pl.
+    """
+    require_admin(x_admin_token)
+    path = profile_file(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No profile file '{filename}'")
+    media_type = "application/json" if filename.endswith(".json") else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=filename)
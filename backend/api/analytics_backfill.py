@@ -0,0 +1,165 @@
+# api/analytics_backfill.py
+"""
+Backfill the progress dashboard (services/analytics.py) for conversations that
+were analysed, or never analysed, before aggregates existed.
+
+Walks conversations in keyset order and, for each one without a stored
+analysis, takes its presentation metrics from:
+    --from-jobs   the latest finished performance.analyze job in JOB_STORE_PATH
+    --analyze     a fresh metrics-only Gemini call (no memo), --concurrency at a time
+New analyses are bulk-inserted; then every user's aggregates are rebuilt in one
+pass over performance_analyses (--rebuild alone just does that, e.g. after
+deleting rows by hand).
+
+Sources:
+    --db PATH   a LocalDatabase file (services/local_db.py)
+    otherwise   Supabase via SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY
+
+Usage (from backend/):
+    python -m api.analytics_backfill [--from-jobs] [--analyze] [--rebuild] [--db /tmp/load.db]
+        [--limit 500] [--concurrency 4] [--batch-size 500]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from services.analytics import LocalAnalyticsStore, METRIC_FIELDS, SupabaseAnalyticsStore, rebuild_aggregates
+from services.config import load_config
+from services.export import EXPORT_TABLES, LocalSource, iter_batches, open_source
+from services.local_db import utc_now
+
+
+def open_store(local_db: str = None):
+    """The analytics store and export source for the same database."""
+    source = open_source("database", local_db)
+    if isinstance(source, LocalSource):
+        return LocalAnalyticsStore(source.db), source
+    return SupabaseAnalyticsStore(source.client), source
+
+
+def job_metrics() -> dict:
+    """conversation_id -> (metrics, finished_at) from the latest finished analysis job of each."""
+    try:
+        jobs = open_source("jobs")
+    except RuntimeError as e:
+        print(f"⏭️ Not importing from jobs: {e}")
+        return {}
+    found = {}
+    for batch in iter_batches(jobs, EXPORT_TABLES["scores"]):
+        for row in batch:
+            metrics = (row["result"] or {}).get("presentationMetrics")
+            if row["kind"] == "performance.analyze" and row["conversation_id"] and metrics:
+                found[row["conversation_id"]] = (metrics, row["finished_at"])
+    print(f"🗂️ {len(found)} conversations have a finished analysis job")
+    return found
+
+
+async def analyze_metrics(messages: list) -> dict:
+    """Presentation metrics only; None if the model's output couldn't be parsed."""
+    from services.clients import get_gemini_client
+    from services.model_router import model_router
+    from services.structured_output import parse_model
+    from api.performance import (FALLBACK_METRICS, PresentationMetrics, build_presentation_metrics_prompt,
+                                 format_conversation_for_analysis, structured_config)
+
+    transcript = format_conversation_for_analysis(messages)
+    if not transcript.strip():
+        return None
+    response = await model_router.generate(
+        "analysis_metrics",
+        contents=build_presentation_metrics_prompt(transcript),
+        config=structured_config(PresentationMetrics),
+        client=get_gemini_client(),
+    )
+    metrics, status = parse_model((response.text or "").strip(), PresentationMetrics, FALLBACK_METRICS)
+    return metrics.model_dump() if status in ("ok", "repaired") else None
+
+
+async def backfill(store, source, from_jobs: bool, analyze: bool, limit: int, concurrency: int,
+                   batch_size: int) -> dict:
+    from api.judge import extract_judge_key_from_history
+
+    imported = job_metrics() if from_jobs else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"conversations": 0, "from_jobs": 0, "analyzed": 0, "skipped": 0}
+
+    async def analysis_for(conversation: dict):
+        messages = await asyncio.to_thread(store.conversation_messages, conversation["id"])
+        if not messages:
+            return None
+        metrics = None
+        if conversation["id"] in imported:
+            metrics, _ = imported[conversation["id"]]
+            stats["from_jobs"] += 1
+        elif analyze and stats["analyzed"] < limit:
+            stats["analyzed"] += 1
+            async with semaphore:
+                try:
+                    metrics = await analyze_metrics(messages)
+                except Exception as e:
+                    print(f"⚠️ Analysis of {conversation['id']} failed: {e}")
+        if not metrics:
+            return None
+        return {
+            "conversation_id": conversation["id"],
+            "user_id": conversation["user_id"],
+            "judge": extract_judge_key_from_history(messages) or "unknown",
+            **{field: float(metrics[field]) for field in METRIC_FIELDS},
+            # Placeholders: rebuild_aggregates numbers them in created_at order
+            "user_seq": 0,
+            "judge_seq": 0,
+            # The pitch's own time, so the trend follows the order the pitches were made in
+            "created_at": conversation["created_at"],
+        }
+
+    for batch in iter_batches(source, EXPORT_TABLES["conversations"], batch_size=batch_size):
+        stats["conversations"] += len(batch)
+        done = await asyncio.to_thread(store.analysed, [row["id"] for row in batch])
+        pending = [row for row in batch if row["id"] not in done]
+        rows = [row for row in await asyncio.gather(*(analysis_for(c) for c in pending)) if row]
+        stats["skipped"] += len(pending) - len(rows)
+        await asyncio.to_thread(store.insert_analyses, rows)
+        print(f"📥 {stats['conversations']} conversations scanned, {len(rows)} analyses added from this batch")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="LocalDatabase path instead of Supabase")
+    parser.add_argument("--from-jobs", action="store_true", help="import metrics from finished analysis jobs")
+    parser.add_argument("--analyze", action="store_true", help="run a metrics analysis for the rest")
+    parser.add_argument("--rebuild", action="store_true", help="only rebuild aggregates from stored analyses")
+    parser.add_argument("--limit", type=int, default=500, help="at most this many --analyze calls")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    if not (args.from_jobs or args.analyze or args.rebuild):
+        parser.error("nothing to do: pass --from-jobs, --analyze and/or --rebuild")
+
+    load_config()
+    try:
+        store, source = open_store(args.db)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+    started = time.perf_counter()
+    if args.from_jobs or args.analyze:
+        stats = asyncio.run(backfill(store, source, args.from_jobs, args.analyze, args.limit, args.concurrency,
+                                     args.batch_size))
+        print(f"✅ Backfill: {stats}")
+
+    # Seqs and totals over everything stored, in the order the analyses happened. Analyses
+    # recorded live while this runs may be overwritten; rebuild again once traffic is quiet.
+    analyses = iter_batches(source, EXPORT_TABLES["performance_analyses"], until=utc_now(),
+                            batch_size=args.batch_size)
+    result = rebuild_aggregates(store, analyses)
+    print(f"📈 Rebuilt {result['aggregates']} aggregates from {result['analyses']} analyses "
+          f"({result['renumbered']} renumbered) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# api/export.py
+"""
+Bulk export of conversations, messages and scores for offline analytics.
+
+Writes one file per table per run into --out, as newline-delimited JSON
+(optionally gzipped) or Parquet (needs pyarrow), and records each table's
+watermark in --out/manifest.json. The next run into the same directory picks
+up from there and exports only newer rows; --full ignores the manifest.
+
+Sources:
+    --db PATH   a LocalDatabase file (services/local_db.py)
+    otherwise   Supabase via SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY
+    scores      always the job store in JOB_STORE_PATH (skipped if unset)
+
+Usage (from backend/):
+    python -m api.export --out exports/ [--format ndjson|parquet] [--gzip]
+        [--tables conversations,messages,scores] [--db /tmp/load.db] [--full] [--batch-size 1000]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from services.config import load_config
+from services.export import BATCH_SIZE, EXPORT_TABLES, FORMATS, ExportError, export_chunks, open_source, settled_until
+
+MANIFEST = "manifest.json"
+
+
+def load_manifest(out_dir: str) -> dict:
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir: str, manifest: dict) -> None:
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def export_table(source, table: str, out_dir: str, fmt: str, compress: bool, since, until: str,
+                 batch_size: int, run_id: str) -> dict:
+    """Export one table to a new file; returns its stats (the file is removed if no rows were new)."""
+    spec = EXPORT_TABLES[table]
+    extension = "parquet" if fmt == "parquet" else "ndjson.gz" if compress else "ndjson"
+    path = os.path.join(out_dir, f"{table}-{run_id}.{extension}")
+    progress = {}
+    started = time.perf_counter()
+    opener = gzip.open if compress and fmt == "ndjson" else open
+    with opener(path + ".part", "wb") as f:
+        for chunk in export_chunks(source, spec, fmt, since=since, until=until, batch_size=batch_size,
+                                   progress=progress):
+            f.write(chunk)
+    elapsed = time.perf_counter() - started
+
+    if progress["rows"] == 0:
+        os.remove(path + ".part")
+        path = None
+    else:
+        os.replace(path + ".part", path)
+    return {
+        "rows": progress["rows"],
+        "watermark": progress["watermark"],
+        "file": os.path.basename(path) if path else None,
+        "bytes": os.path.getsize(path) if path else 0,
+        "seconds": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="output directory (holds the manifest)")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="gzip NDJSON output")
+    parser.add_argument("--tables", default=",".join(EXPORT_TABLES))
+    parser.add_argument("--db", help="LocalDatabase path instead of Supabase")
+    parser.add_argument("--full", action="store_true", help="ignore saved watermarks and export everything")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_config()
+    os.makedirs(args.out, exist_ok=True)
+    manifest = load_manifest(args.out)
+    until = settled_until()
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    sources = {}
+
+    for table in [t.strip() for t in args.tables.split(",") if t.strip()]:
+        spec = EXPORT_TABLES.get(table)
+        if spec is None:
+            raise SystemExit(f"Unknown table '{table}'. Exportable: {', '.join(EXPORT_TABLES)}")
+        try:
+            if spec.origin not in sources:
+                sources[spec.origin] = open_source(spec.origin, args.db)
+        except RuntimeError as e:
+            print(f"⏭️ Skipping {table}: {e}")
+            continue
+
+        state = manifest["tables"].setdefault(table, {"watermark": None, "files": []})
+        since = None if args.full else state["watermark"]
+        try:
+            result = export_table(sources[spec.origin], table, args.out, args.format, args.gzip, since, until,
+                                  args.batch_size, run_id)
+        except ExportError as e:
+            raise SystemExit(str(e))
+
+        if result["file"]:
+            state["watermark"] = result["watermark"]
+            state["files"].append(result["file"])
+            save_manifest(args.out, manifest)
+        rate = result["rows"] / result["seconds"] if result["seconds"] else 0.0
+        print(f"📦 {table}: {result['rows']} rows since {since or 'the beginning'} -> "
+              f"{result['file'] or 'nothing new'} ({result['bytes'] / 1e6:.1f} MB, {rate:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
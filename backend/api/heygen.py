@@ -1,10 +1,13 @@
 # api/heygen.py
 from fastapi import APIRouter, HTTPException
-import httpx
 import os
-from dotenv import load_dotenv
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.config import load_config
+from services.breaker import CircuitOpenError
+from services.governor import UpstreamError, get_governor, raise_for_upstream_status
 
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../../.env.local"))
+load_config()
 
 router = APIRouter(prefix="/heygen", tags=["HeyGen"])
 
@@ -13,7 +16,11 @@ async def get_heygen_token():
     """
     Exchange HeyGen API key for a session token.
     This token is used by the frontend to initialize the streaming avatar.
+    While HeyGen's circuit breaker is open, returns no token and static_avatar=true
+    at once, so the frontend shows a still image instead of waiting on HeyGen.
     """
+    import httpx
+
     api_key = os.getenv("HEYGEN_API_KEY")
     if not api_key:
         raise HTTPException(
@@ -23,24 +30,30 @@ async def get_heygen_token():
     
     base_url = os.getenv("HEYGEN_API_URL", "https://api.heygen.com")
     
-    try:
+    async def create_token():
         async with httpx.AsyncClient() as client:
             response = await client.post(
                 f"{base_url}/v1/streaming.create_token",
                 headers={"x-api-key": api_key},
                 timeout=30.0
             )
-            
-            if response.status_code != 200:
-                error_detail = response.text
-                raise HTTPException(
-                    status_code=response.status_code, 
-                    detail=f"Failed to get HeyGen token: {error_detail}"
-                )
-            
-            data = response.json()
-            return {"token": data["data"]["token"]}
-    
+        raise_for_upstream_status("heygen", response)
+        return response
+
+    try:
+        response = await get_governor("heygen").run(create_token)
+        data = response.json()
+        return {"token": data["data"]["token"], "static_avatar": False}
+
+    except CircuitOpenError as e:
+        print(f"🖼️ HeyGen circuit open, falling back to a static avatar")
+        return {"token": None, "static_avatar": True, "retry_after": int(e.headers()["Retry-After"])}
+    except UpstreamError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Failed to get HeyGen token: {e.detail}",
+            headers=e.headers()
+        )
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="HeyGen API request timed out")
     except httpx.RequestError as e:
@@ -0,0 +1,41 @@
+# api/jobs.py
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.jobs import job_manager
+from services.sse import sse_event
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+@router.get("/stats")
+async def get_job_stats():
+    """Queue depth and job counts by status."""
+    return job_manager.stats()
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """
+    Poll a background job (see POST /performance/analyze/jobs and /judges/get_score/jobs).
+    `partial` fills in as results arrive; `result` is set once status is "succeeded".
+    """
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Subscribe to a job over server-sent events: a `status` snapshot first, then
+    `status`, `partial`, and finally `result` or `error`.
+    """
+    if not await job_manager.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for event, data in job_manager.subscribe(job_id):
+            yield sse_event(event, data)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -1,45 +1,47 @@
 # api/judge_api/judges.py
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, Query, Request
 from fastapi.responses import FileResponse
 from pydantic import BaseModel, Field
-from supabase import create_client, Client
-from typing import List, Literal
-from google import genai
+from typing import Awaitable, Callable, List, Literal, Optional, Tuple
+import asyncio
+import math
 import os
 import json
 import time
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-from services.elevenlabs_service import text_to_speech_base64
-
-
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../../.env.local"))
+from services.config import load_config
+from services.auth import authenticate
+from services.cache import digest, get_cache
+from services.clients import get_supabase_client, register_prewarm_hook
+from services.elevenlabs_service import AudioFormat, negotiate_audio_format, text_to_speech_base64_async
+from services.governor import UpstreamError
+from services.breaker import CircuitOpenError
+from services.model_router import model_router
+from services.structured_output import parse_model_with_defaults
+from services.jobs import Job, QueueFullError, job_manager
+from services.semantic_cache import get_reply_cache
+from services.context_cache import get_context_cache, to_gemini_contents
+from functools import partial
+from services import metrics
+from services.cancellation import Turn, TurnCancelled, resolve_heard, turn_registry
+from services.speculation import Speculation, get_speculator
+from services.memory import distil_transcript, forget, has_memories, list_memories, recall_prompt, remember
+
+
+load_config()
 
 router = APIRouter(prefix="/judges", tags=["Judges"])
 
-# Initialize client lazily
-def get_gemini_client() -> genai.Client:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing GEMINI_API_KEY in environment.")
-    return genai.Client(api_key=api_key)
-
-def get_supabase_client(user_token: str) -> Client:
-    url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-    anon_key = os.getenv("SUPABASE_KEY") or os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-    
-    if not url or not anon_key:
-        raise RuntimeError("Missing Supabase configuration. Please set SUPABASE_URL and SUPABASE_KEY or NEXT_PUBLIC_SUPABASE_URL and NEXT_PUBLIC_SUPABASE_ANON_KEY")
-    
-    # Create client with anon key - we'll verify the user token separately
-    client = create_client(url, anon_key)
-    
-    return client
+# Longest a judge reply waits for its audio before going out text-only; a slow
+# ElevenLabs shouldn't hold up a reply that is already written
+TTS_BUDGET_SECONDS = float(os.getenv("TTS_BUDGET_SECONDS", "8"))
 
+@lru_cache(maxsize=1)
 def load_personas() -> dict:
-    """Load judge personas from the local JSON file."""
+    """Load judge personas from the local JSON file (read once, on first use)."""
     path = os.path.join(os.path.dirname(__file__), "../placeholder/personas.json")
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
@@ -54,6 +56,60 @@ def get_chat_history(supabase_session, conversation_id):
     )
     return history_resp
 
+# History is cached per user as well as conversation. The Supabase client is
+# shared and carries no user session, so row-level security doesn't scope the
+# fetch: load_history checks the caller owns the conversation before reading it,
+# cached or not
+HISTORY_CACHE_TTL_SECONDS = 1800
+
+def history_cache():
+    # Rewritten every turn, so shared-tier only: a per-worker copy would go stale.
+    # Without a shared tier history isn't cached at all
+    return get_cache("history", HISTORY_CACHE_TTL_SECONDS, local=False)
+
+async def load_history(supabase_session, conversation_id: str, user_id: Optional[str] = None) -> List[dict]:
+    """
+    Conversation history. With the caller's user_id, 404 unless they own the
+    conversation, and read through the cache.
+    """
+    def fetch():
+        return get_chat_history(supabase_session, conversation_id).data or None
+
+    # Blocking Supabase reads run in a thread so they never stall other requests
+    if user_id is None:
+        return await asyncio.to_thread(fetch) or []
+    await require_conversation_owner(supabase_session, user_id, conversation_id)
+    return await history_cache().get_or_set(f"{user_id}:{conversation_id}", lambda: asyncio.to_thread(fetch)) or []
+
+# Ownership never changes, so a confirmed owner is remembered for as long as a session lasts
+OWNERSHIP_CACHE_TTL_SECONDS = 1800
+
+async def require_conversation_owner(supabase_session, user_id: str, conversation_id: str) -> None:
+    """Raise 404 unless the conversation exists and belongs to `user_id`."""
+    def fetch() -> bool:
+        rows = (
+            supabase_session.table("conversations")
+            .select("id")
+            .eq("id", conversation_id)
+            .eq("user_id", user_id)
+            .limit(1)
+            .execute()
+        ).data
+        return bool(rows)
+
+    cache = get_cache("ownership", OWNERSHIP_CACHE_TTL_SECONDS)
+    if not await cache.get_or_set(f"{user_id}:{conversation_id}", lambda: asyncio.to_thread(fetch), cache_if=bool):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+async def forget_history(user_id: Optional[str], conversation_id: str) -> None:
+    if user_id is not None:
+        await history_cache().delete(f"{user_id}:{conversation_id}")
+
+async def record_history(user_id: Optional[str], conversation_id: str, history: List[dict], rows: List[dict]) -> None:
+    """Write through `history` plus newly inserted `rows`, if they are complete database rows."""
+    if user_id is not None and rows and all(msg.get("id") for msg in history + rows):
+        await history_cache().set(f"{user_id}:{conversation_id}", history + rows)
+
 def format_openai_messages(history):
     messages = []
     for msg in history:
@@ -73,7 +129,7 @@ def extract_judge_key_from_history(history):
                     return key
     return None
 
-personas = load_personas()
+register_prewarm_hook(load_personas)
 
 # --- Data Models ---
 class JudgePersona(BaseModel):
@@ -97,6 +153,10 @@ class ConversationHistory(BaseModel):
 class NewMessageRequest(BaseModel):
     conversation_id: str
     new_message: str
+    # Audio formats the client can play, in preference order ("opus,mp3"); MP3 by default
+    audio_format: Optional[str] = None
+    # TTS latency optimization level, 0 (best quality) to 4 (fastest first chunk)
+    audio_latency: Optional[int] = Field(None, ge=0, le=4)
 
 class GetScoreRequest(BaseModel):
     conversation_id: str
@@ -117,6 +177,11 @@ def get_judge_system_prompt(name: str) -> str:
     You can be precise and ask sharp questions to the founder based on the pitch.
     """
 
+def memory_query(name: str) -> str:
+    """What a judge would want to recall about a founder: their specialties, plus the pitch basics."""
+    persona = get_judge_persona(name, load_personas())
+    return " ".join(persona.specialties + persona.causes) + " traction revenue customers market team risk raise"
+
 class SelectJudgeRequest(BaseModel):
     judge: Literal["altman", "elon", "zuck"] = None
 
@@ -150,6 +215,11 @@ class InvestmentMemoOutput(BaseModel):
     memo: InvestmentMemo
     metrics: PresentationMetrics
 
+def get_fallback_score() -> InvestmentMemoOutput:
+    """Defaults for any memo/metrics fields the model failed to return."""
+    from api.performance import FALLBACK_MEMO, FALLBACK_METRICS
+    return InvestmentMemoOutput(memo=FALLBACK_MEMO.model_dump(), metrics=FALLBACK_METRICS.model_dump())
+
 
 @router.get("/get_judges")
 async def get_judges():
@@ -218,40 +288,13 @@ async def select_judge(request: SelectJudgeRequest, authorization: str = Header(
         supabase = get_supabase_client(token)
         
         # Verify user authentication using the token directly
-        user_response = supabase.auth.get_user(token)
-        
-        if not user_response or not user_response.user:
+        user = await authenticate(supabase, token)
+        if not user:
             raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
         
-        user_id = user_response.user.id
-
-        # Validate judge selection
-        judge = request.judge.lower().strip()
-        allowed_judges = {"altman", "elon", "zuck"}
-        if judge not in allowed_judges:
-            raise HTTPException(status_code=400, detail=f"Invalid judge '{judge}'. Must be one of: {', '.join(allowed_judges)}")
-
-        # Create new conversation in database
-        convo_resp = supabase.table("conversations").insert({
-            "user_id": user_id
-        }).execute()
-        
-        if not convo_resp.data or len(convo_resp.data) == 0:
-            raise HTTPException(status_code=500, detail="Failed to create conversation")
-            
-        conversation_id = convo_resp.data[0]["id"]
-
-        # Insert the judge system prompt as the first message
-        system_prompt = get_judge_system_prompt(judge)
-        message_resp = supabase.table("messages").insert({
-            "conversation_id": conversation_id,
-            "sender": "system",
-            "content": system_prompt
-        }).execute()
-        
-        if not message_resp.data:
-            raise HTTPException(status_code=500, detail="Failed to initialize conversation with judge")
+        user_id = user.id
 
+        conversation_id, judge, _ = start_conversation(supabase, user_id, request.judge)
         return {"conversation_id": conversation_id, "judge": judge}
     
     except HTTPException:
@@ -261,8 +304,44 @@ async def select_judge(request: SelectJudgeRequest, authorization: str = Header(
         print(f"Unexpected error in select_judge: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def start_conversation(supabase, user_id: str, judge: str):
+    """
+    Create a conversation with `judge` and seed it with the judge's system prompt.
+    Returns (conversation_id, judge_key, history).
+    """
+    # Validate judge selection
+    judge = judge.lower().strip()
+    allowed_judges = {"altman", "elon", "zuck"}
+    if judge not in allowed_judges:
+        raise HTTPException(status_code=400, detail=f"Invalid judge '{judge}'. Must be one of: {', '.join(allowed_judges)}")
+
+    # Create new conversation in database
+    convo_resp = supabase.table("conversations").insert({
+        "user_id": user_id
+    }).execute()
+    
+    if not convo_resp.data or len(convo_resp.data) == 0:
+        raise HTTPException(status_code=500, detail="Failed to create conversation")
+        
+    conversation_id = convo_resp.data[0]["id"]
+
+    # Insert the judge system prompt as the first message, with what the judge
+    # remembers from the founder's earlier pitches
+    judge_names = {key: persona["name"] for key, persona in load_personas().items()}
+    system_prompt = get_judge_system_prompt(judge) + recall_prompt(user_id, judge, memory_query(judge), judge_names)
+    message_resp = supabase.table("messages").insert({
+        "conversation_id": conversation_id,
+        "sender": "system",
+        "content": system_prompt
+    }).execute()
+    
+    if not message_resp.data:
+        raise HTTPException(status_code=500, detail="Failed to initialize conversation with judge")
+
+    return conversation_id, judge, message_resp.data
+
 @router.post("/generate")
-async def generate_text(request: NewMessageRequest, authorization: str = Header(...)):
+async def generate_text(request: NewMessageRequest, http_request: Request, authorization: str = Header(...)):
     """
     Endpoint for a judge persona to respond to a pitch, keeping conversational history.
     Returns both text and audio URL.
@@ -270,16 +349,40 @@ async def generate_text(request: NewMessageRequest, authorization: str = Header(
     print(f"🎯 /judges/generate endpoint called with conversation_id: {request.conversation_id}")
     token = authorization.replace("Bearer ", "")
     supabase = get_supabase_client(token)
-    client = get_gemini_client()
     
     # Verify user authentication
-    user_response = supabase.auth.get_user(token)
-    if not user_response or not user_response.user:
+    user = await authenticate(supabase, token)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
 
-    # 🧠 Load existing conversation history
-    history_resp = get_chat_history(supabase, request.conversation_id)
-    history = history_resp.data or []
+    return await answer_founder(supabase, request.conversation_id, request.new_message, http_request,
+                                negotiate_audio_format(request.audio_format), request.audio_latency,
+                                user_id=user.id)
+
+
+def history_key(history) -> str:
+    """Identifies a conversation's history as loaded, so a reply prepared on it can be matched."""
+    return f"{len(history)}:{history[-1].get('id') if history else ''}"
+
+
+async def answer_founder(supabase, conversation_id: str, new_message: str,
+                         http_request: Optional[Request] = None, audio_format: Optional[AudioFormat] = None,
+                         audio_latency: Optional[int] = None, history: Optional[List[dict]] = None,
+                         on_reply: Optional[Callable[[str], Awaitable[None]]] = None,
+                         user_id: Optional[str] = None) -> dict:
+    """
+    Save the founder's message and the judge's reply to it: a speculative reply
+    started on a partial transcript if one matches, else a cached first-turn reply,
+    else a freshly generated one. Audio comes back in `audio_format` (MP3 by default).
+
+    Callers holding the conversation's history (e.g. a room session) pass it in to
+    skip the fetch; `on_reply` receives the reply text before its audio is synthesized.
+    With the caller's `user_id`, history is read from and written through the cache.
+    """
+    audio_format = audio_format or negotiate_audio_format()
+    if history is None:
+        # 🧠 Load existing conversation history
+        history = await load_history(supabase, conversation_id, user_id)
 
     if not history:
         raise HTTPException(status_code=404, detail="Conversation not found or empty")
@@ -293,68 +396,216 @@ async def generate_text(request: NewMessageRequest, authorization: str = Header(
 
     # 🧩 Convert history into OpenAI message format
     messages = format_openai_messages(history)
-    messages.append({"role": "user", "content": request.new_message})
+    messages.append({"role": "user", "content": new_message})
 
-    supabase.table("messages").insert({
-        "conversation_id": request.conversation_id,
+    user_rows = supabase.table("messages").insert({
+        "conversation_id": conversation_id,
         "sender": "user",
-        "content": request.new_message
-    }).execute()
+        "content": new_message
+    }).execute().data or []
+    # Stale from here until the turn completes and writes through
+    await forget_history(user_id, conversation_id)
 
-    try:
-        print(f"🤖 Calling Gemini with {len(messages)} messages")
+    speculator = get_speculator()
+    speculation = speculator.claim(conversation_id, new_message, history_key(history)) if speculator else None
 
-        # Convert messages to Gemini format
-        prompt_parts = []
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            if role == "system":
-                prompt_parts.append(f"System: {content}")
-            elif role == "user":
-                prompt_parts.append(f"User: {content}")
-            elif role == "assistant":
-                prompt_parts.append(f"Assistant: {content}")
-
-        full_prompt = "\n\n".join(prompt_parts)
-
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=full_prompt,
-            config={
-                "temperature": 0.8,
-            }
-        )
-        reply = response.text.strip()
-        print(f"✅ Gemini response received (length: {len(reply)})")
+    # Openings are near-identical across rehearsals; reuse a cached first reply if one is
+    # close enough, unless the judge remembers this founder and should answer accordingly
+    is_first_turn = all(msg["sender"] == "system" for msg in history) \
+        and not any(has_memories(msg["content"]) for msg in history)
+    reply_cache = get_reply_cache() if is_first_turn and speculation is None else None
 
-        # 🎙️ Convert text to speech using ElevenLabs (no file storage)
-        try:
-            print(f"🎙️ Generating audio for judge: {judge_key}")
-            audio_base64 = text_to_speech_base64(reply, judge_key)
-            print(f"✅ Audio generated successfully")
-        except Exception as audio_error:
-            print(f"⚠️ Warning: Failed to generate audio: {audio_error}")
-            audio_base64 = None
+    try:
+        # Cached audio is only reusable in the format it was synthesized in
+        cache_key = f"{judge_key}:{audio_format.name}"
+        cached = reply_cache.lookup(cache_key, new_message) if reply_cache else None
+        if cached:
+            print(f"⚡ Semantic cache hit for judge {judge_key}, skipping Gemini and TTS")
+            reply, audio_base64 = cached.text, cached.audio_base64
+        else:
+            turn = turn_registry.begin(conversation_id)
+            try:
+                # Upstream work is abandoned as soon as the client leaves or the founder barges in
+                reply, audio_base64 = await turn_registry.run(
+                    turn,
+                    generate_judge_reply(turn, conversation_id, judge_key, messages, speculation,
+                                         audio_format, audio_latency, on_reply),
+                    http_request
+                )
+            except TurnCancelled as cancelled:
+                return persist_interrupted_reply(supabase, conversation_id, cancelled)
+            finally:
+                turn_registry.finish(turn)
+
+            if reply_cache and audio_base64:
+                reply_cache.store(cache_key, new_message, reply, audio_base64)
 
         # 💾 Save assistant reply
         print(f"💾 Saving assistant reply to database")
-        supabase.table("messages").insert({
-            "conversation_id": request.conversation_id,
+        assistant_rows = supabase.table("messages").insert({
+            "conversation_id": conversation_id,
             "sender": "assistant",
             "content": reply
-        }).execute()
+        }).execute().data or []
+        await record_history(user_id, conversation_id, history, user_rows + assistant_rows)
 
         print(f"🎉 Response generated successfully, returning to client")
         return {
             "judge_reply": reply,
-            "audio_base64": audio_base64
+            "audio_base64": audio_base64,
+            "audio_format": audio_format.name if audio_base64 else None,
+            "audio_mime_type": audio_format.mime_type if audio_base64 else None,
+            # TTS failed, timed out or has its circuit open: the reply is text-only
+            "degraded": None if audio_base64 else "text_only"
         }
+    except UpstreamError:
+        raise
     except Exception as e:
         print(f"❌ Error generating judge response: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating judge response: {e}")
 
 
+def request_judge_reply(conversation_id: str, judge_key: str, messages: List[dict]):
+    """Start the Gemini call for the judge's next turn; awaiting it gives the SDK response."""
+    # Persona prompt as the system instruction, turns as Gemini contents, so a
+    # stable prefix can be served from the provider's context cache
+    system_instruction, contents = to_gemini_contents(messages)
+    config = {"temperature": 0.8}
+    if system_instruction:
+        config["system_instruction"] = system_instruction
+    context_cache = get_context_cache()
+    # Only the bare persona prompt is the same across conversations; one with a
+    # founder's memories would just evict the shared entry
+    shared_key = None if has_memories(system_instruction) else f"persona:{judge_key}"
+
+    return model_router.generate(
+        "judge_reply",
+        contents=contents,
+        config=config,
+        prepare=partial(context_cache.prepare, conversation_id,
+                        shared_key=shared_key) if context_cache else None
+    )
+
+
+async def generate_judge_reply(turn: Turn, conversation_id: str, judge_key: str, messages: List[dict],
+                               speculation: Optional[Speculation] = None, audio_format: Optional[AudioFormat] = None,
+                               audio_latency: Optional[int] = None,
+                               on_reply: Optional[Callable[[str], Awaitable[None]]] = None):
+    """Gemini reply (reusing a claimed speculation), then its audio; returns (reply, audio_base64 or None)."""
+    turn.enter("llm")
+    response = None
+    if speculation is not None:
+        print(f"🔮 Reusing speculative reply started {speculation.head_start():.2f}s ago")
+        try:
+            response = await speculation.task
+        except Exception as e:
+            print(f"⚠️ Speculative reply failed ({e}), regenerating")
+    if response is None:
+        print(f"🤖 Calling Gemini with {len(messages)} messages")
+        response = await request_judge_reply(conversation_id, judge_key, messages)
+    reply = turn.reply = response.text.strip()
+    print(f"✅ Gemini response received (length: {len(reply)})")
+    if on_reply is not None:
+        await on_reply(reply)
+
+    # 🎙️ Convert text to speech using ElevenLabs (no file storage)
+    turn.enter("tts")
+    try:
+        print(f"🎙️ Generating audio for judge: {judge_key}")
+        audio_base64 = await asyncio.wait_for(
+            text_to_speech_base64_async(reply, judge_key, audio_format, audio_latency), TTS_BUDGET_SECONDS
+        )
+        print(f"✅ Audio generated successfully")
+    except CircuitOpenError:
+        print(f"🔇 TTS circuit open, replying text-only")
+        audio_base64 = None
+    except asyncio.TimeoutError:
+        print(f"⏱️ TTS took over {TTS_BUDGET_SECONDS:.0f}s, replying text-only")
+        metrics.inc("tts_budget_exceeded_total")
+        audio_base64 = None
+    except Exception as audio_error:
+        print(f"⚠️ Warning: Failed to generate audio: {audio_error}")
+        audio_base64 = None
+    return reply, audio_base64
+
+
+def persist_interrupted_reply(supabase, conversation_id: str, cancelled: TurnCancelled) -> dict:
+    """
+    Save only what the founder heard of a cancelled reply (nothing if they heard nothing),
+    as checked against the generated reply by Turn.heard().
+    """
+    heard = (cancelled.heard_text or "").strip()
+    if heard:
+        supabase.table("messages").insert({
+            "conversation_id": conversation_id,
+            "sender": "assistant",
+            "content": heard
+        }).execute()
+    return {
+        "judge_reply": heard,
+        "audio_base64": None,
+        "interrupted": True,
+        "reason": cancelled.reason
+    }
+
+
+class InterruptRequest(BaseModel):
+    conversation_id: str
+    # What the founder heard before talking over the judge: the exact text (used only
+    # if it is a prefix of the reply), or the fraction of the reply's audio that played
+    heard_text: Optional[str] = None
+    heard_fraction: Optional[float] = Field(None, ge=0.0, le=1.0)
+
+@router.post("/interrupt")
+async def interrupt_judge(request: InterruptRequest, authorization: str = Header(...)):
+    """
+    Founder barge-in. Cancels the judge's in-flight reply for the conversation, or,
+    if it was already delivered, truncates the saved reply to the part that was heard.
+    """
+    token = authorization.replace("Bearer ", "")
+    supabase = get_supabase_client(token)
+
+    # Verify user authentication
+    user = await authenticate(supabase, token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
+
+    # Only the founder in this conversation may cancel or rewrite its replies
+    await require_conversation_owner(supabase, user.id, request.conversation_id)
+
+    if turn_registry.interrupt(request.conversation_id, request.heard_text, request.heard_fraction):
+        return {"status": "cancelled"}
+
+    if request.heard_text is None and request.heard_fraction is None:
+        return {"status": "idle"}
+
+    last_reply = (
+        supabase.table("messages")
+        .select("*")
+        .eq("conversation_id", request.conversation_id)
+        .eq("sender", "assistant")
+        .order("created_at", desc=True)
+        .limit(1)
+        .execute()
+    ).data
+    if not last_reply:
+        return {"status": "idle"}
+
+    message = last_reply[0]
+    heard = resolve_heard(message["content"], request.heard_text, request.heard_fraction)
+    if heard is None or heard == message["content"]:
+        return {"status": "unchanged"}
+
+    if heard:
+        supabase.table("messages").update({"content": heard}).eq("id", message["id"]).execute()
+    else:
+        # Nothing was heard: as far as the conversation goes, the judge never spoke
+        supabase.table("messages").delete().eq("id", message["id"]).execute()
+    await forget_history(user.id, request.conversation_id)
+    metrics.inc("replies_truncated_total")
+    return {"status": "truncated", "judge_reply": heard}
+
+
 # --- Endpoint 3: Serve audio files ---
 @router.get("/audio/{filename}")
 async def get_audio(filename: str):
@@ -381,14 +632,29 @@ async def end_conversation(request: EndConversationRequest, authorization: str =
     supabase = get_supabase_client(token)  
     
     # Verify user authentication
-    user_response = supabase.auth.get_user(token)
-    if not user_response or not user_response.user:
+    user = await authenticate(supabase, token)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
+    # Otherwise another founder's transcript would be distilled into the caller's memories
+    await require_conversation_owner(supabase, user.id, request.conversation_id)
 
     try:
+        # 🧠 Distil what's worth remembering before the transcript is gone
+        history = await load_history(supabase, request.conversation_id, user.id)
+        if history:
+            await remember(user.id, request.conversation_id, extract_judge_key_from_history(history), "session",
+                           distil_transcript(history))
 
         # 🗑️ Delete all messages
         supabase.table("messages").delete().eq("conversation_id", request.conversation_id).execute()
+        await forget_history(user.id, request.conversation_id)
+
+        context_cache = get_context_cache()
+        if context_cache:
+            context_cache.forget(request.conversation_id)
+        speculator = get_speculator()
+        if speculator:
+            speculator.discard(request.conversation_id)
 
         # (Optional) Delete the conversation itself
         # supabase.table("conversations").delete().eq("id", request.conversation_id).execute()
@@ -399,58 +665,181 @@ async def end_conversation(request: EndConversationRequest, authorization: str =
         raise HTTPException(status_code=500, detail=f"Error ending conversation: {e}")
 
 
+# --- Endpoint 5: What the judges remember about the founder ---
+@router.get("/memory")
+async def get_memory(authorization: str = Header(...)):
+    """The founder's remembered facts and feedback from earlier pitches (services/memory.py), newest first."""
+    token = authorization.replace("Bearer ", "")
+    user = await authenticate(get_supabase_client(token), token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
+    return {"memories": await list_memories(user.id)}
+
+@router.delete("/memory")
+async def delete_memory(conversation_id: Optional[str] = Query(None), authorization: str = Header(...)):
+    """
+    Delete everything the judges remember about the founder, or only what came
+    from `conversation_id`. Later conversations start without it.
+    """
+    token = authorization.replace("Bearer ", "")
+    user = await authenticate(get_supabase_client(token), token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
+
+    try:
+        deleted = await forget(user.id, conversation_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting memories: {e}")
+    return {"deleted": deleted}
+
+
+def build_score_messages(history) -> List[dict]:
+    instructions: str = "Now given all of the above chat history, i want you to give a comprehensive overview of how well this pitch preformed using the given structure"
+    instructions += "\n\nProvide your response in JSON format matching the InvestmentMemoOutput schema with 'memo' and 'metrics' fields."
+
+    # 🧩 Conversation so far, then the scoring instruction as the final user turn
+    messages = format_openai_messages(history)
+    messages.append({"role": "user", "content": instructions})
+    return messages
+
+SCORE_CONFIG = {
+    "temperature": 0.8,
+    "response_mime_type": "application/json",
+    "response_schema": InvestmentMemoOutput
+}
+
+def build_score_request(messages: List[dict]):
+    """(contents, config) for scoring; the history prefix matches the judge turns' context cache."""
+    system_instruction, contents = to_gemini_contents(messages)
+    config = dict(SCORE_CONFIG)
+    if system_instruction:
+        config["system_instruction"] = system_instruction
+    return contents, config
+
+def parse_score(reply_text: str) -> dict:
+    return parse_score_with_status(reply_text)[0]
+
+def parse_score_with_status(reply_text: str) -> Tuple[dict, str]:
+    """
+    (score, parse status). `score["defaulted"]` names any memo/metrics fields the
+    model didn't return, which hold placeholder values instead of a real score.
+    """
+    # Parse JSON response, repairing malformed output instead of failing the request
+    score, parse_status, defaulted = parse_model_with_defaults(reply_text, InvestmentMemoOutput, get_fallback_score())
+    print(f"🧩 Score parse status: {parse_status}")
+
+    return {
+        "memo": score.memo.model_dump(),
+        "metrics": score.metrics.model_dump(),
+        "defaulted": defaulted,
+    }, parse_status
+
+# A transcript scores the same however often it is asked for (and whichever worker
+# is asked); keyed by the scoring prompt, so unchanged history is never re-scored
+SCORE_CACHE_TTL_SECONDS = 3600
+
+async def cached_score(messages: List[dict], generate: Callable[[], Awaitable]) -> dict:
+    """Parsed score for the scoring `messages`, calling `generate()` for the model response on a miss."""
+    async def load() -> dict:
+        response = await generate()
+        return parse_score_with_status((response.text or "").strip())[0]
+
+    cache = get_cache("score", SCORE_CACHE_TTL_SECONDS)
+    try:
+        # Never pin a score with placeholder fields in it (a fallback or a partial parse)
+        return await cache.get_or_set(digest(messages), load, cache_if=lambda score: not score["defaulted"])
+    except CircuitOpenError as e:
+        return provisional_score(e)
+
+def provisional_score(error: CircuitOpenError) -> dict:
+    """
+    Stand-in while Gemini's circuit is open: the neutral fallback score, marked
+    provisional with when to ask again, instead of an error. Never cached.
+    """
+    print(f"⏳ Gemini circuit open, returning a provisional score")
+    metrics.inc("provisional_scores_total")
+    score = get_fallback_score()
+    return {
+        "memo": score.memo.model_dump(),
+        "metrics": score.metrics.model_dump(),
+        "provisional": True,
+        "retry_after": math.ceil(error.retry_after),
+    }
+
 @router.post("/get_score")
 async def end_conversation(request: GetScoreRequest, authorization: str = Header(...)):
     token = authorization.replace("Bearer ", "")
     supabase = get_supabase_client(token)
-    client = get_gemini_client()
 
     # 🧠 Load existing conversation history
-    history_resp = get_chat_history(supabase, request.conversation_id)
-    history = history_resp.data or []
+    history = await load_history(supabase, request.conversation_id)
 
     if not history:
         raise HTTPException(status_code=404, detail="Conversation not found or empty")
 
+    return await score_conversation(request.conversation_id, history)
 
-    instructions: str = "Now given all of the above chat history, i want you to give a comprehensive overview of how well this pitch preformed using the given structure"
 
-    # 🧩 Convert history into Gemini message format
-    messages = format_openai_messages(history)
-    messages.append({"role": "user", "content": instructions})
+async def score_conversation(conversation_id: str, history: List[dict]) -> dict:
+    """Memo and metrics for a conversation's history."""
+    messages = build_score_messages(history)
+    contents, config = build_score_request(messages)
+    context_cache = get_context_cache()
 
-    prompt_parts = []
-    for msg in messages:
-        role = msg["role"]
-        content = msg["content"]
-        if role == "system":
-            prompt_parts.append(f"System: {content}")
-        elif role == "user":
-            prompt_parts.append(f"User: {content}")
-        elif role == "assistant":
-            prompt_parts.append(f"Assistant: {content}")
+    try:
+        # Reuse the conversation's cache if the judge turns built one, but a single
+        # scoring call isn't worth creating one for
+        return await cached_score(messages, lambda: model_router.generate(
+            "score",
+            contents=contents,
+            config=config,
+            prepare=partial(context_cache.prepare, conversation_id, create=False) if context_cache else None
+        ))
+    except UpstreamError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating judge response: {e}")
 
-    full_prompt = "\n\n".join(prompt_parts)
-    full_prompt += "\n\nProvide your response in JSON format matching the InvestmentMemoOutput schema with 'memo' and 'metrics' fields."
+
+# --- Background scoring jobs ---
+async def run_score_job(job: Job) -> dict:
+    # The payload only names the conversation, so the job store never holds a transcript
+    history = await load_history(get_supabase_client(), job.payload["conversation_id"], job.payload.get("user_id"))
+    if not history:
+        raise RuntimeError("Conversation not found or empty")
+    messages = build_score_messages(history)
+    contents, config = build_score_request(messages)
+    return await cached_score(messages, lambda: model_router.generate("score", contents=contents, config=config))
+
+job_manager.register("judges.get_score", run_score_job)
+
+@router.post("/get_score/jobs", status_code=202)
+async def submit_score_job(request: GetScoreRequest, authorization: str = Header(...)):
+    """
+    Queue scoring for a conversation and return its job id immediately.
+    Poll GET /jobs/{job_id} or subscribe to GET /jobs/{job_id}/events for the result.
+    """
+    token = authorization.replace("Bearer ", "")
+    supabase = get_supabase_client(token)
+
+    # Verify user authentication
+    user = await authenticate(supabase, token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
+
+    # 🧠 Load existing conversation history
+    history = await load_history(supabase, request.conversation_id, user.id)
+
+    if not history:
+        raise HTTPException(status_code=404, detail="Conversation not found or empty")
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=full_prompt,
-            config={
-                "temperature": 0.8,
-                "response_mime_type": "application/json"
-            }
+        job = await job_manager.submit(
+            "judges.get_score",
+            dedupe_key=f"judges.get_score:{user.id}:{request.conversation_id}",
+            payload={"conversation_id": request.conversation_id, "user_id": user.id},
         )
-        reply_text = response.text.strip()
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
 
-        # Parse JSON response
-        import json
-        reply_data = json.loads(reply_text)
-
-        return {
-            "memo": reply_data.get("memo", {}),
-            "metrics": reply_data.get("metrics", {})
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating judge response: {e}")
\ No newline at end of file
+    return {"job_id": job.id, "status": job.status}
@@ -1,33 +1,36 @@
 # api/performance.py
 from fastapi import APIRouter, HTTPException, Header
-from pydantic import BaseModel
-from supabase import create_client, Client
-from google import genai
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 import os
+import sys
 import json
-from typing import List, Dict
-from dotenv import load_dotenv
-
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../../.env.local"))
+import asyncio
+import math
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Dict, Optional, Tuple
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.config import load_config
+from services.clients import get_gemini_client, get_supabase_client, get_supabase_service_client
+from services.structured_output import IncrementalJSONParser, iter_sections, parse_model_with_defaults
+from services.jobs import Job, QueueFullError, job_manager
+from services.sse import sse_event
+from services.auth import authenticate
+from services.governor import UpstreamError, get_governor
+from services.model_router import model_router
+from services.analytics import SupabaseAnalyticsStore, dashboard, record_analysis
+from services.memory import distil_analysis, remember
+from services.elevenlabs_service import negotiate_audio_format
+from services.narration import narrate_sections, narration_budget, narration_text
+from api.judge import extract_judge_key_from_history, require_conversation_owner
+
+if TYPE_CHECKING:
+    from google import genai
+    from supabase import Client
+
+load_config()
 
 router = APIRouter(prefix="/performance", tags=["Performance"])
 
-# Initialize Gemini client
-def get_gemini_client() -> genai.Client:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing GEMINI_API_KEY in environment.")
-    return genai.Client(api_key=api_key)
-
-def get_supabase_client(user_token: str) -> Client:
-    url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-    anon_key = os.getenv("SUPABASE_KEY") or os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-
-    if not url or not anon_key:
-        raise RuntimeError("Missing Supabase configuration")
-
-    return create_client(url, anon_key)
-
 # --- Data Models ---
 class AnalyzePerformanceRequest(BaseModel):
     conversation_id: str
@@ -57,8 +60,22 @@ class PerformanceAnalysisResponse(BaseModel):
     investmentMemo: InvestmentMemo
     presentationMetrics: PresentationMetrics
     overallScore: float
+    # Fields the model didn't return ("presentationMetrics.clarity"), holding
+    # placeholder values; a client shouldn't present them as the analysis
+    defaultedFields: List[str] = []
 
-def get_conversation_history(supabase: Client, conversation_id: str) -> List[Dict]:
+class NarrateMemoRequest(BaseModel):
+    investmentMemo: InvestmentMemo
+    # Whose voice reads the memo (the judge the founder pitched to)
+    judge: Optional[str] = None
+    # Memo sections to narrate, always read in display order; all of them by default
+    sections: Optional[List[str]] = None
+    # Audio formats the client can play, in preference order ("opus,mp3"); MP3 by default
+    audio_format: Optional[str] = None
+    # ElevenLabs optimize_streaming_latency (0-4); the format's default if omitted
+    audio_latency: Optional[int] = Field(None, ge=0, le=4)
+
+def get_conversation_history(supabase: "Client", conversation_id: str) -> List[Dict]:
     """Fetch all messages from a conversation."""
     history_resp = (
         supabase.table("messages")
@@ -87,46 +104,37 @@ def format_conversation_for_analysis(messages: List[Dict]) -> str:
 
     return "\n\n".join(formatted_lines)
 
-@router.post("/analyze", response_model=PerformanceAnalysisResponse)
-async def analyze_performance(request: AnalyzePerformanceRequest, authorization: str = Header(...)):
-    """
-    Analyze pitch performance based on conversation history.
-    Returns investment memo and presentation metrics.
-    """
-    print(f"🎯 /performance/analyze called with conversation_id: {request.conversation_id}")
-
-    # Extract token
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization header format")
-
-    token = authorization.replace("Bearer ", "")
-
-    try:
-        # Initialize clients
-        supabase = get_supabase_client(token)
-        gemini_client = get_gemini_client()
-
-        # Verify user authentication
-        user_response = supabase.auth.get_user(token)
-        if not user_response or not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
-
-        # Fetch conversation history
-        print(f"📚 Fetching conversation history...")
-        messages = get_conversation_history(supabase, request.conversation_id)
-
-        if not messages or len(messages) == 0:
-            raise HTTPException(status_code=404, detail="No conversation history found. Please complete a pitch session first.")
-
-        # Format conversation
-        conversation_history = format_conversation_for_analysis(messages)
-        print(f"✅ Formatted {len(messages)} messages into conversation history")
-
-        if not conversation_history.strip():
-            raise HTTPException(status_code=404, detail="No valid conversation content found")
-
-        # Enhanced prompt for investment memo
-        investment_memo_prompt = f"""
+# Used only for fields the model did not return (or returned unparseable)
+FALLBACK_MEMO = InvestmentMemo(
+    recommendation="HOLD - Additional information needed for full assessment",
+    summary="Unable to generate detailed analysis from conversation.",
+    valueProposition="Not available from conversation",
+    market="Not discussed in detail",
+    product="Product details not fully articulated",
+    metrics="• No specific metrics mentioned",
+    risks="• Unable to assess from limited information",
+    team="Team background not discussed",
+    deal="Investment terms not specified",
+    scenarioAnalysis="No financial projections provided",
+    conclusion="Additional information needed for comprehensive evaluation"
+)
+
+FALLBACK_METRICS = PresentationMetrics(
+    clarity=7.0,
+    confidence=7.0,
+    engagement=7.0,
+    structure=7.0,
+    delivery=7.0,
+    overall=7.0
+)
+
+def defaulted_fields(memo_defaulted: List[str], metrics_defaulted: List[str]) -> List[str]:
+    """PerformanceAnalysisResponse.defaultedFields from the two parses."""
+    return ([f"investmentMemo.{name}" for name in memo_defaulted]
+            + [f"presentationMetrics.{name}" for name in metrics_defaulted])
+
+def build_investment_memo_prompt(conversation_history: str) -> str:
+    investment_memo_prompt = f"""
 You are an experienced venture capital analyst who has just witnessed a Shark Tank pitch session.
 Below is the complete conversation between the entrepreneur and the judges:
 
@@ -152,9 +160,10 @@ Provide your response in this exact JSON format:
 Be specific and reference actual details from the conversation. If information wasn't provided, note that in your analysis.
 Return ONLY valid JSON, no markdown formatting.
 """
+    return f"You are a venture capital analyst. Respond only with valid JSON, no markdown.\n\n{investment_memo_prompt}"
 
-        # Enhanced prompt for presentation metrics
-        presentation_metrics_prompt = f"""
+def build_presentation_metrics_prompt(conversation_history: str) -> str:
+    presentation_metrics_prompt = f"""
 You are a professional pitch coach and communication expert. Analyze the following pitch conversation:
 
 {conversation_history}
@@ -181,87 +190,363 @@ Provide your response in this exact JSON format:
 Use decimals (0.0 to 10.0) for precise scoring. Be objective and fair in your assessment.
 Return ONLY valid JSON, no markdown formatting.
 """
+    return f"You are a pitch coach. Respond only with valid JSON, no markdown.\n\n{presentation_metrics_prompt}"
+
+def structured_config(schema) -> dict:
+    """Generation config that constrains Gemini's decoding to the given Pydantic schema."""
+    return {
+        "temperature": 0.7,
+        "response_mime_type": "application/json",
+        "response_schema": schema
+    }
+
+async def authenticate_request(authorization: str) -> Tuple[str, "Client"]:
+    """Authenticate the caller and return (user_id, supabase client)."""
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Invalid authorization header format")
+
+    token = authorization.replace("Bearer ", "")
+    supabase = get_supabase_client(token)
+
+    # Verify user authentication
+    user = await authenticate(supabase, token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
+    return user.id, supabase
+
+async def load_conversation_for_analysis(authorization: str, conversation_id: str) -> Tuple[str, str, Optional[str]]:
+    """Authenticate the caller and return (user_id, formatted conversation transcript, judge key)."""
+    user_id, supabase = await authenticate_request(authorization)
+    await require_conversation_owner(supabase, user_id, conversation_id)
+
+    # Fetch conversation history
+    print(f"📚 Fetching conversation history...")
+    messages = await asyncio.to_thread(get_conversation_history, supabase, conversation_id)
+
+    if not messages or len(messages) == 0:
+        raise HTTPException(status_code=404, detail="No conversation history found. Please complete a pitch session first.")
+
+    # Format conversation
+    conversation_history = format_conversation_for_analysis(messages)
+    print(f"✅ Formatted {len(messages)} messages into conversation history")
+
+    if not conversation_history.strip():
+        raise HTTPException(status_code=404, detail="No valid conversation content found")
+
+    return user_id, conversation_history, extract_judge_key_from_history(messages)
+
+async def save_analysis(user_id: str, conversation_id: str, judge: Optional[str],
+                        presentation_metrics: "PresentationMetrics", metrics_status: str,
+                        investment_memo: Optional["InvestmentMemo"] = None, memo_status: str = "fallback") -> None:
+    """
+    Fold a finished analysis into the user's dashboard aggregates and the founder's
+    memory (services/memory.py). Fallback output (the model's couldn't be parsed)
+    isn't recorded; failures are logged and never fail the analysis itself.
+    Nothing is written for a conversation the user doesn't own.
+    """
+    try:
+        # Analytics are written with the service role, which bypasses row-level security
+        await require_conversation_owner(get_supabase_client(), user_id, conversation_id)
+    except HTTPException:
+        print(f"⛔ Not recording analysis of {conversation_id}: not {user_id}'s conversation")
+        return
+    parsed = ("ok", "repaired")
+    await remember(user_id, conversation_id, judge, "analysis", distil_analysis(
+        investment_memo.model_dump() if investment_memo is not None and memo_status in parsed else None,
+        presentation_metrics.model_dump() if metrics_status in parsed else None,
+    ))
+    if metrics_status not in parsed:
+        print(f"⏭️ Not recording {metrics_status} metrics for conversation {conversation_id}")
+        return
+    try:
+        # Users can only read their analytics (see database_schema.sql), so the backend writes them
+        store = SupabaseAnalyticsStore(get_supabase_service_client())
+        await record_analysis(store, user_id, conversation_id, judge, presentation_metrics.model_dump())
+        print(f"📈 Recorded analysis of {conversation_id} in {user_id}'s aggregates")
+    except Exception as e:
+        print(f"⚠️ Failed to record analysis for dashboard: {e}")
+
+@router.post("/analyze", response_model=PerformanceAnalysisResponse)
+async def analyze_performance(request: AnalyzePerformanceRequest, authorization: str = Header(...)):
+    """
+    Analyze pitch performance based on conversation history.
+    Returns investment memo and presentation metrics.
+    """
+    print(f"🎯 /performance/analyze called with conversation_id: {request.conversation_id}")
+
+    try:
+        user_id, conversation_history, judge = await load_conversation_for_analysis(
+            authorization, request.conversation_id
+        )
+        gemini_client = get_gemini_client()
 
         print(f"🤖 Generating investment memo...")
-        # Generate investment memo
-        memo_full_prompt = f"You are a venture capital analyst. Respond only with valid JSON, no markdown.\n\n{investment_memo_prompt}"
-
-        memo_response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=memo_full_prompt,
-            config={
-                "temperature": 0.7,
-                "response_mime_type": "application/json"
-            }
+        memo_response = await model_router.generate(
+            "analysis_memo",
+            contents=build_investment_memo_prompt(conversation_history),
+            config=structured_config(InvestmentMemo),
+            client=gemini_client
         )
 
         memo_text = memo_response.text.strip()
         print(f"✅ Investment memo generated")
 
         print(f"🤖 Generating presentation metrics...")
-        # Generate presentation metrics
-        metrics_full_prompt = f"You are a pitch coach. Respond only with valid JSON, no markdown.\n\n{presentation_metrics_prompt}"
-
-        metrics_response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash-exp",
-            contents=metrics_full_prompt,
-            config={
-                "temperature": 0.7,
-                "response_mime_type": "application/json"
-            }
+        metrics_response = await model_router.generate(
+            "analysis_metrics",
+            contents=build_presentation_metrics_prompt(conversation_history),
+            config=structured_config(PresentationMetrics),
+            client=gemini_client
         )
 
         metrics_text = metrics_response.text.strip()
         print(f"✅ Presentation metrics generated")
 
-        # Parse responses
-        try:
-            memo_data = json.loads(memo_text)
-            investment_memo = InvestmentMemo(**memo_data)
-        except Exception as parse_error:
-            print(f"⚠️ Error parsing investment memo: {parse_error}")
-            # Fallback memo
-            investment_memo = InvestmentMemo(
-                recommendation="HOLD - Additional information needed for full assessment",
-                summary="Unable to generate detailed analysis from conversation.",
-                valueProposition="Not available from conversation",
-                market="Not discussed in detail",
-                product="Product details not fully articulated",
-                metrics="• No specific metrics mentioned",
-                risks="• Unable to assess from limited information",
-                team="Team background not discussed",
-                deal="Investment terms not specified",
-                scenarioAnalysis="No financial projections provided",
-                conclusion="Additional information needed for comprehensive evaluation"
-            )
-
-        try:
-            metrics_data = json.loads(metrics_text)
-            presentation_metrics = PresentationMetrics(**metrics_data)
-        except Exception as parse_error:
-            print(f"⚠️ Error parsing presentation metrics: {parse_error}")
-            # Fallback metrics
-            presentation_metrics = PresentationMetrics(
-                clarity=7.0,
-                confidence=7.0,
-                engagement=7.0,
-                structure=7.0,
-                delivery=7.0,
-                overall=7.0
-            )
+        # Parse responses, repairing malformed JSON instead of discarding the call
+        investment_memo, memo_status, memo_defaulted = parse_model_with_defaults(
+            memo_text, InvestmentMemo, FALLBACK_MEMO
+        )
+        presentation_metrics, metrics_status, metrics_defaulted = parse_model_with_defaults(
+            metrics_text, PresentationMetrics, FALLBACK_METRICS
+        )
+        print(f"🧩 Parse status - memo: {memo_status}, metrics: {metrics_status}")
 
         overall_score = presentation_metrics.overall
 
         print(f"🎉 Analysis complete! Overall score: {overall_score}")
+        await save_analysis(user_id, request.conversation_id, judge, presentation_metrics, metrics_status,
+                            investment_memo, memo_status)
 
         return PerformanceAnalysisResponse(
             investmentMemo=investment_memo,
             presentationMetrics=presentation_metrics,
-            overallScore=overall_score
+            overallScore=overall_score,
+            defaultedFields=defaulted_fields(memo_defaulted, metrics_defaulted)
         )
 
+    except (HTTPException, UpstreamError):
+        raise
+    except Exception as e:
+        print(f"❌ Error analyzing performance: {e}")
+        raise HTTPException(status_code=500, detail=f"Error analyzing performance: {str(e)}")
+
+
+async def stream_analysis(gemini_client: "genai.Client", conversation_history: str,
+                          on_metrics: Optional[Callable] = None) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Run the memo and metrics calls concurrently, yielding (event, data) as results arrive:
+    `section` per memo field, `metrics`, then `result` with the full response.
+    `on_metrics(presentation_metrics, metrics_status, investment_memo, memo_status)` is
+    awaited once both are parsed.
+    """
+    # Metrics are small; generate them alongside the streamed memo
+    metrics_task = asyncio.create_task(model_router.generate(
+        "analysis_metrics",
+        contents=build_presentation_metrics_prompt(conversation_history),
+        config=structured_config(PresentationMetrics),
+        client=gemini_client
+    ))
+    try:
+        parser = IncrementalJSONParser(max_depth=1)
+        memo_prompt = build_investment_memo_prompt(conversation_history)
+        # Streams can't be retried or hedged once started, so only the model is routed
+        decision = model_router.choose("analysis_memo", memo_prompt)
+        # A stream's duration follows its length, not Gemini's health: the breaker counts only errors
+        async with get_governor("gemini").slot(timed=False):
+            stream = await gemini_client.aio.models.generate_content_stream(
+                model=decision.model,
+                contents=memo_prompt,
+                config=structured_config(InvestmentMemo)
+            )
+            async for chunk in stream:
+                for name, value in iter_sections(parser.feed(chunk.text or "")):
+                    yield "section", {"name": name, "value": value}
+
+        investment_memo, memo_status, memo_defaulted = parse_model_with_defaults(
+            parser.text, InvestmentMemo, FALLBACK_MEMO
+        )
+
+        metrics_response = await metrics_task
+        presentation_metrics, metrics_status, metrics_defaulted = parse_model_with_defaults(
+            (metrics_response.text or "").strip(), PresentationMetrics, FALLBACK_METRICS
+        )
+        print(f"🧩 Parse status - memo: {memo_status}, metrics: {metrics_status}")
+        if on_metrics is not None:
+            await on_metrics(presentation_metrics, metrics_status, investment_memo, memo_status)
+        yield "metrics", presentation_metrics.model_dump()
+
+        result = PerformanceAnalysisResponse(
+            investmentMemo=investment_memo,
+            presentationMetrics=presentation_metrics,
+            overallScore=presentation_metrics.overall,
+            defaultedFields=defaulted_fields(memo_defaulted, metrics_defaulted)
+        )
+        yield "result", result.model_dump()
+    finally:
+        if not metrics_task.done():
+            metrics_task.cancel()
+
+@router.post("/analyze/stream")
+async def analyze_performance_stream(request: AnalyzePerformanceRequest, authorization: str = Header(...)):
+    """
+    Same analysis as /analyze, streamed as server-sent events so memo sections
+    can render as soon as each one is generated.
+
+    Events: `section` ({"name", "value"}) per memo field, `metrics` once the
+    presentation metrics are in, then `result` with the full response.
+    """
+    print(f"🎯 /performance/analyze/stream called with conversation_id: {request.conversation_id}")
+
+    try:
+        user_id, conversation_history, judge = await load_conversation_for_analysis(
+            authorization, request.conversation_id
+        )
+        gemini_client = get_gemini_client()
     except HTTPException:
         raise
     except Exception as e:
         print(f"❌ Error analyzing performance: {e}")
         raise HTTPException(status_code=500, detail=f"Error analyzing performance: {str(e)}")
+
+    async def on_metrics(presentation_metrics, metrics_status, investment_memo, memo_status):
+        await save_analysis(user_id, request.conversation_id, judge, presentation_metrics, metrics_status,
+                            investment_memo, memo_status)
+
+    async def event_stream():
+        try:
+            async for event, data in stream_analysis(gemini_client, conversation_history, on_metrics):
+                yield sse_event(event, data)
+        except Exception as e:
+            print(f"❌ Error streaming performance analysis: {e}")
+            yield sse_event("error", {"detail": f"Error analyzing performance: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@router.post("/narrate")
+async def narrate_memo(request: NarrateMemoRequest, authorization: str = Header(...)):
+    """
+    Read an investment memo (as returned by /analyze) aloud in the judge's voice,
+    streamed as server-sent events. Sections are synthesized concurrently
+    (NARRATION_CONCURRENCY at a time) but sent in display order, each as soon as
+    it is ready, so the recommendation can play while later sections render.
+
+    Events: `section` ({"name", "index", "text", "hash", "status", "audio",
+    "audio_format", "audio_mime_type"}) per non-empty section, `audio` null when
+    synthesis failed, then `done` with counts. Each founder may narrate
+    NARRATION_USER_CHARS_PER_HOUR characters an hour; past that, 429 with Retry-After.
+    """
+    user_id, _ = await authenticate_request(authorization)
+    names = list(InvestmentMemo.model_fields)
+    if request.sections is not None:
+        unknown = sorted(set(request.sections) - set(names))
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown memo sections: {', '.join(unknown)}")
+        names = [name for name in names if name in request.sections]
+    memo = request.investmentMemo.model_dump()
+    chars = sum(len(narration_text(name, memo[name])) for name in names)
+    wait = narration_budget.charge(user_id, chars)
+    if wait:
+        print(f"🚦 Narration budget spent for {user_id}, {chars} characters asked")
+        raise HTTPException(status_code=429, detail="Narration limit reached, please retry later",
+                            headers={"Retry-After": str(max(1, math.ceil(wait)))})
+    audio_format = negotiate_audio_format(request.audio_format)
+    print(f"🎙️ /performance/narrate called for {len(names)} sections in {request.judge or 'default'}'s voice")
+
+    async def event_stream():
+        narrated = failed = 0
+        try:
+            async for section in narrate_sections([(name, memo[name]) for name in names], request.judge,
+                                                  audio_format, request.audio_latency):
+                if section["audio"]:
+                    narrated += 1
+                else:
+                    failed += 1
+                yield sse_event("section", section)
+            yield sse_event("done", {"sections": narrated + failed, "narrated": narrated, "failed": failed})
+        except Exception as e:
+            print(f"❌ Error narrating memo: {e}")
+            yield sse_event("error", {"detail": f"Error narrating memo: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+# --- Background jobs ---
+async def run_analysis_job(job: Job) -> dict:
+    """
+    Job handler: memo sections are published as partial results while they stream in.
+    The payload only names the conversation; its transcript is loaded when the job
+    runs, so the job store never holds one.
+    """
+    messages = await asyncio.to_thread(get_conversation_history, get_supabase_client(),
+                                       job.payload["conversation_id"])
+    conversation_history = format_conversation_for_analysis(messages)
+    if not conversation_history.strip():
+        raise RuntimeError("No conversation history found")
+
+    gemini_client = get_gemini_client()
+    result = None
+    on_metrics = None
+    if job.payload.get("user_id"):
+        async def on_metrics(presentation_metrics, metrics_status, investment_memo, memo_status):
+            await save_analysis(job.payload["user_id"], job.payload["conversation_id"], job.payload.get("judge"),
+                                presentation_metrics, metrics_status, investment_memo, memo_status)
+
+    async for event, data in stream_analysis(gemini_client, conversation_history, on_metrics):
+        if event == "section":
+            job.update_partial(data["name"], data["value"])
+        elif event == "metrics":
+            job.update_partial("presentationMetrics", data)
+        elif event == "result":
+            result = data
+    print(f"🎉 Analysis job {job.id} complete! Overall score: {result['overallScore']}")
+    return result
+
+job_manager.register("performance.analyze", run_analysis_job)
+
+@router.post("/analyze/jobs", status_code=202)
+async def submit_analysis_job(request: AnalyzePerformanceRequest, authorization: str = Header(...)):
+    """
+    Queue a performance analysis and return its job id immediately.
+    Poll GET /jobs/{job_id} or subscribe to GET /jobs/{job_id}/events for progress.
+    Re-submitting while the analysis is still running returns the same job.
+    """
+    print(f"🎯 /performance/analyze/jobs called with conversation_id: {request.conversation_id}")
+
+    try:
+        # Checks there is something to analyse; the job reloads the transcript itself
+        user_id, _, judge = await load_conversation_for_analysis(authorization, request.conversation_id)
+        job = await job_manager.submit(
+            "performance.analyze",
+            dedupe_key=f"performance.analyze:{user_id}:{request.conversation_id}",
+            payload={"conversation_id": request.conversation_id, "user_id": user_id, "judge": judge},
+        )
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        print(f"❌ Error submitting analysis job: {e}")
+        raise HTTPException(status_code=500, detail=f"Error submitting analysis job: {str(e)}")
+
+    return {"job_id": job.id, "status": job.status}
+
+
+# --- Progress dashboard ---
+@router.get("/dashboard")
+async def get_dashboard(authorization: str = Header(...)):
+    """
+    The caller's progress across every analysed pitch: mean metrics, best and
+    latest overall score, improvement since the first pitch and the trend
+    (least-squares slope of the overall score per analysis), overall and per
+    judge. Read from running aggregates, so its cost doesn't grow with history.
+    """
+    user_id, _ = await authenticate_request(authorization)
+    try:
+        # Service role: the request carries no user session for RLS, so the read is scoped to user_id here
+        store = SupabaseAnalyticsStore(get_supabase_service_client())
+        aggregates = await asyncio.to_thread(store.get_aggregates, user_id)
+    except Exception as e:
+        print(f"❌ Error loading dashboard: {e}")
+        raise HTTPException(status_code=500, detail=f"Error loading dashboard: {str(e)}")
+    return {"user_id": user_id, **dashboard(aggregates)}
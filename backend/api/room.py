@@ -0,0 +1,468 @@
+# api/room.py
+from fastapi import APIRouter, HTTPException, WebSocket
+from starlette.websockets import WebSocketState
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import os
+import json
+import time
+import uuid
+import asyncio
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.config import load_config
+from services.governor import UpstreamError
+from services.cancellation import turn_registry
+from services.elevenlabs_service import negotiate_audio_format
+from services.speculation import end_of_speech_likelihood, get_speculator
+from services.auth import authenticate
+from services import metrics
+from api.judge import (
+    answer_founder, extract_judge_key_from_history, format_openai_messages, load_history,
+    get_supabase_client, history_key, request_judge_reply, require_conversation_owner, score_conversation,
+    start_conversation
+)
+from api.transcribe import transcribe_bytes
+
+load_config()
+
+router = APIRouter(prefix="/room", tags=["Room"])
+
+# One WebSocket per pitch session. The client authenticates once with a
+# `hello`, which binds the conversation and judge; the session then keeps the
+# Supabase client, history and judge in memory, so a turn costs no auth call
+# and no history fetch.
+#
+# Client -> server (JSON text frames; binary frames are founder audio):
+#   hello      {token, conversation_id | judge, session_id?, last_seq?, audio_format?, audio_latency?}
+#   message    {text}                          founder text turn
+#   <binary>   audio chunks, then
+#   audio_end  {content_type?, filename?}      transcribe the chunks and answer them
+#   partial    {text, confidence?, end_of_speech?, silence_ms?}  speculative generation
+#   interrupt  {heard_text?, heard_fraction?}  founder barge-in
+#   score      {}                              memo and metrics for the conversation so far
+#   ack        {seq}                           events up to seq may be dropped from the replay buffer
+#   ping       {}
+#   bye        {}                              end the session (no resume)
+#
+# Server -> client: `ready` after hello, then sequenced events — transcript,
+# judge_text, judge_audio, score, interrupt, error — plus unsequenced
+# heartbeat and pong. Requests may carry an `id`, echoed back as `reply_to`.
+# judge_audio has degraded="text_only" and no audio when TTS is unavailable;
+# a score has provisional=true while Gemini is (see services/breaker.py).
+#
+# After a disconnect the session stays resumable for ROOM_RESUME_SECONDS: a
+# hello with the same session_id and token re-attaches it without another auth
+# call, replays events after `last_seq`, and delivers anything that finished
+# while the client was away. Sessions live in this worker's memory, so a resume
+# must reach the same worker (sticky routing when scaling out).
+
+HEARTBEAT_SECONDS = float(os.getenv("ROOM_HEARTBEAT_SECONDS", "15"))
+RESUME_SECONDS = float(os.getenv("ROOM_RESUME_SECONDS", "120"))
+REPLAY_EVENTS = int(os.getenv("ROOM_REPLAY_EVENTS", "256"))
+REPLAY_BYTES = int(os.getenv("ROOM_REPLAY_BYTES", str(16 * 1024 * 1024)))
+MAX_AUDIO_BYTES = int(os.getenv("ROOM_MAX_AUDIO_BYTES", str(25 * 1024 * 1024)))
+# The peer is considered gone after this many silent heartbeat intervals
+MISSED_HEARTBEATS = 3
+
+# Close codes (4000-4999 are application-defined)
+CLOSE_REPLACED = 4000
+CLOSE_BAD_REQUEST = 4400
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+
+
+class RoomError(Exception):
+    def __init__(self, code: int, detail: str):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+
+class RoomSession:
+    """A pitch session: auth, conversation, history and the event stream, across reconnects."""
+
+    def __init__(self, token: str, user_id: str, supabase, conversation_id: str, judge_key: str, history: list):
+        self.id = uuid.uuid4().hex
+        self.token = token
+        self.user_id = user_id
+        self.supabase = supabase
+        self.conversation_id = conversation_id
+        self.judge_key = judge_key
+        self.history = history
+        self.audio_format = None
+        self.audio_latency: Optional[int] = None
+        self.audio = bytearray()
+        self.seq = 0
+        self._replay: Deque[Tuple[int, str]] = deque()
+        self._replay_bytes = 0
+        self.socket: Optional[WebSocket] = None
+        self._send_lock = asyncio.Lock()
+        # Serialises turns and scoring, which both read and extend the history
+        self.turn_lock = asyncio.Lock()
+        self.tasks: set = set()
+        self._expiry: Optional[asyncio.Task] = None
+
+    async def emit(self, event: str, reply_to: Optional[str] = None, **data) -> None:
+        """Send a sequenced event, keeping it for replay if the client is away."""
+        self.seq += 1
+        payload = {"type": event, "seq": self.seq, **data}
+        if reply_to is not None:
+            payload["reply_to"] = reply_to
+        text = json.dumps(payload)
+        self._replay.append((self.seq, text))
+        self._replay_bytes += len(text)
+        while len(self._replay) > REPLAY_EVENTS or self._replay_bytes > REPLAY_BYTES:
+            self._replay_bytes -= len(self._replay.popleft()[1])
+        metrics.inc("room_events_total", type=event)
+        await self.send_text(text)
+
+    async def send_text(self, text: str) -> None:
+        socket = self.socket
+        if socket is None or socket.application_state != WebSocketState.CONNECTED:
+            return
+        async with self._send_lock:
+            try:
+                await socket.send_text(text)
+            except Exception:
+                # The receive loop notices the disconnect and detaches the session
+                pass
+
+    async def send_unsequenced(self, event: str, **data) -> None:
+        await self.send_text(json.dumps({"type": event, **data}))
+
+    def ack(self, seq: int) -> None:
+        while self._replay and self._replay[0][0] <= seq:
+            self._replay_bytes -= len(self._replay.popleft()[1])
+
+    async def replay(self, last_seq: int) -> bool:
+        """Resend events after `last_seq`; False if some were already dropped."""
+        complete = not self._replay or self._replay[0][0] <= last_seq + 1
+        for seq, text in list(self._replay):
+            if seq > last_seq:
+                await self.send_text(text)
+        return complete
+
+    def spawn(self, coroutine) -> asyncio.Task:
+        """Run work that must outlive the current connection (it reports through emit)."""
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+
+class RoomRegistry:
+    def __init__(self):
+        self._sessions: Dict[str, RoomSession] = {}
+
+    def get(self, session_id: str) -> Optional[RoomSession]:
+        return self._sessions.get(session_id)
+
+    def add(self, session: RoomSession) -> None:
+        self._sessions[session.id] = session
+        metrics.set_gauge("room_sessions", len(self._sessions))
+
+    async def attach(self, session: RoomSession, websocket: WebSocket) -> None:
+        if session._expiry is not None:
+            session._expiry.cancel()
+            session._expiry = None
+        previous, session.socket = session.socket, websocket
+        if previous is not None and previous is not websocket:
+            # A reconnect raced the old socket's timeout; the newest connection wins
+            try:
+                await previous.close(code=CLOSE_REPLACED)
+            except Exception:
+                pass
+
+    def detach(self, session: RoomSession, websocket: WebSocket) -> None:
+        if session.socket is not websocket:
+            return
+        session.socket = None
+        session._expiry = asyncio.create_task(self._expire(session))
+
+    async def _expire(self, session: RoomSession) -> None:
+        await asyncio.sleep(RESUME_SECONDS)
+        self.close(session, "expired")
+
+    def close(self, session: RoomSession, reason: str) -> None:
+        if self._sessions.pop(session.id, None) is None:
+            return
+        if session._expiry is not None and session._expiry is not asyncio.current_task():
+            session._expiry.cancel()
+        # In-flight turns are left to finish: their replies are persisted either way
+        metrics.inc("room_sessions_closed_total", reason=reason)
+        metrics.set_gauge("room_sessions", len(self._sessions))
+        print(f"🚪 Room session {session.id[:8]} closed ({reason})")
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "connected": sum(1 for s in self._sessions.values() if s.socket is not None),
+            "resumes": {
+                result: metrics.get_counter("room_resumes_total", result=result)
+                for result in ("replayed", "resync", "unknown")
+            },
+        }
+
+
+room_registry = RoomRegistry()
+
+metrics.register_collector("room", room_registry.stats)
+
+
+async def open_session(hello: dict) -> Tuple[RoomSession, int]:
+    """
+    Authenticate a hello and return (session, last_seq): a resumed session, or a new
+    one bound to an existing conversation or a new conversation with `judge`.
+    """
+    token = (hello.get("token") or "").replace("Bearer ", "")
+    if not token:
+        raise RoomError(CLOSE_UNAUTHORIZED, "token is required")
+
+    session_id = hello.get("session_id")
+    if session_id:
+        session = room_registry.get(session_id)
+        if session is not None and session.token == token:
+            return session, int(hello.get("last_seq") or 0)
+        # Expired or from another worker: start over, the client refetches what it missed
+        metrics.inc("room_resumes_total", result="unknown")
+
+    supabase = get_supabase_client(token)
+    user = await authenticate(supabase, token)
+    if not user:
+        raise RoomError(CLOSE_UNAUTHORIZED, "Invalid or expired authentication token")
+    user_id = user.id
+
+    try:
+        if hello.get("conversation_id"):
+            conversation_id = hello["conversation_id"]
+            # The socket drives turns, barge-ins and scores on whatever it binds
+            await require_conversation_owner(supabase, user_id, conversation_id)
+            history = await load_history(supabase, conversation_id, user_id)
+            judge_key = extract_judge_key_from_history(history)
+            if not history or not judge_key:
+                raise RoomError(CLOSE_NOT_FOUND, "Conversation not found or empty")
+        elif hello.get("judge"):
+            conversation_id, judge_key, history = start_conversation(supabase, user_id, hello["judge"])
+        else:
+            raise RoomError(CLOSE_BAD_REQUEST, "conversation_id or judge is required")
+    except HTTPException as e:
+        code = CLOSE_NOT_FOUND if e.status_code == 404 else CLOSE_BAD_REQUEST if e.status_code < 500 else 1011
+        raise RoomError(code, str(e.detail))
+
+    session = RoomSession(token, user_id, supabase, conversation_id, judge_key, list(history))
+    room_registry.add(session)
+    return session, 0
+
+
+async def run_turn(session: RoomSession, text: str, reply_to: Optional[str]) -> None:
+    """Answer one founder turn, streaming judge_text then judge_audio."""
+    async def on_reply(reply: str) -> None:
+        await session.emit("judge_text", reply_to, text=reply)
+
+    async with session.turn_lock:
+        try:
+            result = await answer_founder(
+                session.supabase, session.conversation_id, text,
+                audio_format=session.audio_format, audio_latency=session.audio_latency,
+                history=session.history, on_reply=on_reply, user_id=session.user_id,
+            )
+        except (HTTPException, UpstreamError) as e:
+            await session.emit("error", reply_to, status=e.status_code, detail=str(getattr(e, "detail", e)))
+            return
+
+        # Mirror what answer_founder persisted
+        session.history.append({"sender": "user", "content": text})
+        if result["judge_reply"]:
+            session.history.append({"sender": "assistant", "content": result["judge_reply"]})
+
+        if result.get("interrupted"):
+            await session.emit("judge_text", reply_to, text=result["judge_reply"], interrupted=True,
+                               reason=result["reason"])
+        elif result["audio_base64"]:
+            await session.emit("judge_audio", reply_to, audio_base64=result["audio_base64"],
+                               audio_format=result["audio_format"], audio_mime_type=result["audio_mime_type"])
+        else:
+            # Tell the client to stop waiting for audio: the judge_text is all there is
+            await session.emit("judge_audio", reply_to, audio_base64=None, degraded=result.get("degraded"))
+
+
+async def run_audio_turn(session: RoomSession, audio: bytes, content_type: str, filename: str,
+                         reply_to: Optional[str]) -> None:
+    api_key = os.getenv("ELEVENLABS_API_KEY") or os.getenv("NEXT_PUBLIC_ELEVENLABS_API_KEY")
+    try:
+        transcript = await transcribe_bytes(api_key, filename, audio, content_type)
+    except UpstreamError as e:
+        await session.emit("error", reply_to, status=e.status_code, detail=f"ElevenLabs API error: {e.detail}")
+        return
+    except Exception as e:
+        await session.emit("error", reply_to, status=502, detail=f"Transcription failed: {e}")
+        return
+    await session.emit("transcript", reply_to, text=transcript)
+    if transcript.strip():
+        await run_turn(session, transcript, reply_to)
+
+
+async def run_score(session: RoomSession, reply_to: Optional[str]) -> None:
+    async with session.turn_lock:
+        history = list(session.history)
+    try:
+        score = await score_conversation(session.conversation_id, history)
+    except (HTTPException, UpstreamError) as e:
+        await session.emit("error", reply_to, status=e.status_code, detail=str(getattr(e, "detail", e)))
+        return
+    await session.emit("score", reply_to, **score)
+
+
+def observe_partial(session: RoomSession, message: dict) -> str:
+    """Feed a partial transcript to the speculator, starting a speculative reply when ready."""
+    speculator = get_speculator()
+    text = message.get("text") or ""
+    if speculator is None:
+        return "disabled"
+    likelihood = end_of_speech_likelihood(text, message.get("end_of_speech"), message.get("silence_ms"))
+    status = speculator.observe(session.conversation_id, text, message.get("confidence"), likelihood)
+    if status != "ready" or session.turn_lock.locked():
+        return status if status != "ready" else "busy"
+
+    messages = format_openai_messages(session.history)
+    messages.append({"role": "user", "content": text})
+    speculator.start(
+        session.conversation_id, text, history_key(session.history),
+        lambda: request_judge_reply(session.conversation_id, session.judge_key, messages),
+        prompt_chars=sum(len(msg["content"]) for msg in messages),
+    )
+    return "speculating"
+
+
+async def handle_message(session: RoomSession, message: dict) -> bool:
+    """Dispatch one client message; returns False when the client ends the session."""
+    kind = message.get("type")
+    reply_to = message.get("id")
+    if kind == "message":
+        text = (message.get("text") or "").strip()
+        if text:
+            # A new turn while the judge is still answering is a barge-in
+            turn_registry.interrupt(session.conversation_id)
+            session.spawn(run_turn(session, text, reply_to))
+    elif kind == "audio_end":
+        audio, session.audio = bytes(session.audio), bytearray()
+        if audio:
+            turn_registry.interrupt(session.conversation_id)
+            session.spawn(run_audio_turn(session, audio, message.get("content_type") or "audio/wav",
+                                         message.get("filename") or "answer.wav", reply_to))
+    elif kind == "partial":
+        await session.send_unsequenced("partial", status=observe_partial(session, message), reply_to=reply_to)
+    elif kind == "interrupt":
+        # Checked against the reply itself before anything is saved (resolve_heard)
+        heard_text, heard_fraction = message.get("heard_text"), message.get("heard_fraction")
+        turn = turn_registry.interrupt(
+            session.conversation_id,
+            heard_text if isinstance(heard_text, str) else None,
+            heard_fraction if isinstance(heard_fraction, (int, float)) else None,
+        )
+        await session.emit("interrupt", reply_to, status="cancelled" if turn else "idle")
+    elif kind == "score":
+        session.spawn(run_score(session, reply_to))
+    elif kind == "ack":
+        session.ack(int(message.get("seq") or 0))
+    elif kind == "ping":
+        await session.send_unsequenced("pong", ts=time.time(), reply_to=reply_to)
+    elif kind == "bye":
+        return False
+    else:
+        await session.emit("error", reply_to, status=400, detail=f"Unknown message type '{kind}'")
+    return True
+
+
+async def heartbeat(session: RoomSession, websocket: WebSocket) -> None:
+    while session.socket is websocket:
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        await session.send_unsequenced("heartbeat", ts=time.time(), seq=session.seq)
+
+
+@router.websocket("/ws")
+async def room_socket(websocket: WebSocket):
+    """
+    Shark Tank room session over a single WebSocket; see the protocol notes at the
+    top of api/room.py.
+    """
+    await websocket.accept()
+    try:
+        hello = await asyncio.wait_for(websocket.receive_json(), timeout=HEARTBEAT_SECONDS)
+        if hello.get("type") != "hello":
+            raise RoomError(CLOSE_BAD_REQUEST, "first message must be hello")
+        session, last_seq = await open_session(hello)
+    except RoomError as e:
+        await websocket.close(code=e.code, reason=e.detail[:120])
+        return
+    except Exception as e:
+        await websocket.close(code=CLOSE_BAD_REQUEST, reason=f"invalid hello: {e}"[:120])
+        return
+
+    if hello.get("audio_format") or session.audio_format is None:
+        session.audio_format = negotiate_audio_format(hello.get("audio_format"))
+    if hello.get("audio_latency") is not None:
+        session.audio_latency = max(0, min(4, int(hello["audio_latency"])))
+
+    resumed = hello.get("session_id") == session.id
+    await room_registry.attach(session, websocket)
+    await session.send_unsequenced(
+        "ready", session_id=session.id, conversation_id=session.conversation_id, judge=session.judge_key,
+        seq=session.seq, resumed=resumed, heartbeat_seconds=HEARTBEAT_SECONDS,
+        audio_format=session.audio_format.name,
+    )
+    if resumed:
+        complete = await session.replay(last_seq)
+        metrics.inc("room_resumes_total", result="replayed" if complete else "resync")
+        if not complete:
+            # Older events were dropped: the client should reload the conversation over HTTP
+            await session.send_unsequenced("resync", seq=session.seq)
+    print(f"🛋️ Room session {session.id[:8]} {'resumed' if resumed else 'opened'} for {session.conversation_id}")
+
+    beat = asyncio.create_task(heartbeat(session, websocket))
+    ended = False
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(websocket.receive(), timeout=HEARTBEAT_SECONDS * MISSED_HEARTBEATS)
+            except asyncio.TimeoutError:
+                print(f"💤 Room session {session.id[:8]} missed heartbeats, detaching")
+                break
+            if frame["type"] == "websocket.disconnect":
+                break
+            if frame.get("bytes") is not None:
+                if len(session.audio) + len(frame["bytes"]) > MAX_AUDIO_BYTES:
+                    session.audio = bytearray()
+                    await session.emit("error", status=413, detail="Audio exceeds ROOM_MAX_AUDIO_BYTES")
+                else:
+                    session.audio += frame["bytes"]
+                continue
+            try:
+                message = json.loads(frame.get("text") or "")
+            except ValueError:
+                await session.emit("error", status=400, detail="Messages must be JSON")
+                continue
+            if not isinstance(message, dict):
+                await session.emit("error", status=400, detail="Messages must be JSON objects")
+                continue
+            try:
+                if not await handle_message(session, message):
+                    ended = True
+                    break
+            except (TypeError, ValueError, AttributeError) as e:
+                # A field of the wrong type (e.g. a non-numeric ack seq) fails that message, not the socket
+                await session.emit("error", message.get("id"), status=400, detail=f"Malformed message: {e}")
+    except RuntimeError:
+        # Socket already closed underneath us
+        pass
+    finally:
+        beat.cancel()
+        room_registry.detach(session, websocket)
+        if ended:
+            room_registry.close(session, "bye")
+        if websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except Exception:
+                pass
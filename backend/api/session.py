@@ -1,41 +1,298 @@
+# api/session.py
+"""
+Synthetic traffic generator for the conversations/messages schema.
+
+Creates N users with M conversations each, seeds every conversation with a
+history of configurable length, then runs a mixed read/write workload shaped
+like the judge endpoints (history reads, conversation listings and reply
+appends) and reports insert and select throughput with latency percentiles.
+
+Targets:
+    local     SQLite stand-in derived from database_schema.sql (services/local_db.py)
+    supabase  the project in SUPABASE_URL via PostgREST. Use a service-role key
+              (SUPABASE_SERVICE_ROLE_KEY) so inserts for synthetic users bypass RLS.
+
+Usage (from backend/):
+    python -m api.session --target local --db /tmp/load.db --users 50 --conversations 4 \
+        --history 4-30 --concurrency 16 --operations 5000 --read-ratio 0.8 --explain
+"""
+import argparse
+import json
 import os
-from uuid import uuid4
-from supabase import create_client, Client
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 
-from dotenv import load_dotenv
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../../.env.local"))
+from services.config import load_config
+from services.local_db import LocalDatabase
 
-url = os.environ.get("SUPABASE_URL") 
-key = os.environ.get("SUPABASE_KEY")
+SYSTEM_PROMPT = "You are a seasoned investor on a pitch panel. Stay in character and ask probing questions."
+USER_LINES = [
+    "We're building premium instant coffee for busy professionals.",
+    "We have $40k in monthly recurring revenue, growing 25% month over month.",
+    "Our gross margin is 60% and CAC payback is under three months.",
+    "We're raising $500k for 10% equity to expand into retail.",
+    "The team previously scaled supply chains at two global coffee brands.",
+]
+ASSISTANT_LINES = [
+    "What stops an incumbent from copying you within a quarter?",
+    "Walk me through your unit economics in detail.",
+    "Why is now the right time for this product?",
+    "How defensible is your distribution?",
+    "What would you do with twice the money?",
+]
 
-supabase: Client = create_client(url, key)
 
-auth = supabase.auth.sign_in_with_password({
-    "email": "test@example.com",
-    "password": "testpassword"
-})
+def synthetic_message(conversation_id: str, index: int, length: int) -> Dict[str, str]:
+    if index == 0:
+        sender, content = "system", SYSTEM_PROMPT
+    elif index % 2 == 1:
+        sender, content = "user", random.choice(USER_LINES)
+    else:
+        sender, content = "assistant", random.choice(ASSISTANT_LINES)
+    # Pad towards the requested average message size
+    if len(content) < length:
+        content = (content + " ") * (length // len(content)) + content[: length % len(content)]
+    return {"conversation_id": conversation_id, "sender": sender, "content": content.strip()}
 
-user_id = auth.user.id
 
-# 1️⃣ Create a conversation
-conversation = supabase.table("conversations").insert({
-    "user_id": user_id
-}).execute()
+# --- Targets ---
+class LocalTarget:
+    def __init__(self, path: str):
+        self.db = LocalDatabase(path)
 
-conversation_id = conversation.data[0]["id"]
-print("Conversation ID:", conversation_id)
+    def insert_conversations(self, user_id: str, count: int) -> List[str]:
+        return [row["id"] for row in self.db.insert("conversations", [{"user_id": user_id}] * count)]
 
-# 2️⃣ Add messages
-messages = [
-    {"conversation_id": conversation_id, "sender": "user", "content": "Hello, agent!"},
-    {"conversation_id": conversation_id, "sender": "agent", "content": "Hello there! How can I help you?"}
-]
-supabase.table("messages").insert(messages).execute()
+    def insert_messages(self, rows: List[Dict[str, str]]) -> None:
+        self.db.insert("messages", rows)
+
+    def read_history(self, conversation_id: str) -> int:
+        return len(self.db.select("messages", {"conversation_id": conversation_id}, order_by="created_at"))
+
+    def list_conversations(self, user_id: str) -> int:
+        return len(self.db.select("conversations", {"user_id": user_id}, order_by="created_at DESC", limit=20))
+
+    def explain(self) -> Dict[str, List[str]]:
+        return {
+            "read_history": self.db.explain(
+                "SELECT * FROM messages WHERE conversation_id = ? ORDER BY created_at", ["x"]),
+            "list_conversations": self.db.explain(
+                "SELECT * FROM conversations WHERE user_id = ? ORDER BY created_at DESC LIMIT 20", ["x"]),
+        }
+
+    def sizes(self) -> Dict[str, int]:
+        return {table: self.db.count(table) for table in ("conversations", "messages")}
+
+
+class SupabaseTarget:
+    def __init__(self):
+        load_config()
+        self.url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+        self.key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+        if not self.url or not self.key:
+            raise SystemExit("Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (or SUPABASE_KEY) to use --target supabase")
+        self._local = threading.local()
+        # Import the SDK up front so its load time isn't charged to the first insert
+        import supabase  # noqa: F401
+
+    @property
+    def client(self):
+        # supabase-py clients hold a single httpx.Client; give each worker thread its own
+        client = getattr(self._local, "client", None)
+        if client is None:
+            from supabase import create_client
+
+            client = self._local.client = create_client(self.url, self.key)
+        return client
+
+    def insert_conversations(self, user_id: str, count: int) -> List[str]:
+        resp = self.client.table("conversations").insert([{"user_id": user_id}] * count).execute()
+        return [row["id"] for row in resp.data]
+
+    def insert_messages(self, rows: List[Dict[str, str]]) -> None:
+        self.client.table("messages").insert(rows).execute()
+
+    def read_history(self, conversation_id: str) -> int:
+        resp = self.client.table("messages").select("*").eq("conversation_id", conversation_id) \
+            .order("created_at").execute()
+        return len(resp.data)
+
+    def list_conversations(self, user_id: str) -> int:
+        resp = self.client.table("conversations").select("*").eq("user_id", user_id) \
+            .order("created_at", desc=True).limit(20).execute()
+        return len(resp.data)
+
+    def explain(self) -> Dict[str, List[str]]:
+        return {"note": ["Query plans are only available for --target local; use EXPLAIN in the SQL editor"]}
+
+    def sizes(self) -> Dict[str, int]:
+        return {}
+
+
+# --- Measurement ---
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.rows: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, op: str, seconds: float, rows: int = 0) -> None:
+        with self._lock:
+            self.latencies.setdefault(op, []).append(seconds)
+            self.rows[op] = self.rows.get(op, 0) + rows
+
+    def error(self, op: str) -> None:
+        with self._lock:
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+    def timed(self, op: str, fn, *args) -> int:
+        started = time.perf_counter()
+        try:
+            rows = fn(*args)
+        except Exception as e:
+            self.error(op)
+            print(f"❌ {op} failed: {e}")
+            return 0
+        self.record(op, time.perf_counter() - started, rows or 0)
+        return rows or 0
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        result = {}
+        for op, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+            result[op] = {
+                "calls": len(values),
+                "rows": self.rows.get(op, 0),
+                "errors": self.errors.get(op, 0),
+                "calls_per_s": round(len(values) / elapsed, 1) if elapsed else 0.0,
+                "rows_per_s": round(self.rows.get(op, 0) / elapsed, 1) if elapsed else 0.0,
+                "p50_ms": round(pick(0.50), 2),
+                "p95_ms": round(pick(0.95), 2),
+                "p99_ms": round(pick(0.99), 2),
+            }
+        return result
+
+
+def parse_range(value: str) -> Tuple[int, int]:
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def seed(target, pool: ThreadPoolExecutor, args) -> Tuple[Dict[str, List[str]], dict]:
+    """Create users, conversations and histories; returns ({user_id: [conversation_id]}, stats)."""
+    stats = Stats()
+    users = [str(uuid.uuid4()) for _ in range(args.users)]
+    low, high = parse_range(args.history)
+
+    def seed_user(user_id: str) -> List[str]:
+        started = time.perf_counter()
+        conversation_ids = target.insert_conversations(user_id, args.conversations)
+        stats.record("insert_conversations", time.perf_counter() - started, len(conversation_ids))
+
+        batch: List[Dict[str, str]] = []
+        for conversation_id in conversation_ids:
+            batch.extend(synthetic_message(conversation_id, i, args.message_chars)
+                         for i in range(random.randint(low, high)))
+        for start in range(0, len(batch), args.batch_size):
+            chunk = batch[start:start + args.batch_size]
+            stats.timed("insert_messages", lambda rows: target.insert_messages(rows) or len(rows), chunk)
+        return conversation_ids
+
+    started = time.perf_counter()
+    conversations = dict(zip(users, pool.map(seed_user, users)))
+    return conversations, {"elapsed_s": round(time.perf_counter() - started, 3),
+                           "operations": stats.summary(time.perf_counter() - started)}
+
+
+def run_workload(target, pool: ThreadPoolExecutor, conversations: Dict[str, List[str]], args) -> dict:
+    """Mixed traffic: history reads and listings (reads) vs. reply appends (writes)."""
+    stats = Stats()
+    users = list(conversations)
+    turn_counter = {}
+
+    def one_operation(_):
+        user_id = random.choice(users)
+        conversation_id = random.choice(conversations[user_id])
+        if random.random() < args.read_ratio:
+            if random.random() < 0.85:
+                stats.timed("read_history", target.read_history, conversation_id)
+            else:
+                stats.timed("list_conversations", target.list_conversations, user_id)
+        else:
+            # One judge turn: the founder's message, then the judge's reply
+            turn = turn_counter[conversation_id] = turn_counter.get(conversation_id, 1) + 2
+            for index in (turn, turn + 1):
+                row = synthetic_message(conversation_id, index, args.message_chars)
+                stats.timed("append_message", lambda r: target.insert_messages([r]) or 1, row)
+
+    started = time.perf_counter()
+    list(pool.map(one_operation, range(args.operations)))
+    elapsed = time.perf_counter() - started
+    return {"elapsed_s": round(elapsed, 3), "ops_per_s": round(args.operations / elapsed, 1),
+            "operations": stats.summary(elapsed)}
+
+
+def print_phase(name: str, phase: dict) -> None:
+    print(f"\n📊 {name} ({phase['elapsed_s']}s)")
+    print(f"  {'operation':<22}{'calls':>8}{'rows/s':>10}{'calls/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for op, s in phase["operations"].items():
+        print(f"  {op:<22}{s['calls']:>8}{s['rows_per_s']:>10}{s['calls_per_s']:>10}"
+              f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("local", "supabase"), default="local")
+    parser.add_argument("--db", default=":memory:", help="SQLite path for --target local")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=3, help="conversations per user")
+    parser.add_argument("--history", default="4-20", help="messages per conversation, e.g. 10 or 4-20")
+    parser.add_argument("--message-chars", type=int, default=160, help="approximate message length")
+    parser.add_argument("--batch-size", type=int, default=200, help="rows per seeding insert")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=2000, help="workload operations after seeding")
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    parser.add_argument("--explain", action="store_true", help="print query plans for the hot queries")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    target = LocalTarget(args.db) if args.target == "local" else SupabaseTarget()
+    print(f"🌱 Seeding {args.users} users x {args.conversations} conversations "
+          f"({args.history} messages each) on {args.target}")
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        conversations, seeding = seed(target, pool, args)
+        print_phase("Seeding", seeding)
+        print(f"\n🔀 Running {args.operations} operations ({args.read_ratio:.0%} reads) "
+              f"with concurrency {args.concurrency}")
+        workload = run_workload(target, pool, conversations, args)
+        print_phase(f"Workload — {workload['ops_per_s']} ops/s", workload)
+
+    results = {"config": vars(args), "seeding": seeding, "workload": workload, "table_sizes": target.sizes()}
+    if results["table_sizes"]:
+        print(f"\n🗄️ Table sizes: {results['table_sizes']}")
+    if args.explain:
+        results["query_plans"] = target.explain()
+        print("\n🔎 Query plans:")
+        for query, plan in results["query_plans"].items():
+            print(f"  {query}: " + " | ".join(plan))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
 
-# 3️⃣ Fetch conversation history
-history = supabase.table("messages").select("*").eq("conversation_id", conversation_id).order("created_at").execute()
-for msg in history.data:
-    print(f"[{msg['sender']}] {msg['content']}")
 
-print(user_id)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
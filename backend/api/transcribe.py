@@ -1,17 +1,59 @@
 # api/transcribe.py
-from fastapi import APIRouter, HTTPException, UploadFile, File, Header, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Header, Form, Request
+from pydantic import BaseModel, Field
 from typing import Optional
-import httpx
 import os
-from dotenv import load_dotenv
-import tempfile
-from pathlib import Path
 import asyncio
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.config import load_config
+from services.clients import get_elevenlabs_base_url
+from services.governor import UpstreamError, get_governor, raise_for_upstream_status
+from services.speculation import end_of_speech_likelihood, get_speculator
+from services.audio import prepare_for_stt
+from services.auth import authenticate
+from services import metrics
 
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../../.env.local"))
+load_config()
 
 router = APIRouter(prefix="/elevenlabs", tags=["Transcribe"])
 
+async def transcribe_bytes(api_key: str, filename: str, content: bytes, content_type: str) -> str:
+    """
+    Send audio to ElevenLabs Scribe V1 through the STT governor (rate limits,
+    retries on 429/5xx). Uncompressed audio is first trimmed to the speech and
+    converted to 16 kHz mono PCM, off the event loop; digital silence is never
+    uploaded. The upload is sent from memory so retries can resend it.
+    """
+    import httpx
+
+    prepared = await asyncio.to_thread(prepare_for_stt, content, filename, content_type)
+    if prepared.is_silent:
+        metrics.inc("stt_skipped_total", reason="silence")
+        print(f"🔇 Digital silence in {prepared.original_seconds:.1f}s of audio, skipping STT")
+        return ''
+
+    data = {'model_id': 'scribe_v1'}
+    if prepared.file_format:
+        data['file_format'] = prepared.file_format
+
+    async def call():
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.post(
+                f'{get_elevenlabs_base_url()}/v1/speech-to-text',
+                headers={'xi-api-key': api_key},
+                data=data,
+                files={'file': (prepared.filename, prepared.content, prepared.content_type)}
+            )
+        raise_for_upstream_status("elevenlabs_stt", response)
+        return response
+
+    response = await get_governor("elevenlabs_stt").run(call)
+
+    # ElevenLabs returns {"text": "transcribed content"}
+    result = response.json()
+    return result.get('text', '')
+
 @router.post("/stt")
 async def transcribe_audio(audio: UploadFile = File(...)):
     """
@@ -20,6 +62,8 @@ async def transcribe_audio(audio: UploadFile = File(...)):
     Accepts audio file in various formats (WAV, MP3, WebM, MPEG).
     Returns transcribed text.
     """
+    import httpx
+
     api_key = os.getenv("ELEVENLABS_API_KEY") or os.getenv("NEXT_PUBLIC_ELEVENLABS_API_KEY")
     if not api_key:
         raise HTTPException(
@@ -27,61 +71,97 @@ async def transcribe_audio(audio: UploadFile = File(...)):
             detail="ELEVENLABS_API_KEY not configured in environment variables"
         )
     
-    # Create a temporary file to store the uploaded audio
-    temp_file = None
     try:
         # Read the uploaded file content
         audio_content = await audio.read()
-        
-        # Create a temporary file with the appropriate extension
-        suffix = Path(audio.filename or "audio.wav").suffix
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            temp_file.write(audio_content)
-            temp_file_path = temp_file.name
-        
-        # Send the audio to ElevenLabs Scribe V1 API
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            with open(temp_file_path, 'rb') as f:
-                files = {'audio': (audio.filename or 'audio.wav', f, audio.content_type or 'audio/wav')}
-                headers = {'xi-api-key': api_key}
-                
-                response = await client.post(
-                    'https://api.elevenlabs.io/v1/speech-to-text',
-                    headers=headers,
-                    files=files
-                )
-        
-        # Clean up temporary file
-        os.unlink(temp_file_path)
-        
-        if response.status_code != 200:
-            error_detail = response.text
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"ElevenLabs API error: {error_detail}"
-            )
-        
-        # ElevenLabs returns {"text": "transcribed content"}
-        result = response.json()
-        transcript = result.get('text', '')
+
+        transcript = await transcribe_bytes(
+            api_key, audio.filename or 'audio.wav', audio_content, audio.content_type or 'audio/wav'
+        )
         
         return {"transcript": transcript}
     
+    except HTTPException:
+        raise
+    except UpstreamError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"ElevenLabs API error: {e.detail}",
+            headers=e.headers()
+        )
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="Transcription request timed out")
     except httpx.RequestError as e:
         raise HTTPException(status_code=503, detail=f"Failed to connect to ElevenLabs API: {str(e)}")
     except Exception as e:
-        # Clean up temp file if it exists
-        if temp_file and os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+class PartialTranscriptRequest(BaseModel):
+    conversation_id: str
+    text: str
+    # STT confidence for the partial, if the recognizer reports one
+    confidence: Optional[float] = Field(None, ge=0.0, le=1.0)
+    # End-of-speech signal: the client's own probability, or trailing silence so far
+    end_of_speech: Optional[float] = Field(None, ge=0.0, le=1.0)
+    silence_ms: Optional[int] = Field(None, ge=0)
+
+@router.post("/partial")
+async def partial_transcript(request: PartialTranscriptRequest, authorization: str = Header(...)):
+    """
+    Report a partial transcript while the founder is still speaking.
+
+    Once the partial is stable and end of speech looks likely, the judge's reply
+    starts generating speculatively; the final message (via /audio-with-judge or
+    /judges/generate) reuses it if the final transcript differs only trivially.
+    """
+    speculator = get_speculator()
+    if speculator is None:
+        return {"status": "disabled"}
+
+    from api.judge import (
+        get_supabase_client, load_history, extract_judge_key_from_history,
+        format_openai_messages, history_key, request_judge_reply, require_conversation_owner
+    )
+
+    # Partials arrive several times a second; authentication and ownership are both
+    # cached, so checking them before touching speculation state stays cheap
+    token = authorization.replace("Bearer ", "")
+    supabase = get_supabase_client(token)
+    user = await authenticate(supabase, token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
+    await require_conversation_owner(supabase, user.id, request.conversation_id)
+
+    likelihood = end_of_speech_likelihood(request.text, request.end_of_speech, request.silence_ms)
+    status = speculator.observe(request.conversation_id, request.text, request.confidence, likelihood)
+    if status != "ready":
+        return {"status": status}
+
+    history = await load_history(supabase, request.conversation_id, user.id)
+    judge_key = extract_judge_key_from_history(history)
+    if not history or not judge_key:
+        raise HTTPException(status_code=404, detail="Conversation not found or empty")
+
+    messages = format_openai_messages(history)
+    messages.append({"role": "user", "content": request.text})
+    speculator.start(
+        request.conversation_id,
+        request.text,
+        history_key(history),
+        lambda: request_judge_reply(request.conversation_id, judge_key, messages),
+        prompt_chars=sum(len(msg["content"]) for msg in messages),
+    )
+    return {"status": "speculating"}
+
+
 @router.post("/audio-with-judge")
 async def transcribe_and_generate(
+    http_request: Request,
     audio: UploadFile = File(...),
     conversation_id: Optional[str] = Form(None),
+    audio_format: Optional[str] = Form(None),
+    audio_latency: Optional[int] = Form(None, ge=0, le=4),
     authorization: str = Header(None)
 ):
     """
@@ -90,10 +170,13 @@ async def transcribe_and_generate(
     This endpoint:
     1. Transcribes the audio using ElevenLabs Scribe V1
     2. If conversation_id and authorization are provided, sends transcript to judge
+       (reusing a reply speculated from partial transcripts when it still fits)
     3. Returns both transcript and judge response (if applicable)
     
     This reduces latency by handling both operations in one request.
     """
+    import httpx
+
     api_key = os.getenv("ELEVENLABS_API_KEY") or os.getenv("NEXT_PUBLIC_ELEVENLABS_API_KEY")
     if not api_key:
         raise HTTPException(
@@ -101,92 +184,40 @@ async def transcribe_and_generate(
             detail="ELEVENLABS_API_KEY not configured in environment variables"
         )
     
-    # Create a temporary file to store the uploaded audio
-    temp_file = None
     try:
         # Read the uploaded file content
         audio_content = await audio.read()
-        
-        # Create a temporary file with the appropriate extension
-        suffix = Path(audio.filename or "audio.wav").suffix
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            temp_file.write(audio_content)
-            temp_file_path = temp_file.name
-        
-        # Send the audio to ElevenLabs Scribe V1 API
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            with open(temp_file_path, 'rb') as f:
-                files = {'audio': (audio.filename or 'audio.wav', f, audio.content_type or 'audio/wav')}
-                headers = {'xi-api-key': api_key}
-                
-                response = await client.post(
-                    'https://api.elevenlabs.io/v1/speech-to-text',
-                    headers=headers,
-                    files=files
-                )
-        
-        # Clean up temporary file
-        os.unlink(temp_file_path)
-        
-        if response.status_code != 200:
-            error_detail = response.text
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"ElevenLabs API error: {error_detail}"
-            )
-        
-        # ElevenLabs returns {"text": "transcribed content"}
-        result = response.json()
-        transcript = result.get('text', '')
+
+        transcript = await transcribe_bytes(
+            api_key, audio.filename or 'audio.wav', audio_content, audio.content_type or 'audio/wav'
+        )
         
         # If conversation_id and authorization are provided, send to judge
         judge_reply = None
+        audio_base64 = None
+        audio_mime_type = None
+        degraded = None
         if conversation_id and authorization:
             try:
-                # Import judge functions
-                from api.judge import get_supabase_client, get_openai_client, get_chat_history, format_openai_messages
+                from api.judge import get_supabase_client, answer_founder
+                from services.elevenlabs_service import negotiate_audio_format
                 
                 token = authorization.replace("Bearer ", "")
                 supabase = get_supabase_client(token)
-                openai_client = get_openai_client()
                 
                 # Verify user authentication
-                user_response = supabase.auth.get_user(token)
-                if not user_response or not user_response.user:
+                user = await authenticate(supabase, token)
+                if not user:
                     raise HTTPException(status_code=401, detail="Invalid or expired authentication token")
                 
-                # Load conversation history
-                history_resp = get_chat_history(supabase, conversation_id)
-                history = history_resp.data or []
-                
-                if not history:
-                    raise HTTPException(status_code=404, detail="Conversation not found or empty")
-                
-                # Convert history into OpenAI message format
-                messages = format_openai_messages(history)
-                messages.append({"role": "user", "content": transcript})
-                
-                # Save user message to database
-                supabase.table("messages").insert({
-                    "conversation_id": conversation_id,
-                    "sender": "user",
-                    "content": transcript
-                }).execute()
-                
-                # Generate judge response
-                openai_response = openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    temperature=0.8,
-                )
-                judge_reply = openai_response.choices[0].message.content.strip()
-                
-                # Save assistant reply to database
-                supabase.table("messages").insert({
-                    "conversation_id": conversation_id,
-                    "sender": "assistant",
-                    "content": judge_reply
-                }).execute()
+                # Saves the transcript and the judge's reply, like /judges/generate
+                result = await answer_founder(supabase, conversation_id, transcript, http_request,
+                                              negotiate_audio_format(audio_format), audio_latency,
+                                              user_id=user.id)
+                judge_reply = result["judge_reply"]
+                audio_base64 = result["audio_base64"]
+                audio_mime_type = result.get("audio_mime_type")
+                degraded = result.get("degraded")
                 
             except Exception as judge_error:
                 # Log judge error but still return transcript
@@ -196,16 +227,24 @@ async def transcribe_and_generate(
         
         return {
             "transcript": transcript,
-            "judge_reply": judge_reply
+            "judge_reply": judge_reply,
+            "audio_base64": audio_base64,
+            "audio_mime_type": audio_mime_type,
+            "degraded": degraded
         }
     
+    except HTTPException:
+        raise
+    except UpstreamError as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"ElevenLabs API error: {e.detail}",
+            headers=e.headers()
+        )
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="Transcription request timed out")
     except httpx.RequestError as e:
         raise HTTPException(status_code=503, detail=f"Failed to connect to ElevenLabs API: {str(e)}")
     except Exception as e:
-        # Clean up temp file if it exists
-        if temp_file and os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
@@ -0,0 +1,333 @@
+# bench/admission_flood.py
+"""
+Admission-control benchmark (services/admission.py): do interactive turns keep
+their latency while analyses flood the backend?
+
+Starts the upstream stubs and the real backend, then runs the same interactive
+workload in three scenarios, each on a fresh backend:
+
+    baseline        interactive sessions alone
+    flood, off      plus --flood clients posting /performance/analyze in a loop,
+                    with ADMISSION_ENABLED=0 and no governor reservations
+    flood, on       the same flood with admission control (the defaults, or
+                    --backend-env overrides)
+
+Interactive sessions are /judges/select, then --turns turns of an
+/elevenlabs/stt upload (the founder speaking) and /judges/generate, --sessions
+times per user. Flood clients each analyse their own conversation (set up
+before timing starts) until the interactive sessions finish, sleeping for
+Retry-After (capped at 5 s) after a 503.
+
+Tail latencies need samples and one run is noisy, so the scenarios run
+--repeats times, interleaved (baseline, off, on, baseline, ...) so drift on the
+host hits them alike. Percentiles are over the samples of every repetition;
+p99 from fewer than 100 samples is marked with *, since it is then close to
+the maximum. "p99 range" is the lowest and highest p99 of single repetitions,
+and a difference is only called out when the ranges do not overlap.
+
+Reported per scenario: interactive latency and errors per endpoint; analyses
+completed, refused with 503 and failed (by status); and the server's own
+view from /metrics (median over repetitions of each p99): interactive
+admission wait, STT preprocessing, STT governor queue wait and upstream time.
+
+Usage (from backend/):
+    python -m bench.admission_flood [--users 6] [--sessions 3] [--turns 3] [--flood 24] [--repeats 3]
+        [--stub gemini=400,100] [--backend-env ADMISSION_CAPACITY=12] [--output flood.json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from bench.load_test import JUDGES, PITCH_LINES, Backend, Recorder, _free_port, git_commit, make_wav, percentile
+from bench.stubs import StubServer, StubState, parse_profile
+
+INTERACTIVE_ENDPOINTS = ("judges.select", "judges.generate", "elevenlabs.stt")
+# Turns every priority mechanism off, for the "flood, off" scenario
+ADMISSION_OFF = {
+    "ADMISSION_ENABLED": "0",
+    **{f"GOVERNOR_{provider}_RESERVED": "0" for provider in ("GEMINI", "ELEVENLABS_TTS", "ELEVENLABS_STT")},
+}
+# Flood conversations set up at once, well inside the interactive admission slots
+SETUP_CONCURRENCY = 4
+# Below this many samples a p99 is little more than the maximum
+MIN_P99_SAMPLES = 100
+# Server-side timings read from /metrics after each run: label -> summary key
+SERVER_TIMINGS = {
+    "admission wait": 'admission_wait_seconds{class="interactive"}',
+    "stt preprocess": "audio_preprocess_seconds",
+    "stt queue": 'upstream_queue_wait_seconds{provider="elevenlabs_stt"}',
+    "stt upstream": 'upstream_latency_seconds{provider="elevenlabs_stt"}',
+}
+
+
+async def interactive_user(client: httpx.AsyncClient, recorder: Recorder, index: int, sessions: int, turns: int,
+                           wav: bytes) -> None:
+    headers = {"Authorization": f"Bearer flood-interactive-{index}"}
+    for _ in range(sessions):
+        selected = await recorder.call(client, "judges.select", "POST", "/judges/select",
+                                       json={"judge": random.choice(JUDGES)}, headers=headers)
+        if not selected:
+            continue
+        for turn in range(turns):
+            await recorder.call(client, "elevenlabs.stt", "POST", "/elevenlabs/stt",
+                                files={"audio": ("answer.wav", wav, "audio/wav")})
+            await recorder.call(client, "judges.generate", "POST", "/judges/generate",
+                                json={"conversation_id": selected["conversation_id"],
+                                      "new_message": PITCH_LINES[turn % len(PITCH_LINES)]}, headers=headers)
+        recorder.sessions_completed += 1
+
+
+async def prepare_flood_conversation(client: httpx.AsyncClient, index: int, setup: asyncio.Semaphore) -> tuple:
+    """
+    A conversation with one exchange in it, for a flood client to analyse. Set up
+    a few at a time and retried until it holds a message, so neither the setup
+    nor an empty conversation (analysed as a 404) skews the timed phase.
+    """
+    headers = {"Authorization": f"Bearer flood-batch-{index}"}
+    async with setup:
+        for _ in range(5):
+            selected = await client.post("/judges/select", json={"judge": JUDGES[index % len(JUDGES)]},
+                                         headers=headers)
+            if selected.status_code >= 400:
+                continue
+            conversation_id = selected.json()["conversation_id"]
+            generated = await client.post("/judges/generate", json={"conversation_id": conversation_id,
+                                                                    "new_message": PITCH_LINES[1]}, headers=headers)
+            if generated.status_code < 400:
+                return headers, conversation_id
+    raise SystemExit(f"Could not set up flood conversation {index}")
+
+
+async def flood_client(client: httpx.AsyncClient, headers: dict, conversation_id: str, stop: asyncio.Event,
+                       outcomes: dict, latencies: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            response = await client.post("/performance/analyze", json={"conversation_id": conversation_id},
+                                          headers=headers)
+        except httpx.HTTPError as e:
+            outcomes[type(e).__name__] += 1
+            continue
+        if response.status_code == 503 and "retry-after" in response.headers:
+            outcomes["refused"] += 1
+            try:
+                await asyncio.wait_for(stop.wait(), min(5.0, float(response.headers["retry-after"])))
+            except asyncio.TimeoutError:
+                pass
+        elif response.status_code >= 400:
+            outcomes[str(response.status_code)] += 1
+        else:
+            outcomes["completed"] += 1
+            latencies.append(time.perf_counter() - started)
+
+
+async def run_scenario(base_url: str, args, flood: int) -> dict:
+    recorder = Recorder()
+    wav = make_wav()
+    outcomes, batch_latencies = defaultdict(int), []
+    limits = httpx.Limits(max_connections=args.users + flood + 8)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        setup = asyncio.Semaphore(SETUP_CONCURRENCY)
+        conversations = await asyncio.gather(*(prepare_flood_conversation(client, i, setup) for i in range(flood)))
+        stop = asyncio.Event()
+        flooders = [asyncio.create_task(flood_client(client, headers, conversation_id, stop, outcomes,
+                                                     batch_latencies))
+                    for headers, conversation_id in conversations]
+        # Let the flood build up before the first interactive turn
+        await asyncio.sleep(args.warmup if flood else 0)
+        started = time.perf_counter()
+        await asyncio.gather(*(interactive_user(client, recorder, i, args.sessions, args.turns, wav)
+                               for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*flooders)
+        try:
+            snapshot = (await client.get("/metrics")).json()
+        except (httpx.HTTPError, ValueError):
+            snapshot = {}
+
+    summaries = snapshot.get("summaries", {})
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "latencies": {name: values for name, values in recorder.latencies.items()},
+        "errors": {name: dict(errors) for name, errors in recorder.errors.items()},
+        "batch": {"outcomes": dict(outcomes), "latencies": batch_latencies},
+        "server_p99": {label: summaries[key]["p99"] for label, key in SERVER_TIMINGS.items() if key in summaries},
+        "admission": snapshot.get("admission", {}),
+    }
+
+
+def run_backend(stubs: StubServer, env: dict, args, flood: int, log_suffix: str) -> dict:
+    backend_env = {**stubs.backend_env(), **env}
+    log_path = f"{args.backend_log}.{log_suffix}" if args.backend_log else None
+    backend = Backend(backend_env, _free_port(), log_path)
+    try:
+        backend.wait_ready()
+        return asyncio.run(run_scenario(backend.url, args, flood))
+    finally:
+        backend.stop()
+
+
+def aggregate(runs: List[dict]) -> dict:
+    """Pool the repetitions of one scenario: percentiles over every sample, plus per-run p99s."""
+    endpoints = {}
+    for name in INTERACTIVE_ENDPOINTS:
+        per_run = [run["latencies"].get(name, []) for run in runs]
+        values = [value for run in per_run for value in run]
+        if not values:
+            continue
+        errors = defaultdict(int)
+        for run in runs:
+            for kind, count in run["errors"].get(name, {}).items():
+                errors[kind] += count
+        endpoints[name] = {
+            "count": len(values),
+            "errors": sum(errors.values()),
+            "error_breakdown": dict(errors),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "p99_per_run_ms": [round(percentile(run, 99) * 1000, 1) for run in per_run if run],
+        }
+
+    outcomes = defaultdict(int)
+    for run in runs:
+        for kind, count in run["batch"]["outcomes"].items():
+            outcomes[kind] += count
+    batch_latencies = [value for run in runs for value in run["batch"]["latencies"]]
+    elapsed = sum(run["elapsed_s"] for run in runs)
+    server = {}
+    for label in SERVER_TIMINGS:
+        values = [run["server_p99"][label] for run in runs if run["server_p99"].get(label) is not None]
+        if values:
+            server[label] = round(statistics.median(values) * 1000, 1)
+    return {
+        "repeats": len(runs),
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": endpoints,
+        "batch": {
+            "outcomes": dict(outcomes),
+            "throughput_rps": round(outcomes["completed"] / elapsed, 3) if elapsed else 0.0,
+            "p50_ms": round(percentile(batch_latencies, 50) * 1000, 1) if batch_latencies else None,
+        },
+        "server_p99_ms": server,
+        "admission": runs[-1]["admission"],
+    }
+
+
+def _p99(stats: dict) -> str:
+    return f"{stats['p99_ms']:.0f}{'*' if stats['count'] < MIN_P99_SAMPLES else ''}"
+
+
+def compare(name: str, off: dict, on: dict) -> str:
+    """One line comparing flood p99 without and with admission control, noise included."""
+    if off["count"] < MIN_P99_SAMPLES or on["count"] < MIN_P99_SAMPLES:
+        verdict = f"too few samples to compare p99 (need {MIN_P99_SAMPLES}; raise --repeats or --sessions)"
+    elif max(on["p99_per_run_ms"]) < min(off["p99_per_run_ms"]):
+        verdict = "lower with admission control in every repetition"
+    elif min(on["p99_per_run_ms"]) > max(off["p99_per_run_ms"]):
+        verdict = "HIGHER with admission control in every repetition"
+    else:
+        verdict = "within run-to-run noise (per-repetition ranges overlap)"
+    return (f"{name} p99 under flood: {off['p99_ms']:.0f} ms without admission control -> "
+            f"{on['p99_ms']:.0f} ms with it; {verdict}")
+
+
+def print_scenarios(scenarios: dict) -> None:
+    print(f"\n{'scenario':<14}{'endpoint':<18}{'n':>6}{'err':>5}{'p50':>7}{'p95':>7}{'p99':>8}  p99 range")
+    print("-" * 80)
+    for label, results in scenarios.items():
+        for name in INTERACTIVE_ENDPOINTS:
+            stats = results["endpoints"].get(name)
+            if stats:
+                runs = stats["p99_per_run_ms"]
+                print(f"{label:<14}{name:<18}{stats['count']:>6}{stats['errors']:>5}{stats['p50_ms']:>7.0f}"
+                      f"{stats['p95_ms']:>7.0f}{_p99(stats):>8}  {min(runs):.0f}-{max(runs):.0f}")
+        batch = results["batch"]
+        if batch["outcomes"]:
+            outcomes = dict(batch["outcomes"])
+            completed, refused = outcomes.pop("completed", 0), outcomes.pop("refused", 0)
+            failed = ", ".join(f"{count} {kind}" for kind, count in sorted(outcomes.items())) or "none failed"
+            print(f"{'':<14}analyses: {completed} completed ({batch['throughput_rps']:.2f}/s, p50 "
+                  f"{batch['p50_ms'] or 0:.0f} ms), {refused} refused with 503; {failed}")
+    print(f"\nServer p99 (ms, median over repetitions){'':<4}" + "".join(f"{label:>16}" for label in SERVER_TIMINGS))
+    for label, results in scenarios.items():
+        server = results["server_p99_ms"]
+        print(f"{label:<44}" + "".join(f"{server[key]:>16.0f}" if key in server else f"{'-':>16}"
+                                       for key in SERVER_TIMINGS))
+    print(f"\n* fewer than {MIN_P99_SAMPLES} samples: p99 is close to the maximum")
+
+    off, on = scenarios.get("flood, off"), scenarios.get("flood, on")
+    if off and on:
+        for name in ("judges.generate", "elevenlabs.stt"):
+            if name in off["endpoints"] and name in on["endpoints"]:
+                print(compare(name, off["endpoints"][name], on["endpoints"][name]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=6, help="interactive users")
+    parser.add_argument("--sessions", type=int, default=3, help="sessions per interactive user")
+    parser.add_argument("--turns", type=int, default=3, help="judge turns per session")
+    parser.add_argument("--flood", type=int, default=24, help="concurrent analysis clients")
+    parser.add_argument("--repeats", type=int, default=3, help="runs of every scenario, interleaved")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of flood before interactive load")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout (s)")
+    parser.add_argument("--stub", action="append", default=[],
+                        help="override a stub profile: provider=latency_ms,jitter_ms[,error_rate]")
+    parser.add_argument("--backend-env", action="append", default=[], help="extra KEY=VALUE for the backend")
+    parser.add_argument("--backend-log", help="write each run's backend output to this path + suffix")
+    parser.add_argument("--scenarios", default="baseline,flood-off,flood-on", help="comma-separated subset")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    state = StubState()
+    for spec in args.stub:
+        name, profile = parse_profile(spec)
+        state.profiles[name] = profile
+    extra_env = dict(kv.split("=", 1) for kv in args.backend_env)
+
+    plan = {
+        "baseline": ("baseline", extra_env, 0),
+        "flood-off": ("flood, off", {**extra_env, **ADMISSION_OFF}, args.flood),
+        "flood-on": ("flood, on", extra_env, args.flood),
+    }
+    keys = [key.strip() for key in args.scenarios.split(",")]
+    stubs = StubServer(state=state).start()
+    runs: Dict[str, List[dict]] = defaultdict(list)
+    try:
+        for repeat in range(1, args.repeats + 1):
+            for key in keys:
+                label, env, flood = plan[key]
+                print(f"Running {label} ({repeat}/{args.repeats}): {args.users} users x {args.sessions} sessions "
+                      f"x {args.turns} turns, {flood} analysis clients")
+                runs[label].append(run_backend(stubs, env, args, flood, f"{key}.{repeat}"))
+    finally:
+        stubs.stop()
+
+    scenarios = {label: aggregate(label_runs) for label, label_runs in runs.items()}
+    print_scenarios(scenarios)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "config": {"users": args.users, "sessions": args.sessions, "turns": args.turns,
+                           "flood": args.flood, "repeats": args.repeats,
+                           "stubs": {n: vars(p) for n, p in state.profiles.items()}, "backend_env": extra_env},
+                "scenarios": scenarios,
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
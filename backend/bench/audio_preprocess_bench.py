@@ -0,0 +1,163 @@
+# bench/audio_preprocess_bench.py
+"""
+Audio preprocessing benchmark: upload bytes and STT latency per utterance,
+with and without trimming/downmixing/resampling before upload.
+
+The fixture corpus is synthetic and deterministic: voiced, syllable-shaped
+"speech" over a faint noise floor, with the leading and trailing silence a
+browser recording typically has, in the formats browsers produce (48 kHz
+stereo int16/float32, 44.1 kHz mono float32, 24-bit, 16 kHz mono). Each
+utterance goes through the real transcribe_bytes() against bench/stubs.py,
+whose STT stand-in charges latency per MB uploaded and per second of audio.
+Speech coverage checks that trimming kept the whole true speech region.
+
+Usage (from backend/):
+    python -m bench.audio_preprocess_bench [--utterances 6] [--repeats 3]
+        [--ms-per-mb 80] [--ms-per-audio-second 40] [--base-latency-ms 150]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import struct
+import time
+
+import numpy as np
+
+from bench.stubs import ProviderProfile, StubServer, StubState
+
+# (label, rate, channels, encoding)
+FORMATS = [
+    ("48k stereo int16", 48000, 2, "int16"),
+    ("48k stereo float32", 48000, 2, "float32"),
+    ("44.1k mono float32", 44100, 1, "float32"),
+    ("48k mono int24", 48000, 1, "int24"),
+    ("16k mono int16", 16000, 1, "int16"),
+]
+
+
+def synth_speech(rng: np.random.Generator, seconds: float, rate: int) -> np.ndarray:
+    """Harmonic voice with a drifting pitch, chopped into syllables, at roughly -20 dBFS."""
+    t = np.arange(int(seconds * rate)) / rate
+    f0 = rng.uniform(100, 220) * (1 + 0.08 * np.sin(2 * np.pi * rng.uniform(0.3, 0.8) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = np.clip(np.sin(2 * np.pi * rng.uniform(3.5, 5.0) * t), 0, None) ** 0.5
+    signal = voice * syllables
+    return (0.1 * signal / np.abs(signal).max()).astype(np.float32)
+
+
+def make_utterance(rng: np.random.Generator, rate: int, channels: int) -> tuple:
+    """(float32 frames x channels, speech_start_s, speech_end_s) with silence either side."""
+    lead, speech, tail = rng.uniform(0.5, 2.5), rng.uniform(2.0, 6.0), rng.uniform(1.0, 4.0)
+    voice = synth_speech(rng, speech, rate)
+    mono = np.concatenate([np.zeros(int(lead * rate), np.float32), voice, np.zeros(int(tail * rate), np.float32)])
+    mono += rng.normal(0, 10 ** (-60 / 20), len(mono)).astype(np.float32)
+    frames = np.repeat(mono[:, None], channels, axis=1)
+    if channels == 2:
+        frames[:, 1] *= 0.8
+    return frames, lead, lead + speech
+
+
+def encode_wav(frames: np.ndarray, rate: int, encoding: str) -> bytes:
+    channels = frames.shape[1]
+    if encoding == "float32":
+        tag, bits, payload = 3, 32, frames.astype("<f4").tobytes()
+    elif encoding == "int24":
+        ints = (np.clip(frames, -1, 1 - 2 ** -23) * 2 ** 23).astype("<i4")
+        tag, bits, payload = 1, 24, ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        tag, bits, payload = 1, 16, (np.clip(frames, -1, 1 - 2 ** -15) * 2 ** 15).astype("<i2").tobytes()
+    block = channels * bits // 8
+    header = struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + len(payload), b"WAVE", b"fmt ", 16, tag, channels,
+                         rate, rate * block, block, bits, b"data", len(payload))
+    return header + payload
+
+
+def build_corpus(utterances: int, seed: int = 7) -> list:
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(utterances):
+        label, rate, channels, encoding = FORMATS[i % len(FORMATS)]
+        frames, start, end = make_utterance(rng, rate, channels)
+        corpus.append({"label": label, "wav": encode_wav(frames, rate, encoding), "rate": rate,
+                       "seconds": len(frames) / rate, "speech": (start, end)})
+    return corpus
+
+
+def speech_coverage(item: dict) -> float:
+    """Fraction of the true speech region inside the trimmed bounds."""
+    from services.audio import decode_wav, speech_bounds
+
+    samples, rate = decode_wav(item["wav"])
+    start, end = speech_bounds(samples, rate)
+    true_start, true_end = item["speech"]
+    kept = max(0.0, min(end / rate, true_end) - max(start / rate, true_start))
+    return kept / (true_end - true_start)
+
+
+async def run_mode(corpus: list, preprocess: bool, repeats: int, state: StubState) -> list:
+    from api.transcribe import transcribe_bytes
+
+    os.environ["AUDIO_PREPROCESS"] = "1" if preprocess else "0"
+    rows = []
+    for item in corpus:
+        latencies = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            await transcribe_bytes("stub", "answer.wav", item["wav"], "audio/wav")
+            latencies.append(time.perf_counter() - started)
+        rows.append({**item, "uploaded": state.stt_uploads[-1]["bytes"], "latency": statistics.median(latencies)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=len(FORMATS) * 2)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--ms-per-mb", type=float, default=80.0, help="stub upload cost (~100 Mbit/s)")
+    parser.add_argument("--ms-per-audio-second", type=float, default=40.0, help="stub transcription cost")
+    parser.add_argument("--base-latency-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    state = StubState(stt_ms_per_mb=args.ms_per_mb, stt_ms_per_audio_second=args.ms_per_audio_second)
+    state.profiles["stt"] = ProviderProfile(args.base_latency_ms, 0)
+    stubs = StubServer(state=state).start()
+    os.environ.update(stubs.backend_env())
+    os.environ["GOVERNOR_ELEVENLABS_STT_RATE"] = "0"
+
+    corpus = build_corpus(args.utterances)
+    try:
+        async def both():
+            # Warm up imports and the connection path so neither mode pays for them
+            await run_mode(corpus[:1], True, 1, state)
+            return await run_mode(corpus, False, args.repeats, state), await run_mode(corpus, True, args.repeats, state)
+
+        raw, prepared = asyncio.run(both())
+    finally:
+        stubs.stop()
+
+    from services.audio import preprocess_audio
+
+    print(f"{len(corpus)} utterances, STT stub: {args.base_latency_ms:.0f} ms + {args.ms_per_mb:.0f} ms/MB "
+          f"+ {args.ms_per_audio_second:.0f} ms/audio-s\n")
+    print(f"{'fixture':<20}{'audio s':>8}{'raw KB':>9}{'sent KB':>9}{'raw ms':>8}{'prep ms':>9}"
+          f"{'cpu ms':>8}{'speech kept':>13}")
+    for before, after in zip(raw, prepared):
+        started = time.perf_counter()
+        preprocess_audio(before["wav"], "answer.wav", "audio/wav")
+        cpu_ms = (time.perf_counter() - started) * 1000
+        print(f"{before['label']:<20}{before['seconds']:>8.1f}{before['uploaded'] / 1024:>9.0f}"
+              f"{after['uploaded'] / 1024:>9.0f}{before['latency'] * 1000:>8.0f}{after['latency'] * 1000:>9.0f}"
+              f"{cpu_ms:>8.1f}{speech_coverage(before):>13.1%}")
+
+    raw_bytes = sum(r["uploaded"] for r in raw)
+    sent_bytes = sum(r["uploaded"] for r in prepared)
+    raw_ms = statistics.mean(r["latency"] for r in raw) * 1000
+    prep_ms = statistics.mean(r["latency"] for r in prepared) * 1000
+    print(f"\nUpload bytes: {1 - sent_bytes / raw_bytes:.0%} fewer; "
+          f"mean STT latency per utterance {raw_ms:.0f} ms -> {prep_ms:.0f} ms ({1 - prep_ms / raw_ms:.0%} lower)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# bench/breaker_drill.py
+"""
+Fault drill for the upstream circuit breakers (services/breaker.py).
+
+Runs the real backend against the stubs (bench/stubs.py) with short breaker
+windows, then injects faults into one provider at a time and checks, phase by
+phase, that its breaker opens, the degraded mode takes over and requests fail
+fast, and that a probe closes the breaker once the fault is cleared:
+
+    tts      slow (5s):      judge replies go text-only within the TTS budget,
+                             then immediately once the breaker is open
+    gemini   failing (503):  /judges/get_score returns a provisional score
+                             without calling Gemini; /judges/generate is a fast 503
+    heygen   failing (503):  /heygen/token returns static_avatar=true
+
+Each check prints ✅ or ❌; the exit status is non-zero if any failed.
+
+Usage (from backend/):
+    python -m bench.breaker_drill [--open-seconds 2] [--backend-log drill.log]
+"""
+import argparse
+import sys
+import time
+from typing import Callable, List
+
+import httpx
+
+from bench.load_test import Backend, PITCH_LINES, _free_port
+from bench.stubs import ProviderProfile, StubServer, StubState
+
+HEADERS = {"Authorization": "Bearer drill-user"}
+
+
+class Drill:
+    def __init__(self, client: httpx.Client, state: StubState, open_seconds: float):
+        self.client = client
+        self.state = state
+        self.open_seconds = open_seconds
+        self.failures: List[str] = []
+        self.turn = 0
+
+    def check(self, label: str, ok: bool, detail: str = "") -> None:
+        print(f"  {'✅' if ok else '❌'} {label}{f' ({detail})' if detail else ''}")
+        if not ok:
+            self.failures.append(label)
+
+    def timed(self, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = self.client.request(method, url, headers=HEADERS, **kwargs)
+        return response, time.perf_counter() - started
+
+    def breaker(self, provider: str) -> str:
+        return self.client.get("/health").json()["breakers"].get(provider, {}).get("state", "closed")
+
+    def new_conversation(self) -> str:
+        return self.client.post("/judges/select", json={"judge": "altman"}, headers=HEADERS).json()["conversation_id"]
+
+    def generate(self, conversation_id: str):
+        self.turn += 1
+        # A distinct message per turn: the stubbed reply is constant, so audio
+        # caching is disabled for the drill and the reply cache only sees first turns
+        line = f"{PITCH_LINES[self.turn % len(PITCH_LINES)]} (turn {self.turn})"
+        return self.timed("POST", "/judges/generate", json={"conversation_id": conversation_id, "new_message": line})
+
+    def until(self, predicate: Callable[[], bool], attempts: int = 20) -> int:
+        """Repeat `predicate` until it holds; returns how many calls that took (0 if it never did)."""
+        for attempt in range(1, attempts + 1):
+            if predicate():
+                return attempt
+        return 0
+
+    def wait_for_probe(self) -> None:
+        time.sleep(self.open_seconds + 0.2)
+
+
+def drill_tts(d: Drill, budget: float) -> None:
+    print("\nTTS slow (5s per call)")
+    conversation_id = d.new_conversation()
+    response, _ = d.generate(conversation_id)
+    d.check("baseline reply has audio", response.status_code == 200 and bool(response.json().get("audio_base64")))
+
+    d.state.profiles["tts"] = ProviderProfile(5000)
+    response, elapsed = d.generate(conversation_id)
+    d.check("slow TTS: reply is text-only within the budget",
+            response.status_code == 200 and response.json().get("degraded") == "text_only" and elapsed < budget + 2,
+            f"{elapsed:.2f}s, budget {budget:.1f}s")
+    opened = d.until(lambda: d.generate(conversation_id) and d.breaker("elevenlabs_tts") == "open")
+    d.check("breaker opens", bool(opened), f"after {opened + 1} slow calls")
+    response, elapsed = d.generate(conversation_id)
+    d.check("open: text-only without waiting for TTS",
+            response.json().get("degraded") == "text_only" and elapsed < budget / 2, f"{elapsed:.2f}s")
+    d.check("/health reports text_only_replies",
+            d.client.get("/health").json()["degraded_modes"]["text_only_replies"] is True)
+
+    d.state.profiles["tts"] = ProviderProfile(50)
+    d.wait_for_probe()
+    response, _ = d.generate(conversation_id)
+    d.check("probe succeeds: audio is back", bool(response.json().get("audio_base64")))
+    d.check("breaker closed", d.breaker("elevenlabs_tts") == "closed")
+
+
+def drill_gemini(d: Drill) -> None:
+    print("\nGemini failing (every call 503)")
+    conversation_id = d.new_conversation()
+    d.generate(conversation_id)
+
+    d.state.profiles["gemini"] = ProviderProfile(50, 0, 1.0)
+    opened = d.until(lambda: d.timed("POST", "/judges/get_score", json={"conversation_id": conversation_id})
+                     and d.breaker("gemini") == "open")
+    d.check("breaker opens", bool(opened), f"after {opened} failing score requests")
+    calls = d.state.calls.get("gemini", 0)
+    response, elapsed = d.timed("POST", "/judges/get_score", json={"conversation_id": conversation_id})
+    body = response.json()
+    d.check("open: score is provisional, without calling Gemini",
+            response.status_code == 200 and body.get("provisional") is True and d.state.calls.get("gemini", 0) == calls,
+            f"{elapsed * 1000:.0f} ms, retry_after {body.get('retry_after')}s")
+    response, elapsed = d.generate(conversation_id)
+    d.check("open: judge reply fails fast with 503 and Retry-After",
+            response.status_code == 503 and "retry-after" in response.headers and elapsed < 0.5,
+            f"{response.status_code} in {elapsed * 1000:.0f} ms")
+
+    d.state.profiles["gemini"] = ProviderProfile(50)
+    d.wait_for_probe()
+    response, _ = d.timed("POST", "/judges/get_score", json={"conversation_id": conversation_id})
+    d.check("probe succeeds: real score", response.status_code == 200 and not response.json().get("provisional"))
+    d.check("breaker closed", d.breaker("gemini") == "closed")
+
+
+def drill_heygen(d: Drill) -> None:
+    print("\nHeyGen failing (every call 503)")
+    response, _ = d.timed("POST", "/heygen/token")
+    d.check("baseline token", response.status_code == 200 and response.json().get("static_avatar") is False)
+
+    d.state.profiles["heygen"] = ProviderProfile(20, 0, 1.0)
+    opened = d.until(lambda: d.timed("POST", "/heygen/token") and d.breaker("heygen") == "open")
+    d.check("breaker opens", bool(opened), f"after {opened} failing token requests")
+    response, elapsed = d.timed("POST", "/heygen/token")
+    d.check("open: static_avatar flag, fast",
+            response.status_code == 200 and response.json().get("static_avatar") is True and elapsed < 0.5,
+            f"{elapsed * 1000:.0f} ms")
+
+    d.state.profiles["heygen"] = ProviderProfile(20)
+    d.wait_for_probe()
+    response, _ = d.timed("POST", "/heygen/token")
+    d.check("probe succeeds: token is back", response.json().get("token") is not None)
+    d.check("breaker closed", d.breaker("heygen") == "closed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--open-seconds", type=float, default=2.0, help="breaker open time before probing")
+    parser.add_argument("--tts-budget", type=float, default=1.5, help="TTS_BUDGET_SECONDS for the backend")
+    parser.add_argument("--backend-log", help="write backend stdout/stderr to this file")
+    args = parser.parse_args()
+
+    state = StubState()
+    for name in state.profiles:
+        state.profiles[name] = ProviderProfile(20 if name != "gemini" else 50)
+    stubs = StubServer(state=state).start()
+    env = stubs.backend_env()
+    env.update({
+        "TTS_BUDGET_SECONDS": str(args.tts_budget),
+        "CACHE_TTS_TTL_SECONDS": "0",
+        "CACHE_SCORE_TTL_SECONDS": "0",
+        # No retries, so each request is one breaker outcome
+        "GOVERNOR_GEMINI_RETRIES": "0",
+        "GOVERNOR_HEYGEN_RETRIES": "0",
+        "BREAKER_ELEVENLABS_TTS_SLOW_SECONDS": str(args.tts_budget * 0.8),
+    })
+    for provider in ("GEMINI", "ELEVENLABS_TTS", "HEYGEN"):
+        env[f"BREAKER_{provider}_MIN_CALLS"] = "3"
+        env[f"BREAKER_{provider}_WINDOW"] = "6"
+        env[f"BREAKER_{provider}_OPEN_SECONDS"] = str(args.open_seconds)
+
+    backend = Backend(env, _free_port(), args.backend_log)
+    try:
+        backend.wait_ready()
+        with httpx.Client(base_url=backend.url, timeout=30) as client:
+            d = Drill(client, state, args.open_seconds)
+            health = client.get("/health").json()
+            d.check("healthy at start", health["status"] == "ok")
+            drill_tts(d, args.tts_budget)
+            drill_gemini(d)
+            drill_heygen(d)
+            print(f"\nBreakers: {client.get('/health').json()['breakers']}")
+    finally:
+        backend.stop()
+        stubs.stop()
+
+    if d.failures:
+        print(f"\n❌ {len(d.failures)} check(s) failed: {', '.join(d.failures)}")
+        sys.exit(1)
+    print("\n✅ All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# bench/cache_bench.py
+"""
+Multi-worker cache benchmark: hit ratio, upstream loads and lookup latency with
+each shared tier, as several uvicorn workers would see them.
+
+Spawns --workers processes that each run services/cache.py over the same
+Zipf-distributed key stream (requests spread round-robin, as a load balancer
+would). A miss calls a loader that sleeps --load-ms, standing in for Supabase,
+Gemini or TTS, and returns a history-sized JSON value. Then a stampede phase:
+every worker asks for one cold key --burst times at once, and the bench counts
+how many loads actually ran.
+
+Shared tiers compared: none (local LRU per worker), sqlite (one file) and
+redis (bench/resp_server.py standing in for Redis).
+
+Usage (from backend/):
+    python -m bench.cache_bench [--workers 4] [--requests 2000] [--keys 300]
+        [--zipf 1.1] [--load-ms 20] [--burst 8] [--tiers none,sqlite,redis]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from bench.resp_server import RespServer
+
+
+def history_value(key: str) -> list:
+    return [{"id": f"{key}-{i}", "sender": "user" if i % 2 else "assistant",
+             "content": f"Turn {i} of {key}: our CAC is $40 and payback is under six months. " * 3}
+            for i in range(12)]
+
+
+def zipf_keys(count: int, keys: int, s: float, seed: int) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (rank ** s) for rank in range(1, keys + 1)]
+    return [f"k{i}" for i in rng.choices(range(keys), weights=weights, k=count)]
+
+
+async def worker_run(keys: list, load_ms: float, burst: int, barrier) -> dict:
+    from services import metrics
+    from services.cache import get_cache
+
+    cache = get_cache("bench", 300)
+    loads = 0
+
+    async def loader(key):
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(load_ms / 1000)
+        return history_value(key)
+
+    latencies = []
+    for key in keys:
+        started = time.perf_counter()
+        await cache.get_or_set(key, lambda: loader(key))
+        latencies.append(time.perf_counter() - started)
+    steady_loads = loads
+
+    # Stampede: every worker starts its burst at the same moment
+    await asyncio.to_thread(barrier.wait)
+    await asyncio.gather(*(cache.get_or_set("cold", lambda: loader("cold")) for _ in range(burst)))
+    return {
+        "latencies": latencies,
+        "loads": steady_loads,
+        "stampede_loads": loads - steady_loads,
+        "hits": (metrics.get_counter("cache_requests_total", namespace="bench", tier="local", result="hit")
+                 + metrics.get_counter("cache_requests_total", namespace="bench", tier="shared", result="hit")),
+    }
+
+
+def worker_main(env: dict, keys: list, load_ms: float, burst: int, barrier, results) -> None:
+    os.environ.update(env)
+    results.put(asyncio.run(worker_run(keys, load_ms, burst, barrier)))
+
+
+def run_tier(tier: str, args, stream: list, resp: RespServer) -> dict:
+    env = {"CACHE_SHARED": "none", "CACHE_BENCH_TTL_SECONDS": "300"}
+    if tier == "sqlite":
+        path = os.path.join(tempfile.mkdtemp(prefix="cache-bench-"), "cache.sqlite3")
+        env.update(CACHE_SHARED="sqlite", CACHE_SQLITE_PATH=path)
+    elif tier == "redis":
+        resp.data.clear()
+        env["CACHE_SHARED"] = resp.url
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    barrier = context.Barrier(args.workers)
+    processes = [
+        context.Process(target=worker_main,
+                        args=(env, stream[i::args.workers], args.load_ms, args.burst, barrier, results))
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(lat for row in rows for lat in row["latencies"])
+    return {
+        "tier": tier,
+        "hit_ratio": sum(row["hits"] for row in rows) / len(stream),
+        "loads": sum(row["loads"] for row in rows),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "stampede_loads": sum(row["stampede_loads"] for row in rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=300)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--load-ms", type=float, default=20.0)
+    parser.add_argument("--burst", type=int, default=8, help="concurrent requests per worker for one cold key")
+    parser.add_argument("--tiers", default="none,sqlite,redis")
+    args = parser.parse_args()
+
+    stream = zipf_keys(args.requests, args.keys, args.zipf, seed=11)
+    resp = RespServer().start()
+    try:
+        rows = [run_tier(tier.strip(), args, stream, resp) for tier in args.tiers.split(",")]
+    finally:
+        resp.stop()
+
+    print(f"{args.workers} workers, {args.requests} requests over {args.keys} keys (zipf {args.zipf}), "
+          f"{len(set(stream))} distinct; loader {args.load_ms:.0f} ms\n")
+    print(f"{'shared tier':<13}{'hit ratio':>10}{'loads':>8}{'p50 ms':>9}{'p95 ms':>9}{'stampede loads':>16}")
+    for row in rows:
+        print(f"{row['tier']:<13}{row['hit_ratio']:>10.1%}{row['loads']:>8}{row['p50_ms']:>9.2f}"
+              f"{row['p95_ms']:>9.2f}{row['stampede_loads']:>9} of {args.workers * args.burst}")
+    print(f"\nA perfect cache loads each distinct key once: {len(set(stream))} loads")
+
+
+if __name__ == "__main__":
+    main()
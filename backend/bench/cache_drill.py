@@ -0,0 +1,83 @@
+# bench/cache_drill.py
+"""
+Correctness drill for the Redis-protocol shared cache tier (services/cache.py
+RespStore) against bench/resp_server.py.
+
+The store multiplexes every command over one connection, so a command that
+stops waiting for its reply (cancelled by a turn interrupt, a lost hedge, a
+wait_for budget, or its own timeout) must not leave that reply on the socket
+for the next command to read as its own. Each check cancels or times out a
+GET mid-roundtrip, then reads a different key and verifies it gets that key's
+value, not the abandoned one:
+
+    cancelled     the caller's task is cancelled while the reply is in flight
+    wait_for      an outer asyncio.wait_for expires first
+    timeout       the store's own timeout expires first
+
+Each check prints ✅ or ❌; the exit status is non-zero if any failed.
+
+Usage (from backend/):
+    python -m bench.cache_drill
+"""
+import asyncio
+import sys
+
+from bench.resp_server import RespServer
+from services.cache import RespStore
+
+REPLY_DELAY = 0.2
+
+
+async def abandon_get(store: RespStore, key: str, how: str) -> None:
+    if how == "cancelled":
+        task = asyncio.create_task(store.get(key))
+        await asyncio.sleep(REPLY_DELAY / 2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    elif how == "wait_for":
+        try:
+            await asyncio.wait_for(store.get(key), REPLY_DELAY / 2)
+        except asyncio.TimeoutError:
+            pass
+    else:
+        store.timeout = REPLY_DELAY / 2
+        try:
+            await store.get(key)
+        except asyncio.TimeoutError:
+            pass
+        store.timeout = 1.0
+
+
+async def run(server: RespServer) -> list:
+    failures = []
+    for how in ("cancelled", "wait_for", "timeout"):
+        store = RespStore(server.url)
+        await store.set("auth:token-a", b"user-a", 60)
+        await store.set("auth:token-b", b"user-b", 60)
+        server.reply_delay = REPLY_DELAY
+        await abandon_get(store, "auth:token-a", how)
+        server.reply_delay = 0.0
+        # Let the abandoned reply arrive before the next command goes out
+        await asyncio.sleep(REPLY_DELAY)
+        value = await store.get("auth:token-b")
+        ok = value == b"user-b"
+        print(f"{'✅' if ok else '❌'} {how}: next GET returned {value!r}")
+        if not ok:
+            failures.append(how)
+    return failures
+
+
+def main():
+    server = RespServer().start()
+    try:
+        failures = asyncio.run(run(server))
+    finally:
+        server.stop()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# bench/export_bench.py
+"""
+Bulk export throughput and memory on a seeded LocalDatabase.
+
+Seeds conversations and messages (shaped like api/session.py's synthetic
+traffic) into a SQLite file, then exports `messages` with services/export.py:
+
+  * keyset-paginated NDJSON and Parquet at two table sizes, reporting rows/s,
+    output size and peak Python heap (tracemalloc, in a separate untimed run).
+    Memory should not grow with the table.
+  * the table's last pages fetched with LIMIT/OFFSET, for comparison: each
+    page rescans everything before it.
+  * an incremental run after appending rows, from the first run's watermark.
+
+Usage (from backend/):
+    python -m bench.export_bench [--messages 200000] [--batch-size 1000]
+        [--message-chars 160] [--offset-pages 60]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from api.session import synthetic_message
+from services.export import EXPORT_TABLES, LocalSource, export_chunks, iter_batches
+from services.local_db import LocalDatabase
+
+FAR_FUTURE = "9999-01-01T00:00:00+00:00"
+
+
+def seed(db: LocalDatabase, messages: int, message_chars: int, per_conversation: int = 20) -> None:
+    conversations = max(1, messages // per_conversation)
+    ids = [row["id"] for row in db.insert("conversations", [{"user_id": f"user-{i % 500}"}
+                                                             for i in range(conversations)])]
+    batch = []
+    for n in range(messages):
+        batch.append(synthetic_message(ids[n // per_conversation % len(ids)], n % per_conversation, message_chars))
+        if len(batch) == 5000:
+            db.insert("messages", batch)
+            batch = []
+    if batch:
+        db.insert("messages", batch)
+
+
+def run_export(db: LocalDatabase, fmt: str, batch_size: int, since=None, trace: bool = False) -> dict:
+    progress = {}
+    size = 0
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    for chunk in export_chunks(LocalSource(db), EXPORT_TABLES["messages"], fmt, since=since, until=FAR_FUTURE,
+                               batch_size=batch_size, progress=progress):
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    peak = 0
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"rows": progress["rows"], "watermark": progress["watermark"], "seconds": elapsed,
+            "bytes": size, "peak_mb": peak / 1e6}
+
+
+def offset_pages(db: LocalDatabase, batch_size: int, first_page: int, pages: int) -> float:
+    """Seconds per row fetching `pages` pages from `first_page` on with LIMIT/OFFSET."""
+    started = time.perf_counter()
+    rows = 0
+    for page in range(first_page, first_page + pages):
+        rows += len(db.execute("SELECT id, conversation_id, sender, content, created_at FROM messages "
+                               "ORDER BY created_at, id LIMIT ? OFFSET ?", (batch_size, page * batch_size)))
+    return (time.perf_counter() - started) / max(rows, 1)
+
+
+def keyset_pages(db: LocalDatabase, batch_size: int, first_page: int, pages: int) -> float:
+    """The same pages by keyset, resuming from the watermark of the row before `first_page`."""
+    since = None
+    if first_page:
+        row = db.execute("SELECT id, created_at FROM messages ORDER BY created_at, id LIMIT 1 OFFSET ?",
+                         (first_page * batch_size - 1,))[0]
+        since = f"{row['created_at']}|{row['id']}"
+    started = time.perf_counter()
+    rows = 0
+    for page, batch in enumerate(iter_batches(LocalSource(db), EXPORT_TABLES["messages"], since=since,
+                                              until=FAR_FUTURE, batch_size=batch_size)):
+        rows += len(batch)
+        if page + 1 == pages:
+            break
+    return (time.perf_counter() - started) / max(rows, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--message-chars", type=int, default=160)
+    parser.add_argument("--offset-pages", type=int, default=60, help="pages for the OFFSET comparison")
+    args = parser.parse_args()
+
+    random.seed(3)
+    try:
+        import pyarrow  # noqa: F401
+        formats = ["ndjson", "parquet"]
+    except ImportError:
+        print("pyarrow not installed; skipping Parquet\n")
+        formats = ["ndjson"]
+
+    workdir = tempfile.mkdtemp(prefix="export-bench-")
+    sizes = [args.messages // 4, args.messages]
+    print(f"{'messages':>9}{'format':>9}{'rows/s':>11}{'MB out':>9}{'peak heap MB':>14}")
+    db = LocalDatabase(os.path.join(workdir, "export.db"))
+    seeded = 0
+    last = {}
+    for size in sizes:
+        seed(db, size - seeded, args.message_chars)
+        seeded = size
+        for fmt in formats:
+            # Timed without tracemalloc, which slows allocation-heavy code unevenly
+            result = last[fmt] = run_export(db, fmt, args.batch_size)
+            traced = run_export(db, fmt, args.batch_size, trace=True)
+            print(f"{result['rows']:>9}{fmt:>9}{result['rows'] / result['seconds']:>11,.0f}"
+                  f"{result['bytes'] / 1e6:>9.1f}{traced['peak_mb']:>14.1f}")
+
+    plan = db.explain("SELECT * FROM messages WHERE created_at <= ? AND (created_at, id) > (?, ?) "
+                      "ORDER BY created_at, id LIMIT ?", (FAR_FUTURE, "", "", args.batch_size))
+    print(f"\nKeyset page plan: {' | '.join(plan)}")
+
+    # OFFSET rescans every earlier row, so late pages slow down; keyset seeks straight to them
+    first_page = max(0, seeded // args.batch_size - args.offset_pages)
+    offset = offset_pages(db, args.batch_size, first_page, args.offset_pages)
+    print(f"Last {args.offset_pages} pages: OFFSET {offset * 1e6:.1f} "
+          f"µs/row, keyset {keyset_pages(db, args.batch_size, first_page, args.offset_pages) * 1e6:.1f} µs/row")
+
+    appended = max(1, args.messages // 100)
+    seed(db, appended, args.message_chars)
+    incremental = run_export(db, "ndjson", args.batch_size, since=last["ndjson"]["watermark"])
+    print(f"Incremental run after appending {appended} messages: {incremental['rows']} rows in "
+          f"{incremental['seconds'] * 1000:.0f} ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# bench/import_time.py
+"""
+Cold-start import budget check for the backend.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter (several
+times, keeping the fastest run), prints the slowest imports, and exits non-zero
+if the total exceeds the budget or if any provider SDK is imported eagerly.
+Provider SDKs must only load on first use (see services/clients.py).
+
+Usage (from backend/):
+    python -m bench.import_time [--budget-ms 900] [--runs 3] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Must not be imported by `import main`
+LAZY_MODULES = ("google.genai", "supabase", "elevenlabs", "httpx")
+
+
+def run_importtime(module: str):
+    """Return {module: (self_us, cumulative_us)} for one cold import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1", "PREWARM": ""},
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "900")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        timings = run_importtime(args.module)
+        total_ms = timings[args.module][1] / 1000
+        if best is None or total_ms < best[0]:
+            best = (total_ms, timings)
+    total_ms, timings = best
+
+    print(f"Slowest imports (cumulative) for `import {args.module}`:")
+    for name, (self_us, cumulative_us) in sorted(timings.items(), key=lambda kv: -kv[1][1])[: args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:7.1f} ms)  {name}")
+    print(f"\nTotal: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+
+    failures = []
+    eager = sorted(m for m in LAZY_MODULES if m in timings)
+    if eager:
+        failures.append(f"provider SDKs imported eagerly: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Within budget")
+
+
+if __name__ == "__main__":
+    main()
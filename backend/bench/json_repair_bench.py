@@ -0,0 +1,88 @@
+# bench/json_repair_bench.py
+"""
+Replays the malformed-output corpus through the old strict parsing
+(json.loads + schema validation) and through services.structured_output,
+and reports how many expensive LLM calls each approach would have wasted.
+
+Only a complete parse ("ok" or "repaired") counts as a saved call. A "partial"
+result fills the fields the model didn't return with placeholder defaults, so
+it is counted as wasted and listed on its own with how many fields it defaulted.
+
+Usage (from backend/):
+    python -m bench.json_repair_bench [--corpus bench/fixtures/malformed_llm_outputs.json] [--verbose]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from api.judge import InvestmentMemoOutput, get_fallback_score
+from api.performance import FALLBACK_MEMO, FALLBACK_METRICS, InvestmentMemo, PresentationMetrics
+from services.structured_output import parse_model_with_defaults
+
+SCHEMAS = {
+    "memo": (InvestmentMemo, FALLBACK_MEMO),
+    "metrics": (PresentationMetrics, FALLBACK_METRICS),
+    "score": (InvestmentMemoOutput, get_fallback_score()),
+}
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "malformed_llm_outputs.json")
+
+
+def strict_parse(text, model) -> bool:
+    try:
+        model(**json.loads(text))
+        return True
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+
+    strict_wasted = 0
+    repaired_wasted = 0
+    partial_fields = []
+    statuses = {}
+    started = time.perf_counter()
+
+    for case in cases:
+        model, fallback = SCHEMAS[case["kind"]]
+        strict_ok = strict_parse(case["text"], model)
+        _, status, defaulted = parse_model_with_defaults(case["text"], model, fallback)
+
+        strict_wasted += 0 if strict_ok else 1
+        repaired_wasted += 1 if defaulted else 0
+        if status == "partial":
+            partial_fields.append(len(defaulted))
+        statuses[status] = statuses.get(status, 0) + 1
+
+        if args.verbose:
+            print(f"{case['name']:<40} strict={'ok' if strict_ok else 'FAIL':<5} structured={status}"
+                  f"{f' ({len(defaulted)} defaulted)' if defaulted else ''}")
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    saved = strict_wasted - repaired_wasted
+
+    print(f"Cases:                        {len(cases)}")
+    print(f"Wasted calls (json.loads):    {strict_wasted}")
+    print(f"Wasted calls (structured):    {repaired_wasted}")
+    print(f"Calls saved:                  {saved} ({saved / max(strict_wasted, 1):.0%} of previously wasted)")
+    if partial_fields:
+        print(f"Partial (counted as wasted):  {len(partial_fields)}, defaulting "
+              f"{sum(partial_fields)} fields ({min(partial_fields)}-{max(partial_fields)} each)")
+    print(f"Structured outcomes:          {json.dumps(statuses)}")
+    print(f"Parse time:                   {elapsed_ms:.1f} ms total, {elapsed_ms / len(cases):.2f} ms/case")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+# bench/load_test.py
+"""
+End-to-end load and latency benchmark for the backend, fully offline.
+
+Starts the upstream stubs (bench/stubs.py), launches the real backend with
+uvicorn pointed at them, then drives scripted pitch sessions from concurrent
+virtual users:
+
+    /judges/select -> /judges/generate x N -> /elevenlabs/stt -> /performance/analyze
+
+Reports per-endpoint request counts, errors, throughput and p50/p95/p99
+latency, and can write the results to JSON and diff them against a baseline.
+
+Usage (from backend/):
+    python -m bench.load_test [--users 20] [--concurrency 10] [--turns 3]
+                              [--stub gemini=900,300,0.02] [--stub tts=600,200]
+                              [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import wave
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.stubs import StubServer, StubState, parse_profile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PITCH_LINES = [
+    "Hi, I'm Sam and we're building premium instant coffee for busy professionals.",
+    "We're at $40k MRR, growing 25% month over month, with 60% gross margins.",
+    "We're raising $500k for 10% to expand into grocery retail.",
+    "Our team spent ten years at Nestle and Blue Bottle.",
+    "Customer acquisition cost is $18 and payback is under three months.",
+]
+JUDGES = ("altman", "elon", "zuck")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_wav(seconds: float = 2.0, rate: int = 16000) -> bytes:
+    """A short mono PCM16 tone, standing in for a recorded answer."""
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        sample = int(8000 * math.sin(2 * math.pi * 220 * i / rate))
+        frames += sample.to_bytes(2, "little", signed=True)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.sessions_completed = 0
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[dict]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.errors[name][type(e).__name__] += 1
+            return None
+        finally:
+            self.latencies[name].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[name][str(response.status_code)] += 1
+            return None
+        return response.json()
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            errors = sum(self.errors[name].values())
+            endpoints[name] = {
+                "count": len(values),
+                "errors": errors,
+                "error_breakdown": dict(self.errors[name]),
+                "error_rate": round(errors / len(values), 4) if values else 0.0,
+                "throughput_rps": round(len(values) / elapsed, 3) if elapsed else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1) if values else 0.0,
+            }
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "sessions_completed": self.sessions_completed,
+            "endpoints": endpoints,
+        }
+
+
+async def run_session(client: httpx.AsyncClient, recorder: Recorder, user_index: int, turns: int, wav: bytes):
+    headers = {"Authorization": f"Bearer bench-user-{user_index}"}
+    judge = random.choice(JUDGES)
+
+    selected = await recorder.call(client, "judges.select", "POST", "/judges/select", json={"judge": judge}, headers=headers)
+    if not selected:
+        return
+    conversation_id = selected["conversation_id"]
+
+    for turn in range(turns):
+        line = PITCH_LINES[turn % len(PITCH_LINES)]
+        await recorder.call(client, "judges.generate", "POST", "/judges/generate",
+                            json={"conversation_id": conversation_id, "new_message": line}, headers=headers)
+
+    await recorder.call(client, "elevenlabs.stt", "POST", "/elevenlabs/stt",
+                        files={"audio": ("answer.wav", wav, "audio/wav")})
+    await recorder.call(client, "performance.analyze", "POST", "/performance/analyze",
+                        json={"conversation_id": conversation_id}, headers=headers)
+    recorder.sessions_completed += 1
+
+
+async def drive(base_url: str, users: int, concurrency: int, turns: int, timeout: float) -> dict:
+    recorder = Recorder()
+    wav = make_wav()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def virtual_user(index: int):
+            async with semaphore:
+                await run_session(client, recorder, index, turns, wav)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(i) for i in range(users)))
+        elapsed = time.perf_counter() - started
+    return recorder.summary(elapsed)
+
+
+class Backend:
+    """The real backend (`uvicorn main:app`) in a subprocess, wired to the stubs."""
+
+    def __init__(self, env: Dict[str, str], port: int, log_path: Optional[str] = None):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.log = open(log_path, "w") if log_path else subprocess.DEVNULL
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR,
+            env={**os.environ, **env},
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+
+    def wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit(f"Backend exited with code {self.process.returncode}")
+            try:
+                if httpx.get(self.url + "/", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        raise SystemExit("Backend did not become ready in time")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        if self.log is not subprocess.DEVNULL:
+            self.log.close()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict, baseline: Optional[dict] = None) -> None:
+    print(f"\n{results['sessions_completed']} sessions in {results['elapsed_s']}s")
+    header = f"{'endpoint':<22}{'count':>7}{'err%':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results["endpoints"].items():
+        line = (f"{name:<22}{stats['count']:>7}{stats['error_rate'] * 100:>6.1f}%{stats['throughput_rps']:>8.2f}"
+                f"{stats['p50_ms']:>9.0f}{stats['p95_ms']:>9.0f}{stats['p99_ms']:>9.0f}")
+        previous = (baseline or {}).get("endpoints", {}).get(name)
+        if previous and previous["p95_ms"]:
+            change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}% vs baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="total scripted sessions to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions in flight at once")
+    parser.add_argument("--turns", type=int, default=3, help="judge turns per session")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout (s)")
+    parser.add_argument("--stub", action="append", default=[],
+                        help="provider=latency_ms,jitter_ms,error_rate[,status]; providers: "
+                             "supabase, gemini, tts, stt, heygen")
+    parser.add_argument("--backend-env", action="append", default=[], help="extra KEY=VALUE for the backend")
+    parser.add_argument("--backend-log", help="write backend stdout/stderr to this file")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare p95 against")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    state = StubState()
+    for spec in args.stub:
+        name, profile = parse_profile(spec)
+        state.profiles[name] = profile
+
+    stubs = StubServer(state=state).start()
+    env = stubs.backend_env()
+    env.update(kv.split("=", 1) for kv in args.backend_env)
+    backend = Backend(env, _free_port(), args.backend_log)
+    try:
+        backend.wait_ready()
+        print(f"Stubs at {stubs.url}, backend at {backend.url}; "
+              f"{args.users} sessions, concurrency {args.concurrency}, {args.turns} turns")
+        results = asyncio.run(drive(backend.url, args.users, args.concurrency, args.turns, args.timeout))
+        try:
+            results["backend_metrics"] = httpx.get(backend.url + "/metrics", timeout=5).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+    finally:
+        backend.stop()
+        stubs.stop()
+
+    results.update({
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "turns": args.turns,
+            "stubs": {name: vars(profile) for name, profile in state.profiles.items()},
+        },
+        "upstream_calls": dict(state.calls),
+    })
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
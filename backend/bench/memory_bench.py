@@ -0,0 +1,152 @@
+# bench/memory_bench.py
+"""
+Founder memory benchmark (services/memory.py): what distilling, storing and
+recalling memories costs, and how big the judge's prompt gets compared with
+stuffing every earlier transcript into it.
+
+Builds synthetic founders with --sessions earlier pitches each (founder turns
+carrying figures, judge turns asking questions and pushing back, and an
+analysis memo per session), stores their distilled memories in a fresh SQLite
+store, then times --recalls recalls per history size as /judges/select would
+run them.
+
+Reported per history size:
+    distil ms    distil_transcript + distil_analysis per session
+    store ms     MemoryStore.add per session (two sources)
+    recall p50/p95/p99 ms
+    memory tok   the memory section added to the system prompt
+    stuffed tok  every earlier transcript pasted in instead
+
+Usage (from backend/):
+    python -m bench.memory_bench [--sessions 1,5,20,50] [--founders 20] [--turns 8]
+        [--budget 300] [--top-k 8] [--recalls 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from services.memory import MemoryStore, distil_analysis, distil_transcript, estimate_tokens, render
+
+JUDGES = {"altman": "Sam Altman", "elon": "Elon Musk", "zuck": "Mark Zuckerberg"}
+PRODUCTS = ("instant coffee", "pet insurance", "solar microgrids", "AI bookkeeping", "drone inspections",
+            "meal kits", "climbing gyms", "payroll for nurses")
+FOUNDER_LINES = (
+    "We're at ${mrr}k MRR, growing {growth}% month over month.",
+    "Our gross margins are {margin}% and churn is {churn}% a month.",
+    "We're raising ${raise_k}k for {equity}% to expand into {n} new markets.",
+    "Customer acquisition cost is ${cac} and payback is under {payback} months.",
+    "The team spent {years} years at Stripe and Google before this.",
+    "We have {pilots} enterprise pilots and a waitlist of {waitlist} users.",
+    "Honestly I think the product speaks for itself and people love it.",
+    "Thanks for having me, it's great to be here today.",
+)
+JUDGE_LINES = (
+    "How do you keep churn down once the novelty wears off?",
+    "I'm worried your CAC goes up fast once you leave the early adopters.",
+    "What stops a bigger competitor from copying this in six months?",
+    "That valuation is hard to justify on {mrr}k of MRR, convince me.",
+    "Interesting. Tell me more about the team.",
+    "The market is real but I don't see the moat yet.",
+)
+
+
+def fill(template: str, rng: random.Random) -> str:
+    return template.format(mrr=rng.randint(5, 400), growth=rng.randint(5, 40), margin=rng.randint(20, 80),
+                           churn=rng.randint(1, 9), raise_k=rng.choice((250, 500, 1000, 2000)),
+                           equity=rng.randint(5, 20), n=rng.randint(2, 5), cac=rng.randint(10, 300),
+                           payback=rng.randint(2, 12), years=rng.randint(3, 12), pilots=rng.randint(2, 15),
+                           waitlist=rng.randint(200, 9000))
+
+
+def synthetic_session(rng: random.Random, judge: str, turns: int):
+    product = rng.choice(PRODUCTS)
+    history = [{"sender": "system", "content": f"You are {JUDGES[judge]}, an investor on Shark Tank."}]
+    history.append({"sender": "user", "content": f"Hi, we're building {product} for busy people."})
+    for _ in range(turns):
+        history.append({"sender": "assistant", "content": fill(rng.choice(JUDGE_LINES), rng)})
+        history.append({"sender": "user", "content": " ".join(fill(rng.choice(FOUNDER_LINES), rng)
+                                                              for _ in range(2))})
+    memo = {
+        "summary": f"A {product} startup with early traction. The founder pitched a seed round.",
+        "risks": "• Customer acquisition cost may rise\n• Competitive market\n• Thin margins at scale",
+        "recommendation": f"{rng.choice(('PASS', 'HOLD', 'INVEST'))} - promising but unproven. More data needed.",
+    }
+    metrics = {name: round(rng.uniform(3, 9), 1)
+               for name in ("clarity", "confidence", "engagement", "structure", "delivery", "overall")}
+    return history, memo, metrics
+
+
+def pct(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,5,20,50", help="earlier sessions per founder, comma-separated")
+    parser.add_argument("--founders", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=8, help="judge/founder exchanges per session")
+    parser.add_argument("--budget", type=int, default=300, help="memory token budget (MEMORY_TOKEN_BUDGET)")
+    parser.add_argument("--top-k", type=int, default=8, help="memories recalled at most (MEMORY_TOP_K)")
+    parser.add_argument("--recalls", type=int, default=200, help="timed recalls per history size")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from api.judge import get_judge_system_prompt, memory_query
+
+    persona_tokens = estimate_tokens(get_judge_system_prompt("altman"))
+    print(f"Persona prompt alone: {persona_tokens} tokens; budget {args.budget} tokens, top-k {args.top_k}\n")
+    print(f"{'sessions':>8} {'memories':>9} {'distil ms':>10} {'store ms':>9} {'recall p50':>11} {'p95':>7} "
+          f"{'p99':>7} {'memory tok':>11} {'stuffed tok':>12}")
+    print("-" * 93)
+
+    for sessions in (int(s) for s in args.sessions.split(",")):
+        rng = random.Random(args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = MemoryStore(os.path.join(tmp, "memory.sqlite3"))
+            distil_times, store_times, stuffed, now = [], [], [], time.time()
+            for founder in range(args.founders):
+                user_id = f"founder-{founder}"
+                transcript_tokens = 0
+                for session in range(sessions):
+                    judge = rng.choice(list(JUDGES))
+                    history, memo, metrics = synthetic_session(rng, judge, args.turns)
+                    transcript_tokens += sum(estimate_tokens(m["content"]) for m in history[1:])
+                    started = time.perf_counter()
+                    from_session = distil_transcript(history)
+                    from_analysis = distil_analysis(memo, metrics)
+                    distil_times.append(time.perf_counter() - started)
+                    # Spread the sessions over the last few months, oldest first
+                    created_at = now - (sessions - session) * 3 * 86400
+                    started = time.perf_counter()
+                    store.add(user_id, f"{user_id}-c{session}", judge, "session", from_session, created_at)
+                    store.add(user_id, f"{user_id}-c{session}", judge, "analysis", from_analysis, created_at)
+                    store_times.append(time.perf_counter() - started)
+                stuffed.append(transcript_tokens)
+
+            memories = statistics.mean(len(store.memories(f"founder-{f}")) for f in range(args.founders))
+            recall_times, section_tokens = [], []
+            for i in range(args.recalls):
+                judge = list(JUDGES)[i % len(JUDGES)]
+                started = time.perf_counter()
+                recalled = store.recall(f"founder-{i % args.founders}", judge, memory_query(judge), args.budget,
+                                        args.top_k)
+                section = render(recalled, judge, JUDGES)
+                recall_times.append(time.perf_counter() - started)
+                section_tokens.append(estimate_tokens(section))
+            store.close()
+
+        print(f"{sessions:>8} {memories:>9.0f} {statistics.mean(distil_times) * 1000:>10.2f} "
+              f"{statistics.mean(store_times) * 1000:>9.2f} {pct(recall_times, 0.5):>11.2f} "
+              f"{pct(recall_times, 0.95):>7.2f} {pct(recall_times, 0.99):>7.2f} "
+              f"{statistics.mean(section_tokens):>11.0f} {statistics.mean(stuffed):>12.0f}")
+
+    print("\nExample memory section (last founder, last judge):")
+    print(section)
+
+
+if __name__ == "__main__":
+    main()
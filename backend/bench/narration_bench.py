@@ -0,0 +1,133 @@
+# bench/narration_bench.py
+"""
+Memo narration benchmark (services/narration.py): how soon the first section
+of a narrated investment memo is ready to play, and how long the whole memo
+takes, as the number of concurrent TTS calls grows.
+
+Narrates an eleven-section memo through narrate_sections, the same path
+/performance/narrate streams, against bench/stubs.py. The TTS stand-in waits a
+fixed first-chunk delay and then generates audio --realtime-factor times
+faster than real time, so longer sections take longer. Every run narrates a
+memo for a different company so it starts cold; the last row repeats the
+final memo to show the "tts" cache serving it.
+
+Reported per concurrency level (median of --repeats):
+    first ms    until the first section (the recommendation) is yielded
+    total ms    until the last section is yielded
+    TTS calls   upstream calls per memo
+
+Usage (from backend/):
+    python -m bench.narration_bench [--concurrency 1,2,3,6,11] [--repeats 3]
+        [--first-chunk-ms 300] [--realtime-factor 15] [--judge altman]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from bench.stubs import ProviderProfile, StubServer, StubState
+
+MEMO = {
+    "recommendation": "INVEST - {company} has real traction and a founder who knows the numbers. "
+                      "The valuation is rich but defensible if growth holds.",
+    "summary": "{company} sells AI bookkeeping to small businesses. The founder pitched a $1M seed round "
+               "at a $10M cap after reaching $40k MRR in nine months.",
+    "valueProposition": "{company} closes the books in hours instead of weeks, at a third of the cost of an "
+                        "accountant.",
+    "market": "• 30M small businesses in the US\n• Bookkeeping spend of roughly $60B a year\n"
+              "• Fragmented market with no dominant software player for {company} to displace",
+    "product": "{company} is a web app that connects to bank accounts, categorises transactions with a "
+               "language model and flags anything unusual for a human reviewer.",
+    "metrics": "• {company} is at $40k MRR, growing 18% month over month\n• 3% monthly churn\n"
+               "• CAC of $220, payback under five months",
+    "risks": "• Incumbents could bundle the same feature as {company}\n• Accuracy errors are costly for "
+             "customers\n• Customer acquisition cost may rise outside early adopters",
+    "team": "The two founders of {company}, ex-Stripe and ex-Intuit, have eight years of combined experience "
+            "in payments and small-business accounting.",
+    "deal": "$1M for 10% of {company} on a post-money SAFE, with a pro-rata right for the lead investor.",
+    "scenarioAnalysis": "Conservative: {company} reaches $1.5M ARR in two years. Base: $4M ARR. Optimistic: "
+                        "$9M ARR with an accountant channel partnership.",
+    "conclusion": "{company} is a strong seed bet on a large, boring market. Worth backing if churn stays "
+                  "under 4%.",
+}
+
+
+def memo_for(company: str) -> list:
+    return [(name, value.format(company=company)) for name, value in MEMO.items()]
+
+
+async def narrate_once(sections: list, args, concurrency: int) -> tuple:
+    from services.narration import narrate_sections
+
+    started = time.perf_counter()
+    first = None
+    statuses = []
+    async for section in narrate_sections(sections, args.judge, concurrency=concurrency):
+        if first is None:
+            first = time.perf_counter() - started
+        statuses.append(section["status"])
+    return first, time.perf_counter() - started, statuses
+
+
+async def run(args, state: StubState) -> list:
+    levels = [int(level) for level in args.concurrency.split(",")]
+    # Warm up the client and connection pool
+    await narrate_once(memo_for("Warmup Co"), args, 1)
+    rows, run_index, sections = [], 0, None
+    for concurrency in levels + [levels[-1]]:
+        cached = len(rows) == len(levels)
+        runs, calls = [], []
+        for _ in range(args.repeats):
+            if not cached:
+                run_index += 1
+                sections = memo_for(f"Company {run_index}")
+            before = state.calls.get("tts", 0)
+            runs.append(await narrate_once(sections, args, concurrency))
+            calls.append(state.calls.get("tts", 0) - before)
+        rows.append({
+            "concurrency": concurrency,
+            "cached": cached,
+            "first_ms": statistics.median(r[0] for r in runs) * 1000,
+            "total_ms": statistics.median(r[1] for r in runs) * 1000,
+            "tts_calls": statistics.median(calls),
+            "failed": sum(status != "ok" for r in runs for status in r[2]),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,2,3,6,11", help="concurrent TTS calls, comma-separated")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--first-chunk-ms", type=float, default=300.0, help="stub delay before the first chunk")
+    parser.add_argument("--realtime-factor", type=float, default=15.0, help="stub generation speed vs real time")
+    parser.add_argument("--judge", default="altman")
+    args = parser.parse_args()
+
+    state = StubState(tts_first_chunk_ms=args.first_chunk_ms, tts_realtime_factor=args.realtime_factor)
+    state.profiles["tts"] = ProviderProfile(0, 0)
+    stubs = StubServer(state=state).start()
+    os.environ.update(stubs.backend_env())
+    try:
+        rows = asyncio.run(run(args, state))
+    finally:
+        stubs.stop()
+
+    print(f"Stub TTS: {args.first_chunk_ms:.0f} ms to first chunk, {args.realtime_factor:g}x real time; "
+          f"{len(MEMO)} sections, median of {args.repeats}\n")
+    print(f"{'concurrency':>11}{'first ms':>10}{'total ms':>10}{'TTS calls':>11}{'failed':>8}")
+    print("-" * 50)
+    for row in rows:
+        label = f"{row['concurrency']}{' cached' if row['cached'] else ''}"
+        print(f"{label:>11}{row['first_ms']:>10.0f}{row['total_ms']:>10.0f}{row['tts_calls']:>11.0f}"
+              f"{row['failed']:>8}")
+    sequential = rows[0]
+    best = min(rows[:-1], key=lambda row: row["total_ms"])
+    print(f"\nConcurrency {best['concurrency']} vs sequential: whole memo "
+          f"{sequential['total_ms']:.0f} -> {best['total_ms']:.0f} ms, first section "
+          f"{sequential['first_ms']:.0f} -> {best['first_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
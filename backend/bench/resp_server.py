@@ -0,0 +1,148 @@
+# bench/resp_server.py
+"""
+Local stand-in for a Redis server, for CACHE_SHARED=redis://... without Redis.
+
+Speaks RESP and implements the handful of commands services/cache.py uses
+(GET, SET with EX/PX/NX/XX, DEL) plus PING, AUTH, SELECT, DBSIZE and
+FLUSHALL. One in-memory keyspace, lazy expiry, no persistence.
+
+Usage (from backend/):
+    python -m bench.resp_server [--port 6390]
+    CACHE_SHARED=redis://127.0.0.1:6390/0 uvicorn main:app --workers 4
+"""
+import argparse
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class RespServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands = 0
+        # Seconds to wait before each reply, to emulate a slow or distant server
+        self.reply_delay = 0.0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry[0]
+
+    def execute(self, args: List[bytes]) -> bytes:
+        self.commands += 1
+        name = args[0].upper()
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            value = self._get(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            key, value, expires, condition = args[1], args[2], None, None
+            options = iter(args[3:])
+            for option in options:
+                option = option.upper()
+                if option in (b"EX", b"PX"):
+                    amount = float(next(options))
+                    expires = time.monotonic() + (amount if option == b"EX" else amount / 1000)
+                elif option in (b"NX", b"XX"):
+                    condition = option
+                else:
+                    return b"-ERR syntax error\r\n"
+            exists = self._get(key) is not None
+            if (condition == b"NX" and exists) or (condition == b"XX" and not exists):
+                return b"$-1\r\n"
+            self.data[key] = (value, expires)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            return b":%d\r\n" % sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+        if name == b"DBSIZE":
+            return b":%d\r\n" % len(self.data)
+        if name == b"FLUSHALL":
+            self.data.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    writer.write(b"-ERR expected an array\r\n")
+                    break
+                args = []
+                for _ in range(int(line[1:])):
+                    size = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(size + 2))[:-2])
+                if self.reply_delay:
+                    await asyncio.sleep(self.reply_delay)
+                writer.write(self.execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def start(self) -> "RespServer":
+        """Serve on a background thread; returns once the port is bound."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.serve())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait(5)
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def run():
+        server = RespServer(args.host, args.port)
+        await server.serve()
+        print(f"RESP stand-in listening on {server.url}")
+        await server._server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+# bench/stubs.py
+"""
+Local stand-ins for Supabase (auth + PostgREST), Gemini, ElevenLabs (TTS/STT)
+and HeyGen, served from one in-process HTTP server so the real backend can be
+exercised offline. Each provider has configurable latency, jitter and error rate.
+
+Point the backend at a running stub with the environment from `backend_env()`:
+    SUPABASE_URL         -> http://host:port
+    GEMINI_API_BASE_URL  -> http://host:port/gemini
+    ELEVENLABS_API_URL   -> http://host:port/elevenlabs
+    HEYGEN_API_URL       -> http://host:port/heygen
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+# Fake JWT-shaped key; the Supabase client only checks the shape
+STUB_API_KEY = "stub.eyJyb2xlIjoiYW5vbiJ9.stub"
+STUB_SERVICE_KEY = "stub.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.stub"
+
+MEMO = {
+    "recommendation": "HOLD - Promising product, unit economics not yet proven.",
+    "summary": "The founder pitched a consumer product with early traction.",
+    "valueProposition": "Convenience without sacrificing quality.",
+    "market": "Large consumer segment with premium growth.",
+    "product": "A differentiated premium product.",
+    "metrics": "• $40k MRR\n• 25% month-over-month growth",
+    "risks": "• Competition\n• Margin pressure",
+    "team": "Two co-founders with relevant experience.",
+    "deal": "Asking $500k for 10% equity.",
+    "scenarioAnalysis": "Conservative: $1M ARR; Base: $3M ARR; Optimistic: $8M ARR",
+    "conclusion": "Revisit after margin data is available.",
+}
+METRICS = {"clarity": 8.1, "confidence": 7.6, "engagement": 8.4, "structure": 7.9, "delivery": 8.0, "overall": 8.0}
+JUDGE_REPLY = (
+    "Interesting. Walk me through your unit economics: what does it cost you to acquire a "
+    "customer, and how long until they pay that back? And why can't an incumbent copy this in a quarter?"
+)
+
+
+@dataclass
+class ProviderProfile:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    # Status returned for injected errors; 429s carry Retry-After
+    error_status: int = 503
+
+    def delay(self) -> float:
+        return max(0.0, random.gauss(self.latency_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms) / 1000
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+# Typical upstream latencies; override with --stub provider=latency,jitter,error_rate
+DEFAULT_PROFILES = {
+    "supabase": ProviderProfile(15, 5),
+    "gemini": ProviderProfile(900, 300),
+    "tts": ProviderProfile(600, 200),
+    "stt": ProviderProfile(500, 150),
+    "heygen": ProviderProfile(150, 50),
+}
+
+
+def parse_profile(spec: str) -> tuple:
+    """Parse 'gemini=800,200,0.02' into ('gemini', ProviderProfile(800, 200, 0.02))."""
+    name, _, values = spec.partition("=")
+    parts = [float(v) for v in values.split(",") if v]
+    profile = ProviderProfile(*parts[:3])
+    if len(parts) > 3:
+        profile.error_status = int(parts[3])
+    return name.strip(), profile
+
+
+@dataclass
+class StubState:
+    profiles: Dict[str, ProviderProfile] = field(default_factory=lambda: dict(DEFAULT_PROFILES))
+    tables: Dict[str, List[dict]] = field(default_factory=lambda: {"conversations": [], "messages": []})
+    calls: Dict[str, int] = field(default_factory=dict)
+    # Gemini prefill cost: extra latency per 1k *uncached* input tokens
+    prefill_ms_per_1k_tokens: float = 40.0
+    # name -> {"model", "tokens", "expire_at"}, emulating the cachedContents API
+    gemini_caches: Dict[str, dict] = field(default_factory=dict)
+    gemini_tokens: Dict[str, int] = field(default_factory=lambda: {"uncached": 0, "cached": 0})
+    # STT cost model: extra latency per MB uploaded and per second of audio transcribed
+    stt_ms_per_mb: float = 0.0
+    stt_ms_per_audio_second: float = 0.0
+    stt_uploads: List[dict] = field(default_factory=list)
+    # TTS streaming model: delay before the first chunk (each optimize_streaming_latency
+    # level removes 15% of it) and generation speed as a multiple of real time.
+    # With tts_realtime_factor=0 the whole body is returned at once.
+    tts_first_chunk_ms: float = 0.0
+    tts_realtime_factor: float = 0.0
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _provider_for(path: str) -> str:
+    if path.startswith("/gemini"):
+        return "gemini"
+    if path.startswith("/elevenlabs") and "speech-to-text" in path:
+        return "stt"
+    if path.startswith("/elevenlabs"):
+        return "tts"
+    if path.startswith("/heygen"):
+        return "heygen"
+    return "supabase"
+
+
+# Speaking rate used to turn TTS text into seconds of audio
+SPEECH_CHARS_PER_SECOND = 15
+
+
+def _tts_encoding(output_format: str) -> tuple:
+    """(bytes per audio second, encoder lookahead ms, media type) for an ElevenLabs output_format."""
+    codec, _, rest = output_format.partition("_")
+    parts = rest.split("_")
+    if codec == "pcm":
+        return int(parts[0]) * 2, 0, "audio/pcm"
+    if codec in ("ulaw", "alaw"):
+        return int(parts[0]), 0, "audio/basic"
+    if codec == "opus":
+        return int(parts[1]) * 125, 20, "audio/ogg"
+    # MP3 frames need ~1152 samples of lookahead plus encoder delay
+    return int(parts[1]) * 125, 80, "audio/mpeg"
+
+
+def _audio_seconds(content: bytes, file_format: Optional[str]) -> float:
+    """Duration of an STT upload: raw 16 kHz PCM, a WAV header, or ~128 kbps if compressed."""
+    if file_format == "pcm_s16le_16":
+        return len(content) / 32000
+    if content[:4] == b"RIFF" and len(content) >= 44:
+        # Byte rate from the fmt chunk; headers are small enough to ignore
+        byte_rate = int.from_bytes(content[28:32], "little")
+        if byte_rate:
+            return (len(content) - 44) / byte_rate
+    return len(content) / 16000
+
+
+def _pick_json_payload(body: dict) -> Optional[dict]:
+    """Choose the structured response a schema-constrained Gemini request expects."""
+    config = body.get("generationConfig") or {}
+    if config.get("responseMimeType") != "application/json":
+        return None
+    schema = json.dumps(config.get("responseSchema") or config.get("responseJsonSchema") or {})
+    prompt = json.dumps(body.get("contents", ""))
+    if '"memo"' in schema or "InvestmentMemoOutput" in prompt:
+        return {"memo": MEMO, "metrics": METRICS}
+    if '"clarity"' in schema or "pitch coach" in prompt:
+        return METRICS
+    return MEMO
+
+
+def _count_tokens(*values) -> int:
+    """Rough token estimate (4 characters per token) over every text part."""
+    chars = 0
+    stack = list(values)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, str):
+            chars += len(value)
+    return chars // 4
+
+
+def _gemini_response(text: str, prompt_tokens: int = 100, cached_tokens: int = 0) -> dict:
+    usage = {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": len(text) // 4,
+        "totalTokenCount": prompt_tokens + len(text) // 4,
+    }
+    if cached_tokens:
+        usage["cachedContentTokenCount"] = cached_tokens
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": usage,
+        "modelVersion": "stub",
+    }
+
+
+def _gemini_error(status: int, message: str) -> JSONResponse:
+    return JSONResponse({"error": {"code": status, "message": message}}, status_code=status)
+
+
+def _filter_rows(rows: List[dict], params) -> List[dict]:
+    for key, value in params.items():
+        if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            continue
+        op, _, operand = value.partition(".")
+        if op == "eq":
+            rows = [r for r in rows if str(r.get(key)) == operand]
+        elif op == "gt":
+            rows = [r for r in rows if str(r.get(key)) > operand]
+        elif op == "gte":
+            rows = [r for r in rows if str(r.get(key)) >= operand]
+        elif op == "lt":
+            rows = [r for r in rows if str(r.get(key)) < operand]
+        elif op == "in":
+            allowed = set(operand.strip("()").split(","))
+            rows = [r for r in rows if str(r.get(key)) in allowed]
+    order = params.get("order")
+    if order:
+        for clause in reversed(order.split(",")):
+            column, _, direction = clause.partition(".")
+            rows = sorted(rows, key=lambda r: str(r.get(column)), reverse=direction.startswith("desc"))
+    if "limit" in params:
+        start = int(params.get("offset", 0))
+        rows = rows[start:start + int(params["limit"])]
+    return rows
+
+
+def create_stub_app(state: Optional[StubState] = None) -> FastAPI:
+    state = state or StubState()
+    app = FastAPI(title="Upstream stubs")
+    app.state.stub = state
+
+    @app.middleware("http")
+    async def inject_latency_and_faults(request: Request, call_next):
+        provider = _provider_for(request.url.path)
+        state.calls[provider] = state.calls.get(provider, 0) + 1
+        profile = state.profiles.get(provider, ProviderProfile())
+        await asyncio.sleep(profile.delay())
+        if profile.should_fail():
+            headers = {"Retry-After": "1"} if profile.error_status == 429 else None
+            return JSONResponse({"error": {"code": profile.error_status, "message": "injected fault"}},
+                                status_code=profile.error_status, headers=headers)
+        try:
+            return await call_next(request)
+        except ClientDisconnect:
+            # The backend cancelled the call mid-request (e.g. a barge-in)
+            state.calls[f"{provider}_aborted"] = state.calls.get(f"{provider}_aborted", 0) + 1
+            return Response(status_code=499)
+
+    # --- Supabase auth ---
+    @app.get("/auth/v1/user")
+    async def get_user(request: Request):
+        token = request.headers.get("authorization", "").replace("Bearer ", "")
+        user_id = str(uuid.uuid5(uuid.NAMESPACE_URL, token or "anonymous"))
+        return {
+            "id": user_id, "aud": "authenticated", "role": "authenticated", "email": f"{user_id[:8]}@bench.local",
+            "app_metadata": {}, "user_metadata": {}, "created_at": _now(),
+        }
+
+    # --- Supabase PostgREST ---
+    @app.get("/rest/v1/{table}")
+    async def select_rows(table: str, request: Request):
+        return _filter_rows(list(state.tables.setdefault(table, [])), request.query_params)
+
+    @app.post("/rest/v1/{table}")
+    async def insert_rows(table: str, request: Request):
+        payload = await request.json()
+        rows = payload if isinstance(payload, list) else [payload]
+        created = []
+        for row in rows:
+            row = {"id": str(uuid.uuid4()), "created_at": _now(), **row}
+            state.tables.setdefault(table, []).append(row)
+            created.append(row)
+        return JSONResponse(created, status_code=201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update_rows(table: str, request: Request):
+        changes = await request.json()
+        updated = _filter_rows(list(state.tables.get(table, [])), request.query_params)
+        for row in updated:
+            row.update(changes)
+        return updated
+
+    @app.delete("/rest/v1/{table}")
+    async def delete_rows(table: str, request: Request):
+        doomed = {id(r) for r in _filter_rows(list(state.tables.get(table, [])), request.query_params)}
+        kept = [r for r in state.tables.get(table, []) if id(r) not in doomed]
+        removed = [r for r in state.tables.get(table, []) if id(r) in doomed]
+        state.tables[table] = kept
+        return removed
+
+    # --- Gemini ---
+    @app.post("/gemini/{version}/cachedContents")
+    async def create_cached_content(version: str, request: Request):
+        body = await request.json()
+        name = f"cachedContents/{uuid.uuid4().hex[:16]}"
+        ttl = float(str(body.get("ttl", "3600s")).rstrip("s"))
+        tokens = _count_tokens(body.get("contents"), body.get("systemInstruction"))
+        state.gemini_caches[name] = {"model": body.get("model"), "tokens": tokens, "expire_at": time.time() + ttl}
+        expire = datetime.fromtimestamp(time.time() + ttl, timezone.utc).isoformat()
+        return {"name": name, "model": body.get("model"), "createTime": _now(), "updateTime": _now(),
+                "expireTime": expire, "usageMetadata": {"totalTokenCount": tokens}}
+
+    @app.delete("/gemini/{version}/cachedContents/{cache_id}")
+    async def delete_cached_content(version: str, cache_id: str):
+        if state.gemini_caches.pop(f"cachedContents/{cache_id}", None) is None:
+            return _gemini_error(404, "CachedContent not found")
+        return {}
+
+    @app.post("/gemini/{version}/models/{model_action:path}")
+    async def gemini(version: str, model_action: str, request: Request):
+        body = await request.json()
+        model = "models/" + model_action.split(":", 1)[0]
+
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            cache = state.gemini_caches.get(body["cachedContent"])
+            if cache is None or cache["expire_at"] < time.time():
+                return _gemini_error(404, f"CachedContent not found (or expired): {body['cachedContent']}")
+            if cache["model"] != model:
+                return _gemini_error(400, f"Model {model} does not match cached content model {cache['model']}")
+            if body.get("systemInstruction"):
+                return _gemini_error(400, "CachedContent can not be used with a request setting system_instruction")
+            cached_tokens = cache["tokens"]
+
+        uncached_tokens = _count_tokens(body.get("contents"), body.get("systemInstruction"))
+        state.gemini_tokens["uncached"] += uncached_tokens
+        state.gemini_tokens["cached"] += cached_tokens
+        # Prefill scales with the tokens the model actually has to read
+        await asyncio.sleep(uncached_tokens / 1000 * state.prefill_ms_per_1k_tokens / 1000)
+
+        payload = _pick_json_payload(body)
+        text = json.dumps(payload) if payload is not None else JUDGE_REPLY
+        prompt_tokens = uncached_tokens + cached_tokens
+
+        if model_action.endswith(":streamGenerateContent"):
+            async def stream():
+                step = max(1, len(text) // 8)
+                for i in range(0, len(text), step):
+                    await asyncio.sleep(0.02)
+                    chunk = _gemini_response(text[i:i + step], prompt_tokens, cached_tokens)
+                    yield f"data: {json.dumps(chunk)}\r\n\r\n"
+            return StreamingResponse(stream(), media_type="text/event-stream")
+        return _gemini_response(text, prompt_tokens, cached_tokens)
+
+    # --- ElevenLabs ---
+    @app.post("/elevenlabs/v1/text-to-speech/{voice_id}")
+    @app.post("/elevenlabs/v1/text-to-speech/{voice_id}/stream")
+    async def tts(voice_id: str, request: Request):
+        body = await request.json()
+        output_format = request.query_params.get("output_format", "mp3_44100_128")
+        level = int(request.query_params.get("optimize_streaming_latency") or 0)
+        byte_rate, lookahead_ms, media_type = _tts_encoding(output_format)
+        seconds = len(body.get("text", "")) / SPEECH_CHARS_PER_SECOND
+        audio = b"\x00" * int(byte_rate * seconds)
+        if not state.tts_realtime_factor:
+            return Response(audio, media_type=media_type)
+
+        first_chunk = (state.tts_first_chunk_ms * (1 - 0.15 * min(4, level)) + lookahead_ms) / 1000
+        chunk_bytes = max(1, int(byte_rate * 0.1))
+
+        async def stream():
+            await asyncio.sleep(first_chunk)
+            for offset in range(0, len(audio), chunk_bytes):
+                if offset:
+                    # 100 ms of audio per chunk, generated faster than real time
+                    await asyncio.sleep(0.1 / state.tts_realtime_factor)
+                yield audio[offset:offset + chunk_bytes]
+
+        return StreamingResponse(stream(), media_type=media_type)
+
+    @app.post("/elevenlabs/v1/speech-to-text")
+    async def stt(request: Request):
+        form = await request.form()
+        upload = form.get("file") or form.get("audio")
+        content = await upload.read() if upload is not None else b""
+        seconds = _audio_seconds(content, form.get("file_format"))
+        state.stt_uploads.append({"bytes": len(content), "seconds": seconds, "file_format": form.get("file_format")})
+        await asyncio.sleep((len(content) / 1e6 * state.stt_ms_per_mb + seconds * state.stt_ms_per_audio_second) / 1000)
+        return {"text": "We make premium instant coffee and we're growing 25% month over month.", "language_code": "en"}
+
+    # --- HeyGen ---
+    @app.post("/heygen/v1/streaming.create_token")
+    async def heygen_token():
+        return {"data": {"token": uuid.uuid4().hex}}
+
+    return app
+
+
+class StubServer:
+    """Runs the stub app with uvicorn in a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, state: Optional[StubState] = None):
+        self.state = state or StubState()
+        self.config = uvicorn.Config(create_stub_app(self.state), host=host, port=port, log_level="warning",
+                                     access_log=False)
+        self.server = uvicorn.Server(self.config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        sock = self.server.servers[0].sockets[0]
+        host, port = sock.getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("Stub server failed to start")
+            time.sleep(0.02)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+    def backend_env(self) -> Dict[str, str]:
+        return backend_env(self.url)
+
+
+def backend_env(stub_url: str) -> Dict[str, str]:
+    return {
+        "SUPABASE_URL": stub_url,
+        "SUPABASE_KEY": STUB_API_KEY,
+        "SUPABASE_SERVICE_ROLE_KEY": STUB_SERVICE_KEY,
+        "GEMINI_API_KEY": "stub",
+        "GEMINI_API_BASE_URL": f"{stub_url}/gemini",
+        "ELEVENLABS_API_KEY": "stub",
+        "ELEVENLABS_API_URL": f"{stub_url}/elevenlabs",
+        "HEYGEN_API_KEY": "stub",
+        "HEYGEN_API_URL": f"{stub_url}/heygen",
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the upstream stubs standalone")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--stub", action="append", default=[], help="provider=latency_ms,jitter_ms,error_rate[,status]")
+    args = parser.parse_args()
+
+    stub_state = StubState()
+    for spec in args.stub:
+        name, profile = parse_profile(spec)
+        stub_state.profiles[name] = profile
+    server = StubServer(port=args.port, state=stub_state).start()
+    print(f"Stubs listening on {server.url}")
+    for key, value in server.backend_env().items():
+        print(f"export {key}={value}")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
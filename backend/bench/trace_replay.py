@@ -0,0 +1,252 @@
+# bench/trace_replay.py
+"""
+Replay recorded request traces (services/tracing.py) against the real backend
+with every upstream call answered from the recording, so a change to the API
+code can be measured without Gemini, Supabase or ElevenLabs variance.
+
+Record a trace by running the backend with TRACE_RECORD_DIR set, e.g. against
+the stubs:
+    python -m bench.load_test --users 20 --backend-env TRACE_RECORD_DIR=/tmp/traces
+or in a real environment with real traffic (set TRACE_SALT to keep pseudonyms
+stable across workers).
+
+Replay launches the backend with TRACE_REPLAY pointing at the trace, then
+re-sends every recorded request, each client's requests in their recorded
+order and --concurrency clients at a time. Upstream responses arrive after
+their recorded latency scaled by --timing ("original", "none" or a factor):
+"none" leaves only the backend's own cost.
+
+Reported per endpoint: p50/p95/p99 latency as replayed, the recorded upstream
+time on each request's critical path (scaled), and the overhead left when that
+is subtracted. Requests whose status differs from the recording and upstream
+calls that had no recorded answer are counted; both should be zero for a
+faithful replay.
+
+Usage (from backend/):
+    python -m bench.trace_replay /tmp/traces/trace-*.jsonl.gz [--timing none] [--concurrency 8]
+        [--keep-gaps] [--output replay.json] [--compare baseline.json] [--backend-log replay.log]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+import wave
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from bench.load_test import Backend, Recorder, _free_port, git_commit, percentile, print_report
+from services.tracing import load_trace, path_shape, timing_scale
+
+DUMMY_KEYS = ("SUPABASE_KEY", "SUPABASE_SERVICE_ROLE_KEY", "GEMINI_API_KEY", "ELEVENLABS_API_KEY", "HEYGEN_API_KEY")
+
+
+def upstream_critical_ms(request: dict) -> float:
+    """Time covered by at least one upstream call (overlapping calls count once)."""
+    spans = sorted((call["offset_ms"], call["offset_ms"] + call["duration_ms"])
+                   for call in request["upstream"] if call.get("offset_ms") is not None)
+    covered, end = 0.0, float("-inf")
+    for start, stop in spans:
+        if stop > end:
+            covered += stop - max(start, end)
+            end = stop
+    return covered
+
+
+def stand_in_wav(params: dict) -> bytes:
+    """
+    A tone with a recorded upload's WAV parameters, standing in for the founder's
+    voice (which is never recorded). Not silence: preprocessing would trim it away
+    and skip the STT call the recording made.
+    """
+    import numpy as np
+
+    t = np.arange(params["frames"]) / params["rate"]
+    tone = 0.25 * np.sin(2 * np.pi * 220 * t)
+    width = params["sample_width"]
+    if width == 1:
+        samples = ((tone + 1) * 127.5).astype(np.uint8)
+    else:
+        full_scale = 2 ** (8 * width - 1) - 1
+        samples = (tone * full_scale).astype("<i4" if width > 2 else "<i2")
+        if width == 3:
+            samples = samples.view(np.uint8).reshape(-1, 4)[:, :3]
+    # Same sample on every channel, interleaved frame by frame
+    frames = np.repeat(samples.reshape(len(t), -1), params["channels"], axis=0)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(params["channels"])
+        wav.setsampwidth(width)
+        wav.setframerate(params["rate"])
+        wav.writeframes(np.ascontiguousarray(frames).tobytes())
+    return buffer.getvalue()
+
+
+def request_kwargs(request: dict) -> dict:
+    """Headers and body to re-send a recorded request."""
+    headers = dict(request.get("headers", {}))
+    headers["X-Trace-Replay"] = str(request["index"])
+    if request.get("client"):
+        headers["Authorization"] = f"Bearer replay-{request['client']}"
+    kwargs = {"headers": headers}
+    if "body" in request:
+        kwargs["content"] = request["body"].encode("utf-8")
+    elif "parts" in request:
+        headers.pop("content-type", None)
+        kwargs["data"] = {p["name"]: p["value"] for p in request["parts"] if "value" in p}
+        kwargs["files"] = {p["name"]: (p["filename"], stand_in_wav(p["wav"]) if "wav" in p else b"\0" * p["size"],
+                                       p["content_type"]) for p in request["parts"] if "filename" in p}
+    elif "body_size" in request:
+        kwargs["content"] = stand_in_wav(request["wav"]) if "wav" in request else b"\0" * request["body_size"]
+    return kwargs
+
+
+async def replay(base_url: str, requests: List[dict], concurrency: int, scale: float, keep_gaps: bool,
+                 timeout: float) -> dict:
+    recorder = Recorder()
+    overhead: Dict[str, List[float]] = defaultdict(list)
+    upstream: Dict[str, List[float]] = defaultdict(list)
+    mismatches: Dict[str, int] = defaultdict(int)
+
+    # Each client's requests depend on the ones before (select, then generate on that
+    # conversation); requests without credentials stand alone
+    clients: Dict[str, List[dict]] = defaultdict(list)
+    for request in requests:
+        clients[request.get("client") or f"anonymous-{request['index']}"].append(request)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def run_client(session: List[dict]):
+            async with semaphore:
+                previous = None
+                for request in session:
+                    if keep_gaps and previous is not None:
+                        gap = request["arrival_s"] - previous["arrival_s"] - previous["duration_ms"] / 1000
+                        if gap > 0:
+                            await asyncio.sleep(gap * scale)
+                    previous = request
+                    name = f"{request['method']} {path_shape(request['path'])}"
+                    url = request["path"] + (f"?{request['query']}" if request.get("query") else "")
+                    started = time.perf_counter()
+                    try:
+                        response = await client.request(request["method"], url, **request_kwargs(request))
+                    except httpx.HTTPError as e:
+                        recorder.errors[name][type(e).__name__] += 1
+                        continue
+                    finally:
+                        elapsed = time.perf_counter() - started
+                        recorder.latencies[name].append(elapsed)
+                    expected = upstream_critical_ms(request) * scale
+                    upstream[name].append(expected / 1000)
+                    overhead[name].append(elapsed - expected / 1000)
+                    if response.status_code != request["response"]["status"]:
+                        mismatches[name] += 1
+                        recorder.errors[name][str(response.status_code)] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_client(session) for session in clients.values()))
+        elapsed = time.perf_counter() - started
+
+    results = recorder.summary(elapsed)
+    results["sessions_completed"] = len(clients)
+    for name, stats in results["endpoints"].items():
+        stats["upstream_p50_ms"] = round(percentile(upstream[name], 50) * 1000, 1)
+        stats["overhead_p50_ms"] = round(percentile(overhead[name], 50) * 1000, 1)
+        stats["overhead_p95_ms"] = round(percentile(overhead[name], 95) * 1000, 1)
+        stats["status_mismatches"] = mismatches[name]
+    return results
+
+
+def print_overhead(results: dict, baseline: dict = None) -> None:
+    print(f"\n{'endpoint':<42}{'upstream p50':>13}{'overhead p50':>13}{'p95':>9}{'mismatch':>10}")
+    print("-" * 87)
+    for name, stats in results["endpoints"].items():
+        line = (f"{name[:41]:<42}{stats['upstream_p50_ms']:>13.1f}{stats['overhead_p50_ms']:>13.1f}"
+                f"{stats['overhead_p95_ms']:>9.1f}{stats['status_mismatches']:>10}")
+        previous = (baseline or {}).get("endpoints", {}).get(name)
+        if previous and previous.get("overhead_p50_ms"):
+            line += f"   overhead {stats['overhead_p50_ms'] - previous['overhead_p50_ms']:+.1f} ms vs baseline"
+        print(line)
+    upstream = results.get("upstream_replayed", {})
+    if upstream:
+        print(f"\nUpstream calls answered: {upstream}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("traces", nargs="+", help="trace files (trace-*.jsonl.gz)")
+    parser.add_argument("--timing", default="original", help="upstream timing: original, none or a factor")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients replayed at once")
+    parser.add_argument("--keep-gaps", action="store_true", help="keep each client's think time between requests")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout (s)")
+    parser.add_argument("--backend-env", action="append", default=[], help="extra KEY=VALUE for the backend")
+    parser.add_argument("--backend-log", help="write backend stdout/stderr to this file")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    paths = [os.path.abspath(path) for path in args.traces]
+    headers, requests, background = load_trace(paths)
+    if not requests:
+        raise SystemExit("No requests in the trace")
+    scale = timing_scale(args.timing)
+
+    env = {name: "replay" for name in DUMMY_KEYS}
+    env["SUPABASE_URL"] = "http://supabase.replay.invalid"
+    for header in headers:
+        env.update(header.get("env", {}))
+    memory_dir = tempfile.TemporaryDirectory()
+    env.update({
+        "TRACE_REPLAY": ",".join(paths),
+        "TRACE_REPLAY_TIMING": args.timing,
+        "TRACE_RECORD_DIR": "",
+        # Founder memory from earlier runs would change the judge's prompts
+        "MEMORY_STORE_PATH": os.path.join(memory_dir.name, "memory.sqlite3"),
+    })
+    env.update(kv.split("=", 1) for kv in args.backend_env)
+
+    backend = Backend(env, _free_port(), args.backend_log)
+    try:
+        backend.wait_ready()
+        print(f"Replaying {len(requests)} requests ({len(background)} background upstream calls) "
+              f"from {len(paths)} trace file(s), timing {args.timing}, concurrency {args.concurrency}")
+        results = asyncio.run(replay(backend.url, requests, args.concurrency, scale, args.keep_gaps, args.timeout))
+        try:
+            counters = httpx.get(backend.url + "/metrics", timeout=5).json()["counters"]
+            replayed = defaultdict(int)
+            for name, value in counters.items():
+                if name.startswith("trace_replay_upstream_total"):
+                    replayed[name.split('result="')[1].split('"')[0]] += value
+            results["upstream_replayed"] = dict(replayed)
+        except (httpx.HTTPError, ValueError, KeyError):
+            pass
+    finally:
+        backend.stop()
+        memory_dir.cleanup()
+
+    results.update({
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {"traces": paths, "timing": args.timing, "concurrency": args.concurrency,
+                   "keep_gaps": args.keep_gaps},
+    })
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print_overhead(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# bench/tts_format_bench.py
+"""
+TTS output-format benchmark: bytes and time-to-first-chunk per negotiated
+audio format and latency-optimization level.
+
+Streams judge replies through the real AsyncElevenLabs client, built with the
+same request parameters the backend sends (voice profile, output_format,
+optimize_streaming_latency), against bench/stubs.py. The TTS stand-in streams
+100 ms chunks sized by each format's bitrate, waits a fixed first-chunk delay
+(15% shorter per latency level) plus the codec's encoder lookahead, and
+generates audio faster than real time.
+
+Usage (from backend/):
+    python -m bench.tts_format_bench [--repeats 3] [--first-chunk-ms 250]
+        [--realtime-factor 20] [--judge elon]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from bench.stubs import JUDGE_REPLY, ProviderProfile, StubServer, StubState
+
+REPLIES = {
+    "short": "Interesting. What's your customer acquisition cost?",
+    "typical": JUDGE_REPLY,
+    "long": JUDGE_REPLY * 2,
+}
+
+
+async def stream_once(kwargs: dict) -> tuple:
+    from services.clients import get_async_elevenlabs_client
+
+    client = get_async_elevenlabs_client()
+    started = time.perf_counter()
+    first = None
+    size = 0
+    async for chunk in client.text_to_speech.convert(**kwargs):
+        if chunk:
+            if first is None:
+                first = time.perf_counter() - started
+            size += len(chunk)
+    return first, time.perf_counter() - started, size
+
+
+async def run(args) -> list:
+    from services.elevenlabs_service import AUDIO_FORMATS, _convert_kwargs
+
+    # Warm up the client and connection pool
+    await stream_once(_convert_kwargs("warm up", args.judge, None, None))
+    rows = []
+    for audio_format in AUDIO_FORMATS.values():
+        for latency in sorted({0, audio_format.default_latency, 4}):
+            for label, text in REPLIES.items():
+                kwargs = _convert_kwargs(text, args.judge, audio_format, latency)
+                runs = [await stream_once(kwargs) for _ in range(args.repeats)]
+                rows.append({
+                    "format": audio_format.name,
+                    "output_format": audio_format.output_format,
+                    "latency": latency,
+                    "default": latency == audio_format.default_latency,
+                    "reply": label,
+                    "ttfc_ms": statistics.median(r[0] for r in runs) * 1000,
+                    "total_ms": statistics.median(r[1] for r in runs) * 1000,
+                    "bytes": runs[0][2],
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--first-chunk-ms", type=float, default=250.0, help="stub delay before the first chunk")
+    parser.add_argument("--realtime-factor", type=float, default=20.0, help="stub generation speed vs real time")
+    parser.add_argument("--judge", default="elon")
+    args = parser.parse_args()
+
+    state = StubState(tts_first_chunk_ms=args.first_chunk_ms, tts_realtime_factor=args.realtime_factor)
+    state.profiles["tts"] = ProviderProfile(0, 0)
+    stubs = StubServer(state=state).start()
+    os.environ.update(stubs.backend_env())
+    try:
+        rows = asyncio.run(run(args))
+    finally:
+        stubs.stop()
+
+    print(f"Stub TTS: {args.first_chunk_ms:.0f} ms to first chunk at level 0, "
+          f"{args.realtime_factor:g}x real time; median of {args.repeats}\n")
+    print(f"{'format':<8}{'output_format':<16}{'level':>6}{'reply':>9}{'KB':>8}{'first chunk ms':>16}{'total ms':>10}")
+    for row in rows:
+        marker = "*" if row["default"] else " "
+        print(f"{row['format']:<8}{row['output_format']:<16}{row['latency']:>5}{marker}{row['reply']:>9}"
+              f"{row['bytes'] / 1024:>8.1f}{row['ttfc_ms']:>16.0f}{row['total_ms']:>10.0f}")
+    print("\n* the format's default latency level")
+
+    mp3 = {r["reply"]: r for r in rows if r["format"] == "mp3" and r["default"]}
+    for name in ("opus", "pcm"):
+        best = {r["reply"]: r for r in rows if r["format"] == name and r["default"]}
+        typical, baseline = best["typical"], mp3["typical"]
+        print(f"{name} vs mp3 (typical reply, default levels): {typical['bytes'] / baseline['bytes']:.1f}x bytes, "
+              f"first chunk {baseline['ttfc_ms']:.0f} -> {typical['ttfc_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,9 +23,62 @@ CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON public.conversations(use
 CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON public.messages(conversation_id);
 CREATE INDEX IF NOT EXISTS idx_messages_created_at ON public.messages(created_at);
 
+-- Keyset pagination for bulk export (services/export.py pages by (created_at, id))
+CREATE INDEX IF NOT EXISTS idx_conversations_created_at_id ON public.conversations(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_messages_created_at_id ON public.messages(created_at, id);
+
+-- Presentation metrics of each analysed conversation (one row per conversation;
+-- re-analysing replaces it). user_seq / judge_seq number a user's analyses overall
+-- and per judge, the x axis of the trend in user_performance_aggregates.
+CREATE TABLE IF NOT EXISTS public.performance_analyses (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    conversation_id UUID NOT NULL UNIQUE REFERENCES public.conversations(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL,
+    judge TEXT NOT NULL,
+    clarity DOUBLE PRECISION NOT NULL,
+    confidence DOUBLE PRECISION NOT NULL,
+    engagement DOUBLE PRECISION NOT NULL,
+    structure DOUBLE PRECISION NOT NULL,
+    delivery DOUBLE PRECISION NOT NULL,
+    overall DOUBLE PRECISION NOT NULL,
+    user_seq INTEGER NOT NULL,
+    judge_seq INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Running totals per user, overall (judge = '*') and per judge, updated as each
+-- analysis completes so the dashboard reads a handful of rows instead of
+-- re-analysing history. version guards concurrent read-modify-write updates.
+CREATE TABLE IF NOT EXISTS public.user_performance_aggregates (
+    user_id UUID NOT NULL,
+    judge TEXT NOT NULL,
+    analyses INTEGER NOT NULL DEFAULT 0,
+    sum_clarity DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_confidence DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_engagement DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_structure DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_delivery DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_overall DOUBLE PRECISION NOT NULL DEFAULT 0,
+    -- Sum of seq * overall, for the least-squares slope of overall over analyses
+    sum_seq_overall DOUBLE PRECISION NOT NULL DEFAULT 0,
+    first_overall DOUBLE PRECISION,
+    last_overall DOUBLE PRECISION,
+    best_overall DOUBLE PRECISION,
+    best_conversation_id UUID,
+    last_analysis_at TIMESTAMP WITH TIME ZONE,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, judge)
+);
+
+CREATE INDEX IF NOT EXISTS idx_performance_analyses_user_id ON public.performance_analyses(user_id);
+CREATE INDEX IF NOT EXISTS idx_performance_analyses_created_at_id ON public.performance_analyses(created_at, id);
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE public.conversations ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.messages ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.performance_analyses ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.user_performance_aggregates ENABLE ROW LEVEL SECURITY;
 
 -- Create RLS policies for conversations
 CREATE POLICY "Users can view their own conversations" ON public.conversations
@@ -68,3 +121,12 @@ CREATE POLICY "Users can delete messages from their conversations" ON public.mes
             SELECT id FROM public.conversations WHERE user_id = auth.uid()
         )
     );
+
+-- Create RLS policies for performance analytics. Users can only read them: the
+-- backend writes both tables with the service role (SUPABASE_SERVICE_ROLE_KEY),
+-- which bypasses RLS, so a client can't forge its own scores or aggregates
+CREATE POLICY "Users can view their own performance analyses" ON public.performance_analyses
+    FOR SELECT USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can view their own performance aggregates" ON public.user_performance_aggregates
+    FOR SELECT USING (auth.uid() = user_id);
@@ -22,3 +22,14 @@ CREATE POLICY "Enable all operations for authenticated users" ON public.messages
             SELECT id FROM public.conversations WHERE user_id = auth.uid()
         )
     );
+
+-- Performance analytics are written by the backend with the service role;
+-- users may only read their own (replaces the earlier FOR ALL policies)
+DROP POLICY IF EXISTS "Users can manage their own performance analyses" ON public.performance_analyses;
+DROP POLICY IF EXISTS "Users can manage their own performance aggregates" ON public.user_performance_aggregates;
+
+CREATE POLICY "Users can view their own performance analyses" ON public.performance_analyses
+    FOR SELECT USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can view their own performance aggregates" ON public.user_performance_aggregates
+    FOR SELECT USING (auth.uid() = user_id);
@@ -1,12 +1,46 @@
 # main.py
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from services.config import load_config
+
+# Load .env.local once, before any router reads configuration
+load_config()
+
 from api.judge import router as judges_router
 from api.heygen import router as heygen_router
 from api.transcribe import router as transcribe_router
 from api.performance import router as performance_router
+from api.jobs import router as jobs_router
+from api.room import router as room_router
+from api.admin import router as admin_router
+from services.jobs import job_manager
+from services.governor import UpstreamError
+from services import breaker, metrics
+from services.clients import prewarm
+from services.profiler import ProfilerMiddleware
+from services.tracing import TraceMiddleware
+from services.admission import AdmissionMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start background job workers (and re-queue persisted jobs, if any)
+    await job_manager.start()
+    # Optionally import provider SDKs and build clients in the background so the
+    # first request doesn't pay for it (PREWARM=1)
+    if os.getenv("PREWARM", "").lower() in ("1", "true", "yes"):
+        asyncio.create_task(asyncio.to_thread(prewarm))
+    yield
+    await job_manager.stop()
+
+app = FastAPI(title="Judge API Orchestrator", lifespan=lifespan)
 
-app = FastAPI(title="Judge API Orchestrator")
+# Interactive turns before batch analyses; inside CORS so browsers can read its
+# 503s and Retry-After (see services/admission.py)
+app.add_middleware(AdmissionMiddleware)
 
 # CORS middleware to allow frontend to call the API
 app.add_middleware(
@@ -20,12 +54,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outside CORS, so a profiled request is captured from first byte to last (see services/profiler.py)
+app.add_middleware(ProfilerMiddleware)
+# Records or replays request traces when TRACE_RECORD_DIR / TRACE_REPLAY is set (see services/tracing.py)
+app.add_middleware(TraceMiddleware)
+
 # Register routers (you can add more later)
 app.include_router(judges_router)
 app.include_router(heygen_router)
 app.include_router(transcribe_router)
 app.include_router(performance_router)
+app.include_router(jobs_router)
+app.include_router(room_router)
+app.include_router(admin_router)
+
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    # Upstream rate limits / overload are surfaced as 429/503 with Retry-After, not 500
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers=exc.headers()
+    )
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Judge API"}
+
+@app.get("/health")
+async def health():
+    """
+    Liveness plus upstream circuit breaker states. "degraded" while any breaker is
+    open or probing; degraded_modes says which fallbacks are in effect.
+    """
+    return breaker.health()
+
+@app.get("/metrics")
+async def get_metrics(format: str = "json"):
+    """Process metrics (upstream governors, queues, caches). Use ?format=prometheus for text exposition."""
+    if format == "prometheus":
+        return PlainTextResponse(metrics.prometheus_text())
+    return metrics.snapshot()
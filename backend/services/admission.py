@@ -0,0 +1,278 @@
+# services/admission.py
+import asyncio
+import contextvars
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from services import metrics
+
+# Priority-aware admission control. Interactive turns (the judge's reply, STT)
+# and batch work (analyses, scores, narration) share one worker and the same
+# upstream quotas; without priorities a burst of analyses queues the founder's
+# next turn behind it.
+#
+# AdmissionMiddleware classifies each HTTP request by route (ROUTE_CLASSES;
+# anything unlisted is cheap and bypasses admission) and admits it into one of
+# ADMISSION_CAPACITY request slots:
+#
+#   - interactive requests may use every slot, batch requests all but
+#     ADMISSION_INTERACTIVE_RESERVED, so a batch flood never fills the server;
+#   - when a slot frees, queued interactive requests start before queued batch
+#     ones (batch work is deferred while load is high);
+#   - each class has a bounded queue and a maximum wait. A request that would
+#     wait longer (queue position x recent service time per slot) is refused at
+#     once with 503 and Retry-After instead of timing out later, and one still
+#     queued at its deadline is refused then.
+#
+# The admitted request's class is kept in a context variable, so the upstream
+# governors (services/governor.py) can hold back a share of each provider's
+# slots from batch calls too; background jobs run as batch.
+#
+# Queue depth and in-flight counts per class are exported under "admission" in
+# /metrics; admission_wait_seconds{class} and admission_total{class,result}
+# record waits and outcomes.
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Requests outside admission control, and code running outside any request
+STANDARD = "standard"
+
+ROUTE_CLASSES = {
+    ("POST", "/judges/generate"): INTERACTIVE,
+    ("POST", "/judges/select"): INTERACTIVE,
+    ("POST", "/elevenlabs/stt"): INTERACTIVE,
+    ("POST", "/elevenlabs/partial"): INTERACTIVE,
+    ("POST", "/elevenlabs/audio-with-judge"): INTERACTIVE,
+    ("POST", "/performance/analyze"): BATCH,
+    ("POST", "/performance/analyze/stream"): BATCH,
+    ("POST", "/performance/narrate"): BATCH,
+    ("POST", "/judges/get_score"): BATCH,
+}
+
+# class -> (rank, max queue, max wait seconds); lower ranks start first
+CLASS_DEFAULTS = {
+    INTERACTIVE: (0, 64, 3.0),
+    BATCH: (1, 32, 20.0),
+}
+
+# Assumed service time per request until a class has finished a few
+INITIAL_SERVICE_SECONDS = 1.0
+SERVICE_EWMA_ALPHA = 0.2
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("admission_priority", default=STANDARD)
+
+
+def current_priority() -> str:
+    """The priority class of the work running in this context."""
+    return _priority.get()
+
+
+def set_priority(priority: str) -> contextvars.Token:
+    return _priority.set(priority)
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """The route's priority class, or None if it bypasses admission control."""
+    return ROUTE_CLASSES.get((method, path.rstrip("/") or "/"))
+
+
+class AdmissionRejected(Exception):
+    """The request could not be admitted before its class's deadline."""
+
+    def __init__(self, priority: str, reason: str, retry_after: float):
+        super().__init__(f"Server busy ({priority} {reason}), please retry")
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class PriorityClass:
+    def __init__(self, name: str, rank: int, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.rank = rank
+        # Slots this class may hold at once
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.service_seconds = INITIAL_SERVICE_SECONDS
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "service_seconds": round(self.service_seconds, 3),
+        }
+
+
+class AdmissionController:
+    """Request slots shared by priority classes, strict priority between their queues."""
+
+    def __init__(self, capacity: int, interactive_reserved: int, classes: Dict[str, tuple]):
+        self.capacity = max(1, capacity)
+        self.interactive_reserved = max(0, min(interactive_reserved, self.capacity - 1))
+        self.classes = {
+            name: PriorityClass(name, rank, self.capacity if name == INTERACTIVE
+                                else self.capacity - self.interactive_reserved, max_queue, max_wait)
+            for name, (rank, max_queue, max_wait) in classes.items()
+        }
+        self._ranked = sorted(self.classes.values(), key=lambda c: c.rank)
+        self.in_flight = 0
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "interactive_reserved": self.interactive_reserved,
+            "in_flight": self.in_flight,
+            "classes": {c.name: c.stats() for c in self._ranked},
+        }
+
+    def _can_start(self, cls: PriorityClass) -> bool:
+        return self.in_flight < self.capacity and cls.in_flight < cls.limit
+
+    def _start(self, cls: PriorityClass) -> None:
+        self.in_flight += 1
+        cls.in_flight += 1
+
+    def _queued_ahead(self, cls: PriorityClass) -> int:
+        return sum(len(c.waiters) for c in self._ranked if c.rank <= cls.rank)
+
+    def estimated_wait(self, cls: PriorityClass) -> float:
+        """Seconds until a request joining `cls`'s queue now would start."""
+        return (self._queued_ahead(cls) + 1) * cls.service_seconds / cls.limit
+
+    async def acquire(self, priority: str) -> float:
+        """Take a slot for `priority`, queueing if needed; returns the seconds waited."""
+        cls = self.classes[priority]
+        if self._can_start(cls) and not self._queued_ahead(cls):
+            self._start(cls)
+            self._admitted(cls, 0.0)
+            return 0.0
+
+        if len(cls.waiters) >= cls.max_queue:
+            self._reject(cls, "queue_full", self.estimated_wait(cls))
+        estimate = self.estimated_wait(cls)
+        if estimate > cls.max_wait:
+            self._reject(cls, "deadline", estimate)
+
+        future = asyncio.get_running_loop().create_future()
+        cls.waiters.append(future)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), cls.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                cls.waiters.remove(future)
+                self._reject(cls, "timeout", self.estimated_wait(cls))
+        except asyncio.CancelledError:
+            # The client went away while queued; hand on a slot it was just given
+            if future.done() and not future.cancelled():
+                self.release(priority)
+            else:
+                future.cancel()
+                cls.waiters.remove(future)
+            raise
+        waited = time.monotonic() - started
+        self._admitted(cls, waited)
+        return waited
+
+    def release(self, priority: str, service_seconds: Optional[float] = None) -> None:
+        """Give back a slot and admit whoever is next, highest priority first."""
+        cls = self.classes[priority]
+        self.in_flight -= 1
+        cls.in_flight -= 1
+        if service_seconds is not None:
+            cls.service_seconds += SERVICE_EWMA_ALPHA * (service_seconds - cls.service_seconds)
+        for candidate in self._ranked:
+            while candidate.waiters and self._can_start(candidate):
+                future = candidate.waiters.popleft()
+                if future.done():
+                    continue
+                self._start(candidate)
+                future.set_result(None)
+
+    def _admitted(self, cls: PriorityClass, waited: float) -> None:
+        metrics.inc("admission_total", **{"class": cls.name, "result": "admitted"})
+        metrics.observe("admission_wait_seconds", waited, **{"class": cls.name})
+
+    def _reject(self, cls: PriorityClass, reason: str, retry_after: float):
+        metrics.inc("admission_total", **{"class": cls.name, "result": reason})
+        raise AdmissionRejected(cls.name, reason, retry_after)
+
+
+def _env(priority: str, setting: str, default):
+    value = os.getenv(f"ADMISSION_{priority.upper()}_{setting}")
+    return type(default)(value) if value else default
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """
+    The process-wide controller, or None when ADMISSION_ENABLED=0. Sized by
+    ADMISSION_CAPACITY and ADMISSION_INTERACTIVE_RESERVED; each class's queue by
+    ADMISSION_<CLASS>_{QUEUE,MAX_WAIT_SECONDS}.
+    """
+    global _controller
+    if os.getenv("ADMISSION_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    if _controller is None:
+        _controller = AdmissionController(
+            int(os.getenv("ADMISSION_CAPACITY", "16")),
+            int(os.getenv("ADMISSION_INTERACTIVE_RESERVED", "12")),
+            {name: (rank, _env(name, "QUEUE", max_queue), _env(name, "MAX_WAIT_SECONDS", max_wait))
+             for name, (rank, max_queue, max_wait) in CLASS_DEFAULTS.items()},
+        )
+    return _controller
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits classified HTTP requests (see module comment)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.controller = get_admission_controller()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.controller is None:
+            return await self.app(scope, receive, send)
+        priority = classify(scope["method"], scope["path"])
+        if priority is None:
+            return await self.app(scope, receive, send)
+
+        try:
+            await self.controller.acquire(priority)
+        except AdmissionRejected as e:
+            print(f"🚦 Refused {scope['method']} {scope['path']}: {priority} {e.reason}, "
+                  f"retry in {e.retry_after:.1f}s")
+            body = json.dumps({"detail": str(e)}).encode("utf-8")
+            headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                       *((k.lower().encode(), v.encode()) for k, v in e.headers().items())]
+            await send({"type": "http.response.start", "status": 503, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        token = set_priority(priority)
+        started = time.monotonic()
+        try:
+            # Held until the response is fully sent, streamed bodies included
+            await self.app(scope, receive, send)
+        finally:
+            _priority.reset(token)
+            self.controller.release(priority, time.monotonic() - started)
+
+
+metrics.register_collector("admission", lambda: _controller.stats() if _controller is not None else {})
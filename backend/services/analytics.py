@@ -0,0 +1,302 @@
+# services/analytics.py
+import asyncio
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional
+
+from services import metrics
+from services.local_db import utc_now
+
+# Per-user performance aggregates for the progress dashboard. Each completed
+# analysis is stored in performance_analyses and folded into running totals in
+# user_performance_aggregates: one row for the user overall (judge "*") and one
+# per judge. Means and the trend are derived from the totals when read, so the
+# dashboard is a single indexed select of a few rows however many pitches the
+# user has made.
+#
+# Re-analysing a conversation replaces its analysis: the totals take the
+# difference and the analysis keeps its place (seq) in the trend. "best" is the
+# best score ever recorded and is not lowered by a re-analysis.
+#
+# Totals are updated read-modify-write, guarded by a version column, so two
+# analyses finishing together for one user retry rather than lose an update.
+# rebuild_aggregates() recomputes everything from performance_analyses.
+
+METRIC_FIELDS = ("clarity", "confidence", "engagement", "structure", "delivery", "overall")
+ALL_JUDGES = "*"
+MAX_ATTEMPTS = 5
+
+
+class AggregateConflict(RuntimeError):
+    pass
+
+
+class ForeignAnalysis(PermissionError):
+    """The conversation's stored analysis belongs to another user."""
+
+
+def empty_aggregate(user_id: str, judge: str) -> Dict[str, Any]:
+    row = {"user_id": user_id, "judge": judge, "analyses": 0, "sum_seq_overall": 0.0,
+           "first_overall": None, "last_overall": None, "best_overall": None, "best_conversation_id": None,
+           "last_analysis_at": None, "version": 0}
+    row.update({f"sum_{field}": 0.0 for field in METRIC_FIELDS})
+    return row
+
+
+def apply_analysis(aggregate: Dict[str, Any], analysis: Dict[str, Any], seq: int,
+                   previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fold `analysis` (at position `seq`) into `aggregate`, replacing `previous`,
+    the same conversation's earlier analysis, if there was one. Returns a new row.
+    """
+    row = dict(aggregate)
+    overall = analysis["overall"]
+    if previous is None:
+        row["analyses"] += 1
+    for field in METRIC_FIELDS:
+        row[f"sum_{field}"] += analysis[field] - (previous[field] if previous else 0.0)
+    row["sum_seq_overall"] += seq * (overall - (previous["overall"] if previous else 0.0))
+    if seq == 1:
+        row["first_overall"] = overall
+    if seq == row["analyses"]:
+        row["last_overall"] = overall
+    if row["best_overall"] is None or overall > row["best_overall"]:
+        row["best_overall"] = overall
+        row["best_conversation_id"] = analysis["conversation_id"]
+    row["last_analysis_at"] = max(filter(None, (row["last_analysis_at"], analysis["created_at"])))
+    row["updated_at"] = utc_now()
+    return row
+
+
+def trend_slope(aggregate: Dict[str, Any]) -> Optional[float]:
+    """Least-squares slope of the overall score per analysis (x = seq 1..n), or None below two."""
+    n = aggregate["analyses"]
+    if n < 2:
+        return None
+    sum_x = n * (n + 1) / 2
+    sum_xx = n * (n + 1) * (2 * n + 1) / 6
+    return (n * aggregate["sum_seq_overall"] - sum_x * aggregate["sum_overall"]) / (n * sum_xx - sum_x ** 2)
+
+
+def summarize(aggregate: Dict[str, Any]) -> Dict[str, Any]:
+    """Dashboard view of one aggregate row."""
+    n = aggregate["analyses"]
+    slope = trend_slope(aggregate)
+    return {
+        "analyses": n,
+        "means": {field: round(aggregate[f"sum_{field}"] / n, 2) if n else None for field in METRIC_FIELDS},
+        "best": {"overall": aggregate["best_overall"], "conversation_id": aggregate["best_conversation_id"]},
+        "first_overall": aggregate["first_overall"],
+        "last_overall": aggregate["last_overall"],
+        "improvement": round(aggregate["last_overall"] - aggregate["first_overall"], 2) if n >= 2 else None,
+        "trend_per_analysis": round(slope, 3) if slope is not None else None,
+        "last_analysis_at": aggregate["last_analysis_at"],
+    }
+
+
+def dashboard(aggregates: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    rows = {row["judge"]: row for row in aggregates}
+    overall = rows.pop(ALL_JUDGES, None)
+    return {
+        "overall": summarize(overall) if overall else summarize(empty_aggregate("", ALL_JUDGES)),
+        "by_judge": {judge: summarize(row) for judge, row in sorted(rows.items())},
+    }
+
+
+# --- Stores ---
+class SupabaseAnalyticsStore:
+    def __init__(self, client):
+        self.client = client
+
+    def get_analysis(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        rows = self.client.table("performance_analyses").select("*") \
+            .eq("conversation_id", conversation_id).limit(1).execute().data
+        return rows[0] if rows else None
+
+    def replace_analysis(self, row: Dict[str, Any]) -> None:
+        self.client.table("performance_analyses").delete().eq("conversation_id", row["conversation_id"]).execute()
+        self.client.table("performance_analyses").insert(row).execute()
+
+    def set_seqs(self, analysis_id: str, user_seq: int, judge_seq: int) -> None:
+        self.client.table("performance_analyses").update({"user_seq": user_seq, "judge_seq": judge_seq}) \
+            .eq("id", analysis_id).execute()
+
+    def get_aggregate(self, user_id: str, judge: str) -> Optional[Dict[str, Any]]:
+        rows = self.client.table("user_performance_aggregates").select("*") \
+            .eq("user_id", user_id).eq("judge", judge).limit(1).execute().data
+        return rows[0] if rows else None
+
+    def get_aggregates(self, user_id: str) -> List[Dict[str, Any]]:
+        return self.client.table("user_performance_aggregates").select("*").eq("user_id", user_id).execute().data or []
+
+    def insert_aggregate(self, row: Dict[str, Any]) -> bool:
+        try:
+            self.client.table("user_performance_aggregates").insert(row).execute()
+            return True
+        except Exception as e:
+            # 23505: unique_violation, another worker created the row first
+            if "23505" in str(e) or "duplicate key" in str(e):
+                return False
+            raise
+
+    def update_aggregate(self, row: Dict[str, Any], version: int) -> bool:
+        updated = self.client.table("user_performance_aggregates").update(row) \
+            .eq("user_id", row["user_id"]).eq("judge", row["judge"]).eq("version", version).execute().data
+        return bool(updated)
+
+    def put_aggregates(self, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            self.client.table("user_performance_aggregates").upsert(rows).execute()
+
+    # --- Backfill ---
+    def analysed(self, conversation_ids: List[str]) -> set:
+        rows = self.client.table("performance_analyses").select("conversation_id") \
+            .in_("conversation_id", conversation_ids).execute().data or []
+        return {row["conversation_id"] for row in rows}
+
+    def insert_analyses(self, rows: List[Dict[str, Any]]) -> None:
+        if rows:
+            self.client.table("performance_analyses").insert(rows).execute()
+
+    def conversation_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        return self.client.table("messages").select("sender, content") \
+            .eq("conversation_id", conversation_id).order("created_at").execute().data or []
+
+
+class LocalAnalyticsStore:
+    """The same operations on a LocalDatabase (services/local_db.py)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def get_analysis(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.select("performance_analyses", {"conversation_id": conversation_id}, limit=1)
+        return rows[0] if rows else None
+
+    def replace_analysis(self, row: Dict[str, Any]) -> None:
+        self.db.delete("performance_analyses", {"conversation_id": row["conversation_id"]})
+        self.db.insert("performance_analyses", [row])
+
+    def set_seqs(self, analysis_id: str, user_seq: int, judge_seq: int) -> None:
+        self.db.execute("UPDATE performance_analyses SET user_seq = ?, judge_seq = ? WHERE id = ?",
+                        (user_seq, judge_seq, analysis_id))
+
+    def get_aggregate(self, user_id: str, judge: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.select("user_performance_aggregates", {"user_id": user_id, "judge": judge}, limit=1)
+        return rows[0] if rows else None
+
+    def get_aggregates(self, user_id: str) -> List[Dict[str, Any]]:
+        return self.db.select("user_performance_aggregates", {"user_id": user_id})
+
+    def insert_aggregate(self, row: Dict[str, Any]) -> bool:
+        try:
+            self.db.insert("user_performance_aggregates", [row])
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def update_aggregate(self, row: Dict[str, Any], version: int) -> bool:
+        columns = [column for column in row if column not in ("user_id", "judge")]
+        sql = (f"UPDATE user_performance_aggregates SET {', '.join(f'{c} = ?' for c in columns)} "
+               f"WHERE user_id = ? AND judge = ? AND version = ? RETURNING judge")
+        return bool(self.db.execute(sql, [row[c] for c in columns] + [row["user_id"], row["judge"], version]))
+
+    def put_aggregates(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.db.execute("DELETE FROM user_performance_aggregates WHERE user_id = ? AND judge = ?",
+                            (row["user_id"], row["judge"]))
+        self.db.insert("user_performance_aggregates", rows)
+
+    # --- Backfill ---
+    def analysed(self, conversation_ids: List[str]) -> set:
+        placeholders = ", ".join("?" for _ in conversation_ids)
+        rows = self.db.execute(f"SELECT conversation_id FROM performance_analyses "
+                               f"WHERE conversation_id IN ({placeholders})", conversation_ids)
+        return {row["conversation_id"] for row in rows}
+
+    def insert_analyses(self, rows: List[Dict[str, Any]]) -> None:
+        self.db.insert("performance_analyses", rows)
+
+    def conversation_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        return self.db.select("messages", {"conversation_id": conversation_id}, order_by="created_at",
+                              columns="sender, content")
+
+
+def record_analysis_sync(store, user_id: str, conversation_id: str, judge: str,
+                         scores: Dict[str, float]) -> Dict[str, Any]:
+    """Store an analysis and fold it into the user's aggregates. Returns the stored analysis."""
+    previous = store.get_analysis(conversation_id)
+    # Callers check ownership first; this is the backstop, since folding another
+    # user's row would move it between their aggregates
+    if previous and previous["user_id"] != user_id:
+        metrics.inc("performance_analyses_refused_total")
+        raise ForeignAnalysis(f"Analysis of {conversation_id} belongs to another user")
+    # Conversations don't change judge; if one somehow did, rebuild_aggregates() fixes the split
+    judge = previous["judge"] if previous else judge or "unknown"
+    analysis = {
+        # A re-analysis keeps the original's id and time, and so its place in the trend
+        **({"id": previous["id"], "created_at": previous["created_at"]} if previous else {"created_at": utc_now()}),
+        "conversation_id": conversation_id,
+        "user_id": user_id,
+        "judge": judge,
+        **{field: float(scores[field]) for field in METRIC_FIELDS},
+    }
+    # The two rows are updated independently, each taking its own seq, so a
+    # conflict on one never re-applies the analysis to the other
+    analysis["user_seq"] = _fold(store, user_id, ALL_JUDGES, analysis, previous, "user_seq")
+    analysis["judge_seq"] = _fold(store, user_id, judge, analysis, previous, "judge_seq")
+    store.replace_analysis(analysis)
+    metrics.inc("performance_analyses_recorded_total", replaced=previous is not None)
+    return analysis
+
+
+def _fold(store, user_id: str, judge: str, analysis: Dict[str, Any], previous: Optional[Dict[str, Any]],
+          seq_field: str) -> int:
+    """Apply `analysis` to one aggregate row with a versioned compare-and-set; returns its seq there."""
+    for _ in range(MAX_ATTEMPTS):
+        current = store.get_aggregate(user_id, judge) or empty_aggregate(user_id, judge)
+        seq = previous[seq_field] if previous else current["analyses"] + 1
+        row = apply_analysis(current, analysis, seq, previous)
+        row["version"] = current["version"] + 1
+        if current["version"] == 0:
+            written = store.insert_aggregate(row)
+        else:
+            written = store.update_aggregate(row, current["version"])
+        if written:
+            return seq
+        # Lost a race with another analysis for this user; retry from the fresh row
+        metrics.inc("performance_aggregate_conflicts_total")
+    raise AggregateConflict(f"Could not update aggregate {user_id}/{judge} after {MAX_ATTEMPTS} attempts")
+
+
+async def record_analysis(store, user_id: str, conversation_id: str, judge: str, scores: Dict[str, float]) -> None:
+    """record_analysis_sync off the event loop."""
+    await asyncio.to_thread(record_analysis_sync, store, user_id, conversation_id, judge, scores)
+
+
+def rebuild_aggregates(store, analyses: Iterable[List[Dict[str, Any]]]) -> Dict[str, int]:
+    """
+    Recompute every aggregate (and each analysis' seqs) from `analyses`: batches of
+    performance_analyses rows in created_at order, e.g. services.export.iter_batches.
+    Memory is proportional to users x judges, not to analyses.
+    """
+    aggregates: Dict[tuple, Dict[str, Any]] = {}
+    counted = renumbered = 0
+    for batch in analyses:
+        for analysis in batch:
+            counted += 1
+            seqs = []
+            for scope in (ALL_JUDGES, analysis["judge"]):
+                key = (analysis["user_id"], scope)
+                aggregate = aggregates.get(key) or empty_aggregate(*key)
+                seq = aggregate["analyses"] + 1
+                aggregates[key] = apply_analysis(aggregate, analysis, seq)
+                seqs.append(seq)
+            if (analysis.get("user_seq"), analysis.get("judge_seq")) != tuple(seqs):
+                store.set_seqs(analysis["id"], *seqs)
+                renumbered += 1
+    rows = list(aggregates.values())
+    for row in rows:
+        row["version"] = 1
+    for start in range(0, len(rows), 500):
+        store.put_aggregates(rows[start:start + 500])
+    return {"analyses": counted, "aggregates": len(rows), "renumbered": renumbered}
@@ -0,0 +1,316 @@
+# services/audio.py
+import os
+import re
+import struct
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from services import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Audio preprocessing before speech-to-text. Browser recordings arrive as WAV
+# (often 44.1/48 kHz stereo, float or int) with long silences either side of
+# the utterance. Uncompressed input is decoded straight from the upload
+# buffer, trimmed to the speech with an energy VAD, downmixed to mono,
+# resampled to the STT's native rate and re-encoded as raw 16-bit PCM, which
+# the STT accepts without server-side decoding.
+#
+# Compressed input (WebM/Opus, MP3, ...) is already compact and would need a
+# codec to decode, so it is passed through unchanged.
+#
+# The VAD only trims; it never decides on its own that a recording is empty. A
+# quiet speaker (a laptop mic at arm's length peaks around -45 dBFS) can fall
+# under every gate, so when no frame qualifies the whole recording is uploaded
+# and the STT decides. Only digital silence, nothing above DIGITAL_SILENCE_DB,
+# is reported as silent and skipped.
+
+TARGET_RATE = 16000
+# Frame size for the VAD energy measurement
+FRAME_MS = 20
+# Speech kept either side of the detected region so word onsets and tails survive
+PAD_MS = 200
+# Peak level (dBFS) at or below which a recording is digital silence: the
+# last bit of 16-bit PCM is -90.3 dBFS, so dither and zeroed buffers qualify
+DIGITAL_SILENCE_DB = -90.0
+
+# Raw 16-bit PCM content types: audio/pcm is little-endian, audio/L16 (RFC 2586) big-endian
+_PCM_TYPE_RE = re.compile(r"audio/(l16|pcm)\b", re.IGNORECASE)
+
+
+class AudioFormatError(ValueError):
+    pass
+
+
+@dataclass
+class PreparedAudio:
+    content: bytes
+    filename: str
+    content_type: str
+    # ElevenLabs `file_format`: "pcm_s16le_16" for raw 16 kHz mono PCM, else None
+    file_format: Optional[str]
+    original_bytes: int
+    # Seconds of audio before and after trimming (None when passed through)
+    original_seconds: Optional[float] = None
+    speech_seconds: Optional[float] = None
+
+    @property
+    def is_silent(self) -> bool:
+        return self.speech_seconds == 0
+
+
+def decode_wav(data: bytes) -> Tuple["np.ndarray", int]:
+    """
+    Decode a RIFF/WAVE buffer into (samples, rate). `samples` has shape
+    (frames, channels) and, for 8/16/32-bit PCM and float input, is a read-only
+    view of `data` rather than a copy.
+    """
+    import numpy as np
+
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise AudioFormatError("not a RIFF/WAVE file")
+
+    view = memoryview(data)
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", data, body)
+            if fmt[0] == 0xFFFE and size >= 40:
+                # WAVE_FORMAT_EXTENSIBLE: the real format tag leads the sub-format GUID
+                fmt = (struct.unpack_from("<H", data, body + 24)[0],) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioFormatError("data chunk before fmt chunk")
+            # Streaming recorders leave the size at 0 or 0xFFFFFFFF; take the rest of the buffer
+            end = len(data) if size in (0, 0xFFFFFFFF) else min(len(data), body + size)
+            return _pcm_frames(view[body:end], fmt), fmt[2]
+        offset = body + size + (size & 1)
+    raise AudioFormatError("no data chunk")
+
+
+def _pcm_frames(payload: memoryview, fmt: tuple) -> "np.ndarray":
+    import numpy as np
+
+    tag, channels, rate, _, block_align, bits = fmt
+    # Zeros here would divide by zero below; such headers are uploaded as recorded
+    if channels < 1:
+        raise AudioFormatError("no channels")
+    if rate < 1:
+        raise AudioFormatError("no sample rate")
+    if block_align < 1:
+        raise AudioFormatError("no block alignment")
+    usable = len(payload) - len(payload) % block_align
+    payload = payload[:usable]
+    if tag == 3 and bits in (32, 64):
+        samples = np.frombuffer(payload, dtype="<f4" if bits == 32 else "<f8")
+    elif tag == 1 and bits == 8:
+        samples = np.frombuffer(payload, dtype=np.uint8)
+    elif tag == 1 and bits in (16, 32):
+        samples = np.frombuffer(payload, dtype="<i2" if bits == 16 else "<i4")
+    elif tag == 1 and bits == 24:
+        # No 24-bit dtype: widen through a (n, 3) byte view into the top of an int32 (one copy)
+        raw = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 3)
+        samples = (raw[:, 0].astype(np.int32) << 8) | (raw[:, 1].astype(np.int32) << 16) \
+            | (raw[:, 2].astype(np.int8).astype(np.int32) << 24)
+    else:
+        raise AudioFormatError(f"unsupported WAV encoding (format {tag}, {bits}-bit)")
+    return samples.reshape(-1, channels)
+
+
+def _full_scale(dtype: "np.dtype") -> float:
+    import numpy as np
+
+    if dtype.kind == "f":
+        return 1.0
+    if dtype == np.uint8:
+        return 128.0
+    return float(np.iinfo(dtype).max) + 1.0
+
+
+def peak_db(samples: "np.ndarray") -> float:
+    """Peak sample level in dBFS (-inf for an empty or all-zero buffer)."""
+    import numpy as np
+
+    if samples.size == 0:
+        return float("-inf")
+    if samples.dtype == np.uint8:
+        peak = float(np.abs(samples.astype(np.int16) - 128).max())
+    else:
+        peak = float(max(abs(float(samples.max())), abs(float(samples.min()))))
+    return 20.0 * np.log10(peak / _full_scale(samples.dtype)) if peak > 0 else float("-inf")
+
+
+def speech_bounds(samples: "np.ndarray", rate: int, threshold_db: float = -40.0,
+                  floor_margin_db: float = 12.0) -> Tuple[int, int]:
+    """
+    Energy VAD: (start, end) sample indices spanning the first to last speech frame,
+    padded by PAD_MS. A frame is speech when its RMS is above `threshold_db` (dBFS)
+    and `floor_margin_db` above the recording's noise floor (capped well below the
+    peak, so a recording with no silence in it keeps its quieter words).
+    Returns (0, 0) when nothing qualifies.
+    """
+    import numpy as np
+
+    frame = max(1, rate * FRAME_MS // 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return 0, 0
+    frames = samples[:count * frame].reshape(count, frame * samples.shape[1])
+    scale = _full_scale(samples.dtype)
+    offset = 128.0 if samples.dtype == np.uint8 else 0.0
+    if offset:
+        frames = frames.astype(np.float32) - offset
+    # Sum of squares per frame without materialising a float copy of the signal
+    energy = np.einsum("ij,ij->i", frames, frames, dtype=np.float64) / (frames.shape[1] * scale * scale)
+    level_db = 10.0 * np.log10(np.maximum(energy, 1e-12))
+
+    noise_floor = float(np.percentile(level_db, 10))
+    gate = max(threshold_db, min(noise_floor + floor_margin_db, float(level_db.max()) - 25.0))
+    speech = np.flatnonzero(level_db > gate)
+    if speech.size == 0:
+        return 0, 0
+    pad = rate * PAD_MS // 1000
+    return max(0, int(speech[0]) * frame - pad), min(len(samples), (int(speech[-1]) + 1) * frame + pad)
+
+
+def to_mono_float(samples: "np.ndarray") -> "np.ndarray":
+    """Downmix (frames, channels) to a float32 signal in [-1, 1]; one allocation."""
+    import numpy as np
+
+    scale = _full_scale(samples.dtype)
+    if samples.dtype == np.uint8:
+        mono = samples.mean(axis=1, dtype=np.float32)
+        mono -= 128.0
+    elif samples.shape[1] == 1:
+        mono = samples[:, 0].astype(np.float32)
+    else:
+        mono = samples.mean(axis=1, dtype=np.float32)
+    if scale != 1.0:
+        mono *= np.float32(1.0 / scale)
+    return mono
+
+
+def resample(signal: "np.ndarray", rate: int, target: int = TARGET_RATE) -> "np.ndarray":
+    """
+    Resample a mono float32 signal. Integer downsampling ratios (48k, 32k -> 16k)
+    average each block of samples, a box filter that also suppresses aliasing;
+    other ratios use linear interpolation.
+    """
+    import numpy as np
+
+    if rate == target or len(signal) == 0:
+        return signal
+    if rate > target and rate % target == 0:
+        factor = rate // target
+        usable = len(signal) - len(signal) % factor
+        return signal[:usable].reshape(-1, factor).mean(axis=1)
+    count = int(len(signal) * target / rate)
+    positions = np.arange(count, dtype=np.float64) * (rate / target)
+    return np.interp(positions, np.arange(len(signal)), signal).astype(np.float32)
+
+
+def encode_pcm16(signal: "np.ndarray") -> bytes:
+    """Little-endian 16-bit PCM bytes, clipping in place."""
+    import numpy as np
+
+    np.clip(signal, -1.0, 32767 / 32768, out=signal)
+    signal *= 32768.0
+    return signal.astype("<i2").tobytes()
+
+
+def _pcm_params(content_type: str) -> Tuple[int, int]:
+    """Rate and channels from an 'audio/L16;rate=48000;channels=2' content type."""
+    params = dict(
+        part.strip().split("=", 1) for part in content_type.split(";")[1:] if "=" in part
+    )
+    rate, channels = int(params.get("rate", TARGET_RATE)), int(params.get("channels", 1))
+    if rate < 1 or channels < 1:
+        raise AudioFormatError(f"invalid PCM parameters (rate {rate}, {channels} channels)")
+    return rate, channels
+
+
+def preprocess_audio(content: bytes, filename: str, content_type: str, threshold_db: float = -40.0) -> PreparedAudio:
+    """
+    Trim, downmix and resample uncompressed audio to 16 kHz mono PCM for STT.
+    Anything that isn't WAV or raw 16-bit PCM comes back unchanged. When the VAD
+    finds no speech the recording is kept whole; only digital silence comes back
+    with speech_seconds 0.
+    """
+    import numpy as np
+
+    passthrough = PreparedAudio(content, filename, content_type, None, len(content))
+    try:
+        if content[:4] == b"RIFF":
+            samples, rate = decode_wav(content)
+        elif _PCM_TYPE_RE.match(content_type or ""):
+            rate, channels = _pcm_params(content_type)
+            dtype = ">i2" if _PCM_TYPE_RE.match(content_type).group(1).lower() == "l16" else "<i2"
+            usable = len(content) - len(content) % (2 * channels)
+            samples = np.frombuffer(memoryview(content)[:usable], dtype=dtype).reshape(-1, channels)
+        else:
+            return passthrough
+    except (AudioFormatError, ValueError, struct.error) as e:
+        print(f"⚠️ Audio preprocessing skipped ({e}); uploading as recorded")
+        return passthrough
+
+    original_seconds = len(samples) / rate
+    start, end = speech_bounds(samples, rate, threshold_db)
+    if start == end:
+        if peak_db(samples) <= DIGITAL_SILENCE_DB:
+            end = 0
+        else:
+            metrics.inc("audio_vad_fallback_total")
+            start, end = 0, len(samples)
+    signal = resample(to_mono_float(samples[start:end]), rate)
+    return PreparedAudio(
+        content=encode_pcm16(signal),
+        filename=os.path.splitext(filename or "audio")[0] + ".pcm",
+        content_type="application/octet-stream",
+        file_format="pcm_s16le_16",
+        original_bytes=len(content),
+        original_seconds=original_seconds,
+        speech_seconds=len(signal) / TARGET_RATE,
+    )
+
+
+def prepare_for_stt(content: bytes, filename: str, content_type: str) -> PreparedAudio:
+    """
+    preprocess_audio with the environment's settings, recording byte and timing
+    metrics. Disable with AUDIO_PREPROCESS=0; tune the VAD with AUDIO_VAD_THRESHOLD_DB.
+    """
+    if os.getenv("AUDIO_PREPROCESS", "1").lower() in ("0", "false", "no"):
+        return PreparedAudio(content, filename, content_type, None, len(content))
+
+    started = time.perf_counter()
+    prepared = preprocess_audio(content, filename, content_type,
+                                threshold_db=float(os.getenv("AUDIO_VAD_THRESHOLD_DB", "-40")))
+    metrics.observe("audio_preprocess_seconds", time.perf_counter() - started)
+    metrics.inc("stt_upload_bytes_total", prepared.original_bytes, stage="received")
+    metrics.inc("stt_upload_bytes_total", len(prepared.content), stage="uploaded")
+    if prepared.original_seconds is not None:
+        metrics.inc("stt_audio_seconds_total", prepared.original_seconds, stage="received")
+        metrics.inc("stt_audio_seconds_total", prepared.speech_seconds, stage="uploaded")
+    return prepared
+
+
+def _stats() -> dict:
+    received = metrics.get_counter("stt_upload_bytes_total", stage="received")
+    uploaded = metrics.get_counter("stt_upload_bytes_total", stage="uploaded")
+    return {
+        "enabled": os.getenv("AUDIO_PREPROCESS", "1").lower() not in ("0", "false", "no"),
+        "bytes_received": received,
+        "bytes_uploaded": uploaded,
+        "upload_ratio": round(uploaded / received, 4) if received else None,
+        "seconds_trimmed": round(metrics.get_counter("stt_audio_seconds_total", stage="received")
+                                 - metrics.get_counter("stt_audio_seconds_total", stage="uploaded"), 3),
+        "vad_fallbacks": metrics.get_counter("audio_vad_fallback_total"),
+        "p95_preprocess_ms": round((metrics.percentile("audio_preprocess_seconds", 95) or 0.0) * 1000, 3),
+    }
+
+
+metrics.register_collector("audio_preprocess", _stats)
@@ -0,0 +1,65 @@
+# services/auth.py
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from services.cache import get_cache
+
+# Token verification via Supabase, cached. Every endpoint checks the caller's
+# token with auth.get_user(), a network round trip per request (several per
+# pitch turn). Verified users are cached under a hash of the token (raw tokens
+# are never stored) for CACHE_AUTH_TTL_SECONDS, and never past the token's own
+# expiry. Failed verifications are not cached. A token revoked before it
+# expires stays accepted for at most the TTL; set it to 0 to verify every call.
+
+AUTH_TTL_SECONDS = 60.0
+
+
+@dataclass
+class AuthenticatedUser:
+    id: str
+    email: Optional[str] = None
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """The JWT's `exp` claim (unverified; Supabase has already checked the signature), or None."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+async def authenticate(supabase, token: str) -> Optional[AuthenticatedUser]:
+    """
+    The user `token` belongs to, or None if Supabase rejects it.
+    Args:
+        supabase: Client for the request (get_supabase_client(token))
+        token: Bearer token without the "Bearer " prefix
+    """
+    cache = get_cache("auth", AUTH_TTL_SECONDS, max_entries=4096, max_bytes=1024 * 1024)
+    ttl = cache.ttl
+    expiry = token_expiry(token)
+    if expiry is not None:
+        ttl = min(ttl, expiry - time.time())
+        if ttl <= 0:
+            ttl = 0.0
+
+    def verify() -> Optional[dict]:
+        user_response = supabase.auth.get_user(token)
+        if not user_response or not user_response.user:
+            return None
+        return {"id": user_response.user.id, "email": getattr(user_response.user, "email", None)}
+
+    # Supabase's client is blocking; keep its round trip off the event loop
+    if ttl <= 0:
+        user = await asyncio.to_thread(verify)
+    else:
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        user = await cache.get_or_set(key, lambda: asyncio.to_thread(verify), ttl=ttl)
+    return AuthenticatedUser(**user) if user else None
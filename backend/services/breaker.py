@@ -0,0 +1,207 @@
+# services/breaker.py
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from services import metrics
+from services.governor import OverloadedError, UpstreamError, classify_error, is_retryable
+
+# Per-provider circuit breakers. Each governor (services/governor.py) checks its
+# breaker before queueing a call and reports how the call went. Over the last
+# `window` calls, once at least `min_calls` have finished, the breaker opens when
+# the share of failures (5xx, timeouts, transport errors) or of slow calls (over
+# `slow_seconds`, including calls abandoned by a caller's timeout after that long)
+# reaches its threshold. While open, calls fail at once with CircuitOpenError
+# instead of queueing for an upstream that is down.
+#
+# After `open_seconds` the breaker is half-open: the next `probe_calls` calls go
+# through as probes. If they succeed it closes again; if one fails it re-opens for
+# twice as long as before (up to `max_open_seconds`).
+#
+# Callers degrade rather than fail where they can (see DEGRADED_MODES): judge
+# replies come back text-only when TTS is open, scores are provisional when
+# Gemini is open and the frontend shows a static avatar when HeyGen is open.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# provider -> degraded behaviour while its breaker is open, as reported by /health
+DEGRADED_MODES = {
+    "gemini": "provisional_scores",
+    "elevenlabs_tts": "text_only_replies",
+    "heygen": "static_avatar",
+}
+
+
+class CircuitOpenError(OverloadedError):
+    """The provider's breaker is open; retry after `retry_after` seconds."""
+
+    def __init__(self, provider: str, retry_after: float):
+        UpstreamError.__init__(self, provider, 503, f"{provider} is unavailable (circuit open), please retry",
+                               retry_after)
+
+
+class CircuitBreaker:
+    """Failure- and latency-rate breaker for one upstream provider."""
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5, failure_ratio: float = 0.5,
+                 slow_seconds: float = 10.0, slow_ratio: float = 0.5, open_seconds: float = 15.0,
+                 max_open_seconds: float = 120.0, probe_calls: int = 1):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_seconds = slow_seconds
+        self.slow_ratio = slow_ratio
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probe_calls = probe_calls
+        # (failed, slow) per finished call
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._open_seconds = open_seconds
+        self._opened_at = 0.0
+        self._probes = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self._open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected (open, or half-open with its probes taken)."""
+        state = self.state
+        return state == OPEN or state == HALF_OPEN and self._probes >= self.probe_calls
+
+    def retry_after(self) -> float:
+        return max(1.0, self._opened_at + self._open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """
+        Admit a call or raise CircuitOpenError. Returns True if the call is a probe;
+        the caller must then report it with record() or abandon().
+        """
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and self._probes < self.probe_calls:
+            self._probes += 1
+            return True
+        metrics.inc("circuit_rejections_total", provider=self.name)
+        raise CircuitOpenError(self.name, self.retry_after())
+
+    def record(self, probe: bool, duration: float, error: Optional[BaseException] = None) -> None:
+        """Report a finished call: `error` if it failed, else how long it took."""
+        failed = error is not None and counts_as_failure(error)
+        slow = duration >= self.slow_seconds
+        if failed or slow:
+            self._last_error = f"{type(error).__name__}: {error}"[:200] if failed else f"slow call ({duration:.1f}s)"
+        if probe:
+            self._probes -= 1
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._open(min(self.max_open_seconds, self._open_seconds * 2))
+                elif self._probes == 0:
+                    self._outcomes.clear()
+                    self._open_seconds = self.base_open_seconds
+                    self._transition(CLOSED)
+            return
+        self._outcomes.append((failed, slow))
+        if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = sum(1 for f, _ in self._outcomes if f) / len(self._outcomes)
+            slow_calls = sum(1 for _, s in self._outcomes if s) / len(self._outcomes)
+            if failures >= self.failure_ratio or slow_calls >= self.slow_ratio:
+                self._open(self.base_open_seconds)
+
+    def abandon(self, probe: bool, duration: float) -> None:
+        """A call cancelled by its caller: only counts (as slow) if it had already run too long."""
+        if duration >= self.slow_seconds:
+            self.record(probe, duration)
+        elif probe:
+            self._probes -= 1
+
+    def _open(self, seconds: float) -> None:
+        self._open_seconds = seconds
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+        print(f"🔌 {self.name} circuit opened for {seconds:.0f}s ({self._last_error})")
+
+    def _transition(self, state: str) -> None:
+        if state == CLOSED and self._state != CLOSED:
+            print(f"🔌 {self.name} circuit closed")
+        self._state = state
+        metrics.inc("circuit_transitions_total", provider=self.name, state=state)
+
+    def stats(self) -> dict:
+        outcomes = len(self._outcomes)
+        return {
+            "state": self.state,
+            "calls_in_window": outcomes,
+            "failure_ratio": round(sum(1 for f, _ in self._outcomes if f) / outcomes, 3) if outcomes else 0.0,
+            "slow_ratio": round(sum(1 for _, s in self._outcomes if s) / outcomes, 3) if outcomes else 0.0,
+            "retry_after_s": round(self.retry_after(), 1) if self._state == OPEN else None,
+            "last_error": self._last_error,
+        }
+
+
+def counts_as_failure(exc: BaseException) -> bool:
+    """Upstream outages count; our own shedding, rate limits (429) and client errors don't."""
+    if isinstance(exc, (OverloadedError, asyncio.CancelledError)):
+        return False
+    status, _ = classify_error(exc)
+    return status != 429 and is_retryable(exc)
+
+
+# provider -> (slow call seconds, open seconds); the rest are shared defaults
+BREAKER_DEFAULTS = {
+    "gemini": (15.0, 15.0),
+    "gemini_cache": (10.0, 30.0),
+    "elevenlabs_tts": (6.0, 15.0),
+    "elevenlabs_stt": (15.0, 15.0),
+    "heygen": (5.0, 30.0),
+}
+
+
+def _env(provider: str, setting: str, default):
+    value = os.getenv(f"BREAKER_{provider.upper()}_{setting}")
+    return type(default)(value) if value else default
+
+
+def create_breaker(provider: str) -> Optional[CircuitBreaker]:
+    """
+    A breaker for `provider`, or None if disabled (BREAKERS=0). Thresholds can be
+    overridden per provider with BREAKER_<PROVIDER>_{WINDOW,MIN_CALLS,FAILURE_RATIO,
+    SLOW_SECONDS,SLOW_RATIO,OPEN_SECONDS,MAX_OPEN_SECONDS,PROBES}.
+    """
+    if os.getenv("BREAKERS", "1").lower() in ("0", "false", "no"):
+        return None
+    slow_seconds, open_seconds = BREAKER_DEFAULTS.get(provider, (10.0, 15.0))
+    return CircuitBreaker(
+        provider,
+        window=_env(provider, "WINDOW", 20),
+        min_calls=_env(provider, "MIN_CALLS", 5),
+        failure_ratio=_env(provider, "FAILURE_RATIO", 0.5),
+        slow_seconds=_env(provider, "SLOW_SECONDS", slow_seconds),
+        slow_ratio=_env(provider, "SLOW_RATIO", 0.5),
+        open_seconds=_env(provider, "OPEN_SECONDS", open_seconds),
+        max_open_seconds=_env(provider, "MAX_OPEN_SECONDS", 120.0),
+        probe_calls=_env(provider, "PROBES", 1),
+    )
+
+
+def health() -> Dict[str, dict]:
+    """Breaker state per provider and which degraded modes are in effect."""
+    from services.governor import _governors
+
+    breakers = {name: g.breaker.stats() for name, g in _governors.items() if g.breaker is not None}
+    degraded = {mode: breakers.get(provider, {}).get("state", CLOSED) != CLOSED
+                for provider, mode in DEGRADED_MODES.items()}
+    return {"status": "degraded" if any(b["state"] != CLOSED for b in breakers.values()) else "ok",
+            "breakers": breakers, "degraded_modes": degraded}
+
+
+metrics.register_collector("breakers", lambda: health()["breakers"])
@@ -0,0 +1,538 @@
+# services/cache.py
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import unquote, urlparse
+
+from services import metrics
+from services.config import data_path
+
+# Two-tier cache shared by the API modules. Each namespace (auth, tts, score,
+# history, ...) has an in-process LRU in front of an optional shared tier that
+# every uvicorn worker on the host sees:
+#
+#   CACHE_SHARED=none (default)   local LRU only
+#   CACHE_SHARED=sqlite           a SQLite file (CACHE_SQLITE_PATH, default
+#                                 DATA_DIR/pitch-cache.sqlite3), WAL mode
+#   CACHE_SHARED=redis://host:6379/0
+#                                 any Redis-protocol server; bench/resp_server.py
+#                                 is a local stand-in
+#
+# Values are stored encoded (see encode()), so the local tier's size bound is
+# exact and callers never share a mutable object through it. A miss is loaded
+# once per key: concurrent callers in a worker wait on the same load, and
+# across workers a short lease in the shared tier lets one worker load while
+# the others poll for its result.
+#
+# The cache is an optimization only: shared-tier errors are logged and count
+# as misses, never as request failures.
+
+# Encoded value header: one byte of format, then the payload
+_RAW = b"\x00"        # bytes as-is (audio)
+_JSON = b"\x01"       # UTF-8 JSON
+_JSON_ZLIB = b"\x02"  # zlib-compressed JSON
+# JSON payloads at least this long are compressed when that saves 10% or more
+COMPRESS_MIN_BYTES = 1024
+
+_orjson = None
+
+
+def _json_dumps(value: Any) -> bytes:
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    if _orjson:
+        try:
+            return _orjson.dumps(value)
+        except TypeError:
+            # Non-string dict keys and the like; the stdlib encoder coerces them
+            pass
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def encode(value: Any) -> bytes:
+    """Serialize a bytes or JSON-compatible value to its cached form."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _RAW + bytes(value)
+    payload = _json_dumps(value)
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) <= len(payload) * 0.9:
+            return _JSON_ZLIB + compressed
+    return _JSON + payload
+
+
+def decode(data: bytes) -> Any:
+    header, payload = data[:1], memoryview(data)[1:]
+    if header == _RAW:
+        return bytes(payload)
+    if header == _JSON_ZLIB:
+        return json.loads(zlib.decompress(payload))
+    if header == _JSON:
+        return json.loads(bytes(payload))
+    raise ValueError(f"unknown cache encoding {header!r}")
+
+
+def digest(*parts: Any) -> str:
+    """Stable key for a value: sha256 of its JSON form."""
+    return hashlib.sha256(_json_dumps(parts)).hexdigest()
+
+
+class LocalLRU:
+    """In-process tier: encoded values bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: str, data: bytes, ttl: float) -> None:
+        if len(data) > self.max_bytes:
+            return
+        self.delete(key)
+        self._entries[key] = (data, time.monotonic() + ttl)
+        self.bytes += len(data)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[0])
+
+
+class SQLiteStore:
+    """
+    Shared tier in a SQLite file, for workers on one host. Operations run on a
+    worker thread so a busy database never blocks the event loop.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, purge_every: int = 500):
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _run(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        row = self._run("SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: bytes, ttl: float, only_if_absent: bool = False) -> bool:
+        now = time.time()
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self._run("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        if only_if_absent:
+            self._run("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            return self._run("INSERT OR IGNORE INTO cache VALUES (?, ?, ?)", (key, value, now + ttl)).rowcount == 1
+        self._run("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, value, now + ttl))
+        return True
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set only if the key is absent (or expired); True if this call set it."""
+        return await asyncio.to_thread(self._set, key, value, ttl, True)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._run, "DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RespError(Exception):
+    pass
+
+
+class RespStore:
+    """
+    Shared tier on a Redis-protocol server, speaking just enough RESP for
+    GET / SET PX [NX] / DEL over one pipelined-by-lock connection per event loop.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, timeout: float = 1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._conn: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self._conn = (reader, writer)
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", str(self.db))
+        return self._conn
+
+    async def _roundtrip(self, *args: Union[str, bytes]) -> Any:
+        reader, writer = self._conn
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg.encode("utf-8") if isinstance(arg, str) else arg
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        writer.write(b"".join(parts))
+        await writer.drain()
+        return await self._read_reply(reader)
+
+    async def _read_reply(self, reader: asyncio.StreamReader) -> Any:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RespError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            return None if size < 0 else (await reader.readexactly(size + 2))[:-2]
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [await self._read_reply(reader) for _ in range(size)]
+        raise ConnectionError(f"unexpected reply {line!r}")
+
+    async def command(self, *args: Union[str, bytes]) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Streams are bound to the loop that opened them
+            self._loop, self._lock, self._conn = loop, asyncio.Lock(), None
+        async with self._lock:
+            try:
+                if self._conn is None:
+                    await asyncio.wait_for(self._connect(), self.timeout)
+                return await asyncio.wait_for(self._roundtrip(*args), self.timeout)
+            except RespError:
+                # An error reply was read in full; the connection is still in step
+                raise
+            except BaseException:
+                # Anything else, cancellation included, can leave a reply unread on the
+                # socket for the next command to take as its own: drop the connection
+                if self._conn is not None:
+                    self._conn[1].close()
+                self._conn = None
+                raise
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.command("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.command("SET", key, value, "PX", str(max(1, int(ttl * 1000))))
+
+    async def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return await self.command("SET", key, value, "PX", str(max(1, int(ttl * 1000))), "NX") == "OK"
+
+    async def delete(self, key: str) -> None:
+        await self.command("DEL", key)
+
+
+class Cache:
+    """
+    One namespace of the cache.
+
+    Args:
+        namespace: Key prefix and metrics label
+        ttl: Seconds an entry lives; 0 disables the namespace (get_or_set always loads)
+        shared: Shared tier, or None for local-only
+        local: Keep a local tier in front of the shared one. Turn off for values that
+            change in place (write-through), where another worker's local copy would go stale;
+            without a shared tier the namespace then caches nothing
+        max_entries, max_bytes: Local tier bounds
+        lease_seconds: How long one worker may hold a key's load before others load too
+    """
+
+    def __init__(self, namespace: str, ttl: float, shared=None, local: bool = True, max_entries: int = 1024,
+                 max_bytes: int = 16 * 1024 * 1024, lease_seconds: float = 10.0):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.shared = shared
+        self.local = LocalLRU(max_entries, max_bytes) if local else None
+        self.lease_seconds = lease_seconds
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and (self.local is not None or self.shared is not None)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _shared_failed(self, op: str, error: Exception) -> None:
+        metrics.inc("cache_errors_total", namespace=self.namespace, op=op)
+        print(f"⚠️ Shared cache {op} failed for {self.namespace} ({error!r}); treating as a miss")
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Cached value, or None."""
+        if not self.enabled:
+            return None
+        full_key = self._key(key)
+        if self.local is not None:
+            data = self.local.get(full_key)
+            metrics.inc("cache_requests_total", namespace=self.namespace, tier="local",
+                        result="miss" if data is None else "hit")
+            if data is not None:
+                return decode(data)
+        if self.shared is None:
+            return None
+        try:
+            data = await self.shared.get(full_key)
+        except Exception as e:
+            self._shared_failed("get", e)
+            data = None
+        metrics.inc("cache_requests_total", namespace=self.namespace, tier="shared",
+                    result="miss" if data is None else "hit")
+        if data is None:
+            return None
+        if self.local is not None:
+            self.local.set(full_key, data, self.ttl)
+        return decode(data)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if not self.enabled or value is None:
+            return
+        ttl = ttl or self.ttl
+        full_key, data = self._key(key), encode(value)
+        if self.local is not None:
+            self.local.set(full_key, data, ttl)
+        if self.shared is not None:
+            try:
+                await self.shared.set(full_key, data, ttl)
+            except Exception as e:
+                self._shared_failed("set", e)
+        metrics.inc("cache_stored_bytes_total", len(data), namespace=self.namespace)
+
+    async def delete(self, key: str) -> None:
+        full_key = self._key(key)
+        if self.local is not None:
+            self.local.delete(full_key)
+        if self.shared is not None:
+            try:
+                await self.shared.delete(full_key)
+            except Exception as e:
+                self._shared_failed("delete", e)
+
+    async def get_or_set(self, key: str, loader: Callable[[], Union[Any, Awaitable[Any]]],
+                         ttl: Optional[float] = None, cache_if: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Cached value for `key`, else `loader()`'s (sync or async), stored unless it is
+        None or `cache_if(value)` is false. Loads are coalesced within the worker and,
+        with a shared tier, across workers.
+        """
+        if not self.enabled:
+            return await _call(loader)
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            metrics.inc("cache_coalesced_total", namespace=self.namespace)
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling() or not flight.cancelled():
+                    raise
+                # The loading request went away; load for ourselves below
+
+        flight = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._load(key, loader, ttl, cache_if)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            # Retrieved on behalf of followers that may not exist
+            flight.exception()
+            raise
+        else:
+            flight.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+
+    async def _load(self, key: str, loader, ttl: Optional[float], cache_if) -> Any:
+        lease = None
+        if self.shared is not None and self.lease_seconds > 0:
+            lease = await self._acquire_lease(key)
+            if lease is None:
+                value = await self._wait_for_peer(key)
+                if value is not None:
+                    return value
+        try:
+            started = time.perf_counter()
+            value = await _call(loader)
+            metrics.inc("cache_loads_total", namespace=self.namespace)
+            metrics.observe("cache_load_seconds", time.perf_counter() - started, namespace=self.namespace)
+            if value is not None and (cache_if is None or cache_if(value)):
+                await self.set(key, value, ttl)
+            return value
+        finally:
+            if lease is not None:
+                await self._release_lease(key, lease)
+
+    async def _acquire_lease(self, key: str) -> Optional[bytes]:
+        """A token if this worker now holds the key's load lease, else None. Errors grant it."""
+        token = uuid.uuid4().bytes
+        try:
+            if await self.shared.add(self._key(key) + ":lease", token, self.lease_seconds):
+                return token
+        except Exception as e:
+            self._shared_failed("lease", e)
+            return token
+        return None
+
+    async def _release_lease(self, key: str, token: bytes) -> None:
+        lease_key = self._key(key) + ":lease"
+        try:
+            # Not atomic, but a lease that expired and was re-taken is only deleted early
+            if await self.shared.get(lease_key) == token:
+                await self.shared.delete(lease_key)
+        except Exception as e:
+            self._shared_failed("lease", e)
+
+    async def _wait_for_peer(self, key: str) -> Optional[Any]:
+        """Poll the shared tier while another worker loads `key`; None if it never lands."""
+        deadline = time.monotonic() + self.lease_seconds
+        delay = 0.01
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.2)
+            try:
+                data = await self.shared.get(self._key(key))
+            except Exception as e:
+                self._shared_failed("get", e)
+                break
+            if data is not None:
+                metrics.inc("cache_lease_waits_total", namespace=self.namespace, result="filled")
+                if self.local is not None:
+                    self.local.set(self._key(key), data, self.ttl)
+                return decode(data)
+        metrics.inc("cache_lease_waits_total", namespace=self.namespace, result="timeout")
+        return None
+
+    def stats(self) -> dict:
+        def count(tier: str, result: str) -> float:
+            return metrics.get_counter("cache_requests_total", namespace=self.namespace, tier=tier, result=result)
+
+        local_hits, shared_hits = count("local", "hit"), count("shared", "hit")
+        lookups = local_hits + count("local", "miss") if self.local is not None \
+            else shared_hits + count("shared", "miss")
+        return {
+            "ttl": self.ttl,
+            "local_hits": local_hits,
+            "shared_hits": shared_hits,
+            "lookups": lookups,
+            "hit_ratio": round((local_hits + shared_hits) / lookups, 4) if lookups else 0.0,
+            "loads": metrics.get_counter("cache_loads_total", namespace=self.namespace),
+            "coalesced": metrics.get_counter("cache_coalesced_total", namespace=self.namespace),
+            "lease_waits": metrics.get_counter("cache_lease_waits_total", namespace=self.namespace, result="filled"),
+            "local_entries": len(self.local) if self.local is not None else None,
+            "local_bytes": self.local.bytes if self.local is not None else None,
+        }
+
+
+async def _call(loader: Callable[[], Union[Any, Awaitable[Any]]]) -> Any:
+    result = loader()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+_shared_store = None
+_shared_configured = False
+_caches: Dict[str, Cache] = {}
+
+
+def get_shared_store():
+    """The shared tier selected by CACHE_SHARED (none, sqlite or a redis:// URL), or None."""
+    global _shared_store, _shared_configured
+    if not _shared_configured:
+        _shared_configured = True
+        setting = os.getenv("CACHE_SHARED", "none").strip()
+        try:
+            if setting.startswith(("redis://", "rediss://")):
+                if setting.startswith("rediss://"):
+                    raise ValueError("TLS (rediss://) is not supported")
+                _shared_store = RespStore(setting)
+            elif setting.lower() == "sqlite":
+                _shared_store = SQLiteStore(
+                    os.getenv("CACHE_SQLITE_PATH") or data_path("pitch-cache.sqlite3")
+                )
+            elif setting.lower() not in ("", "none", "0", "false"):
+                raise ValueError(f"unknown CACHE_SHARED value {setting!r}")
+        except (ValueError, sqlite3.Error) as e:
+            print(f"⚠️ Shared cache disabled ({e}); caching in-process only")
+        if _shared_store is not None:
+            print(f"🗄️ Shared cache tier: {_shared_store.name}")
+    return _shared_store
+
+
+def get_cache(namespace: str, ttl: float, **options) -> Cache:
+    """
+    The cache for `namespace`, created on first use. CACHE_<NAMESPACE>_TTL_SECONDS
+    overrides `ttl` (0 disables the namespace); other options are Cache's.
+    """
+    cache = _caches.get(namespace)
+    if cache is None:
+        ttl = float(os.getenv(f"CACHE_{namespace.upper()}_TTL_SECONDS", ttl))
+        cache = _caches[namespace] = Cache(namespace, ttl, get_shared_store(), **options)
+    return cache
+
+
+metrics.register_collector("cache", lambda: {
+    "shared": _shared_store.name if _shared_store is not None else None,
+    "namespaces": {name: cache.stats() for name, cache in _caches.items()},
+})
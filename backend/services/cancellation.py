@@ -0,0 +1,181 @@
+# services/cancellation.py
+import asyncio
+import time
+from typing import TYPE_CHECKING, Awaitable, Dict, Optional
+
+from services import metrics
+
+if TYPE_CHECKING:
+    from starlette.requests import Request
+
+# Cooperative cancellation for judge turns. A turn's upstream work (LLM, then
+# TTS) runs as a task that is cancelled as soon as the client disconnects or
+# the founder barges in (POST /judges/interrupt). Cancelling the task aborts the
+# in-flight HTTP calls, so upstream capacity is released immediately.
+#
+# In-flight turns are tracked per process; with several workers an interrupt
+# only reaches turns running in the worker that receives it (truncation of an
+# already-persisted reply works from any worker).
+
+# Stages in the order a turn runs them, with the upstream provider each one uses
+STAGES = (("llm", "gemini"), ("tts", "elevenlabs_tts"))
+
+DISCONNECT_POLL_SECONDS = 0.25
+
+
+class TurnCancelled(Exception):
+    def __init__(self, reason: str, heard_text: Optional[str] = None):
+        super().__init__(f"turn cancelled ({reason})")
+        self.reason = reason
+        self.heard_text = heard_text
+
+
+class Turn:
+    """One in-flight judge reply for a conversation."""
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.stage: Optional[str] = None
+        self.stage_started = time.monotonic()
+        self.reason: Optional[str] = None
+        # The generated reply, once there is one, and what the founder says they heard of it
+        self.reply: Optional[str] = None
+        self.heard_text: Optional[str] = None
+        self.heard_fraction: Optional[float] = None
+        self._cancelled = asyncio.Event()
+
+    def enter(self, stage: Optional[str]) -> None:
+        """Mark the start of a stage (None when done), timing the previous one."""
+        now = time.monotonic()
+        if self.stage is not None:
+            metrics.observe("turn_stage_seconds", now - self.stage_started, stage=self.stage)
+        self.stage, self.stage_started = stage, now
+
+    def cancel(self, reason: str, heard_text: Optional[str] = None, heard_fraction: Optional[float] = None) -> None:
+        if self._cancelled.is_set():
+            return
+        self.reason = reason
+        self.heard_text = heard_text
+        self.heard_fraction = heard_fraction
+        self._cancelled.set()
+
+    def heard(self) -> str:
+        """What the founder heard of the reply; nothing if it wasn't generated yet."""
+        if self.reply is None:
+            return ""
+        return resolve_heard(self.reply, self.heard_text, self.heard_fraction) or ""
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def saved_upstream_seconds(self) -> Dict[str, float]:
+        """
+        Estimate the upstream time cancellation avoided, per provider: the rest of
+        the current stage plus every later stage, from median stage durations.
+        """
+        saved: Dict[str, float] = {}
+        remaining = False
+        for stage, provider in STAGES:
+            if stage == self.stage:
+                remaining = True
+                typical = metrics.percentile("turn_stage_seconds", 50, stage=stage) or 0.0
+                saved[provider] = max(0.0, typical - (time.monotonic() - self.stage_started))
+            elif remaining:
+                saved[provider] = metrics.percentile("turn_stage_seconds", 50, stage=stage) or 0.0
+        return saved
+
+
+class TurnRegistry:
+    def __init__(self):
+        self._active: Dict[str, Turn] = {}
+
+    def begin(self, conversation_id: str) -> Turn:
+        previous = self._active.get(conversation_id)
+        if previous is not None:
+            # A new message while the judge is still answering is a barge-in too
+            previous.cancel("superseded")
+        turn = self._active[conversation_id] = Turn(conversation_id)
+        return turn
+
+    def finish(self, turn: Turn) -> None:
+        turn.enter(None)
+        if self._active.get(turn.conversation_id) is turn:
+            del self._active[turn.conversation_id]
+
+    def interrupt(self, conversation_id: str, heard_text: Optional[str] = None,
+                  heard_fraction: Optional[float] = None) -> Optional[Turn]:
+        """Cancel the conversation's in-flight turn, if any, returning it."""
+        turn = self._active.get(conversation_id)
+        if turn is not None:
+            turn.cancel("interrupt", heard_text, heard_fraction)
+        return turn
+
+    async def run(self, turn: Turn, work: Awaitable, request: Optional["Request"] = None):
+        """
+        Await `work` unless the turn is cancelled or the client disconnects first,
+        in which case the work is cancelled and TurnCancelled is raised.
+        """
+        task = asyncio.ensure_future(work)
+        cancelled = asyncio.create_task(turn._cancelled.wait())
+        try:
+            while not task.done():
+                await asyncio.wait({task, cancelled}, timeout=DISCONNECT_POLL_SECONDS,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if task.done():
+                    break
+                if not turn.cancelled and request is not None and await request.is_disconnected():
+                    turn.cancel("disconnect")
+                if turn.cancelled:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    self._record_cancellation(turn)
+                    raise TurnCancelled(turn.reason, turn.heard())
+            return task.result()
+        finally:
+            cancelled.cancel()
+
+    def _record_cancellation(self, turn: Turn) -> None:
+        metrics.inc("turns_cancelled_total", reason=turn.reason, stage=turn.stage or "none")
+        for provider, seconds in turn.saved_upstream_seconds().items():
+            metrics.inc("upstream_seconds_saved_total", seconds, provider=provider)
+        print(f"✋ Turn for {turn.conversation_id} cancelled ({turn.reason}) during {turn.stage}")
+
+    def stats(self) -> dict:
+        return {
+            "active_turns": len(self._active),
+            "saved_upstream_seconds": {
+                provider: round(metrics.get_counter("upstream_seconds_saved_total", provider=provider), 3)
+                for _, provider in STAGES
+            },
+        }
+
+
+def heard_prefix(reply: str, heard_fraction: float) -> str:
+    """The part of `reply` played before playback stopped, cut back to a word boundary."""
+    cut = int(len(reply) * max(0.0, min(1.0, heard_fraction)))
+    if cut >= len(reply):
+        return reply
+    prefix = reply[:cut]
+    return prefix[:prefix.rfind(" ")] if " " in prefix else ""
+
+
+def resolve_heard(reply: str, heard_text: Optional[str], heard_fraction: Optional[float]) -> Optional[str]:
+    """
+    What the founder heard of `reply`: `heard_text` if it is a prefix of the reply,
+    else the part `heard_fraction` covers; None if neither applies. The client's
+    text is never stored as the judge's words unless the judge said them.
+    """
+    if heard_text is not None:
+        heard = heard_text.strip()
+        if reply.startswith(heard):
+            return heard
+        metrics.inc("heard_text_rejected_total")
+    if heard_fraction is not None:
+        return heard_prefix(reply, heard_fraction)
+    return None
+
+
+turn_registry = TurnRegistry()
+
+metrics.register_collector("turns", turn_registry.stats)
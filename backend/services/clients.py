@@ -0,0 +1,123 @@
+# services/clients.py
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, List
+
+from services.config import load_config
+
+# Provider SDKs are imported on first use rather than at module import:
+# google.genai alone adds close to a second to cold start.
+if TYPE_CHECKING:
+    from elevenlabs.client import AsyncElevenLabs, ElevenLabs
+    from google import genai
+    from supabase import Client
+
+
+@lru_cache(maxsize=1)
+def get_gemini_client() -> "genai.Client":
+    load_config()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("Missing GEMINI_API_KEY in environment.")
+    from google import genai
+
+    # GEMINI_API_BASE_URL points the SDK at a local stand-in (see bench/stubs.py)
+    base_url = os.getenv("GEMINI_API_BASE_URL")
+    return genai.Client(api_key=api_key, http_options={"base_url": base_url} if base_url else None)
+
+
+def get_supabase_client(user_token: str = None) -> "Client":
+    # Every request used to build its own client: about 50 ms of event-loop time
+    # each, which under load stalled every other request on the loop. The client
+    # holds no user session (tokens are verified separately), so one is shared.
+    return _get_anon_supabase_client()
+
+
+@lru_cache(maxsize=1)
+def _get_anon_supabase_client() -> "Client":
+    load_config()
+    url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+    anon_key = os.getenv("SUPABASE_KEY") or os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY")
+
+    if not url or not anon_key:
+        raise RuntimeError("Missing Supabase configuration. Please set SUPABASE_URL and SUPABASE_KEY or NEXT_PUBLIC_SUPABASE_URL and NEXT_PUBLIC_SUPABASE_ANON_KEY")
+    from supabase import create_client
+
+    # Create client with anon key - we'll verify the user token separately
+    return create_client(url, anon_key)
+
+
+@lru_cache(maxsize=1)
+def get_supabase_service_client() -> "Client":
+    """
+    Client with the service-role key, which bypasses row-level security. Only for
+    server-side writes to tables users may read but not write (the performance
+    analytics), always scoped to a user the caller has already authenticated.
+    """
+    load_config()
+    url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+    service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        raise RuntimeError("Missing Supabase service-role configuration. Please set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
+    from supabase import create_client
+
+    return create_client(url, service_key)
+
+
+@lru_cache(maxsize=1)
+def get_elevenlabs_client() -> "ElevenLabs":
+    load_config()
+    api_key = os.getenv("ELEVENLABS_API_KEY")
+    if not api_key:
+        raise RuntimeError("Missing ELEVENLABS_API_KEY in environment.")
+    from elevenlabs.client import ElevenLabs
+
+    return ElevenLabs(api_key=api_key, base_url=get_elevenlabs_base_url())
+
+
+@lru_cache(maxsize=1)
+def get_async_elevenlabs_client() -> "AsyncElevenLabs":
+    """Async client: awaiting its streams lets cancellation stop audio mid-generation."""
+    load_config()
+    api_key = os.getenv("ELEVENLABS_API_KEY")
+    if not api_key:
+        raise RuntimeError("Missing ELEVENLABS_API_KEY in environment.")
+    from elevenlabs.client import AsyncElevenLabs
+
+    return AsyncElevenLabs(api_key=api_key, base_url=get_elevenlabs_base_url())
+
+
+def get_elevenlabs_base_url() -> str:
+    load_config()
+    return os.getenv("ELEVENLABS_API_URL", "https://api.elevenlabs.io")
+
+
+# --- Pre-warming ---
+_prewarm_hooks: List[Callable[[], object]] = []
+
+
+def register_prewarm_hook(fn: Callable[[], object]) -> None:
+    """Register extra work (e.g. loading personas) to run when the process is pre-warmed."""
+    _prewarm_hooks.append(fn)
+
+
+def prewarm() -> None:
+    """
+    Import provider SDKs and build clients ahead of the first request.
+    Blocking; run it in a thread. Missing credentials are skipped, not fatal.
+    """
+    for name, fn in (
+        ("gemini", get_gemini_client),
+        ("elevenlabs", get_elevenlabs_client),
+        ("supabase", get_supabase_client),
+    ):
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠️ Pre-warm skipped {name}: {e}")
+    for hook in _prewarm_hooks:
+        try:
+            hook()
+        except Exception as e:
+            print(f"⚠️ Pre-warm hook {getattr(hook, '__name__', hook)} failed: {e}")
+    print("🔥 Pre-warm complete")
@@ -0,0 +1,37 @@
+# services/config.py
+import os
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# Where durable local state (SQLite stores holding user data) lives unless a
+# store's own *_PATH setting says otherwise; DATA_DIR overrides it
+DEFAULT_DATA_DIR = os.path.join(BACKEND_DIR, "data")
+
+# Repo-root .env.local (shared with the Next.js app) first, then backend/.env.local
+ENV_FILES = (
+    os.path.join(BACKEND_DIR, "..", ".env.local"),
+    os.path.join(BACKEND_DIR, ".env.local"),
+)
+
+_loaded = False
+
+
+def load_config() -> None:
+    """
+    Load environment files once per process. Safe to call from every module;
+    only the first call touches the filesystem.
+    """
+    global _loaded
+    if _loaded:
+        return
+    from dotenv import load_dotenv
+
+    for path in ENV_FILES:
+        load_dotenv(dotenv_path=path)
+    _loaded = True
+
+
+def data_path(filename: str) -> str:
+    """`filename` inside DATA_DIR (default backend/data), creating the directory."""
+    directory = os.getenv("DATA_DIR") or DEFAULT_DATA_DIR
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
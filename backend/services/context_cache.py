@@ -0,0 +1,269 @@
+# services/context_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import metrics
+from services.clients import get_gemini_client
+from services.governor import get_governor
+
+# Provider-side context caching for Gemini. A judge conversation resends the
+# persona prompt and the whole history every turn; once that prefix is long
+# enough, it is registered with the provider as cached content and later turns
+# send only the new suffix plus the cache handle.
+#
+# Handles are tracked per (conversation, model) because a cache is bound to the
+# model it was created for. Caches are (re)built in the background, so a turn
+# never waits on cache creation: the turn that crosses the threshold goes out
+# uncached and the next one picks up the handle.
+#
+# Locally, bench/stubs.py emulates the cachedContents API (TTL expiry, model
+# checks, cached-token accounting) so this can be exercised without Gemini.
+
+
+@dataclass
+class CacheEntry:
+    name: str
+    model: str
+    # Number of leading contents covered by the cache
+    turns: int
+    digest: str
+    chars: int
+    expire_at: float
+
+
+def _text_chars(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_text_chars(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_text_chars(v) for v in value)
+    return 0
+
+
+def _digest(system_instruction: str, contents: List[dict]) -> str:
+    payload = json.dumps([system_instruction, contents], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GeminiCacheAPI:
+    """Thin async wrapper over client.aio.caches, under its own governor so background
+    cache management never competes with generation for rate-limit tokens."""
+
+    async def create(self, model: str, system_instruction: str, contents: List[dict], ttl_seconds: int,
+                     display_name: str) -> Tuple[str, float]:
+        client = get_gemini_client()
+        config = {"ttl": f"{ttl_seconds}s", "display_name": display_name[:120]}
+        if system_instruction:
+            config["system_instruction"] = system_instruction
+        if contents:
+            config["contents"] = contents
+        cache = await get_governor("gemini_cache").run(lambda: client.aio.caches.create(model=model, config=config))
+        expire_at = cache.expire_time.timestamp() if cache.expire_time else time.time() + ttl_seconds
+        return cache.name, expire_at
+
+    async def delete(self, name: str) -> None:
+        client = get_gemini_client()
+        await get_governor("gemini_cache").run(lambda: client.aio.caches.delete(name=name))
+
+
+class ContextCache:
+    """
+    Tracks cached-content handles and rewrites requests to use them.
+
+    Args:
+        api: Object with async create(...) -> (name, expire_at) and delete(name)
+        min_chars: Smallest prefix worth caching (the provider enforces a token minimum)
+        rebuild_chars: Uncached tail length that triggers re-caching a longer prefix
+        ttl_seconds: Lifetime requested for each cache
+        refresh_margin: Treat a cache as gone this many seconds before it expires
+        max_entries: Bound on tracked handles; the least recently used is deleted
+        delete_grace: Delay before deleting a replaced cache, so requests already
+            holding its handle can finish
+    """
+
+    def __init__(self, api=None, min_chars: int = 16384, rebuild_chars: int = 4096, ttl_seconds: int = 900,
+                 refresh_margin: float = 30.0, max_entries: int = 1000, delete_grace: float = 60.0):
+        self.api = api or GeminiCacheAPI()
+        self.min_chars = min_chars
+        self.rebuild_chars = rebuild_chars
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+        self.delete_grace = delete_grace
+        self._entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self._building: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def _valid(self, entry: CacheEntry, model: str, system_instruction: str, contents: List[dict]) -> bool:
+        return (
+            entry.model == model
+            and entry.expire_at - self.refresh_margin > time.time()
+            and entry.turns <= len(contents)
+            and entry.digest == _digest(system_instruction, contents[:entry.turns])
+        )
+
+    async def prepare(self, key: str, model: str, contents: List[dict], config: Optional[dict] = None,
+                      shared_key: Optional[str] = None, create: bool = True) -> Tuple[List[dict], dict]:
+        """
+        Rewrite a request to use cached content where possible.
+
+        Args:
+            key: Conversation id the history belongs to
+            model: Model the request will be sent to (caches are per model)
+            contents: Full Gemini contents; everything but the last item is treated as stable
+            config: Generation config, possibly carrying system_instruction
+            shared_key: Key for a cache of the system instruction alone (e.g. the persona),
+                used while the conversation has no cache of its own
+            create: Whether a missing or stale cache may be (re)built in the background
+
+        Returns:
+            (contents, config) to send: either unchanged, or the uncached suffix with
+            cached_content set and system_instruction removed
+        """
+        config = dict(config or {})
+        system_instruction = config.get("system_instruction") or ""
+        stable = contents[:-1]
+
+        entry = self._lookup(key, model, system_instruction, contents)
+        if entry is None and shared_key:
+            entry = self._lookup(shared_key, model, system_instruction, contents)
+            if entry is None and create and len(system_instruction) >= self.min_chars:
+                self._build(shared_key, model, system_instruction, [])
+
+        covered = entry.turns if entry else 0
+        prefix_chars = len(system_instruction) + _text_chars(stable)
+        tail_chars = _text_chars(stable[covered:])
+        # With no history yet, the shared cache already covers everything stable
+        worth_caching = create and prefix_chars >= self.min_chars and (stable or not shared_key)
+        if worth_caching and (entry is None or tail_chars >= self.rebuild_chars):
+            self._build(key, model, system_instruction, stable)
+
+        if entry is None:
+            metrics.inc("context_cache_requests_total", result="miss")
+            return contents, config
+
+        metrics.inc("context_cache_requests_total", result="hit")
+        metrics.inc("context_cache_chars_saved_total", entry.chars)
+        config.pop("system_instruction", None)
+        config["cached_content"] = entry.name
+        return contents[covered:], config
+
+    def _lookup(self, key: str, model: str, system_instruction: str, contents: List[dict]) -> Optional[CacheEntry]:
+        entry = self._entries.get((key, model))
+        if entry is None:
+            return None
+        if not self._valid(entry, model, system_instruction, contents):
+            # Expired or the history diverged (e.g. conversation restarted)
+            self._drop((key, model))
+            return None
+        self._entries.move_to_end((key, model))
+        return entry
+
+    def _build(self, key: str, model: str, system_instruction: str, contents: List[dict]) -> None:
+        slot = (key, model)
+        if slot in self._building:
+            return
+        self._building[slot] = asyncio.create_task(self._create(slot, system_instruction, list(contents)))
+
+    async def _create(self, slot: Tuple[str, str], system_instruction: str, contents: List[dict]) -> None:
+        key, model = slot
+        started = time.monotonic()
+        try:
+            name, expire_at = await self.api.create(model, system_instruction, contents, self.ttl_seconds,
+                                                    display_name=f"judge:{key}")
+        except Exception as e:
+            # Below the provider's minimum, quota, etc.: requests just stay uncached
+            metrics.inc("context_cache_create_errors_total")
+            print(f"⚠️ Context cache creation failed for {key}: {e}")
+            return
+        finally:
+            self._building.pop(slot, None)
+
+        metrics.inc("context_cache_creates_total")
+        metrics.observe("context_cache_create_seconds", time.monotonic() - started)
+        self._drop(slot)
+        self._entries[slot] = CacheEntry(
+            name=name,
+            model=model,
+            turns=len(contents),
+            digest=_digest(system_instruction, contents),
+            chars=len(system_instruction) + _text_chars(contents),
+            expire_at=expire_at,
+        )
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, slot: Tuple[str, str]) -> None:
+        entry = self._entries.pop(slot, None)
+        if entry is not None and entry.expire_at > time.time():
+            # Stop paying storage for caches we'll never use again
+            asyncio.create_task(self._delete(entry.name))
+
+    async def _delete(self, name: str) -> None:
+        await asyncio.sleep(self.delete_grace)
+        try:
+            await self.api.delete(name)
+            metrics.inc("context_cache_deletes_total")
+        except Exception as e:
+            print(f"⚠️ Failed to delete context cache {name}: {e}")
+
+    def forget(self, key: str) -> None:
+        """Delete every cache held for a conversation (e.g. when it ends)."""
+        for slot in [slot for slot in self._entries if slot[0] == key]:
+            self._drop(slot)
+
+    def stats(self) -> dict:
+        hits = metrics.get_counter("context_cache_requests_total", result="hit")
+        misses = metrics.get_counter("context_cache_requests_total", result="miss")
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "building": len(self._building),
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "chars_saved": metrics.get_counter("context_cache_chars_saved_total"),
+            "min_chars": self.min_chars,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def to_gemini_contents(messages: List[dict]) -> Tuple[str, List[dict]]:
+    """
+    Split role/content messages into (system_instruction, Gemini contents).
+    System messages become the system instruction; assistant turns use the "model" role.
+    """
+    system = "\n\n".join(msg["content"] for msg in messages if msg["role"] == "system")
+    contents = [
+        {"role": "model" if msg["role"] == "assistant" else "user", "parts": [{"text": msg["content"]}]}
+        for msg in messages
+        if msg["role"] != "system"
+    ]
+    return system, contents
+
+
+_cache: Optional[ContextCache] = None
+
+
+def get_context_cache() -> Optional[ContextCache]:
+    """
+    The shared context cache, or None unless CONTEXT_CACHE_ENABLED is set.
+    Tunables: CONTEXT_CACHE_MIN_CHARS, CONTEXT_CACHE_REBUILD_CHARS, CONTEXT_CACHE_TTL_SECONDS.
+    """
+    global _cache
+    if os.getenv("CONTEXT_CACHE_ENABLED", "").lower() not in ("1", "true", "yes"):
+        return None
+    if _cache is None:
+        _cache = ContextCache(
+            min_chars=int(os.getenv("CONTEXT_CACHE_MIN_CHARS", "16384")),
+            rebuild_chars=int(os.getenv("CONTEXT_CACHE_REBUILD_CHARS", "4096")),
+            ttl_seconds=int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "900")),
+        )
+    return _cache
+
+
+metrics.register_collector("context_cache", lambda: _cache.stats() if _cache else {"enabled": False})
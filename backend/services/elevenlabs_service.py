@@ -3,20 +3,18 @@ import os
 import uuid
 import time
 import base64
+import hashlib
+from dataclasses import dataclass
 from pathlib import Path
-from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
-from dotenv import load_dotenv
 from io import BytesIO
+from typing import Optional
+from services import metrics
+from services.cache import get_cache
+from services.clients import get_async_elevenlabs_client, get_elevenlabs_client
+from services.config import load_config
+from services.governor import get_governor
 
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "../.env.local"))
-
-# Initialize ElevenLabs client
-def get_elevenlabs_client():
-    api_key = os.getenv("ELEVENLABS_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing ELEVENLABS_API_KEY in environment.")
-    return ElevenLabs(api_key=api_key)
+load_config()
 
 # Voice ID mapping for each judge
 JUDGE_VOICE_IDS = {
@@ -25,87 +23,163 @@ JUDGE_VOICE_IDS = {
     "zuck": "ErXwobaYiN019PkySvjV"      # Default voice - you can replace with specific voices
 }
 
+@dataclass(frozen=True)
+class VoiceProfile:
+    """How a judge sounds: voice, model and ElevenLabs voice settings."""
+    voice_id: str
+    model_id: str = "eleven_turbo_v2_5"
+    stability: float = 0.5
+    similarity_boost: float = 0.75
+    style: float = 0.0
+    use_speaker_boost: bool = True
+    speed: float = 1.0
+
+    def voice_settings(self):
+        from elevenlabs import VoiceSettings
+
+        return VoiceSettings(
+            stability=self.stability,
+            similarity_boost=self.similarity_boost,
+            style=self.style,
+            use_speaker_boost=self.use_speaker_boost,
+            speed=self.speed,
+        )
+
+
+# Per-judge voice profiles, keyed like JUDGE_VOICE_IDS
+VOICE_PROFILES = {
+    # Measured and even
+    "altman": VoiceProfile(JUDGE_VOICE_IDS["altman"], stability=0.6, similarity_boost=0.8, style=0.1),
+    # Animated, a little faster
+    "elon": VoiceProfile(JUDGE_VOICE_IDS["elon"], stability=0.4, similarity_boost=0.75, style=0.35, speed=1.05),
+    # Flat and deliberate
+    "zuck": VoiceProfile(JUDGE_VOICE_IDS["zuck"], stability=0.7, similarity_boost=0.7, style=0.0, speed=0.97),
+}
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    name: str
+    # ElevenLabs output_format
+    output_format: str
+    mime_type: str
+    # optimize_streaming_latency used unless the caller asks for another level (0-4)
+    default_latency: int
+
+
+# Formats a client can ask for, by name
+AUDIO_FORMATS = {
+    # Plays everywhere (<audio>, data: URLs); the default
+    "mp3": AudioFormat("mp3", "mp3_22050_32", "audio/mpeg", 0),
+    # Same bitrate, better quality, smaller frames; needs Ogg/Opus support
+    "opus": AudioFormat("opus", "opus_48000_32", "audio/ogg; codecs=opus", 2),
+    # Raw 16 kHz s16le for Web Audio streaming: no decoder, no encoder lookahead
+    "pcm": AudioFormat("pcm", "pcm_16000", "audio/pcm;rate=16000;channels=1", 3),
+}
+DEFAULT_AUDIO_FORMAT = "mp3"
+
+# Synthesized audio depends only on text, voice profile, format and latency level
+TTS_CACHE_TTL_SECONDS = 24 * 3600
+
+
 def get_voice_id_for_judge(judge_name: str) -> str:
     """Get the appropriate ElevenLabs voice ID for a judge."""
-    return JUDGE_VOICE_IDS.get(judge_name.lower(), JUDGE_VOICE_IDS["altman"])
+    return get_voice_profile(judge_name).voice_id
 
-def text_to_speech_base64(text: str, judge_name: str) -> str:
+
+def get_voice_profile(judge_name: str) -> VoiceProfile:
+    """The judge's voice profile (Altman's for unknown judges)."""
+    return VOICE_PROFILES.get((judge_name or "").lower(), VOICE_PROFILES["altman"])
+
+
+def negotiate_audio_format(preferences: Optional[str] = None) -> AudioFormat:
     """
-    Convert text to speech using ElevenLabs API and return as base64 string.
-    No file storage needed - audio data is returned directly.
-    Args:
-        text: The text to convert to speech
-        judge_name: The name of the judge (to select appropriate voice)
-    Returns:
-        Base64 encoded audio data
+    Pick the first supported format from a comma-separated preference list
+    (e.g. "opus, mp3"); MP3 when nothing listed is supported.
     """
-    client = get_elevenlabs_client()
-    voice_id = get_voice_id_for_judge(judge_name)
-
-    # Generate speech
-    response = client.text_to_speech.convert(
-        voice_id=voice_id,
-        optimize_streaming_latency="0",
-        output_format="mp3_22050_32",
+    for name in (preferences or "").split(","):
+        audio_format = AUDIO_FORMATS.get(name.strip().lower())
+        if audio_format:
+            return audio_format
+    return AUDIO_FORMATS[DEFAULT_AUDIO_FORMAT]
+
+
+def _convert_kwargs(text: str, judge_name: str, audio_format: Optional[AudioFormat],
+                    latency: Optional[int]) -> dict:
+    profile = get_voice_profile(judge_name)
+    audio_format = audio_format or AUDIO_FORMATS[DEFAULT_AUDIO_FORMAT]
+    return dict(
+        voice_id=profile.voice_id,
+        optimize_streaming_latency=audio_format.default_latency if latency is None else max(0, min(4, latency)),
+        output_format=audio_format.output_format,
         text=text,
-        model_id="eleven_turbo_v2_5",
-        voice_settings=VoiceSettings(
-            stability=0.5,
-            similarity_boost=0.75,
-            style=0.0,
-            use_speaker_boost=True,
-        ),
+        model_id=profile.model_id,
+        voice_settings=profile.voice_settings(),
     )
 
-    # Collect audio bytes in memory
-    audio_bytes = BytesIO()
-    for chunk in response:
-        if chunk:
-            audio_bytes.write(chunk)
-
-    # Convert to base64
-    audio_bytes.seek(0)
-    base64_audio = base64.b64encode(audio_bytes.read()).decode('utf-8')
-
-    return base64_audio
-
 
-def text_to_speech_bytes(text: str, judge_name: str) -> bytes:
+def text_to_speech_bytes(text: str, judge_name: str, audio_format: Optional[AudioFormat] = None,
+                         latency: Optional[int] = None) -> bytes:
     """
     Convert text to speech using ElevenLabs API and return raw bytes.
     No file storage needed - audio data is returned directly.
     Args:
         text: The text to convert to speech
-        judge_name: The name of the judge (to select appropriate voice)
+        judge_name: The name of the judge (selects the voice profile)
+        audio_format: Output format (MP3 by default)
+        latency: optimize_streaming_latency level 0-4 (the format's default if None)
     Returns:
         Audio data as bytes
     """
     client = get_elevenlabs_client()
-    voice_id = get_voice_id_for_judge(judge_name)
+    response = client.text_to_speech.convert(**_convert_kwargs(text, judge_name, audio_format, latency))
+    return b"".join(chunk for chunk in response if chunk)
+
+
+def text_to_speech_base64(text: str, judge_name: str, audio_format: Optional[AudioFormat] = None,
+                          latency: Optional[int] = None) -> str:
+    """Like text_to_speech_bytes, returned as a base64 string."""
+    return base64.b64encode(text_to_speech_bytes(text, judge_name, audio_format, latency)).decode("utf-8")
 
-    # Generate speech
-    response = client.text_to_speech.convert(
-        voice_id=voice_id,
-        optimize_streaming_latency="0",
-        output_format="mp3_22050_32",
-        text=text,
-        model_id="eleven_turbo_v2_5",
-        voice_settings=VoiceSettings(
-            stability=0.5,
-            similarity_boost=0.75,
-            style=0.0,
-            use_speaker_boost=True,
-        ),
-    )
 
-    # Collect audio bytes in memory
+async def _convert_async(kwargs: dict) -> bytes:
+    client = get_async_elevenlabs_client()
     audio_bytes = BytesIO()
-    for chunk in response:
+    # Chunks are awaited one by one, so cancelling the caller stops the download mid-stream
+    async for chunk in client.text_to_speech.convert(**kwargs):
         if chunk:
             audio_bytes.write(chunk)
+    return audio_bytes.getvalue()
 
-    audio_bytes.seek(0)
-    return audio_bytes.read()
+
+async def text_to_speech_bytes_async(text: str, judge_name: str, audio_format: Optional[AudioFormat] = None,
+                                     latency: Optional[int] = None) -> bytes:
+    """
+    Governed, non-blocking and cancellable variant of text_to_speech_bytes.
+    Concurrent requests for the same text, voice, format and latency share one upstream call,
+    and the audio is cached (namespace "tts", CACHE_TTS_TTL_SECONDS) for repeats.
+    """
+    kwargs = _convert_kwargs(text, judge_name, audio_format, latency)
+    key = hashlib.sha256(
+        f"{get_voice_profile(judge_name)}:{kwargs['output_format']}:{kwargs['optimize_streaming_latency']}:{text}"
+        .encode("utf-8")
+    ).hexdigest()
+
+    async def synthesize() -> bytes:
+        audio = await get_governor("elevenlabs_tts").run(lambda: _convert_async(kwargs), key=key)
+        metrics.inc("tts_bytes_total", len(audio), format=kwargs["output_format"])
+        return audio
+
+    # Stored as raw bytes, a third smaller than the base64 the endpoints return
+    cache = get_cache("tts", TTS_CACHE_TTL_SECONDS, max_entries=256, max_bytes=32 * 1024 * 1024)
+    return await cache.get_or_set(key, synthesize, cache_if=bool)
+
+
+async def text_to_speech_base64_async(text: str, judge_name: str, audio_format: Optional[AudioFormat] = None,
+                                      latency: Optional[int] = None) -> str:
+    """Like text_to_speech_bytes_async, returned as a base64 string."""
+    audio = await text_to_speech_bytes_async(text, judge_name, audio_format, latency)
+    return base64.b64encode(audio).decode("utf-8")
 
 
 def cleanup_old_audio_files(max_age_hours: int = 24):
@@ -0,0 +1,315 @@
+# services/export.py
+import io
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Bulk export of pitch sessions for offline analytics. Each table is read in
+# keyset order, (cursor column, id) — never OFFSET — one batch at a time, and
+# each batch is written out before the next is fetched, so memory stays flat
+# however large the table is.
+#
+# Watermarks make exports incremental. A watermark is "<cursor>|<id>" (or a bare
+# timestamp) and an export returns the rows strictly after it, in order; the
+# last row exported is the watermark for the next run. Rows younger than
+# SETTLE_SECONDS are left for the next run, so a transaction that commits with
+# an older timestamp than a row already exported isn't skipped.
+#
+# Exports are append-only: a row edited in place after it was exported (a
+# reply truncated by a barge-in) is not exported again.
+
+BATCH_SIZE = 1000
+SETTLE_SECONDS = 5.0
+FORMATS = ("ndjson", "parquet")
+
+# Job kinds whose results are scores
+SCORE_JOB_KINDS = ("judges.get_score", "performance.analyze")
+
+
+class ExportError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ExportTable:
+    """
+    A table the exporter knows how to page through.
+
+    Args:
+        name: Export name (and table name in the source)
+        columns: Column name -> type: "string", "timestamp", "float", "int" or "json"
+        origin: Which source holds it: "database" (Supabase / LocalDatabase) or "jobs"
+        cursor: Monotonic column the export is ordered and watermarked by
+    """
+    name: str
+    columns: Dict[str, str]
+    origin: str = "database"
+    cursor: str = "created_at"
+
+
+EXPORT_TABLES: Dict[str, ExportTable] = {}
+
+
+def register_table(table: ExportTable) -> None:
+    EXPORT_TABLES[table.name] = table
+
+
+register_table(ExportTable("conversations", {
+    "id": "string", "user_id": "string", "created_at": "timestamp", "updated_at": "timestamp",
+}))
+register_table(ExportTable("messages", {
+    "id": "string", "conversation_id": "string", "sender": "string", "content": "string",
+    "created_at": "timestamp",
+}))
+register_table(ExportTable("scores", {
+    "id": "string", "kind": "string", "conversation_id": "string", "result": "json",
+    "finished_at": "timestamp",
+}, origin="jobs", cursor="finished_at"))
+register_table(ExportTable("performance_analyses", {
+    "id": "string", "conversation_id": "string", "user_id": "string", "judge": "string",
+    "clarity": "float", "confidence": "float", "engagement": "float", "structure": "float",
+    "delivery": "float", "overall": "float", "user_seq": "int", "judge_seq": "int", "created_at": "timestamp",
+}))
+
+
+def parse_watermark(watermark: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(cursor, id) from "<cursor>|<id>"; a bare timestamp means everything at or after it."""
+    if not watermark:
+        return None
+    cursor, _, row_id = watermark.partition("|")
+    try:
+        datetime.fromisoformat(cursor)
+    except ValueError:
+        raise ExportError(f"invalid watermark {watermark!r}: expected an ISO timestamp, optionally '|<id>'")
+    return cursor, row_id
+
+
+def watermark_of(table: ExportTable, row: Dict[str, Any]) -> str:
+    return f"{row[table.cursor]}|{row['id']}"
+
+
+def settled_until(settle_seconds: float = SETTLE_SECONDS) -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=settle_seconds)).isoformat(timespec="microseconds")
+
+
+# --- Sources ---
+class LocalSource:
+    """Pages tables of a LocalDatabase (services/local_db.py)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def fetch(self, table: ExportTable, after: Optional[Tuple[str, str]], until: str, limit: int) -> List[dict]:
+        columns = ", ".join(table.columns)
+        sql = f"SELECT {columns} FROM {table.name} WHERE {table.cursor} <= ?"
+        params: List[Any] = [until]
+        if after:
+            # Row-value comparison: served by an index on (cursor, id)
+            sql += f" AND ({table.cursor}, id) > (?, ?)"
+            params.extend(after)
+        sql += f" ORDER BY {table.cursor}, id LIMIT ?"
+        params.append(limit)
+        return self.db.execute(sql, params)
+
+
+class SupabaseSource:
+    """Pages tables through PostgREST. Needs a service-role client: RLS would hide other users' rows."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def fetch(self, table: ExportTable, after: Optional[Tuple[str, str]], until: str, limit: int) -> List[dict]:
+        query = (
+            self.client.table(table.name)
+            .select(",".join(table.columns))
+            .lte(table.cursor, until)
+            .order(table.cursor)
+            .order("id")
+            .limit(limit)
+        )
+        if after:
+            cursor, row_id = after
+            # Timestamps contain reserved characters (":", "+"), so they are quoted
+            query = query.or_(f'{table.cursor}.gt."{cursor}",'
+                              f'and({table.cursor}.eq."{cursor}",id.gt."{row_id}")')
+        return query.execute().data or []
+
+
+class JobStoreSource:
+    """Finished scoring jobs from the durable job store (JOB_STORE_PATH), opened read-only."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    def fetch(self, table: ExportTable, after: Optional[Tuple[str, str]], until: str, limit: int) -> List[dict]:
+        sql = (f"SELECT id, kind, payload, result, finished_at FROM jobs WHERE status = 'succeeded' "
+               f"AND kind IN ({', '.join('?' for _ in SCORE_JOB_KINDS)}) AND finished_at <= ?")
+        params: List[Any] = [*SCORE_JOB_KINDS, datetime.fromisoformat(until).timestamp()]
+        if after:
+            sql += " AND (finished_at, id) > (?, ?)"
+            params.extend([datetime.fromisoformat(after[0]).timestamp(), after[1]])
+        sql += " ORDER BY finished_at, id LIMIT ?"
+        params.append(limit)
+        rows = []
+        for job_id, kind, payload, result, finished_at in self.conn.execute(sql, params):
+            rows.append({
+                "id": job_id,
+                "kind": kind,
+                "conversation_id": json.loads(payload or "{}").get("conversation_id"),
+                "result": json.loads(result) if result else None,
+                "finished_at": datetime.fromtimestamp(finished_at, timezone.utc).isoformat(timespec="microseconds"),
+            })
+        return rows
+
+
+def iter_batches(source, table: ExportTable, since: Optional[str] = None, until: Optional[str] = None,
+                 batch_size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    """Keyset-paginated batches of `table` after the `since` watermark, up to `until`."""
+    after = parse_watermark(since)
+    until = until or settled_until()
+    while True:
+        batch = source.fetch(table, after, until, batch_size)
+        if not batch:
+            return
+        yield batch
+        if len(batch) < batch_size:
+            return
+        after = (batch[-1][table.cursor], batch[-1]["id"])
+
+
+def open_source(origin: str, local_db: Optional[str] = None):
+    """
+    The source for tables of `origin`: the job store (JOB_STORE_PATH) for "jobs";
+    for "database", a LocalDatabase at `local_db` or EXPORT_LOCAL_DB, else Supabase
+    with SUPABASE_SERVICE_ROLE_KEY.
+    """
+    if origin == "jobs":
+        path = os.getenv("JOB_STORE_PATH")
+        if not path or not os.path.exists(path):
+            raise RuntimeError("Scores are read from the job store; set JOB_STORE_PATH to an existing store")
+        return JobStoreSource(path)
+
+    local_db = local_db or os.getenv("EXPORT_LOCAL_DB")
+    if local_db:
+        from services.local_db import LocalDatabase
+
+        return LocalSource(LocalDatabase(local_db))
+    url = os.getenv("SUPABASE_URL") or os.getenv("NEXT_PUBLIC_SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        raise RuntimeError("Exporting from Supabase needs SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
+    from supabase import create_client
+
+    return SupabaseSource(create_client(url, key))
+
+
+# --- Writers ---
+def _dumps(row: Dict[str, Any]) -> str:
+    return json.dumps(row, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def ndjson_chunks(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    """One chunk of newline-delimited JSON per batch."""
+    for batch in batches:
+        yield ("\n".join(_dumps(row) for row in batch) + "\n").encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller, so Parquet can stream."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.buffer = bytes(self.buffer), bytearray()
+        return data
+
+
+def _arrow_schema(table: ExportTable):
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "json": pa.string(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "float": pa.float64(),
+        "int": pa.int64(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in table.columns.items()])
+
+
+def _column(values: List[Any], kind: str) -> List[Any]:
+    if kind == "timestamp":
+        return [datetime.fromisoformat(v) if isinstance(v, str) else v for v in values]
+    if kind == "json":
+        return [None if v is None else v if isinstance(v, str) else _dumps(v) for v in values]
+    return values
+
+
+def parquet_chunks(table: ExportTable, batches: Iterator[List[dict]], compression: str = "zstd") -> Iterator[bytes]:
+    """
+    A Parquet file, streamed: one row group per batch, the footer last.
+    Needs pyarrow (optional; `pip install pyarrow`), checked by export_chunks.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(table)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    try:
+        for batch in batches:
+            arrays = [
+                pa.array(_column([row.get(name) for row in batch], kind), type=schema.field(name).type)
+                for name, kind in table.columns.items()
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(source, table: ExportTable, fmt: str, since: Optional[str] = None,
+                  until: Optional[str] = None, batch_size: int = BATCH_SIZE,
+                  progress: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """
+    Encoded export of `table` as byte chunks. If `progress` is given it is kept
+    up to date with "rows" and "watermark" (the last row's) as chunks are produced.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow: pip install pyarrow")
+    parse_watermark(since)
+    progress = progress if progress is not None else {}
+    progress.setdefault("rows", 0)
+    progress.setdefault("watermark", since)
+
+    def tracked() -> Iterator[List[dict]]:
+        for batch in iter_batches(source, table, since, until, batch_size):
+            progress["rows"] += len(batch)
+            progress["watermark"] = watermark_of(table, batch[-1])
+            yield batch
+
+    if fmt == "parquet":
+        return parquet_chunks(table, tracked())
+    return ndjson_chunks(tracked())
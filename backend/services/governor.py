@@ -0,0 +1,412 @@
+# services/governor.py
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+
+from services import metrics
+from services.admission import BATCH, current_priority
+
+if TYPE_CHECKING:
+    import httpx
+
+# Per-provider concurrency governor for upstream AI APIs (Gemini, ElevenLabs, HeyGen).
+# Every upstream call goes through `get_governor(provider).run(...)`, which applies,
+# in order: single-flight coalescing, a circuit breaker (services/breaker.py), a
+# bounded wait queue with deadline-aware shedding, a concurrency cap, a
+# token-bucket rate limit and retries with jittered exponential backoff that
+# honor Retry-After. Calls made for batch work (services/admission.py) can hold
+# all but `reserved` of the concurrency slots, so interactive turns always find one.
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _httpx_errors():
+    """(timeout, transport) exception types, without importing httpx if nothing has yet."""
+    httpx = sys.modules.get("httpx")
+    if httpx is None:
+        return (), ()
+    return (httpx.TimeoutException,), (httpx.TransportError,)
+
+
+class UpstreamError(Exception):
+    """An upstream call failed with a status that callers should surface as-is (not a 500)."""
+
+    def __init__(self, provider: str, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} returned {status_code}: {detail}")
+        self.provider = provider
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    def headers(self) -> Optional[Dict[str, str]]:
+        """Response headers to pass on to our own clients."""
+        if self.retry_after is None:
+            return None
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class OverloadedError(UpstreamError):
+    """The request was shed locally because it could not start before its deadline."""
+
+    def __init__(self, provider: str, reason: str, retry_after: float = 1.0):
+        super().__init__(provider, 503, f"{provider} is overloaded ({reason}), please retry", retry_after)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc: BaseException):
+    """
+    Extract (status_code, retry_after) from the exception types our SDKs raise:
+    google-genai APIError (.code / .response), ElevenLabs ApiError (.status_code / .headers),
+    httpx errors and our own UpstreamError. Status is None for transport failures.
+    """
+    timeout_errors, transport_errors = _httpx_errors()
+    if isinstance(exc, UpstreamError):
+        return exc.status_code, exc.retry_after
+    if isinstance(exc, (asyncio.TimeoutError, *timeout_errors)):
+        return 504, None
+    if isinstance(exc, transport_errors):
+        return None, None
+
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if not isinstance(status, int):
+        status = None
+    headers = getattr(exc, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+    retry_after = None
+    if headers is not None:
+        try:
+            retry_after = _parse_retry_after(headers.get("retry-after") or headers.get("Retry-After"))
+        except AttributeError:
+            retry_after = None
+    return status, retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, OverloadedError):
+        return False
+    status, _ = classify_error(exc)
+    if status is None:
+        return isinstance(exc, (asyncio.TimeoutError, *_httpx_errors()[1]))
+    return status in RETRYABLE_STATUS
+
+
+def raise_for_upstream_status(provider: str, response: "httpx.Response") -> None:
+    """Turn a non-2xx httpx response into an UpstreamError carrying Retry-After."""
+    if response.status_code >= 400:
+        raise UpstreamError(
+            provider,
+            response.status_code,
+            response.text,
+            _parse_retry_after(response.headers.get("retry-after")),
+        )
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def refund(self) -> None:
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def take(self, amount: float) -> float:
+        """
+        Take `amount` tokens if the bucket holds them and return 0; otherwise take
+        none and return how long until it would. Never queues, unlike reserve().
+        """
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class Governor:
+    """Concurrency, rate and retry policy for a single upstream provider."""
+
+    def __init__(self, name: str, max_concurrency: int = 8, rate: float = 0.0, burst: float = 10.0,
+                 max_queue: int = 64, default_deadline: float = 30.0, max_retries: int = 2,
+                 base_backoff: float = 0.25, max_backoff: float = 8.0, breaker=None, reserved: int = 0):
+        self.name = name
+        self.breaker = breaker
+        self.max_concurrency = max_concurrency
+        self.reserved = max(0, min(reserved, max_concurrency - 1))
+        self.max_queue = max_queue
+        self.default_deadline = default_deadline
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.bucket = TokenBucket(rate, burst)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._batch_semaphore = asyncio.Semaphore(max_concurrency - self.reserved)
+        self._in_flight = 0
+        self._waiting = 0
+        self._coalesced: Dict[str, asyncio.Future] = {}
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "queued": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "reserved": self.reserved,
+            "max_queue": self.max_queue,
+            "coalescing_keys": len(self._coalesced),
+            "tokens": round(self.bucket.tokens, 2) if self.bucket.rate > 0 else None,
+            "circuit": self.breaker.state if self.breaker is not None else None,
+        }
+
+    def has_idle_capacity(self) -> bool:
+        """True when a new call would start immediately (nothing queued, a slot free)."""
+        return self._waiting == 0 and self._in_flight < self.max_concurrency
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None, timed: bool = True):
+        """
+        Hold one concurrency slot (after queueing and rate limiting) for the body of
+        the block. Used directly for streaming calls, which cannot be retried; pass
+        timed=False when the block's duration isn't the upstream's latency (a stream
+        paced by its consumer), so the breaker only counts its errors.
+        """
+        deadline = deadline or time.monotonic() + self.default_deadline
+        # Fail fast while the provider is known to be down, before taking a queue place
+        probe = self.breaker.allow() if self.breaker is not None else False
+        if self._waiting >= self.max_queue:
+            if probe:
+                self.breaker.abandon(probe, 0.0)
+            metrics.inc("upstream_shed_total", provider=self.name, reason="queue_full")
+            raise OverloadedError(self.name, "queue full")
+
+        self._waiting += 1
+        waited_from = time.monotonic()
+        batch = self.reserved > 0 and current_priority() == BATCH
+        try:
+            if batch:
+                await self._acquire(self._batch_semaphore, deadline)
+            try:
+                await self._acquire(self._semaphore, deadline)
+            except BaseException:
+                if batch:
+                    self._batch_semaphore.release()
+                raise
+        except BaseException as e:
+            if probe:
+                self.breaker.abandon(probe, 0.0)
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.inc("upstream_shed_total", provider=self.name, reason="deadline")
+                raise OverloadedError(self.name, "deadline exceeded while queued")
+            raise
+        finally:
+            self._waiting -= 1
+
+        try:
+            delay = self.bucket.reserve()
+            if delay > 0:
+                if time.monotonic() + delay > deadline:
+                    # Waiting for a token would blow the deadline: shed now instead
+                    self.bucket.refund()
+                    metrics.inc("upstream_shed_total", provider=self.name, reason="rate_limit")
+                    raise OverloadedError(self.name, "rate limited", retry_after=delay)
+                await asyncio.sleep(delay)
+            metrics.observe("upstream_queue_wait_seconds", time.monotonic() - waited_from, provider=self.name)
+
+            self._in_flight += 1
+            started = time.monotonic()
+
+            def elapsed() -> float:
+                return time.monotonic() - started if timed else 0.0
+
+            try:
+                yield
+            except asyncio.CancelledError:
+                if self.breaker is not None:
+                    self.breaker.abandon(probe, elapsed())
+                    probe = False
+                raise
+            except Exception as e:
+                if self.breaker is not None:
+                    self.breaker.record(probe, elapsed(), e)
+                    probe = False
+                raise
+            else:
+                if self.breaker is not None:
+                    self.breaker.record(probe, elapsed())
+                    probe = False
+            finally:
+                self._in_flight -= 1
+        finally:
+            if probe:
+                # Shed by the rate limiter before the call started
+                self.breaker.abandon(probe, 0.0)
+            self._semaphore.release()
+            if batch:
+                self._batch_semaphore.release()
+
+    @staticmethod
+    async def _acquire(semaphore: asyncio.Semaphore, deadline: float) -> None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        await asyncio.wait_for(semaphore.acquire(), timeout=remaining)
+
+    async def run(self, fn: Callable[[], Awaitable[Any]], *, key: Optional[str] = None,
+                  deadline: Optional[float] = None) -> Any:
+        """
+        Run `fn` (a zero-argument coroutine factory) under this provider's policy.
+        Calls sharing the same `key` while one is in flight share its result.
+        """
+        if key is not None:
+            pending = self._coalesced.get(key)
+            if pending is not None:
+                metrics.inc("upstream_coalesced_total", provider=self.name)
+                try:
+                    return await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+                    # The caller we joined was cancelled and abandoned the call; make our own
+                    return await self.run(fn, key=key, deadline=deadline)
+            future = asyncio.get_running_loop().create_future()
+            self._coalesced[key] = future
+            try:
+                result = await self._run_with_retries(fn, deadline)
+                future.set_result(result)
+                return result
+            except BaseException as e:
+                future.set_exception(e)
+                # Mark retrieved so an un-awaited shared future doesn't warn
+                future.exception()
+                raise
+            finally:
+                del self._coalesced[key]
+
+        return await self._run_with_retries(fn, deadline)
+
+    async def run_sync(self, fn: Callable[..., Any], *args, key: Optional[str] = None,
+                       deadline: Optional[float] = None, **kwargs) -> Any:
+        """Run a blocking SDK call in a worker thread under this provider's policy."""
+        return await self.run(lambda: asyncio.to_thread(fn, *args, **kwargs), key=key, deadline=deadline)
+
+    async def _run_with_retries(self, fn: Callable[[], Awaitable[Any]], deadline: Optional[float]) -> Any:
+        deadline = deadline or time.monotonic() + self.default_deadline
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                async with self.slot(deadline):
+                    metrics.inc("upstream_calls_total", provider=self.name)
+                    result = await fn()
+                metrics.observe("upstream_latency_seconds", time.monotonic() - started, provider=self.name)
+                return result
+            except OverloadedError:
+                raise
+            except Exception as e:
+                status, retry_after = classify_error(e)
+                metrics.inc("upstream_errors_total", provider=self.name, status=status or "transport")
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise self._surface(e, status, retry_after)
+
+                # Full jitter, but never retry sooner than the server asked us to
+                backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+                if retry_after is not None:
+                    backoff = max(backoff, retry_after)
+                if time.monotonic() + backoff >= deadline:
+                    raise self._surface(e, status, retry_after)
+
+                attempt += 1
+                metrics.inc("upstream_retries_total", provider=self.name)
+                print(f"🔁 {self.name} call failed ({status or type(e).__name__}), retry {attempt} in {backoff:.2f}s")
+                await asyncio.sleep(backoff)
+
+    def _surface(self, exc: Exception, status: Optional[int], retry_after: Optional[float]) -> Exception:
+        """Rate limits and upstream outages become UpstreamError so handlers don't answer 500."""
+        if isinstance(exc, UpstreamError):
+            return exc
+        if status == 429 or (status is not None and status >= 502) or status is None and is_retryable(exc):
+            error = UpstreamError(self.name, status if status in (429, 504) else 503, str(exc), retry_after)
+            error.__cause__ = exc
+            return error
+        return exc
+
+
+# name -> (max_concurrency, rate per second, burst, max_queue, default deadline seconds)
+PROVIDER_DEFAULTS = {
+    "gemini": (8, 5.0, 10, 64, 60.0),
+    # Context-cache management runs in the background; keep it off the generation budget
+    "gemini_cache": (2, 2.0, 4, 32, 30.0),
+    "elevenlabs_tts": (4, 3.0, 6, 32, 20.0),
+    "elevenlabs_stt": (4, 3.0, 6, 32, 30.0),
+    "heygen": (2, 1.0, 2, 16, 15.0),
+}
+
+_governors: Dict[str, Governor] = {}
+
+
+def _env(provider: str, setting: str, default):
+    value = os.getenv(f"GOVERNOR_{provider.upper()}_{setting}")
+    return type(default)(value) if value else default
+
+
+def get_governor(provider: str) -> Governor:
+    """
+    Return the shared governor for a provider. Limits can be overridden per provider
+    with GOVERNOR_<PROVIDER>_{CONCURRENCY,RATE,BURST,QUEUE,DEADLINE,RETRIES,RESERVED}; its
+    circuit breaker is configured in services/breaker.py.
+    """
+    governor = _governors.get(provider)
+    if governor is None:
+        from services.breaker import create_breaker
+
+        concurrency, rate, burst, queue, deadline = PROVIDER_DEFAULTS.get(provider, (8, 0.0, 10, 64, 30.0))
+        governor = _governors[provider] = Governor(
+            provider,
+            max_concurrency=_env(provider, "CONCURRENCY", concurrency),
+            rate=_env(provider, "RATE", float(rate)),
+            burst=_env(provider, "BURST", float(burst)),
+            max_queue=_env(provider, "QUEUE", queue),
+            default_deadline=_env(provider, "DEADLINE", float(deadline)),
+            max_retries=_env(provider, "RETRIES", 2),
+            breaker=create_breaker(provider),
+            reserved=_env(provider, "RESERVED", concurrency // 4),
+        )
+    return governor
+
+
+metrics.register_collector("governors", lambda: {name: g.stats() for name, g in _governors.items()})
@@ -0,0 +1,377 @@
+# services/jobs.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from services.admission import BATCH, set_priority
+
+# Job lifecycle
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue is at capacity and a new job cannot be accepted."""
+
+
+class Job:
+    """A unit of background work plus everything a poller or subscriber needs to see."""
+
+    def __init__(self, kind: str, dedupe_key: str, payload: Dict[str, Any], job_id: Optional[str] = None):
+        self.id = job_id or str(uuid.uuid4())
+        self.kind = kind
+        self.dedupe_key = dedupe_key
+        self.payload = payload
+        self.status = QUEUED
+        self.partial: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._subscribers: List[asyncio.Queue] = []
+        self._manager: Optional["JobManager"] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "partial": self.partial,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def update_partial(self, name: str, value: Any) -> None:
+        """Record a partial result (e.g. one memo section) and notify subscribers."""
+        self.partial[name] = value
+        self._publish("partial", {"name": name, "value": value})
+        if self._manager:
+            self._manager._persist(self)
+
+    def _publish(self, event: str, data: Any) -> None:
+        for queue in list(self._subscribers):
+            queue.put_nowait((event, data))
+
+
+JobHandler = Callable[[Job], Awaitable[Any]]
+
+
+class SQLiteJobStore:
+    """
+    Optional durable backing for the job queue. Jobs that were queued or running
+    when the process stopped are re-queued on the next start.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                dedupe_key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                partial TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self._conn.commit()
+
+    @staticmethod
+    def row(job: Job) -> tuple:
+        """The job serialized for save_rows; take it on the event loop, where the job is updated."""
+        return (
+            job.id, job.kind, job.dedupe_key, job.status, json.dumps(job.payload),
+            json.dumps(job.partial), json.dumps(job.result), job.error,
+            job.created_at, job.started_at, job.finished_at,
+        )
+
+    def save_rows(self, rows: List[tuple]) -> None:
+        """Write rows from row() in one transaction. Blocking; JobManager calls it in a thread."""
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO jobs
+                    (id, kind, dedupe_key, status, payload, partial, result, error, created_at, started_at, finished_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            self._conn.commit()
+
+    def save(self, job: Job) -> None:
+        self.save_rows([self.row(job)])
+
+    def load(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def load_unfinished(self) -> List[Job]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATUSES
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def delete_finished_before(self, cutoff: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (SUCCEEDED, FAILED, cutoff)
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        (job_id, kind, dedupe_key, status, payload, partial, result, error,
+         created_at, started_at, finished_at) = row
+        job = Job(kind, dedupe_key, json.loads(payload), job_id=job_id)
+        job.status = status
+        job.partial = json.loads(partial or "{}")
+        job.result = json.loads(result) if result else None
+        job.error = error
+        job.created_at = created_at
+        job.started_at = started_at
+        job.finished_at = finished_at
+        return job
+
+
+class JobManager:
+    """
+    In-process asynchronous job system with a bounded worker pool.
+
+    Submitting returns immediately with a job id; repeated submits with the same
+    dedupe key attach to the job that is already queued or running. Job ids are
+    random UUIDs and act as the capability to read a job's status.
+
+    `max_queue` bounds new submits only. Jobs re-queued from the store on start
+    were already accepted, so they all run even if there are more of them; new
+    submits are refused until the backlog drains below the limit.
+
+    Store writes are write-behind: every change marks the job dirty and one
+    flusher task writes the dirty jobs in a single transaction from a thread,
+    so a burst of partial results costs one commit and never blocks the event
+    loop. submit() waits for its job to be written before returning.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 100, result_ttl: float = 3600.0,
+                 store: Optional[SQLiteJobStore] = None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.store = store
+        self._handlers: Dict[str, JobHandler] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._active_by_key: Dict[str, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._dirty: Dict[str, Job] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        # Unbounded: submit() enforces max_queue, and restored jobs must all fit
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        if self.store:
+            unfinished = await asyncio.to_thread(self.store.load_unfinished)
+            for job in unfinished:
+                job.status = QUEUED
+                self._track(job)
+                self._queue.put_nowait(job)
+            if unfinished:
+                print(f"♻️ Re-queued {len(unfinished)} unfinished jobs"
+                      f"{' (over max_queue; new submits wait for the backlog)' if len(unfinished) >= self.max_queue else ''}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    async def submit(self, kind: str, dedupe_key: str, payload: Dict[str, Any]) -> Job:
+        if kind not in self._handlers:
+            raise KeyError(f"No handler registered for job kind '{kind}'")
+        if not self.running:
+            await self.start()
+
+        existing_id = self._active_by_key.get(dedupe_key)
+        if existing_id and existing_id in self._jobs and self._jobs[existing_id].status in ACTIVE_STATUSES:
+            return self._jobs[existing_id]
+
+        if self._queue.qsize() >= self.max_queue:
+            raise QueueFullError("Job queue is full, please retry later")
+
+        job = Job(kind, dedupe_key, payload)
+        self._track(job)
+        self._persist(job)
+        self._queue.put_nowait(job)
+        self._evict_expired()
+        await self.flush()
+        return job
+
+    async def flush(self) -> None:
+        """Wait until every change so far is in the store."""
+        if self._dirty:
+            self._schedule_flush()
+        if self._flusher is not None:
+            await asyncio.shield(self._flusher)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self.store:
+            # A blocking SQLite read, so off the event loop like the writes
+            job = await asyncio.to_thread(self.store.load, job_id)
+        return job
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[tuple]:
+        """Yield (event, data) tuples: a snapshot first, then live updates until the job finishes."""
+        job = await self.get(job_id)
+        if job is None:
+            return
+        if job.status not in ACTIVE_STATUSES or job.id not in self._jobs:
+            yield "status", job.to_dict()
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        job._subscribers.append(queue)
+        try:
+            yield "status", job.to_dict()
+            if job.status not in ACTIVE_STATUSES and queue.empty():
+                # Finished before the queue was attached, so its final events went to nobody
+                if job.status == SUCCEEDED:
+                    yield "result", job.result
+                else:
+                    yield "error", {"detail": job.error}
+                return
+            while True:
+                event, data = await queue.get()
+                yield event, data
+                if event in ("result", "error"):
+                    return
+        finally:
+            job._subscribers.remove(queue)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "jobs": counts,
+        }
+
+    def _track(self, job: Job) -> None:
+        job._manager = self
+        self._jobs[job.id] = job
+        self._active_by_key[job.dedupe_key] = job.id
+
+    def _persist(self, job: Job) -> None:
+        if self.store:
+            self._dirty[job.id] = job
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self) -> None:
+        while self._dirty:
+            rows = [SQLiteJobStore.row(job) for job in self._dirty.values()]
+            self._dirty.clear()
+            try:
+                await asyncio.to_thread(self.store.save_rows, rows)
+            except Exception as e:
+                print(f"⚠️ Failed to persist {len(rows)} jobs: {e}")
+
+    def _set_status(self, job: Job, status: str) -> None:
+        job.status = status
+        self._persist(job)
+        job._publish("status", {"status": status})
+
+    async def _worker(self, index: int) -> None:
+        # Jobs are deferred work: their upstream calls yield to interactive turns
+        set_priority(BATCH)
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.started_at = time.time()
+        self._set_status(job, RUNNING)
+        try:
+            job.result = await self._handlers[job.kind](job)
+            job.finished_at = time.time()
+            self._set_status(job, SUCCEEDED)
+            job._publish("result", job.result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job.finished_at = time.time()
+            self._set_status(job, FAILED)
+            job._publish("error", {"detail": job.error})
+        finally:
+            if self._active_by_key.get(job.dedupe_key) == job.id:
+                del self._active_by_key[job.dedupe_key]
+
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status not in ACTIVE_STATUSES and (job.finished_at or 0) < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if expired and self.store:
+            asyncio.get_running_loop().run_in_executor(None, self.store.delete_finished_before, cutoff)
+
+
+def _create_job_manager() -> JobManager:
+    store_path = os.getenv("JOB_STORE_PATH")
+    return JobManager(
+        workers=int(os.getenv("JOB_WORKERS", "4")),
+        max_queue=int(os.getenv("JOB_MAX_QUEUE", "100")),
+        result_ttl=float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600")),
+        store=SQLiteJobStore(store_path) if store_path else None,
+    )
+
+
+job_manager = _create_job_manager()
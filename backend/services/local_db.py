@@ -0,0 +1,160 @@
+# services/local_db.py
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from services.config import BACKEND_DIR
+
+# Local SQLite stand-in for the Supabase Postgres database, used by the
+# synthetic-traffic CLI (api/session.py) and the offline benchmarks.
+#
+# The schema is derived from database_schema.sql itself rather than copied, so
+# an index added there is picked up here and its effect can be measured locally.
+# Only CREATE TABLE / CREATE INDEX statements are translated; RLS and policies
+# have no SQLite equivalent and are skipped.
+
+SCHEMA_PATH = os.path.join(BACKEND_DIR, "database_schema.sql")
+
+_TYPE_REWRITES = (
+    (re.compile(r"\bpublic\."), ""),
+    (re.compile(r"\bUUID\s+DEFAULT\s+gen_random_uuid\(\)", re.I), "TEXT"),
+    (re.compile(r"\bTIMESTAMP\s+WITH\s+TIME\s+ZONE\s+DEFAULT\s+NOW\(\)", re.I),
+     "TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f000+00:00', 'now'))"),
+    (re.compile(r"\bTIMESTAMP\s+WITH\s+TIME\s+ZONE\b", re.I), "TEXT"),
+    (re.compile(r"\bUUID\b", re.I), "TEXT"),
+    (re.compile(r"\bJSONB?\b", re.I), "TEXT"),
+    (re.compile(r"\bDEFAULT\s+'[^']*'::\w+", re.I), lambda m: m.group(0).split("::")[0]),
+)
+
+
+def _strip_comments(sql: str) -> str:
+    return "\n".join(line.split("--", 1)[0] for line in sql.splitlines())
+
+
+def translate_schema(sql: str) -> List[str]:
+    """Translate the Postgres DDL in database_schema.sql into SQLite statements."""
+    statements = []
+    for statement in _strip_comments(sql).split(";"):
+        statement = statement.strip()
+        if not re.match(r"CREATE\s+(UNIQUE\s+)?(TABLE|INDEX)\b", statement, re.I):
+            continue
+        for pattern, replacement in _TYPE_REWRITES:
+            statement = pattern.sub(replacement, statement)
+        statements.append(statement)
+    return statements
+
+
+def utc_now() -> str:
+    """Timestamps in the same ISO format PostgREST returns, so they sort as text."""
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+class LocalDatabase:
+    """
+    SQLite database mirroring database_schema.sql. Safe to share across threads:
+    a file database gives each thread its own connection (WAL lets readers run
+    beside a writer); an in-memory one serialises access through one connection.
+    """
+
+    def __init__(self, path: str = ":memory:", schema_path: str = SCHEMA_PATH):
+        self.in_memory = path == ":memory:"
+        self.uri = ":memory:" if self.in_memory else f"file:{os.path.abspath(path)}"
+        self._local = threading.local()
+        self._anchor = self._connect()
+        self._guard = threading.RLock() if self.in_memory else nullcontext()
+        with open(schema_path) as f:
+            for statement in translate_schema(f.read()):
+                self._anchor.execute(statement)
+        self._anchor.commit()
+        self._columns: Dict[str, List[str]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.uri, uri=not self.in_memory, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        if not self.in_memory:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self.in_memory:
+            return self._anchor
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def columns(self, table: str) -> List[str]:
+        if table not in self._columns:
+            self._columns[table] = [row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        return self._columns[table]
+
+    def insert(self, table: str, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert rows and return them as stored (like PostgREST's return=representation)."""
+        if not rows:
+            return []
+        columns = self.columns(table)
+        stored = []
+        for row in rows:
+            row = dict(row)
+            if "id" in columns and "id" not in row:
+                row["id"] = str(uuid.uuid4())
+            if "created_at" in columns and "created_at" not in row:
+                row["created_at"] = utc_now()
+            if "updated_at" in columns and "updated_at" not in row:
+                row["updated_at"] = row.get("created_at", utc_now())
+            stored.append(row)
+
+        keys = list(stored[0])
+        sql = f"INSERT INTO {table} ({', '.join(keys)}) VALUES ({', '.join('?' for _ in keys)})"
+        with self._guard, self.conn:
+            self.conn.executemany(sql, [tuple(row.get(k) for k in keys) for row in stored])
+        return stored
+
+    def select(self, table: str, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+               limit: Optional[int] = None, columns: str = "*") -> List[Dict[str, Any]]:
+        """Equality-filtered select, the subset of PostgREST the backend actually uses."""
+        sql = f"SELECT {columns} FROM {table}"
+        params: List[Any] = []
+        if where:
+            sql += " WHERE " + " AND ".join(f"{column} = ?" for column in where)
+            params.extend(where.values())
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._guard:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def delete(self, table: str, where: Dict[str, Any]) -> int:
+        sql = f"DELETE FROM {table} WHERE " + " AND ".join(f"{column} = ?" for column in where)
+        with self._guard, self.conn:
+            return self.conn.execute(sql, list(where.values())).rowcount
+
+    def execute(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        with self._guard, self.conn:
+            return [dict(row) for row in self.conn.execute(sql, list(params))]
+
+    def explain(self, sql: str, params: Iterable[Any] = ()) -> List[str]:
+        """SQLite's query plan, to check that a query is served by an index."""
+        with self._guard:
+            return [row["detail"] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", list(params))]
+
+    def count(self, table: str) -> int:
+        with self._guard:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and conn is not self._anchor:
+            conn.close()
+            self._local.conn = None
+        self._anchor.close()
@@ -0,0 +1,403 @@
+# services/memory.py
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services import metrics
+from services.config import data_path
+
+# Per-founder memory across pitch sessions. Instead of replaying earlier
+# transcripts into the judge's prompt, finished sessions are distilled into a
+# handful of short memories:
+#
+#   /judges/end            facts the founder stated (figures, traction, team,
+#                          the raise) and the judge's questions and pushback,
+#                          picked out of the transcript without a model call
+#   /performance/analyze   the memo's summary, risks and verdict, and the
+#                          weakest presentation metrics
+#
+# When a conversation starts, the top-k memories for the founder are ranked by
+# BM25 against a query built from the judge's persona, plus priors for the
+# same judge, the kind of memory and recency, and packed into a token budget
+# appended to the judge's system prompt.
+#
+# The store is a SQLite file on the host (MEMORY_STORE_PATH, by default in the
+# data directory), indexed by user. Each memory keeps its term counts, so recall
+# is one index range scan over a founder's memories (capped at
+# MEMORY_MAX_PER_USER) and BM25 in Python; the IDF that matters is within one
+# founder's memories, not across all users.
+#
+# Memories are personal data. They expire after MEMORY_RETENTION_DAYS (expired
+# ones are never recalled and are deleted on the next write), and a founder
+# can list and delete theirs through /judges/memory.
+
+MEMORY_HEADING = "What you remember about this founder from earlier pitches"
+
+# Rough token estimate for budgeting prompt space (about 4 characters a token in English)
+CHARS_PER_TOKEN = 4
+
+_TERM_RE = re.compile(r"[a-z0-9$%][a-z0-9$%'.]*[a-z0-9%]|[a-z0-9$%]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = frozenset(
+    "a an and are as at be been but by can could did do does for from had has have how i i'm if in into is it "
+    "it's its just like me my of on or our so that the their them then there these they this to us was we we're "
+    "were what when where which who why will with would you your".split()
+)
+
+# Words that mark a founder's sentence as a fact worth remembering
+FACT_TERMS = frozenset(
+    "revenue arr mrr customers users subscribers growth growing grew churn retention margin margins cac ltv "
+    "raise raising valuation funding round pre-seed seed series investors burn runway profitable profit pilot "
+    "pilots launch launched beta waitlist contract contracts partnership partners market tam competitors "
+    "competition team founder founders co-founder cofounder hired engineers patent patents pricing price "
+    "subscription b2b b2c enterprise".split()
+)
+# Words that mark a judge's sentence as pushback rather than small talk
+CONCERN_TERMS = frozenset(
+    "concern concerned worry worried risk risky unclear convince convinced prove doubt skeptical weak "
+    "problem problems issue issues challenge however but missing why defensible moat compete".split()
+)
+
+# Ranking priors, added to the BM25 score
+KIND_WEIGHTS = {"feedback": 1.0, "verdict": 0.8, "coaching": 0.8, "question": 0.6, "pitch": 0.5, "fact": 0.4}
+SAME_JUDGE_BOOST = 0.5
+RECENCY_WEIGHT = 1.0
+RECENCY_HALF_LIFE_DAYS = 30.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+# A memory sharing this much of its words with one already recalled is skipped:
+# the same fact restated in a later session, figures aside, keeps only its best
+# (usually most recent) version
+MAX_OVERLAP = 0.6
+
+MAX_FACTS_PER_SESSION = 5
+MAX_JUDGE_NOTES_PER_SESSION = 3
+MAX_MEMORY_CHARS = 280
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms without stopwords, with plural/-ing/-ed endings folded."""
+    terms = []
+    for term in _TERM_RE.findall(text.lower()):
+        if term in _STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "s"):
+            if len(term) > len(suffix) + 3 and term.endswith(suffix) and not term.endswith("ss"):
+                term = term[:-len(suffix)]
+                break
+        terms.append(term)
+    return terms
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def clip(text: str, max_chars: int = MAX_MEMORY_CHARS) -> str:
+    """Collapse whitespace and cut at a word boundary."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0].rstrip(",;:") + "…"
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_RE.split(" ".join(text.split())) if s.strip()]
+
+
+def distil_transcript(history: List[dict]) -> List[Tuple[str, str]]:
+    """
+    (kind, content) memories from a conversation's messages: the founder's most
+    fact-dense sentences ("fact") and the judge's questions ("question") and
+    pushback ("feedback"), in the order they were said.
+    """
+    facts, notes = [], []
+    for position, msg in enumerate(history):
+        for sentence in _sentences(msg.get("content") or ""):
+            words = sentence.split()
+            terms = set(tokenize(sentence))
+            if msg.get("sender") == "user":
+                score = 2 * bool(re.search(r"\d", sentence)) + len(terms & FACT_TERMS)
+                if score >= 2 and 5 <= len(words) <= 60:
+                    facts.append((score, position, ("fact", clip(sentence))))
+            elif msg.get("sender") == "assistant":
+                concern = len(terms & CONCERN_TERMS)
+                if sentence.endswith("?") and 5 <= len(words) <= 50:
+                    notes.append((1 + concern, position, ("question", clip(sentence))))
+                elif concern and 5 <= len(words) <= 50:
+                    notes.append((concern, position, ("feedback", clip(sentence))))
+
+    def strongest(candidates, limit):
+        kept = sorted(candidates, key=lambda c: (-c[0], c[1]))[:limit]
+        return [memory for _, _, memory in sorted(kept, key=lambda c: c[1])]
+
+    return strongest(facts, MAX_FACTS_PER_SESSION) + strongest(notes, MAX_JUDGE_NOTES_PER_SESSION)
+
+
+def distil_analysis(memo: Optional[dict], presentation_metrics: Optional[dict]) -> List[Tuple[str, str]]:
+    """(kind, content) memories from a performance analysis: what was pitched, the risks, the verdict, weak spots."""
+    memories = []
+    if memo:
+        if memo.get("summary"):
+            memories.append(("pitch", clip(" ".join(_sentences(memo["summary"])[:2]))))
+        risks = [line.strip(" •-*\t") for line in (memo.get("risks") or "").splitlines() if line.strip(" •-*\t")]
+        if risks:
+            memories.append(("feedback", clip("Risks raised: " + "; ".join(risks[:3]))))
+        if memo.get("recommendation"):
+            memories.append(("verdict", clip("Verdict: " + _sentences(memo["recommendation"])[0])))
+    if presentation_metrics:
+        scored = {name: float(value) for name, value in presentation_metrics.items() if name != "overall"}
+        weakest = sorted((value, name) for name, value in scored.items() if value < 7.0)[:2]
+        if weakest:
+            parts = ", ".join(f"{name} {value:.1f}/10" for value, name in weakest)
+            overall = float(presentation_metrics.get("overall", 0.0))
+            memories.append(("coaching", f"Weakest presentation areas: {parts} (overall {overall:.1f}/10)"))
+    return memories
+
+
+class MemoryStore:
+    """Founder memories in a SQLite file; safe to share across threads and workers on one host."""
+
+    def __init__(self, path: str, max_per_user: int = 200, retention_days: float = 180.0):
+        self.path = path
+        self.max_per_user = max_per_user
+        self.retention_seconds = retention_days * 86400
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS memories (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                conversation_id TEXT NOT NULL,
+                judge TEXT,
+                source TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                content TEXT NOT NULL,
+                terms TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE (user_id, digest)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_user ON memories(user_id, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_conversation ON memories(conversation_id, source)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memories_created ON memories(created_at)")
+        self._conn.commit()
+
+    def _cutoff(self) -> float:
+        return time.time() - self.retention_seconds
+
+    def add(self, user_id: str, conversation_id: str, judge: Optional[str], source: str,
+            memories: Iterable[Tuple[str, str]], created_at: Optional[float] = None) -> int:
+        """
+        Store a session's memories from `source` ("session" or "analysis"), replacing
+        any earlier ones from the same source, so re-ending or re-analysing a
+        conversation doesn't pile up. Returns how many were stored; a memory the
+        founder already has (same text) is kept once. Every founder's expired
+        memories are deleted on the way.
+        """
+        created_at = created_at or time.time()
+        rows = []
+        for kind, content in memories:
+            counts = Counter(tokenize(content))
+            digest = hashlib.sha1(" ".join(content.lower().split()).encode()).hexdigest()
+            rows.append((user_id, conversation_id, judge, source, kind, content, json.dumps(counts),
+                         sum(counts.values()), digest, created_at))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM memories WHERE conversation_id = ? AND source = ? AND user_id = ?",
+                               (conversation_id, source, user_id))
+            stored = sum(self._conn.execute(
+                "INSERT OR IGNORE INTO memories (user_id, conversation_id, judge, source, kind, content, terms, "
+                "length, digest, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row).rowcount for row in rows)
+            # Oldest go first once a founder is over the cap
+            self._conn.execute(
+                "DELETE FROM memories WHERE user_id = ? AND id NOT IN "
+                "(SELECT id FROM memories WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?)",
+                (user_id, user_id, self.max_per_user))
+            expired = self._conn.execute("DELETE FROM memories WHERE created_at < ?", (self._cutoff(),)).rowcount
+        metrics.inc("memories_stored_total", stored, source=source)
+        if expired:
+            metrics.inc("memories_expired_total", expired)
+        return stored
+
+    def memories(self, user_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, conversation_id, judge, kind, content, terms, length, created_at FROM memories "
+                "WHERE user_id = ? AND created_at >= ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                (user_id, self._cutoff(), self.max_per_user)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def recall(self, user_id: str, judge: Optional[str], query: str, budget_tokens: int,
+               k: int) -> List[dict]:
+        """
+        Up to `k` of the founder's memories, best first, whose contents fit in
+        `budget_tokens` together, skipping near-repeats of a better one. Each has
+        its `score` added.
+        """
+        candidates = self.memories(user_id)
+        if not candidates:
+            return []
+        now = time.time()
+        query_terms = set(tokenize(query))
+        documents = [json.loads(m["terms"]) for m in candidates]
+        average_length = sum(m["length"] for m in candidates) / len(candidates) or 1.0
+        frequency = Counter(term for terms in documents for term in terms if term in query_terms)
+        total = len(candidates)
+
+        for memory, terms in zip(candidates, documents):
+            relevance = 0.0
+            for term in query_terms & terms.keys():
+                idf = math.log(1 + (total - frequency[term] + 0.5) / (frequency[term] + 0.5))
+                tf = terms[term]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * memory["length"] / average_length)
+                relevance += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            age_days = max(0.0, now - memory["created_at"]) / 86400
+            memory["score"] = (relevance
+                               + KIND_WEIGHTS.get(memory["kind"], 0.0)
+                               + (SAME_JUDGE_BOOST if judge and memory["judge"] == judge else 0.0)
+                               + RECENCY_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS))
+
+        chosen, chosen_terms, used = [], [], 0
+        for memory, terms in sorted(zip(candidates, documents), key=lambda pair: -pair[0]["score"]):
+            cost = estimate_tokens(memory["content"]) + 2
+            if used + cost > budget_tokens:
+                continue
+            terms = {term for term in terms if not any(ch.isdigit() for ch in term)}
+            if any(len(terms & other) / (len(terms | other) or 1) >= MAX_OVERLAP for other in chosen_terms):
+                continue
+            chosen.append(memory)
+            chosen_terms.append(terms)
+            used += cost
+            if len(chosen) >= k:
+                break
+        return chosen
+
+    def forget_user(self, user_id: str) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM memories WHERE user_id = ?", (user_id,)).rowcount
+
+    def forget_conversation(self, user_id: str, conversation_id: str) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM memories WHERE user_id = ? AND conversation_id = ?",
+                                      (user_id, conversation_id)).rowcount
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def render(memories: List[dict], judge: Optional[str], judge_names: Dict[str, str]) -> str:
+    """The system-prompt section for recalled memories, or "" if there are none."""
+    if not memories:
+        return ""
+    lines = []
+    for memory in memories:
+        who = "you" if memory["judge"] == judge else judge_names.get(memory["judge"], "another judge")
+        lines.append(f"- (pitched to {who}, {memory['kind']}) {memory['content']}")
+    return (f"\n\n    {MEMORY_HEADING} (use it to follow up naturally; don't recite it):\n    "
+            + "\n    ".join(lines) + "\n")
+
+
+def has_memories(system_prompt: str) -> bool:
+    return MEMORY_HEADING in system_prompt
+
+
+_store: Optional[MemoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_memory_store() -> Optional[MemoryStore]:
+    """
+    The shared memory store, or None if MEMORY_ENABLED is off.
+    Tunables: MEMORY_STORE_PATH (default founder-memory.sqlite3 in DATA_DIR),
+    MEMORY_MAX_PER_USER, MEMORY_RETENTION_DAYS (default 180).
+    """
+    global _store
+    if os.getenv("MEMORY_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    with _store_lock:
+        if _store is None:
+            path = os.getenv("MEMORY_STORE_PATH") or data_path("founder-memory.sqlite3")
+            _store = MemoryStore(path, max_per_user=int(os.getenv("MEMORY_MAX_PER_USER", "200")),
+                                 retention_days=float(os.getenv("MEMORY_RETENTION_DAYS", "180")))
+    return _store
+
+
+def recall_prompt(user_id: str, judge: str, query: str, judge_names: Dict[str, str]) -> str:
+    """
+    The memory section for a new conversation with `judge`, within MEMORY_TOKEN_BUDGET
+    (default 300) and MEMORY_TOP_K (default 8) memories. Never raises: without
+    memories the judge simply starts cold.
+    """
+    store = get_memory_store()
+    if store is None:
+        return ""
+    started = time.perf_counter()
+    try:
+        memories = store.recall(user_id, judge, query, int(os.getenv("MEMORY_TOKEN_BUDGET", "300")),
+                                int(os.getenv("MEMORY_TOP_K", "8")))
+    except sqlite3.Error as e:
+        print(f"⚠️ Memory recall failed: {e}")
+        return ""
+    section = render(memories, judge, judge_names)
+    metrics.observe("memory_recall_seconds", time.perf_counter() - started)
+    metrics.observe("memory_prompt_tokens", estimate_tokens(section))
+    if memories:
+        print(f"🧠 Recalled {len(memories)} memories for {user_id} ({estimate_tokens(section)} tokens)")
+    return section
+
+
+async def remember(user_id: str, conversation_id: str, judge: Optional[str], source: str,
+                   memories: List[Tuple[str, str]]) -> None:
+    """Store distilled memories off the event loop; failures are logged, never raised."""
+    store = get_memory_store()
+    if store is None or not memories:
+        return
+    try:
+        stored = await asyncio.to_thread(store.add, user_id, conversation_id, judge, source, memories)
+        print(f"🧠 Stored {stored} {source} memories from {conversation_id}")
+    except Exception as e:
+        print(f"⚠️ Failed to store memories for {conversation_id}: {e}")
+
+
+async def forget(user_id: str, conversation_id: Optional[str] = None) -> int:
+    """
+    Delete the founder's memories, or only those from one conversation, off the
+    event loop. Returns how many were deleted; unlike remember(), errors raise,
+    so a deletion the founder asked for never fails silently.
+    """
+    store = get_memory_store()
+    if store is None:
+        return 0
+    if conversation_id is None:
+        deleted = await asyncio.to_thread(store.forget_user, user_id)
+    else:
+        deleted = await asyncio.to_thread(store.forget_conversation, user_id, conversation_id)
+    metrics.inc("memories_forgotten_total", deleted)
+    print(f"🧹 Forgot {deleted} memories for {user_id}{f' from {conversation_id}' if conversation_id else ''}")
+    return deleted
+
+
+async def list_memories(user_id: str) -> List[dict]:
+    """The founder's unexpired memories, newest first, as they would be shown to them."""
+    store = get_memory_store()
+    if store is None:
+        return []
+    memories = await asyncio.to_thread(store.memories, user_id)
+    return [{key: memory[key] for key in ("id", "conversation_id", "judge", "kind", "content", "created_at")}
+            for memory in memories]
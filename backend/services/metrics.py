@@ -0,0 +1,139 @@
+# services/metrics.py
+import math
+import threading
+from collections import defaultdict, deque
+from typing import Callable, Dict, Optional, Tuple
+
+# Lightweight in-process metrics registry, exported by GET /metrics.
+# Counters and gauges are keyed by (name, sorted label pairs); latency-style
+# observations keep a bounded reservoir of recent samples for percentiles.
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+_gauges: Dict[Tuple[str, tuple], float] = {}
+_samples: Dict[Tuple[str, tuple], deque] = {}
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+RESERVOIR_SIZE = 1024
+
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        samples = _samples.get(key)
+        if samples is None:
+            samples = _samples[key] = deque(maxlen=RESERVOIR_SIZE)
+        samples.append(value)
+
+
+def get_counter(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0.0)
+
+
+def sample_count(name: str, **labels) -> int:
+    with _lock:
+        return len(_samples.get(_key(name, labels), ()))
+
+
+def percentile(name: str, q: float, **labels) -> Optional[float]:
+    """q-th percentile (0-100) of recent observations, or None if there are none."""
+    with _lock:
+        samples = sorted(_samples.get(_key(name, labels), ()))
+    return _percentile(samples, q)
+
+
+def _percentile(samples: list, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    index = max(0, min(len(samples) - 1, math.ceil(q / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+def register_collector(name: str, fn: Callable[[], dict]) -> None:
+    """Register a callable whose dict output is included in snapshots under `name`."""
+    _collectors[name] = fn
+
+
+def _format(key: Tuple[str, tuple]) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = {_format(k): v for k, v in _counters.items()}
+        gauges = {_format(k): v for k, v in _gauges.items()}
+        samples = {k: sorted(v) for k, v in _samples.items()}
+
+    summaries = {
+        _format(k): {
+            "count": len(v),
+            "p50": _percentile(v, 50),
+            "p95": _percentile(v, 95),
+            "p99": _percentile(v, 99),
+        }
+        for k, v in samples.items()
+    }
+    collected = {}
+    for name, fn in _collectors.items():
+        try:
+            collected[name] = fn()
+        except Exception as e:
+            collected[name] = {"error": str(e)}
+
+    return {"counters": counters, "gauges": gauges, "summaries": summaries, **collected}
+
+
+def _flatten(prefix: str, value, out: list) -> None:
+    if isinstance(value, bool):
+        out.append((prefix, float(value)))
+    elif isinstance(value, (int, float)):
+        out.append((prefix, float(value)))
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}_{k}" if prefix else str(k), v, out)
+
+
+def prometheus_text() -> str:
+    """Render the snapshot in Prometheus text exposition format."""
+    snap = snapshot()
+    lines: list = []
+    for section in ("counters", "gauges"):
+        for name, value in snap[section].items():
+            lines.append(f"{name} {value}")
+    for name, summary in snap["summaries"].items():
+        base, _, labels = name.partition("{")
+        labels = "{" + labels if labels else ""
+        lines.append(f"{base}_count{labels} {summary['count']}")
+        for q in ("p50", "p95", "p99"):
+            if summary[q] is not None:
+                quantile = f'quantile="0.{q[1:]}"'
+                merged = labels[:-1] + "," + quantile + "}" if labels else "{" + quantile + "}"
+                lines.append(f"{base}{merged} {summary[q]}")
+    flat: list = []
+    for name in _collectors:
+        _flatten(name, snap.get(name), flat)
+    lines.extend(f"{_sanitize(name)} {value}" for name, value in flat)
+    return "\n".join(lines) + "\n"
+
+
+def _sanitize(name: str) -> str:
+    return "".join(ch if ch.isalnum() or ch == "_" else "_" for ch in name)
+
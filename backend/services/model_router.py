@@ -0,0 +1,235 @@
+# services/model_router.py
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services import metrics
+from services.clients import get_gemini_client
+from services.governor import OverloadedError, UpstreamError, get_governor, is_retryable
+
+if TYPE_CHECKING:
+    from google import genai
+
+# Model routing for Gemini calls. Each call site names a route ("judge_reply",
+# "score", ...); the route picks a model tier from the prompt size, optionally
+# hedges (sends a duplicate request once the primary has run longer than the
+# route's recent p95 and takes whichever answers first), and fails over to a
+# secondary model when the chosen one times out, is rate limited or fails with
+# a 5xx. Other errors (4xx) would fail the same way on any model, so they are
+# raised as they are.
+
+# Tier -> model; override with GEMINI_MODEL_<TIER>
+TIER_DEFAULTS = {
+    "fast": "gemini-2.0-flash-lite",
+    "standard": "gemini-2.0-flash-exp",
+    "fallback": "gemini-2.0-flash",
+}
+
+# Hedging needs this many latency samples before trusting the p95
+MIN_HEDGE_SAMPLES = 20
+HEDGE_DELAY_BOUNDS = (0.3, 10.0)
+
+
+@dataclass(frozen=True)
+class RoutePolicy:
+    tier: str
+    # Prompts longer than this go to `long_tier` instead
+    long_prompt_chars: int = 8000
+    long_tier: str = "standard"
+    hedge: bool = False
+    # Hedge delay used until enough latency samples exist
+    initial_hedge_delay: float = 2.5
+    # Per-attempt timeout before failing over
+    timeout: float = 60.0
+
+
+ROUTES: Dict[str, RoutePolicy] = {
+    # Interactive judge turns: latency matters most, so short conversations use
+    # the fast tier and slow calls are hedged
+    "judge_reply": RoutePolicy("fast", long_prompt_chars=6000, hedge=True, initial_hedge_delay=2.5, timeout=20.0),
+    "score": RoutePolicy("standard", timeout=60.0),
+    "analysis_memo": RoutePolicy("standard", timeout=60.0),
+    "analysis_metrics": RoutePolicy("fast", long_prompt_chars=12000, hedge=True, initial_hedge_delay=3.0, timeout=30.0),
+}
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str
+    tier: str
+    model: str
+    fallback_model: Optional[str]
+    hedge: bool
+    timeout: float
+
+
+def _model_for(tier: str) -> str:
+    return os.getenv(f"GEMINI_MODEL_{tier.upper()}", TIER_DEFAULTS[tier])
+
+
+def _prompt_chars(contents: Any, config: Optional[dict] = None) -> int:
+    """Characters of prompt text, including a system instruction carried in the config."""
+    def text_chars(value: Any) -> int:
+        if isinstance(value, str):
+            return len(value)
+        if isinstance(value, dict):
+            return sum(text_chars(v) for v in value.values())
+        if isinstance(value, (list, tuple)):
+            return sum(text_chars(v) for v in value)
+        return 0
+
+    return text_chars(contents) + text_chars((config or {}).get("system_instruction"))
+
+
+def _record_usage(route: str, response: Any) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = usage.prompt_token_count or 0
+    cached_tokens = usage.cached_content_token_count or 0
+    metrics.inc("gemini_input_tokens_total", cached_tokens, route=route, kind="cached")
+    metrics.inc("gemini_input_tokens_total", prompt_tokens - cached_tokens, route=route, kind="uncached")
+
+
+class ModelRouter:
+    """Chooses a Gemini model per call and runs it with hedging and failover."""
+
+    def __init__(self, provider: str = "gemini"):
+        self.provider = provider
+        self.hedging_enabled = os.getenv("MODEL_ROUTER_HEDGING", "1").lower() not in ("0", "false", "no")
+
+    def choose(self, route: str, contents: Any, config: Optional[dict] = None) -> RouteDecision:
+        policy = ROUTES[route]
+        tier = policy.long_tier if _prompt_chars(contents, config) > policy.long_prompt_chars else policy.tier
+        model = _model_for(tier)
+        fallback = _model_for("fallback")
+        decision = RouteDecision(
+            route=route,
+            tier=tier,
+            model=model,
+            fallback_model=fallback if fallback != model else None,
+            hedge=policy.hedge and self.hedging_enabled,
+            timeout=policy.timeout,
+        )
+        metrics.inc("model_route_decisions_total", route=route, tier=tier, model=model)
+        return decision
+
+    def hedge_delay(self, route: str, model: str) -> float:
+        """Recent p95 latency for this route and model, clamped; a default until warmed up."""
+        low, high = HEDGE_DELAY_BOUNDS
+        if metrics.sample_count("model_latency_seconds", route=route, model=model) < MIN_HEDGE_SAMPLES:
+            return ROUTES[route].initial_hedge_delay
+        p95 = metrics.percentile("model_latency_seconds", 95, route=route, model=model)
+        return min(high, max(low, p95))
+
+    async def generate(self, route: str, contents: Any, config: Optional[dict] = None,
+                       client: Optional["genai.Client"] = None,
+                       prepare: Optional[Callable[[str, Any, Optional[dict]], Awaitable[Tuple[Any, dict]]]] = None):
+        """
+        Generate content for `route`, returning the SDK response.
+
+        Args:
+            route: Key into ROUTES naming the call site
+            contents: Prompt passed to generate_content
+            config: Generation config passed through unchanged
+            client: Gemini client; defaults to the shared one
+            prepare: Optional async (model, contents, config) -> (contents, config) hook run
+                before every attempt, e.g. to substitute a context-cache handle
+
+        Returns:
+            The google-genai GenerateContentResponse from whichever attempt won
+        """
+        client = client or get_gemini_client()
+        decision = self.choose(route, contents, config)
+
+        async def call(model: str):
+            model_contents, model_config = contents, config
+            if prepare is not None:
+                model_contents, model_config = await prepare(model, contents, config)
+            governor = get_governor(self.provider)
+            # Every attempt, a hedged duplicate included, prepares its own request
+            return await self._call(governor, client, model, model_contents, model_config)
+
+        try:
+            return await self._attempt(decision, decision.model, call)
+        except OverloadedError:
+            # Shed locally: another model on the same provider would be shed too
+            raise
+        except Exception as e:
+            if not decision.fallback_model or not is_retryable(e):
+                raise
+            print(f"🔀 {route} failed on {decision.model} ({type(e).__name__}), failing over to {decision.fallback_model}")
+            metrics.inc("model_failovers_total", route=route, source=decision.model, target=decision.fallback_model)
+            return await self._attempt(decision, decision.fallback_model, call)
+
+    async def _call(self, governor, client, model, contents, config):
+        return await governor.run(lambda: client.aio.models.generate_content(
+            model=model,
+            contents=contents,
+            config=config
+        ))
+
+    async def _attempt(self, decision: RouteDecision, model: str, call):
+        started = time.monotonic()
+        try:
+            if decision.hedge:
+                response, winner = await asyncio.wait_for(self._hedged(decision, model, call), decision.timeout)
+            else:
+                response, winner = await asyncio.wait_for(call(model), decision.timeout), "primary"
+        except asyncio.TimeoutError:
+            metrics.inc("model_timeouts_total", route=decision.route, model=model)
+            raise UpstreamError(self.provider, 504, f"{model} did not answer within {decision.timeout:.0f}s")
+        metrics.observe("model_latency_seconds", time.monotonic() - started, route=decision.route, model=model)
+        metrics.inc("model_calls_total", route=decision.route, model=model, winner=winner)
+        _record_usage(decision.route, response)
+        return response
+
+    async def _hedged(self, decision: RouteDecision, model: str, call) -> Tuple[Any, str]:
+        primary = asyncio.create_task(call(model))
+        hedge = None
+        delay = self.hedge_delay(decision.route, model)
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not get_governor(self.provider).has_idle_capacity():
+                # Never hedge into a backlog: the duplicate would only add load
+                return await primary, "primary"
+
+            metrics.inc("model_hedges_total", route=decision.route)
+            hedge = asyncio.create_task(call(model))
+            roles = {primary: "primary", hedge: "hedge"}
+            pending = set(roles)
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        metrics.inc("model_hedge_wins_total", route=decision.route, winner=roles[task])
+                        return task.result(), roles[task]
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        routes = {}
+        for route, policy in ROUTES.items():
+            hedges = metrics.get_counter("model_hedges_total", route=route)
+            hedge_wins = metrics.get_counter("model_hedge_wins_total", route=route, winner="hedge")
+            models = {_model_for(policy.tier), _model_for(policy.long_tier)}
+            routes[route] = {
+                "hedging": policy.hedge and self.hedging_enabled,
+                "hedges": hedges,
+                "hedge_win_rate": round(hedge_wins / hedges, 4) if hedges else 0.0,
+                "hedge_delay_s": {model: round(self.hedge_delay(route, model), 3) for model in models}
+                if policy.hedge else None,
+            }
+        return {"tiers": {tier: _model_for(tier) for tier in TIER_DEFAULTS}, "routes": routes}
+
+
+model_router = ModelRouter()
+
+metrics.register_collector("model_router", model_router.stats)
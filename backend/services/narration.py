@@ -0,0 +1,163 @@
+# services/narration.py
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional, Tuple
+
+from services import metrics
+from services.breaker import CircuitOpenError
+from services.elevenlabs_service import AudioFormat, get_voice_profile, negotiate_audio_format, \
+    text_to_speech_bytes_async
+from services.governor import TokenBucket
+
+# Narrated investment memos. Every memo section is synthesized in the judge's
+# voice as its own TTS call, a few at a time, and handed back in display order
+# as soon as it and the sections before it are ready: the client can play the
+# recommendation while the conclusion is still rendering. Audio comes from
+# text_to_speech_bytes_async, so a section already narrated (same text, voice,
+# format and latency) is served from the "tts" cache and identical sections
+# rendering concurrently share one upstream call.
+#
+# The memo text comes from the client, so narration would otherwise synthesize
+# whatever it is sent. Each founder has a budget of
+# NARRATION_USER_CHARS_PER_HOUR characters of narration (about four full memos
+# by default), refilled continuously; a request that doesn't fit is refused
+# with Retry-After before any TTS call. Budgets are per process, like the
+# governors, and kept for the most recent NARRATION_MAX_TRACKED_USERS founders.
+
+# Below the elevenlabs_tts governor's concurrency (4), so a narration never holds
+# every slot a judge's reply needs
+NARRATION_CONCURRENCY = int(os.getenv("NARRATION_CONCURRENCY", "3"))
+NARRATION_SECTION_TIMEOUT_SECONDS = float(os.getenv("NARRATION_SECTION_TIMEOUT_SECONDS", "20"))
+# Longer sections are cut at a sentence boundary; a minute or two of speech each
+NARRATION_MAX_CHARS = int(os.getenv("NARRATION_MAX_CHARS", "1500"))
+NARRATION_USER_CHARS_PER_HOUR = int(os.getenv("NARRATION_USER_CHARS_PER_HOUR", "60000"))
+NARRATION_MAX_TRACKED_USERS = int(os.getenv("NARRATION_MAX_TRACKED_USERS", "10000"))
+
+_BULLET_RE = re.compile(r"^\s*(?:[•*\-–#>]+|\d+[.)])\s*")
+_MARKUP_RE = re.compile(r"[*_`#]+")
+_SENTENCE_END_RE = re.compile(r"[.!?](?=\s|$)")
+
+
+def section_title(name: str) -> str:
+    """"scenarioAnalysis" -> "Scenario analysis"."""
+    words = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", name).split()
+    return " ".join([words[0].capitalize()] + [word.lower() for word in words[1:]]) if words else name
+
+
+def narration_text(name: str, value: str, max_chars: int = NARRATION_MAX_CHARS) -> str:
+    """
+    What the judge says for one section: its title, then its text with bullets
+    and markdown dropped and each line ended as a sentence, clipped to `max_chars`.
+    Empty if the section has no text.
+    """
+    lines = []
+    for line in (value or "").splitlines():
+        line = _MARKUP_RE.sub("", _BULLET_RE.sub("", line)).strip()
+        if line:
+            lines.append(line if line[-1] in ".!?:;" else f"{line}.")
+    if not lines:
+        return ""
+    text = f"{section_title(name)}. {' '.join(lines)}"
+    if len(text) > max_chars:
+        ends = [m.end() for m in _SENTENCE_END_RE.finditer(text, 0, max_chars)]
+        text = text[:ends[-1]] if ends else text[:max_chars].rsplit(" ", 1)[0] + "."
+    return text
+
+
+def section_hash(text: str, judge: str, audio_format: AudioFormat, latency: Optional[int]) -> str:
+    """Identifies a section's audio, for clients that keep their own copy."""
+    return hashlib.sha256(
+        f"{get_voice_profile(judge)}:{audio_format.name}:{latency}:{text}".encode("utf-8")
+    ).hexdigest()[:16]
+
+
+class NarrationBudget:
+    """Per-founder token buckets of narration characters."""
+
+    def __init__(self, chars_per_hour: int, max_users: int):
+        self.chars_per_hour = chars_per_hour
+        self.max_users = max_users
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def charge(self, user_id: str, chars: int) -> float:
+        """
+        Spend `chars` of the founder's budget and return 0, or spend nothing and
+        return the seconds until it would fit. 0 when budgets are off (<= 0).
+        """
+        if self.chars_per_hour <= 0:
+            return 0.0
+        bucket = self._buckets.pop(user_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.chars_per_hour / 3600, self.chars_per_hour)
+        self._buckets[user_id] = bucket
+        while len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+        # A memo bigger than the whole budget costs the whole budget
+        wait = bucket.take(min(chars, self.chars_per_hour))
+        metrics.inc("memo_narration_budget_total", result="refused" if wait else "charged")
+        return wait
+
+
+narration_budget = NarrationBudget(NARRATION_USER_CHARS_PER_HOUR, NARRATION_MAX_TRACKED_USERS)
+
+
+async def narrate_sections(sections: List[Tuple[str, str]], judge: str, audio_format: Optional[AudioFormat] = None,
+                           latency: Optional[int] = None, concurrency: int = NARRATION_CONCURRENCY,
+                           timeout: float = NARRATION_SECTION_TIMEOUT_SECONDS) -> AsyncIterator[dict]:
+    """
+    Narrate (name, value) sections, at most `concurrency` TTS calls at a time, and
+    yield one dict per non-empty section in the given order. `audio` is base64, or
+    None with `status` "timeout", "unavailable" (TTS circuit open) or "failed", so
+    the client can fall back to the text. Stopping iteration cancels the rest.
+    """
+    audio_format = audio_format or negotiate_audio_format()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+
+    async def render(index: int, name: str, text: str) -> dict:
+        # Semaphore waiters are woken in order, so sections start in display order
+        async with semaphore:
+            section_started = time.perf_counter()
+            audio, status = None, "ok"
+            try:
+                audio = await asyncio.wait_for(
+                    text_to_speech_bytes_async(text, judge, audio_format, latency), timeout
+                )
+            except CircuitOpenError:
+                status = "unavailable"
+            except asyncio.TimeoutError:
+                status = "timeout"
+            except Exception as e:
+                print(f"⚠️ Failed to narrate memo section {name}: {e}")
+                status = "failed"
+            metrics.inc("memo_narration_sections_total", status=status)
+            metrics.observe("memo_narration_section_seconds", time.perf_counter() - section_started)
+        return {
+            "name": name,
+            "index": index,
+            "text": text,
+            "hash": section_hash(text, judge, audio_format, latency),
+            "status": status,
+            "audio": base64.b64encode(audio).decode("utf-8") if audio else None,
+            "audio_format": audio_format.name if audio else None,
+            "audio_mime_type": audio_format.mime_type if audio else None,
+        }
+
+    texts = [(name, narration_text(name, value)) for name, value in sections]
+    texts = [(name, text) for name, text in texts if text]
+    tasks = [asyncio.create_task(render(index, name, text)) for index, (name, text) in enumerate(texts)]
+    try:
+        for position, task in enumerate(tasks):
+            section = await task
+            if position == 0:
+                metrics.observe("memo_narration_first_section_seconds", time.perf_counter() - started)
+            yield section
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,366 @@
+# services/profiler.py
+import asyncio
+import contextvars
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from services import metrics
+
+# On-demand sampled profiling of whole requests, as ASGI middleware. A request
+# is profiled when it carries X-Profile-Token (= ADMIN_TOKEN), or by chance:
+# PROFILE_SAMPLE_RATE for every route, PROFILE_ROUTES ("/judges/generate=0.05,
+# /performance=1", longest path prefix wins) per route.
+#
+# While a request is profiled a sampler thread wakes every PROFILE_INTERVAL_MS
+# and records one stack per tick, following the request's task and every task
+# it spawns (tracked through a task factory installed only while a profile is
+# running). The stack is causal: from the request down through the tasks it is
+# awaiting to either the code running on the event loop thread or, while
+# suspended, what it is waiting on ("[await Future]" under an httpx read, say).
+# Every tick goes into the wall-clock profile; ticks where the request's own
+# code held the event loop also go into the CPU profile.
+#
+# Each profile is written to PROFILE_DIR as a speedscope file (both profiles)
+# and collapsed stacks (<id>.wall.folded, <id>.cpu.folded, for flamegraph.pl),
+# keeping the newest PROFILE_MAX_FILES profiles. /admin/profiles lists and
+# serves them. Requests that aren't profiled pay for a header scan and, with
+# a rate configured, one random() call.
+
+PROFILE_HEADER = b"x-profile-token"
+ID_HEADER = b"x-profile-id"
+MAX_SAMPLES = 200_000
+FILE_PATTERN = re.compile(r"^[\w.-]+\.(speedscope\.json|wall\.folded|cpu\.folded)$")
+
+_active: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("active_profile", default=None)
+
+
+def profile_dir() -> str:
+    return os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "judge-api-profiles"))
+
+
+def _parse_routes(spec: str) -> List[Tuple[str, float]]:
+    routes = []
+    for item in spec.split(","):
+        path, _, rate = item.strip().partition("=")
+        if path:
+            routes.append((path, float(rate or 1.0)))
+    # Longest prefix first
+    return sorted(routes, key=lambda route: -len(route[0]))
+
+
+def _frame_label(frame) -> Tuple[str, str, int]:
+    code = frame.f_code
+    return getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno
+
+
+def _coroutine_frame(obj):
+    return getattr(obj, "cr_frame", None) or getattr(obj, "gi_frame", None) or getattr(obj, "ag_frame", None)
+
+
+class RequestProfile:
+    """Samples of one request's tasks, taken from a background thread."""
+
+    def __init__(self, method: str, path: str, reason: str, loop: asyncio.AbstractEventLoop, interval: float):
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.loop = loop
+        self.interval = interval
+        self.loop_thread = threading.get_ident()
+        self.root: Optional[asyncio.Task] = None
+        self.tasks: List[asyncio.Task] = []
+        # stack (tuple of frame labels) -> seconds, for the wall-clock and CPU profiles
+        self.wall: Counter = Counter()
+        self.cpu: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.root = asyncio.current_task()
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self.started
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval) and self.samples < MAX_SAMPLES:
+            now = time.perf_counter()
+            try:
+                self._sample(now - last)
+            except Exception:
+                # The loop thread keeps running while we look; a torn read just loses this tick
+                pass
+            last = now
+
+    def _sample(self, weight: float) -> None:
+        running = asyncio.tasks._current_tasks.get(self.loop)
+        thread_frame = sys._current_frames().get(self.loop_thread)
+        stack, on_cpu = self._task_stack(self.root, running, thread_frame, set())
+        if not on_cpu and running is not None and running is not self.root and running in self.tasks:
+            # A task of ours that nothing is awaiting (fire and forget): CPU only
+            cpu_stack, _ = self._task_stack(running, running, thread_frame, set())
+            self.cpu[(("[task " + running.get_name() + "]", "", 0),) + cpu_stack] += weight
+        self.wall[stack] += weight
+        if on_cpu:
+            self.cpu[stack] += weight
+        self.samples += 1
+
+    def _task_stack(self, task: asyncio.Task, running, thread_frame, seen: set) -> Tuple[tuple, bool]:
+        """(stack of frame labels, whether it ends in code running on the loop thread) for `task`."""
+        seen.add(id(task))
+        coro = task.get_coro()
+        if task is running and thread_frame is not None:
+            return self._thread_stack(thread_frame, _coroutine_frame(coro)), True
+
+        labels = []
+        obj = coro
+        while obj is not None:
+            frame = _coroutine_frame(obj)
+            if frame is None:
+                break
+            labels.append(_frame_label(frame))
+            obj = getattr(obj, "cr_await", None) or getattr(obj, "gi_yieldfrom", None) or getattr(obj, "ag_await", None)
+
+        waiter = getattr(task, "_fut_waiter", None)
+        # Follow the await into a task of ours (directly, or the first unfinished child of a gather)
+        children = getattr(waiter, "_children", None) or [waiter]
+        for child in children:
+            if isinstance(child, asyncio.Task) and not child.done() and id(child) not in seen and child in self.tasks:
+                stack, on_cpu = self._task_stack(child, running, thread_frame, seen)
+                return tuple(labels) + (("[task " + child.get_name() + "]", "", 0),) + stack, on_cpu
+        if waiter is not None:
+            labels.append((f"[await {type(waiter).__name__}]", "", 0))
+        elif task.done():
+            labels.append(("[done]", "", 0))
+        return tuple(labels), False
+
+    @staticmethod
+    def _thread_stack(leaf, root_frame) -> tuple:
+        frames = []
+        frame = leaf
+        while frame is not None:
+            frames.append(frame)
+            if frame is root_frame:
+                break
+            frame = frame.f_back
+        return tuple(_frame_label(f) for f in reversed(frames))
+
+    # --- Output ---
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": self.samples,
+            "cpu_ms": round(sum(self.cpu.values()) * 1000, 1),
+            "interval_ms": round(self.interval * 1000, 2),
+        }
+
+    def speedscope(self) -> dict:
+        frames: List[dict] = []
+        index: Dict[tuple, int] = {}
+
+        def frame_index(label: tuple) -> int:
+            if label not in index:
+                index[label] = len(frames)
+                name, file, line = label
+                frames.append({"name": name, "file": file, "line": line} if file else {"name": name})
+            return index[label]
+
+        def profile(name: str, counter: Counter) -> dict:
+            stacks = sorted(counter.items())
+            return {
+                "type": "sampled",
+                "name": f"{self.method} {self.path} ({name})",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(counter.values()) * 1000, 3),
+                "samples": [[frame_index(label) for label in stack] for stack, _ in stacks],
+                "weights": [round(seconds * 1000, 3) for _, seconds in stacks],
+            }
+
+        profiles = [profile("wall", self.wall), profile("cpu", self.cpu)]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": f"{self.method} {self.path} {self.id}",
+            "activeProfileIndex": 0,
+            "exporter": "judge-api profiler",
+        }
+
+    @staticmethod
+    def folded(counter: Counter, interval: float) -> str:
+        """Collapsed stacks ("a;b;c <samples>"), the input flamegraph.pl and speedscope both read."""
+        lines = []
+        for stack, seconds in sorted(counter.items()):
+            names = ";".join(f"{name} ({os.path.basename(file)}:{line})" if file else name
+                             for name, file, line in stack)
+            lines.append(f"{names} {max(1, round(seconds / interval))}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str, max_files: int) -> None:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.id)
+        with open(base + ".speedscope.json", "w") as f:
+            json.dump(self.speedscope(), f, separators=(",", ":"))
+        with open(base + ".wall.folded", "w") as f:
+            f.write(self.folded(self.wall, self.interval))
+        with open(base + ".cpu.folded", "w") as f:
+            f.write(self.folded(self.cpu, self.interval))
+        with open(base + ".json", "w") as f:
+            json.dump(self.summary(), f)
+        prune(directory, max_files)
+
+
+def list_profiles(directory: Optional[str] = None) -> List[dict]:
+    """Summaries of the stored profiles, newest first, with their file names."""
+    directory = directory or profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".json") or name.endswith(".speedscope.json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summary["files"] = [f"{summary['id']}.{suffix}" for suffix in ("speedscope.json", "wall.folded", "cpu.folded")]
+        profiles.append(summary)
+    return profiles
+
+
+def profile_file(name: str, directory: Optional[str] = None) -> Optional[str]:
+    """Path of a stored profile file, or None if `name` isn't one (no path traversal)."""
+    if not FILE_PATTERN.match(name):
+        return None
+    path = os.path.join(directory or profile_dir(), name)
+    return path if os.path.isfile(path) else None
+
+
+def prune(directory: str, max_files: int) -> None:
+    """Keep the newest `max_files` profiles (ids start with their timestamp)."""
+    ids = sorted({name.split(".", 1)[0] for name in os.listdir(directory)}, reverse=True)
+    for stale in ids[max_files:]:
+        for suffix in (".json", ".speedscope.json", ".wall.folded", ".cpu.folded"):
+            try:
+                os.remove(os.path.join(directory, stale + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class _TaskTracker:
+    """Task factory, installed while any profile runs, that adds new tasks to the creator's profile."""
+
+    def __init__(self):
+        self.running = 0
+        self.previous = None
+
+    def install(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self.running == 0:
+            self.previous = loop.get_task_factory()
+            loop.set_task_factory(self.factory)
+        self.running += 1
+
+    def uninstall(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.running -= 1
+        if self.running == 0:
+            loop.set_task_factory(self.previous)
+
+    def factory(self, loop, coro, context=None):
+        if self.previous is not None:
+            task = self.previous(loop, coro) if context is None else self.previous(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        profile = context.get(_active) if context is not None else _active.get()
+        if profile is not None:
+            profile.tasks.append(task)
+        return task
+
+
+_tracker = _TaskTracker()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that profiles selected HTTP requests end to end (see module comment)."""
+
+    def __init__(self, app):
+        self.app = app
+        self.token = os.getenv("ADMIN_TOKEN", "").encode("utf-8")
+        self.rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.routes = _parse_routes(os.getenv("PROFILE_ROUTES", ""))
+        self.interval = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+        self.max_concurrent = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+        self.max_files = int(os.getenv("PROFILE_MAX_FILES", "50"))
+        self.directory = profile_dir()
+        self.active = 0
+
+    def _reason(self, scope) -> Optional[str]:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return "header" if hmac.compare_digest(value, self.token) else None
+        path = scope["path"]
+        for prefix, rate in self.routes:
+            if path.startswith(prefix):
+                return "route" if rate > 0 and random.random() < rate else None
+        if self.rate > 0 and random.random() < self.rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        reason = self._reason(scope)
+        if reason is None or self.active >= self.max_concurrent:
+            return await self.app(scope, receive, send)
+
+        loop = asyncio.get_running_loop()
+        profile = RequestProfile(scope["method"], scope["path"], reason, loop, self.interval)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (ID_HEADER, profile.id.encode())]}
+            await send(message)
+
+        self.active += 1
+        _tracker.install(loop)
+        token = _active.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+            _active.reset(token)
+            _tracker.uninstall(loop)
+            self.active -= 1
+            metrics.inc("profiles_captured_total", reason=reason)
+            try:
+                await asyncio.to_thread(profile.write, self.directory, self.max_files)
+                print(f"🔬 Profiled {profile.method} {profile.path} ({reason}): {profile.samples} samples, "
+                      f"{profile.duration * 1000:.0f} ms -> {profile.id}")
+            except OSError as e:
+                print(f"⚠️ Failed to write profile {profile.id}: {e}")
@@ -0,0 +1,231 @@
+# services/semantic_cache.py
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, Optional, Tuple
+
+from services import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Semantic cache for a judge's reply to the *first* message of a conversation.
+# Openings are near-identical across rehearsals ("Hi, I'm X and we're building Y"),
+# so a nearest-neighbour hit lets us skip both the LLM call and TTS.
+#
+# Embeddings are computed locally on CPU with feature hashing (word unigrams,
+# bigrams and character trigrams), so there is no model to download and lookup
+# is a single matrix-vector product over a compact float32 index per judge.
+#
+# Similar openings from different founders differ mostly in a name or a figure,
+# which barely moves a bag-of-features embedding ("Hi, I'm Alice ..." vs "Hi,
+# I'm Bob ..." score above 0.9). A reply answers one founder's pitch, so a hit
+# also requires both openings to carry exactly the same identifiers (numbers and
+# proper nouns, see identifiers()).
+
+EMBEDDING_DIMS = 512
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_WORD_RE = re.compile(r"[A-Za-z0-9][\w'$%.,-]*")
+_SENTENCE_END = (".", "!", "?")
+
+
+def _bucket(feature: str) -> Tuple[int, float]:
+    h = zlib.crc32(feature.encode("utf-8"))
+    # Signed hashing keeps collisions from systematically inflating similarity
+    return h % EMBEDDING_DIMS, 1.0 if (h >> 31) & 1 else -1.0
+
+
+def embed(text: str) -> "np.ndarray":
+    """L2-normalised hashed bag-of-features embedding (float32, EMBEDDING_DIMS)."""
+    import numpy as np
+
+    vector = np.zeros(EMBEDDING_DIMS, dtype=np.float32)
+    tokens = _TOKEN_RE.findall(text.lower())
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    squashed = " ".join(tokens)
+    features += [f"#{squashed[i:i + 3]}" for i in range(len(squashed) - 2)]
+    for feature in features:
+        index, sign = _bucket(feature)
+        vector[index] += sign
+    norm = float(np.linalg.norm(vector))
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def identifiers(text: str) -> FrozenSet[str]:
+    """
+    Words that make an opening someone's own: anything with a digit (figures,
+    amounts) and capitalized words that don't start a sentence (names, companies).
+    """
+    found = set()
+    sentence_start = True
+    for word in _WORD_RE.findall(text):
+        bare = word.rstrip(".,!?")
+        if any(ch.isdigit() for ch in bare):
+            found.add(bare.lower())
+        elif not sentence_start and bare[:1].isupper() and bare.split("'")[0] != "I":
+            found.add(bare.lower())
+        sentence_start = word.endswith(_SENTENCE_END)
+    return frozenset(found)
+
+
+class CachedReply:
+    __slots__ = ("text", "audio_base64", "prompt", "identifiers", "created_at", "last_access", "size")
+
+    def __init__(self, prompt: str, text: str, audio_base64: Optional[str]):
+        self.prompt = prompt
+        self.text = text
+        self.audio_base64 = audio_base64
+        self.identifiers = identifiers(prompt)
+        self.created_at = self.last_access = time.time()
+        self.size = len(text) + len(audio_base64 or "")
+
+
+class VectorIndex:
+    """Fixed-capacity float32 index with LRU eviction; rows are reused in place."""
+
+    def __init__(self, capacity: int):
+        import numpy as np
+
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, EMBEDDING_DIMS), dtype=np.float32)
+        self.entries: Dict[int, CachedReply] = {}
+        self.lru: "OrderedDict[int, None]" = OrderedDict()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, query: "np.ndarray", threshold: float,
+               accept: Callable[[CachedReply], bool]) -> Tuple[Optional[int], float]:
+        """Best-scoring entry at or above `threshold` that `accept` allows."""
+        if not self.entries:
+            return None, 0.0
+        # Unused rows are zero vectors, so they score 0 and never pass a positive threshold
+        scores = self.vectors @ query
+        for slot in scores.argsort()[::-1]:
+            slot = int(slot)
+            if scores[slot] < threshold:
+                break
+            if slot in self.entries and accept(self.entries[slot]):
+                return slot, float(scores[slot])
+        return None, 0.0
+
+    def touch(self, slot: int) -> CachedReply:
+        self.lru.move_to_end(slot)
+        entry = self.entries[slot]
+        entry.last_access = time.time()
+        return entry
+
+    def add(self, vector: "np.ndarray", entry: CachedReply) -> None:
+        if len(self.entries) >= self.capacity:
+            self.evict_lru()
+        slot = next(i for i in range(self.capacity) if i not in self.entries)
+        self.vectors[slot] = vector
+        self.entries[slot] = entry
+        self.lru[slot] = None
+        self.bytes += entry.size
+
+    def evict_lru(self) -> None:
+        slot, _ = self.lru.popitem(last=False)
+        self.bytes -= self.entries.pop(slot).size
+        self.vectors[slot] = 0
+        metrics.inc("semantic_cache_evictions_total")
+
+
+class SemanticReplyCache:
+    """Per-judge nearest-neighbour cache of first-turn replies (text + audio)."""
+
+    def __init__(self, threshold: float = 0.98, max_entries_per_judge: int = 256,
+                 max_bytes: int = 64 * 1024 * 1024, max_prompt_chars: int = 600):
+        self.threshold = threshold
+        self.max_entries_per_judge = max_entries_per_judge
+        self.max_bytes = max_bytes
+        self.max_prompt_chars = max_prompt_chars
+        self._indexes: Dict[str, VectorIndex] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _index(self, judge_key: str) -> VectorIndex:
+        index = self._indexes.get(judge_key)
+        if index is None:
+            index = self._indexes[judge_key] = VectorIndex(self.max_entries_per_judge)
+        return index
+
+    def lookup(self, judge_key: str, message: str) -> Optional[CachedReply]:
+        if len(message) > self.max_prompt_chars:
+            # Long, detailed openings are unlikely to match and shouldn't get a canned reply
+            return None
+        index = self._index(judge_key)
+        wanted = identifiers(message)
+        slot, score = index.search(embed(message), self.threshold, lambda entry: entry.identifiers == wanted)
+        if slot is not None:
+            self.hits += 1
+            metrics.inc("semantic_cache_lookups_total", judge=judge_key, result="hit")
+            metrics.observe("semantic_cache_hit_similarity", score)
+            return index.touch(slot)
+        self.misses += 1
+        metrics.inc("semantic_cache_lookups_total", judge=judge_key, result="miss")
+        return None
+
+    def store(self, judge_key: str, message: str, reply: str, audio_base64: Optional[str]) -> None:
+        if len(message) > self.max_prompt_chars:
+            return
+        entry = CachedReply(message, reply, audio_base64)
+        if entry.size > self.max_bytes:
+            return
+        self._index(judge_key).add(embed(message), entry)
+        self._enforce_byte_cap()
+
+    def _enforce_byte_cap(self) -> None:
+        while self.total_bytes > self.max_bytes:
+            # Evict the globally least-recently-used entry: the LRU head of the
+            # index whose head was used longest ago
+            victim = min(
+                (index for index in self._indexes.values() if index.entries),
+                key=lambda index: index.entries[next(iter(index.lru))].last_access,
+            )
+            victim.evict_lru()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(index.bytes for index in self._indexes.values())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": {judge: len(index) for judge, index in self._indexes.items()},
+            "bytes": self.total_bytes,
+            "threshold": self.threshold,
+        }
+
+
+_cache: Optional[SemanticReplyCache] = None
+
+
+def get_reply_cache() -> Optional[SemanticReplyCache]:
+    """
+    The shared first-turn reply cache, or None unless SEMANTIC_CACHE_ENABLED is set.
+    Tunables: SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES (per judge),
+    SEMANTIC_CACHE_MAX_BYTES.
+    """
+    global _cache
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "").lower() not in ("1", "true", "yes"):
+        return None
+    if _cache is None:
+        _cache = SemanticReplyCache(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.98")),
+            max_entries_per_judge=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256")),
+            max_bytes=int(os.getenv("SEMANTIC_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        )
+    return _cache
+
+
+metrics.register_collector("semantic_cache", lambda: _cache.stats() if _cache else {"enabled": False})
@@ -0,0 +1,263 @@
+# services/speculation.py
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Awaitable, Callable, List, Optional
+
+from services import metrics
+from services.governor import get_governor
+
+# Speculative judge replies. While the founder is still speaking, the client
+# streams partial transcripts (POST /elevenlabs/partial). Once a partial has
+# stayed the same for a few updates, is confidently recognised and end of
+# speech looks likely, the judge's LLM call starts on that partial. When the
+# final message arrives, a speculation whose text differs only trivially
+# (case, punctuation, fillers, a stray word in a long utterance) is claimed
+# and its reply reused; anything else is cancelled and the turn regenerates.
+#
+# Only the LLM call is speculative. TTS and every database write happen after
+# the final transcript, so a miss costs tokens but never leaks into history.
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+FILLERS = frozenset({"um", "umm", "uh", "uhh", "uhm", "er", "erm", "hmm", "mm", "mhm"})
+
+
+def normalize(text: str) -> List[str]:
+    """Words of a transcript, ignoring case, punctuation and filler words."""
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in FILLERS]
+
+
+def end_of_speech_likelihood(text: str, end_of_speech: Optional[float] = None,
+                             silence_ms: Optional[int] = None, silence_full_ms: int = 700) -> float:
+    """
+    Probability the founder has finished speaking: the client's own estimate if it
+    sends one, else the trailing silence relative to `silence_full_ms`, else whether
+    the partial ends a sentence.
+    """
+    if end_of_speech is not None:
+        return end_of_speech
+    if silence_ms is not None:
+        return min(1.0, silence_ms / silence_full_ms)
+    return 1.0 if text.rstrip().endswith((".", "?", "!")) else 0.0
+
+
+class Speculation:
+    """An LLM call started on a partial transcript."""
+
+    def __init__(self, conversation_id: str, text: str, context_key: str, task: asyncio.Task, prompt_chars: int):
+        self.conversation_id = conversation_id
+        self.text = text
+        self.words = normalize(text)
+        # Identifies the history the prompt was built from; a claim against other history misses
+        self.context_key = context_key
+        self.task = task
+        self.prompt_chars = prompt_chars
+        self.started = time.monotonic()
+        # Mark failures as retrieved: an unclaimed speculation's error is nobody's business
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def head_start(self) -> float:
+        """Seconds of LLM time already spent when the final transcript arrived."""
+        return time.monotonic() - self.started
+
+
+class _Utterance:
+    __slots__ = ("words", "stable", "speculation")
+
+    def __init__(self, words: List[str]):
+        self.words = words
+        self.stable = 1
+        self.speculation: Optional[Speculation] = None
+
+
+class Speculator:
+    """
+    Tracks partial transcripts per conversation and the speculation running for each.
+
+    Args:
+        min_confidence: Smallest STT confidence a partial needs (unknown confidence passes)
+        min_end_of_speech: Smallest end-of-speech likelihood to start speculating
+        stable_partials: Consecutive identical partials (after normalization) required
+        match_ratio: Word-level similarity at which the final transcript counts as
+            trivially different from the speculated partial
+        max_age: Seconds after which an unclaimed speculation is discarded
+        max_conversations: Bound on tracked conversations; the oldest is dropped
+    """
+
+    def __init__(self, min_confidence: float = 0.85, min_end_of_speech: float = 0.6, stable_partials: int = 2,
+                 match_ratio: float = 0.97, max_age: float = 30.0, max_conversations: int = 1000,
+                 provider: str = "gemini"):
+        self.min_confidence = min_confidence
+        self.min_end_of_speech = min_end_of_speech
+        self.stable_partials = stable_partials
+        self.match_ratio = match_ratio
+        self.max_age = max_age
+        self.max_conversations = max_conversations
+        self.provider = provider
+        self._utterances: "OrderedDict[str, _Utterance]" = OrderedDict()
+
+    def matches(self, speculated: List[str], final: List[str]) -> bool:
+        if speculated == final:
+            return True
+        return bool(speculated and final) and SequenceMatcher(None, speculated, final).ratio() >= self.match_ratio
+
+    def observe(self, conversation_id: str, text: str, confidence: Optional[float], end_of_speech: float) -> str:
+        """
+        Record a partial transcript.
+
+        Returns:
+            "ready" when a speculation should start on this partial, "unchanged" when one
+            is already running for it, "busy" when the LLM has no spare capacity, otherwise
+            "waiting"
+        """
+        words = normalize(text)
+        utterance = self._utterances.get(conversation_id)
+        if utterance is not None and utterance.words == words:
+            utterance.stable += 1
+            self._utterances.move_to_end(conversation_id)
+        else:
+            previous = utterance.speculation if utterance else None
+            utterance = self._utterances[conversation_id] = _Utterance(words)
+            self._utterances.move_to_end(conversation_id)
+            if previous is not None:
+                if self.matches(previous.words, words):
+                    utterance.speculation = previous
+                else:
+                    # The founder kept talking: the running guess is already wrong
+                    self._discard(previous, "superseded")
+            self._evict()
+
+        speculation = utterance.speculation
+        if speculation is not None and time.monotonic() - speculation.started > self.max_age:
+            self._discard(speculation, "expired")
+            speculation = utterance.speculation = None
+        if speculation is not None:
+            return "unchanged"
+
+        if (not words
+                or utterance.stable < self.stable_partials
+                or (confidence is not None and confidence < self.min_confidence)
+                or end_of_speech < self.min_end_of_speech):
+            return "waiting"
+        if not get_governor(self.provider).has_idle_capacity():
+            # Speculation is optional load; never queue it behind real turns
+            metrics.inc("speculations_skipped_total", reason="busy")
+            return "busy"
+        return "ready"
+
+    def start(self, conversation_id: str, text: str, context_key: str,
+              generate: Callable[[], Awaitable[Any]], prompt_chars: int = 0) -> Speculation:
+        """Start `generate()` as the speculation for the conversation's current utterance."""
+        utterance = self._utterances.get(conversation_id)
+        if utterance is None:
+            utterance = self._utterances[conversation_id] = _Utterance(normalize(text))
+            self._evict()
+        if utterance.speculation is not None:
+            self._discard(utterance.speculation, "superseded")
+        speculation = utterance.speculation = Speculation(
+            conversation_id, text, context_key, asyncio.ensure_future(generate()), prompt_chars
+        )
+        metrics.inc("speculations_total", outcome="started")
+        print(f"🔮 Speculating judge reply for {conversation_id} on a {len(speculation.words)}-word partial")
+        return speculation
+
+    def claim(self, conversation_id: str, final_text: str, context_key: str) -> Optional[Speculation]:
+        """
+        Hand over the conversation's speculation if it was made for this history and
+        the final transcript differs only trivially from its partial; otherwise cancel it.
+        """
+        utterance = self._utterances.pop(conversation_id, None)
+        speculation = utterance.speculation if utterance else None
+        if speculation is None:
+            return None
+
+        task = speculation.task
+        if speculation.context_key != context_key:
+            self._discard(speculation, "stale")
+        elif task.done() and (task.cancelled() or task.exception() is not None):
+            self._discard(speculation, "failed")
+        elif not self.matches(speculation.words, normalize(final_text)):
+            self._discard(speculation, "miss")
+        else:
+            metrics.inc("speculations_total", outcome="hit")
+            metrics.observe("speculation_head_start_seconds", speculation.head_start())
+            return speculation
+        return None
+
+    def discard(self, conversation_id: str, outcome: str = "abandoned") -> None:
+        """Cancel the conversation's speculation, if any (e.g. when it ends)."""
+        utterance = self._utterances.pop(conversation_id, None)
+        if utterance is not None and utterance.speculation is not None:
+            self._discard(utterance.speculation, outcome)
+
+    def _discard(self, speculation: Speculation, outcome: str) -> None:
+        task = speculation.task
+        metrics.inc("speculations_total", outcome=outcome)
+        usage = None
+        if task.done() and not task.cancelled() and task.exception() is None:
+            usage = getattr(task.result(), "usage_metadata", None)
+        if usage is not None:
+            wasted = usage.total_token_count or (usage.prompt_token_count or 0) + (usage.candidates_token_count or 0)
+            metrics.inc("speculation_wasted_tokens_total", wasted, kind="billed")
+        else:
+            # Still in flight (or failed): the prompt was sent, so count it, ~4 chars a token
+            task.cancel()
+            metrics.inc("speculation_wasted_tokens_total", speculation.prompt_chars // 4, kind="estimated")
+        print(f"🗑️ Discarded speculation for {speculation.conversation_id} ({outcome})")
+
+    def _evict(self) -> None:
+        while len(self._utterances) > self.max_conversations:
+            conversation_id = next(iter(self._utterances))
+            self.discard(conversation_id, "evicted")
+
+    def stats(self) -> dict:
+        hits = metrics.get_counter("speculations_total", outcome="hit")
+        misses = metrics.get_counter("speculations_total", outcome="miss")
+        return {
+            "enabled": True,
+            "started": metrics.get_counter("speculations_total", outcome="started"),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "in_flight": sum(1 for u in self._utterances.values() if u.speculation and not u.speculation.task.done()),
+            "wasted_tokens": {
+                kind: metrics.get_counter("speculation_wasted_tokens_total", kind=kind)
+                for kind in ("billed", "estimated")
+            },
+            "median_head_start_s": round(metrics.percentile("speculation_head_start_seconds", 50) or 0.0, 3),
+            "thresholds": {
+                "min_confidence": self.min_confidence,
+                "min_end_of_speech": self.min_end_of_speech,
+                "stable_partials": self.stable_partials,
+                "match_ratio": self.match_ratio,
+            },
+        }
+
+
+_speculator: Optional[Speculator] = None
+
+
+def get_speculator() -> Optional[Speculator]:
+    """
+    The shared speculator, or None unless SPECULATION_ENABLED is set.
+    Tunables: SPECULATION_MIN_CONFIDENCE, SPECULATION_MIN_END_OF_SPEECH,
+    SPECULATION_STABLE_PARTIALS, SPECULATION_MATCH_RATIO, SPECULATION_MAX_AGE_SECONDS.
+    """
+    global _speculator
+    if os.getenv("SPECULATION_ENABLED", "").lower() not in ("1", "true", "yes"):
+        return None
+    if _speculator is None:
+        _speculator = Speculator(
+            min_confidence=float(os.getenv("SPECULATION_MIN_CONFIDENCE", "0.85")),
+            min_end_of_speech=float(os.getenv("SPECULATION_MIN_END_OF_SPEECH", "0.6")),
+            stable_partials=int(os.getenv("SPECULATION_STABLE_PARTIALS", "2")),
+            match_ratio=float(os.getenv("SPECULATION_MATCH_RATIO", "0.97")),
+            max_age=float(os.getenv("SPECULATION_MAX_AGE_SECONDS", "30")),
+        )
+    return _speculator
+
+
+metrics.register_collector("speculation", lambda: _speculator.stats() if _speculator else {"enabled": False})
@@ -0,0 +1,8 @@
+# services/sse.py
+import json
+from typing import Any
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format a single server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
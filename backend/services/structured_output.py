@@ -0,0 +1,430 @@
+# services/structured_output.py
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+# Parse outcome counters, so we can see how many LLM calls were rescued
+# instead of falling back to the placeholder memo / 7.0 metrics.
+PARSE_STATS: Dict[str, int] = {"ok": 0, "repaired": 0, "partial": 0, "fallback": 0}
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z0-9_-]*\s*\n?|\n?\s*```\s*$")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def strip_markdown_fences(text: str) -> str:
+    """Remove ```json ... ``` wrappers the model sometimes adds despite instructions."""
+    return _FENCE_RE.sub("", text.strip()).strip()
+
+
+def _slice_json_region(text: str) -> str:
+    """Drop prose before the first '{' / '[' and after the last matching close."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text
+    text = text[min(starts):]
+    end = max(text.rfind("}"), text.rfind("]"))
+    # Only trim trailing prose when the region is balanced; a truncated
+    # payload keeps its tail so repair_json can close it.
+    if end != -1 and _is_balanced(text[: end + 1]):
+        return text[: end + 1]
+    return text
+
+
+def _is_balanced(text: str) -> bool:
+    depth = 0
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+    return depth == 0 and not in_string
+
+
+def repair_json(text: str) -> str:
+    """
+    Best-effort repair of common LLM JSON malformations without re-calling the model.
+    Handles markdown fences, surrounding prose, single-quoted strings,
+    unquoted keys, Python literals, raw newlines inside strings, trailing commas,
+    missing commas between members and truncated output (unterminated strings,
+    dangling keys and unclosed brackets).
+    Args:
+        text: Raw model output
+    Returns:
+        A string that is much more likely to be valid JSON
+    """
+    text = _slice_json_region(strip_markdown_fences(text))
+
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = False
+    quote = '"'
+    escape = False
+    i = 0
+    n = len(text)
+
+    while i < n:
+        ch = text[i]
+
+        if in_string:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == quote:
+                in_string = False
+                out.append('"')
+            elif ch == '"':
+                # Double quote inside a single-quoted string
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            # A string directly following a complete value means a missing comma
+            if _needs_comma(out):
+                out.append(",")
+            in_string = True
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            if _needs_comma(out):
+                out.append(",")
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k] in " \t\r\n":
+                k += 1
+            if _needs_comma(out):
+                out.append(",")
+            if stack and stack[-1] == "}" and k < n and text[k] == ":":
+                # Unquoted object key
+                out.append(f'"{word}"')
+            else:
+                out.append(_PY_LITERALS.get(word, word))
+            i = j
+            continue
+        elif ch in "-0123456789":
+            j = i
+            while j < n and text[j] in "+-.eE0123456789":
+                j += 1
+            if _needs_comma(out):
+                out.append(",")
+            out.append(text[i:j])
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # Truncated output: close whatever is still open
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    _drop_dangling_member(out)
+    _drop_trailing_comma(out)
+    while stack:
+        out.append(stack.pop())
+
+    return "".join(out)
+
+
+def _last_significant(out: List[str]) -> str:
+    for token in reversed(out):
+        stripped = token.strip()
+        if stripped:
+            return stripped[-1]
+    return ""
+
+
+def _needs_comma(out: List[str]) -> bool:
+    return _last_significant(out) in ('"', "}", "]") or _last_significant(out).isalnum()
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    while out and not out[-1].strip():
+        out.pop()
+    if out and out[-1].rstrip().endswith(","):
+        out[-1] = out[-1].rstrip()[:-1]
+
+
+def _drop_dangling_member(out: List[str]) -> None:
+    """Remove a trailing `"key":` or `"key"` left behind by truncation."""
+    joined = "".join(out).rstrip()
+    trimmed = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', r"\1", joined)
+    if trimmed != joined and trimmed.endswith(("{", ",")):
+        # Only a dangling key, never a completed array element
+        if _container_at_end(trimmed) == "{":
+            out[:] = [trimmed]
+            return
+    if joined.endswith(":"):
+        out[:] = [joined + " null"]
+
+
+def _container_at_end(text: str) -> str:
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]" and stack:
+            stack.pop()
+    return stack[-1] if stack else ""
+
+
+def loads_lenient(text: str) -> Tuple[Any, str]:
+    """
+    Parse model output as JSON, repairing it if needed.
+    Returns:
+        (data, status) where status is "ok" or "repaired"
+    Raises:
+        ValueError if the text cannot be salvaged
+    """
+    try:
+        return json.loads(text), "ok"
+    except (json.JSONDecodeError, TypeError):
+        pass
+    try:
+        return json.loads(repair_json(text or "")), "repaired"
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Unrecoverable JSON from model: {e}") from e
+
+
+def parse_model(text: str, model: Type[T], fallback: Optional[T] = None) -> Tuple[T, str]:
+    """
+    Parse and validate model output against a Pydantic schema.
+    Missing or invalid fields are filled from `fallback` rather than discarding
+    the whole response, so a truncated memo keeps every section that did arrive.
+    Args:
+        text: Raw model output
+        model: Pydantic model class to validate against
+        fallback: Instance used for fields the model did not return
+    Returns:
+        (instance, status) where status is "ok", "repaired", "partial" or "fallback";
+        see parse_model_with_defaults for which fields a partial result defaulted
+    """
+    result, status, _ = parse_model_with_defaults(text, model, fallback)
+    return result, status
+
+
+def parse_model_with_defaults(text: str, model: Type[T], fallback: Optional[T] = None) -> Tuple[T, str, List[str]]:
+    """
+    parse_model, plus the dotted names of the fields taken from `fallback`
+    ("metrics.clarity"). Empty for "ok" and "repaired"; for "fallback", every
+    field. A "partial" result's defaulted values are placeholders, not the
+    model's output: don't cache, store or count them as a parse that worked.
+    """
+    try:
+        data, status = loads_lenient(text)
+        if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+            # Object wrapped in a one-element array
+            data, status = data[0], "repaired"
+        if not isinstance(data, dict):
+            raise ValueError("Model output is not a JSON object")
+        defaulted: List[str] = []
+        try:
+            result = model.model_validate(data)
+        except ValidationError:
+            if fallback is None:
+                raise
+            result = _merge_with_fallback(data, model, fallback, defaulted)
+            status = "partial"
+            print(f"⚠️ Partial {model.__name__}, defaulted: {', '.join(defaulted)}")
+    except (ValueError, ValidationError) as e:
+        if fallback is None:
+            raise
+        print(f"⚠️ Falling back to default {model.__name__}: {e}")
+        result, status, defaulted = fallback, "fallback", _field_names(model)
+
+    PARSE_STATS[status] += 1
+    return result, status, defaulted
+
+
+def _merge_with_fallback(data: Dict[str, Any], model: Type[T], fallback: T, defaulted: List[str],
+                         prefix: str = "") -> T:
+    """`data` validated field by field, filling from `fallback` and recording each filled field in `defaulted`."""
+    merged = fallback.model_dump()
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        nested = isinstance(annotation, type) and issubclass(annotation, BaseModel)
+        value = data.get(name)
+        if nested and isinstance(value, dict):
+            merged[name] = _merge_with_fallback(value, annotation, getattr(fallback, name), defaulted,
+                                                f"{prefix}{name}.").model_dump()
+            continue
+        if name in data:
+            try:
+                merged[name] = TypeAdapter(annotation).validate_python(value)
+                continue
+            except ValidationError:
+                pass
+        defaulted.extend(_field_names(annotation, f"{prefix}{name}.") if nested else [f"{prefix}{name}"])
+    return model.model_validate(merged)
+
+
+def _field_names(model: Type[BaseModel], prefix: str = "") -> List[str]:
+    """Dotted names of every leaf field of `model`."""
+    names = []
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            names.extend(_field_names(annotation, f"{prefix}{name}."))
+        else:
+            names.append(f"{prefix}{name}")
+    return names
+
+
+class IncrementalJSONParser:
+    """
+    Incrementally scans a streamed JSON object and emits object members as soon
+    as their value is complete, e.g. each memo section while the rest is still
+    being generated.
+
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for path, value in parser.feed(chunk.text):
+                ...
+
+    `path` is a tuple of keys from the root, so ("memo", "risks") for a nested
+    member. Members nested deeper than `max_depth` are not emitted on their own
+    (they arrive as part of their parent).
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.buffer = ""
+        self._pos = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # Frames: [kind, current_key, value_start, expecting_key]
+        self._stack: List[list] = []
+
+    @property
+    def text(self) -> str:
+        return self.buffer
+
+    def feed(self, chunk: str) -> List[Tuple[Tuple[str, ...], Any]]:
+        self.buffer += chunk or ""
+        emitted: List[Tuple[Tuple[str, ...], Any]] = []
+        buf = self.buffer
+
+        while self._pos < len(buf):
+            i = self._pos
+            ch = buf[i]
+            self._pos += 1
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append(["obj", None, None, True])
+                continue
+            if not self._stack:
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame[0] == "obj" and frame[3]:
+                        try:
+                            frame[1] = json.loads(buf[self._string_start : i + 1])
+                        except json.JSONDecodeError:
+                            frame[1] = buf[self._string_start + 1 : i]
+                continue
+
+            frame = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":" and frame[0] == "obj":
+                frame[3] = False
+                frame[2] = i + 1
+            elif ch in "{[":
+                self._stack.append(["obj" if ch == "{" else "arr", None, None, ch == "{"])
+            elif ch in ",}]":
+                if frame[0] == "obj" and not frame[3] and frame[1] is not None:
+                    self._emit(frame, buf[frame[2] : i], emitted)
+                if ch == ",":
+                    if frame[0] == "obj":
+                        frame[1], frame[2], frame[3] = None, None, True
+                else:
+                    self._stack.pop()
+
+        return emitted
+
+    def _emit(self, frame: list, raw: str, emitted: list) -> None:
+        depth = len(self._stack)
+        if depth > self.max_depth:
+            return
+        path = tuple(f[1] for f in self._stack[:-1] if f[0] == "obj") + (frame[1],)
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            try:
+                value, _ = loads_lenient(raw)
+            except ValueError:
+                return
+        emitted.append((path, value))
+
+    def close(self) -> Any:
+        """Parse the full buffered text, repairing it if the stream was cut short."""
+        data, _ = loads_lenient(self.buffer)
+        return data
+
+
+def iter_sections(members: Iterable[Tuple[Tuple[str, ...], Any]], prefix: Tuple[str, ...] = ()) -> Iterable[Tuple[str, Any]]:
+    """Filter emitted members down to the direct children of `prefix`."""
+    for path, value in members:
+        if len(path) == len(prefix) + 1 and path[: len(prefix)] == prefix:
+            yield path[-1], value
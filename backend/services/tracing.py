@@ -0,0 +1,703 @@
+# services/tracing.py
+import asyncio
+import codecs
+import contextvars
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import uuid
+import wave
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from services import metrics
+
+# Record-and-replay traces of real sessions, for measuring the backend's own
+# overhead without upstream variance.
+#
+# Recording (TRACE_RECORD_DIR): TraceMiddleware captures every HTTP request and,
+# through a wrapper around httpx's transports (which Supabase, Gemini,
+# ElevenLabs and HeyGen calls all go through), every upstream call made while
+# serving it: method, path, body, status, time to headers and the arrival time
+# of each streamed chunk. Upstream calls outside any request (background jobs)
+# are recorded on their own. Each request is one gzip member of a JSONL file,
+# trace-<time>-<pid>.jsonl.gz, appended as requests finish.
+#
+# Traces are scrubbed as they are written: Authorization and API keys are
+# dropped, UUIDs and emails become stable pseudonyms (HMAC with TRACE_SALT, a
+# random salt by default), JWTs, phone and card numbers are masked, sensitive
+# JSON fields (email, phone, tokens, user_metadata, ...) are blanked and audio
+# is reduced to its size and WAV parameters. Free text (the pitch itself) is
+# kept, since the judge's prompts and the parsers depend on it.
+#
+# Replay (TRACE_REPLAY=<trace files>): the same transports serve the recorded
+# responses instead of calling out, after the recorded time to headers and
+# chunk gaps scaled by TRACE_REPLAY_TIMING ("original", "none" or a factor).
+# bench/trace_replay.py re-sends the recorded requests with an X-Trace-Replay
+# header naming each one, so its upstream calls are answered from its own
+# recording (exact path and body first, then same path, then same path shape)
+# and otherwise from the whole trace. The application code runs unchanged.
+
+TRACE_VERSION = 1
+REPLAY_HEADER = b"x-trace-replay"
+PSEUDONYM_PREFIX = "00000000-0000-4000-8000-"
+PSEUDONYM_EMAIL_DOMAIN = "@example.invalid"
+
+# Response headers replay needs; everything else is dropped
+KEPT_RESPONSE_HEADERS = ("content-type", "content-range", "retry-after")
+# Inbound headers worth replaying; credentials are never recorded
+KEPT_REQUEST_HEADERS = ("content-type", "accept", "x-request-id")
+SENSITIVE_KEYS = frozenset({
+    "email", "phone", "password", "access_token", "refresh_token", "provider_token", "provider_refresh_token",
+    "token", "api_key", "apikey", "full_name", "avatar_url", "user_metadata", "identities", "ip", "ip_address",
+})
+
+_UUID_RE = re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_JWT_RE = re.compile(r"\beyJ[\w-]+\.[\w-]+\.[\w-]*")
+# Neither may touch the digit runs inside a UUID (or its pseudonym)
+_PHONE_RE = re.compile(r"(?<![\w$.-])\+?\d{0,3}[\s.-]?\(?\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}(?![\w%-])")
+_CARD_RE = re.compile(r"(?<![\w-])(?:\d{4}[ -]?){3}\d{4}(?![\w-])")
+_SECRET_PARAM_RE = re.compile(r"((?:api_?key|key|token|access_token|apikey)=)[^&\s\"]+", re.I)
+
+_current: contextvars.ContextVar[Optional[object]] = contextvars.ContextVar("trace", default=None)
+
+
+class Scrubber:
+    """Removes credentials and personal data from trace text; applying it twice changes nothing."""
+
+    def __init__(self, salt: bytes):
+        self.salt = salt
+
+    def _digest(self, value: str) -> str:
+        return hmac.new(self.salt, value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _uuid(self, match: re.Match) -> str:
+        value = match.group(0).lower()
+        return value if value.startswith(PSEUDONYM_PREFIX) else PSEUDONYM_PREFIX + self._digest(value)[:12]
+
+    def _email(self, match: re.Match) -> str:
+        value = match.group(0).lower()
+        return value if value.endswith(PSEUDONYM_EMAIL_DOMAIN) else f"user-{self._digest(value)[:10]}{PSEUDONYM_EMAIL_DOMAIN}"
+
+    def text(self, text: str) -> str:
+        text = _JWT_RE.sub("[jwt]", text)
+        text = _SECRET_PARAM_RE.sub(r"\1[redacted]", text)
+        text = _EMAIL_RE.sub(self._email, text)
+        text = _UUID_RE.sub(self._uuid, text)
+        text = _CARD_RE.sub("[card]", text)
+        return _PHONE_RE.sub("[phone]", text)
+
+    def value(self, value, key: Optional[str] = None):
+        if key is not None and key.lower() in SENSITIVE_KEYS:
+            if key.lower() == "email" and isinstance(value, str) and value:
+                return self.text(value)
+            # Same type, no content, so the client libraries still parse it
+            return {} if isinstance(value, dict) else [] if isinstance(value, list) else \
+                "[redacted]" if isinstance(value, str) else value
+        if isinstance(value, dict):
+            return {k: self.value(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.value(v) for v in value]
+        if isinstance(value, str):
+            return self.text(value)
+        return value
+
+    def body(self, text: str, content_type: str = "") -> str:
+        """A JSON body is scrubbed field by field (and re-serialised); anything else as text."""
+        if "json" in content_type or text[:1] in ("{", "["):
+            try:
+                return json.dumps(self.value(json.loads(text)), ensure_ascii=False, separators=(",", ":"))
+            except ValueError:
+                pass
+        return self.text(text)
+
+    def client(self, authorization: Optional[str]) -> Optional[str]:
+        """A stable pseudonym for a caller's credentials, so a replay can keep their requests in order."""
+        return f"client-{self._digest(authorization)[:12]}" if authorization else None
+
+
+@lru_cache(maxsize=1)
+def get_scrubber() -> Scrubber:
+    salt = os.getenv("TRACE_SALT")
+    return Scrubber(salt.encode("utf-8") if salt else secrets.token_bytes(16))
+
+
+def is_text(content_type: str) -> bool:
+    content_type = (content_type or "").lower()
+    return any(kind in content_type for kind in ("json", "text/", "event-stream", "x-www-form-urlencoded", "xml"))
+
+
+def path_shape(path: str) -> str:
+    """A path or query with its ids generalised, for matching a call whose ids differ."""
+    return _UUID_RE.sub("{id}", path)
+
+
+def provider_for(host: str, path: str) -> str:
+    if "/rest/v1" in path:
+        return "supabase"
+    if "/auth/v1" in path:
+        return "supabase_auth"
+    if "generativelanguage" in host or ":generateContent" in path or ":streamGenerateContent" in path \
+            or "/cachedContents" in path:
+        return "gemini"
+    if "speech-to-text" in path:
+        return "elevenlabs_stt"
+    if "text-to-speech" in path or "elevenlabs" in host:
+        return "elevenlabs_tts"
+    if "heygen" in host or "streaming." in path:
+        return "heygen"
+    return host
+
+
+def wav_params(data: bytes) -> dict:
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            return {"wav": {"channels": wav.getnchannels(), "sample_width": wav.getsampwidth(),
+                            "rate": wav.getframerate(), "frames": wav.getnframes()}}
+    except (wave.Error, EOFError):
+        return {}
+
+
+def _describe_multipart(body: bytes, content_type: str, scrubber: Scrubber) -> List[dict]:
+    boundary = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not boundary:
+        return [{"name": "body", "size": len(body)}]
+    parts = []
+    for raw in body.split(b"--" + boundary.group(1).encode())[1:]:
+        head, _, data = raw.partition(b"\r\n\r\n")
+        if not data:
+            continue
+        data = data[:-2] if data.endswith(b"\r\n") else data
+        headers = head.decode("utf-8", "replace")
+        name = re.search(r'name="([^"]*)"', headers)
+        filename = re.search(r'filename="([^"]*)"', headers)
+        part_type = re.search(r"content-type:\s*([^\r\n]+)", headers, re.I)
+        part = {"name": name.group(1) if name else ""}
+        if filename:
+            # The file's name can be personal; its extension is kept for format sniffing
+            part.update(filename="upload" + os.path.splitext(filename.group(1))[1],
+                        content_type=part_type.group(1).strip() if part_type else "application/octet-stream",
+                        size=len(data), **wav_params(data))
+        else:
+            part["value"] = scrubber.text(data.decode("utf-8", "replace"))
+        parts.append(part)
+    return parts
+
+
+def describe_body(body: bytes, content_type: str, scrubber: Scrubber) -> dict:
+    if not body:
+        return {}
+    if is_text(content_type):
+        return {"body": scrubber.body(body.decode("utf-8", "replace"), content_type)}
+    if content_type.startswith("multipart/form-data"):
+        return {"parts": _describe_multipart(body, content_type, scrubber)}
+    return {"body_size": len(body), **wav_params(body)}
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+# --- Recording ---
+
+class UpstreamCall:
+    """One upstream HTTP call as it happens; finish() files it with its request trace."""
+
+    def __init__(self, trace: Optional["RequestTrace"], request, body: bytes):
+        self.trace = trace
+        self.started = time.perf_counter()
+        self.headers_at: Optional[float] = None
+        self.method = request.method
+        self.host = request.url.host
+        self.path = request.url.path
+        self.query = request.url.query.decode("ascii", "replace") if isinstance(request.url.query, bytes) \
+            else str(request.url.query)
+        self.content_type = request.headers.get("content-type", "")
+        self.body = body
+        self.status: Optional[int] = None
+        self.response_headers: Dict[str, str] = {}
+        self.chunks: List[Tuple[float, bytes]] = []
+        self.error: Optional[BaseException] = None
+        self._decompress = None
+        self.finished: Optional[float] = None
+
+    def respond(self, response) -> None:
+        self.headers_at = time.perf_counter()
+        self.status = response.status_code
+        self.response_headers = {k: response.headers[k] for k in KEPT_RESPONSE_HEADERS if k in response.headers}
+        if response.headers.get("content-encoding", "").lower() in ("gzip", "deflate"):
+            # Replay serves bodies as they were decoded
+            self._decompress = zlib.decompressobj(zlib.MAX_WBITS | 32)
+
+    def chunk(self, data: bytes) -> None:
+        if self._decompress is not None:
+            data = self._decompress.decompress(data)
+        if data:
+            self.chunks.append((time.perf_counter() - self.headers_at, data))
+
+    def fail(self, error: BaseException) -> None:
+        self.error = error
+        self.finish()
+
+    def finish(self) -> None:
+        if self.finished is not None:
+            return
+        self.finished = time.perf_counter()
+        if self.trace is not None and not self.trace.closed:
+            self.trace.upstream.append(self)
+        elif _recorder is not None:
+            _recorder.write_background(self)
+
+    def to_json(self, scrubber: Scrubber, request_started: Optional[float]) -> dict:
+        record = {
+            "provider": provider_for(self.host, self.path),
+            "method": self.method,
+            "path": scrubber.text(self.path),
+            "query": scrubber.text(self.query),
+            "offset_ms": _ms(self.started - request_started) if request_started else None,
+            "duration_ms": _ms(self.finished - self.started),
+        }
+        if self.body and is_text(self.content_type):
+            text = scrubber.body(self.body.decode("utf-8", "replace"), self.content_type)
+            record["digest"] = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+            record["request_size"] = len(text)
+        elif self.body:
+            record["request_size"] = len(self.body)
+        if self.error is not None:
+            record["error"] = type(self.error).__name__
+            record["message"] = scrubber.text(str(self.error))[:200]
+            return record
+        content_type = self.response_headers.get("content-type", "")
+        record.update(status=self.status, headers=self.response_headers,
+                      ttfb_ms=_ms(self.headers_at - self.started))
+        if not is_text(content_type):
+            record["binary_chunks"] = [[_ms(at), len(data)] for at, data in self.chunks]
+        elif "event-stream" in content_type or len(self.chunks) <= 1:
+            decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            record["chunks"] = [[_ms(at), scrubber.body(decoder.decode(data), content_type)
+                                 if len(self.chunks) == 1 else scrubber.text(decoder.decode(data))]
+                                for at, data in self.chunks]
+        else:
+            # A plain body split by the network: one chunk at its last arrival, scrubbed as a whole
+            text = b"".join(data for _, data in self.chunks).decode("utf-8", "replace")
+            record["chunks"] = [[_ms(self.chunks[-1][0]), scrubber.body(text, content_type)]]
+        return record
+
+
+class RequestTrace:
+    """An inbound request and the upstream calls made while serving it."""
+
+    def __init__(self, scope, arrival: float):
+        self.started = time.perf_counter()
+        self.arrival = arrival
+        self.scope = scope
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        self.body = bytearray()
+        self.upstream: List[UpstreamCall] = []
+        self.status: Optional[int] = None
+        self.response_type = ""
+        self.response_bytes = 0
+        self.first_byte: Optional[float] = None
+        self.closed = False
+
+    def to_json(self, scrubber: Scrubber) -> dict:
+        content_type = self.headers.get("content-type", "")
+        return {
+            "id": uuid.uuid4().hex[:12],
+            "arrival_s": round(self.arrival, 3),
+            "client": scrubber.client(self.headers.get("authorization")),
+            "method": self.scope["method"],
+            "path": scrubber.text(self.scope["path"]),
+            "query": scrubber.text(self.scope.get("query_string", b"").decode("latin-1")),
+            "headers": {k: scrubber.text(self.headers[k]) for k in KEPT_REQUEST_HEADERS if k in self.headers},
+            **describe_body(bytes(self.body), content_type, scrubber),
+            "response": {"status": self.status, "content_type": self.response_type, "bytes": self.response_bytes,
+                         "ttfb_ms": _ms(self.first_byte - self.started) if self.first_byte else None},
+            "duration_ms": _ms(time.perf_counter() - self.started),
+            "upstream": [call.to_json(scrubber, self.started) for call in self.upstream],
+        }
+
+
+class TraceRecorder:
+    """Appends scrubbed request traces to this process's trace file."""
+
+    def __init__(self, directory: str, max_requests: int):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"trace-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.jsonl.gz")
+        self.max_requests = max_requests
+        self.requests = 0
+        self.started = time.perf_counter()
+        self.scrubber = get_scrubber()
+        self._lock = threading.Lock()
+        self._append({"trace_version": TRACE_VERSION, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                      "pid": os.getpid(),
+                      # Where upstream calls went, so a replay issues the same paths
+                      "env": {name: os.getenv(name) for name in ("SUPABASE_URL", "GEMINI_API_BASE_URL",
+                                                                 "ELEVENLABS_API_URL", "HEYGEN_API_URL")
+                              if os.getenv(name)}})
+
+    @property
+    def full(self) -> bool:
+        return self.requests >= self.max_requests
+
+    def _append(self, record: dict) -> None:
+        # One gzip member per line: the file stays readable if the process dies mid-run
+        data = gzip.compress((json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+        with self._lock, open(self.path, "ab") as f:
+            f.write(data)
+
+    def write(self, trace: RequestTrace) -> None:
+        self.requests += 1
+        self._append(trace.to_json(self.scrubber))
+        metrics.inc("trace_requests_recorded_total")
+
+    def write_background(self, call: UpstreamCall) -> None:
+        try:
+            self._append({"background": call.to_json(self.scrubber, None)})
+        except OSError as e:
+            print(f"⚠️ Failed to write trace record: {e}")
+
+
+_recorder: Optional[TraceRecorder] = None
+
+
+# --- Replay ---
+
+def load_trace(paths: List[str]) -> Tuple[List[dict], List[dict], List[dict]]:
+    """(file headers, requests in recorded order, background calls) from trace files."""
+    headers, requests, background = [], [], []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "trace_version" in record:
+                    headers.append(record)
+                elif "background" in record:
+                    background.append(record["background"])
+                else:
+                    requests.append(record)
+    for index, request in enumerate(requests):
+        request["index"] = index
+    return headers, requests, background
+
+
+def timing_scale(setting: str) -> float:
+    setting = (setting or "original").lower()
+    if setting == "original":
+        return 1.0
+    if setting == "none":
+        return 0.0
+    return float(setting)
+
+
+class ReplayCursor:
+    """The upstream calls recorded for one request, handed out as the replayed request makes them."""
+
+    def __init__(self, calls: List[dict]):
+        self.pending = list(calls)
+
+    def take(self, method: str, key: str, shape: str, digest: Optional[str]) -> Optional[dict]:
+        for matches in (lambda c: _key(c) == key and c.get("digest") == digest,
+                        lambda c: _key(c) == key,
+                        lambda c: path_shape(_key(c)) == shape):
+            for i, call in enumerate(self.pending):
+                if call["method"] == method and matches(call):
+                    return self.pending.pop(i)
+        return None
+
+
+def _key(call: dict) -> str:
+    return f"{call['path']}?{call['query']}"
+
+
+class TraceReplayer:
+    """Recorded upstream responses for every request in a set of trace files."""
+
+    def __init__(self, paths: List[str], scale: float):
+        self.scale = scale
+        self.scrubber = get_scrubber()
+        _, self.requests, background = load_trace(paths)
+        self.by_key: Dict[Tuple[str, str], List[dict]] = defaultdict(list)
+        self.by_shape: Dict[Tuple[str, str], List[dict]] = defaultdict(list)
+        for call in [c for r in self.requests for c in r["upstream"]] + background:
+            self.by_key[(call["method"], _key(call))].append(call)
+            self.by_shape[(call["method"], path_shape(_key(call)))].append(call)
+        self._turns: Dict[tuple, int] = defaultdict(int)
+
+    def cursor(self, index: int) -> Optional[ReplayCursor]:
+        return ReplayCursor(self.requests[index]["upstream"]) if 0 <= index < len(self.requests) else None
+
+    def _any(self, pool: Dict[tuple, List[dict]], slot: tuple) -> Optional[dict]:
+        calls = pool.get(slot)
+        if not calls:
+            return None
+        # Round-robin, so repeated calls cycle through every recorded answer
+        turn = self._turns[slot]
+        self._turns[slot] += 1
+        return calls[turn % len(calls)]
+
+    def match(self, request, body: bytes) -> Optional[dict]:
+        scrubber = self.scrubber
+        path = scrubber.text(request.url.path)
+        query = request.url.query.decode("ascii", "replace") if isinstance(request.url.query, bytes) \
+            else str(request.url.query)
+        key = f"{path}?{scrubber.text(query)}"
+        digest = None
+        if body and is_text(request.headers.get("content-type", "")):
+            text = scrubber.body(body.decode("utf-8", "replace"), request.headers.get("content-type", ""))
+            digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+        provider = provider_for(request.url.host, request.url.path)
+
+        cursor = _current.get()
+        call = cursor.take(request.method, key, path_shape(key), digest) if isinstance(cursor, ReplayCursor) else None
+        result = "own"
+        if call is None:
+            result = "trace"
+            exact = [c for c in self.by_key.get((request.method, key), ()) if c.get("digest") == digest]
+            call = exact[0] if exact else (self._any(self.by_key, (request.method, key))
+                                           or self._any(self.by_shape, (request.method, path_shape(key))))
+        if call is None:
+            result = "unmatched"
+            print(f"⚠️ Trace replay: no recorded response for {request.method} {key[:120]}")
+        metrics.inc("trace_replay_upstream_total", provider=provider, result=result)
+        return call
+
+    def response_chunks(self, call: dict) -> List[Tuple[float, bytes]]:
+        if "binary_chunks" in call:
+            return [(at, b"\0" * size) for at, size in call["binary_chunks"]]
+        return [(at, text.encode("utf-8")) for at, text in call.get("chunks", [])]
+
+
+_replayer: Optional[TraceReplayer] = None
+
+
+# --- httpx transport hooks ---
+
+@lru_cache(maxsize=1)
+def _streams():
+    """Stream wrappers, defined on first use so httpx is only imported when tracing is on."""
+    import httpx
+
+    class RecordingSyncStream(httpx.SyncByteStream):
+        def __init__(self, stream, call: UpstreamCall):
+            self.stream, self.call = stream, call
+
+        def __iter__(self):
+            for data in self.stream:
+                self.call.chunk(data)
+                yield data
+
+        def close(self):
+            try:
+                self.stream.close()
+            finally:
+                self.call.finish()
+
+    class RecordingAsyncStream(httpx.AsyncByteStream):
+        def __init__(self, stream, call: UpstreamCall):
+            self.stream, self.call = stream, call
+
+        async def __aiter__(self):
+            async for data in self.stream:
+                self.call.chunk(data)
+                yield data
+
+        async def aclose(self):
+            try:
+                await self.stream.aclose()
+            finally:
+                self.call.finish()
+
+    class ReplaySyncStream(httpx.SyncByteStream):
+        def __init__(self, chunks, scale: float):
+            self.chunks, self.scale = chunks, scale
+
+        def __iter__(self):
+            previous = 0.0
+            for at, data in self.chunks:
+                if self.scale and at > previous:
+                    time.sleep((at - previous) * self.scale / 1000)
+                previous = at
+                yield data
+
+    class ReplayAsyncStream(httpx.AsyncByteStream):
+        def __init__(self, chunks, scale: float):
+            self.chunks, self.scale = chunks, scale
+
+        async def __aiter__(self):
+            previous = 0.0
+            for at, data in self.chunks:
+                if self.scale and at > previous:
+                    await asyncio.sleep((at - previous) * self.scale / 1000)
+                previous = at
+                yield data
+
+    return RecordingSyncStream, RecordingAsyncStream, ReplaySyncStream, ReplayAsyncStream
+
+
+def _replay_response(request, call: Optional[dict]):
+    import httpx
+
+    if call is None:
+        raise httpx.ConnectError("no recorded response in the replayed trace", request=request)
+    if "error" in call:
+        error = getattr(httpx, call["error"], None)
+        if not (isinstance(error, type) and issubclass(error, httpx.TransportError)):
+            error = httpx.TransportError
+        raise error(call.get("message") or "recorded upstream error", request=request)
+    return call["status"], call.get("headers", {})
+
+
+def install_recording() -> None:
+    import httpx
+
+    original_sync = httpx.HTTPTransport.handle_request
+    original_async = httpx.AsyncHTTPTransport.handle_async_request
+    RecordingSyncStream, RecordingAsyncStream, _, _ = _streams()
+
+    def handle_request(self, request):
+        trace = _current.get()
+        # Bodies are recorded decoded; don't let a server pick an encoding we can't decode
+        request.headers["Accept-Encoding"] = "gzip, deflate"
+        call = UpstreamCall(trace if isinstance(trace, RequestTrace) else None, request, request.read())
+        try:
+            response = original_sync(self, request)
+        except Exception as e:
+            call.fail(e)
+            raise
+        call.respond(response)
+        response.stream = RecordingSyncStream(response.stream, call)
+        return response
+
+    async def handle_async_request(self, request):
+        trace = _current.get()
+        request.headers["Accept-Encoding"] = "gzip, deflate"
+        call = UpstreamCall(trace if isinstance(trace, RequestTrace) else None, request, await request.aread())
+        try:
+            response = await original_async(self, request)
+        except BaseException as e:
+            call.fail(e)
+            raise
+        call.respond(response)
+        response.stream = RecordingAsyncStream(response.stream, call)
+        return response
+
+    httpx.HTTPTransport.handle_request = handle_request
+    httpx.AsyncHTTPTransport.handle_async_request = handle_async_request
+
+
+def install_replay() -> None:
+    import httpx
+
+    _, _, ReplaySyncStream, ReplayAsyncStream = _streams()
+
+    def handle_request(self, request):
+        call = _replayer.match(request, request.read())
+        scale = _replayer.scale
+        if call is not None and scale:
+            time.sleep((call.get("ttfb_ms") or call.get("duration_ms") or 0) * scale / 1000)
+        status, headers = _replay_response(request, call)
+        return httpx.Response(status, headers=headers, request=request,
+                              stream=ReplaySyncStream(_replayer.response_chunks(call), scale))
+
+    async def handle_async_request(self, request):
+        call = _replayer.match(request, await request.aread())
+        scale = _replayer.scale
+        if call is not None and scale:
+            await asyncio.sleep((call.get("ttfb_ms") or call.get("duration_ms") or 0) * scale / 1000)
+        status, headers = _replay_response(request, call)
+        return httpx.Response(status, headers=headers, request=request,
+                              stream=ReplayAsyncStream(_replayer.response_chunks(call), scale))
+
+    httpx.HTTPTransport.handle_request = handle_request
+    httpx.AsyncHTTPTransport.handle_async_request = handle_async_request
+
+
+# --- Middleware ---
+
+class TraceMiddleware:
+    """
+    ASGI middleware that records (TRACE_RECORD_DIR) or replays (TRACE_REPLAY)
+    request traces; see the module comment. With neither set it only forwards.
+    Recording tunables: TRACE_MAX_REQUESTS per process (default 10000),
+    TRACE_SKIP_PATHS (default "/metrics,/health,/admin"), TRACE_SALT.
+    """
+
+    def __init__(self, app):
+        global _recorder, _replayer
+        self.app = app
+        self.mode = None
+        self.skip = tuple(p for p in os.getenv("TRACE_SKIP_PATHS", "/metrics,/health,/admin").split(",") if p)
+        replay = os.getenv("TRACE_REPLAY")
+        directory = os.getenv("TRACE_RECORD_DIR")
+        if replay:
+            if _replayer is None:
+                _replayer = TraceReplayer(replay.split(","), timing_scale(os.getenv("TRACE_REPLAY_TIMING")))
+                install_replay()
+                print(f"🎞️ Replaying {len(_replayer.requests)} recorded requests "
+                      f"(timing x{_replayer.scale:g}) from {replay}")
+            self.mode = "replay"
+        elif directory:
+            if _recorder is None:
+                _recorder = TraceRecorder(directory, int(os.getenv("TRACE_MAX_REQUESTS", "10000")))
+                install_recording()
+                print(f"🎞️ Recording request traces to {_recorder.path}")
+            self.mode = "record"
+
+    async def __call__(self, scope, receive, send):
+        if self.mode is None or scope["type"] != "http" or scope["path"].startswith(self.skip):
+            return await self.app(scope, receive, send)
+        if self.mode == "replay":
+            return await self._replay(scope, receive, send)
+        if _recorder.full:
+            return await self.app(scope, receive, send)
+
+        trace = RequestTrace(scope, time.perf_counter() - _recorder.started)
+
+        async def recording_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                trace.body += message.get("body", b"")
+            return message
+
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                trace.response_type = dict(message.get("headers", [])).get(b"content-type", b"").decode("latin-1")
+            elif message["type"] == "http.response.body":
+                if trace.first_byte is None:
+                    trace.first_byte = time.perf_counter()
+                trace.response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            _current.reset(token)
+            trace.closed = True
+            try:
+                await asyncio.to_thread(_recorder.write, trace)
+            except OSError as e:
+                print(f"⚠️ Failed to write trace record: {e}")
+
+    async def _replay(self, scope, receive, send):
+        cursor = None
+        for name, value in scope["headers"]:
+            if name == REPLAY_HEADER:
+                cursor = _replayer.cursor(int(value))
+        token = _current.set(cursor)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
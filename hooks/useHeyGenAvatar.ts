@@ -10,6 +10,8 @@ interface UseHeyGenAvatarReturn {
   stream: MediaStream | null
   isLoading: boolean
   error: string | null
+  // HeyGen is unavailable (its circuit breaker is open): show a static avatar instead
+  isStaticAvatar: boolean
   startAvatar: (avatarId: string, onAvatarSpeak?: (text: string) => void) => Promise<void>
   stopAvatar: () => Promise<void>
   speak: (text: string) => Promise<void>
@@ -21,6 +23,7 @@ export function useHeyGenAvatar(): UseHeyGenAvatarReturn {
   const [stream, setStream] = useState<MediaStream | null>(null)
   const [isLoading, setIsLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
+  const [isStaticAvatar, setIsStaticAvatar] = useState(false)
   const [isAvatarActive, setIsAvatarActive] = useState(false)
   const currentSpeakingTextRef = useRef<string>('')
   const onAvatarSpeakRef = useRef<((text: string) => void) | null>(null)
@@ -33,6 +36,7 @@ export function useHeyGenAvatar(): UseHeyGenAvatarReturn {
 
     setIsLoading(true)
     setError(null)
+    setIsStaticAvatar(false)
     onAvatarSpeakRef.current = onAvatarSpeak || null
 
     try {
@@ -47,7 +51,13 @@ export function useHeyGenAvatar(): UseHeyGenAvatarReturn {
         throw new Error(errorData.detail || 'Failed to get access token')
       }
 
-      const { token } = await tokenResponse.json()
+      const { token, static_avatar } = await tokenResponse.json()
+      if (static_avatar) {
+        console.warn('⚠️ HeyGen unavailable, falling back to a static avatar')
+        setIsStaticAvatar(true)
+        setIsLoading(false)
+        return
+      }
       console.log('✅ Token received from backend')
 
       // Initialize StreamingAvatar
@@ -163,6 +173,7 @@ export function useHeyGenAvatar(): UseHeyGenAvatarReturn {
     stream,
     isLoading,
     error,
+    isStaticAvatar,
     startAvatar,
     stopAvatar,
     speak,